@@ -1,21 +1,29 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import re
+import sys
 import logging
 import asyncio
-import base64
-import binascii
-import re
+from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional, Dict, Any
 import uuid
 from datetime import datetime, timezone, timedelta
-import bcrypt
-from jose import jwt, JWTError
-import secrets
+
+# Code shared with the Render API lives in backend/kayicom_core (bundled through vercel.json includeFiles).
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from kayicom_core import audit, rbac  # noqa: E402
+from kayicom_core.kyc_images import cloudinary_creds, cloudinary_is_configured, kyc_store_image_value  # noqa: E402
+from kayicom_core.responses import ORJSONResponse  # noqa: E402
+from kayicom_core.routers import admin_rbac as admin_rbac_routes  # noqa: E402
+from kayicom_core.routers import auth as auth_routes  # noqa: E402
+from kayicom_core.routers import help_center as help_center_routes  # noqa: E402
+from kayicom_core.routers import system as system_routes  # noqa: E402
+from kayicom_core.security import generate_affiliate_code, generate_client_id, hash_password  # noqa: E402
 
 load_dotenv()
 
@@ -58,205 +66,58 @@ if mongo_url and ('mongodb+srv://' in mongo_url or 'mongodb://' in mongo_url):
         parsed.fragment
     ))
 
+# One Motor client per function instance: module globals survive warm invocations, so the
+# connection pool is reused instead of re-handshaking (TLS + auth) on every request. Pool sizes
+# are small because each instance serves one request at a time.
+MONGO_CLIENT_OPTIONS = {
+    "maxPoolSize": int(os.environ.get("MONGO_MAX_POOL_SIZE", "10")),
+    "minPoolSize": 0,
+    "maxIdleTimeMS": int(os.environ.get("MONGO_MAX_IDLE_MS", "60000")),
+    "serverSelectionTimeoutMS": int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+    "connectTimeoutMS": int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+    "appname": "kayicom-vercel",
+}
+
 client = None
 db = None
+_client_loop = None
 
 def get_db():
-    global client, db
+    global client, db, _client_loop
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    # Motor binds to the event loop of its first operation; rebuild if the runtime replaced it.
+    if client is not None and loop is not None and _client_loop is not None and loop is not _client_loop:
+        client.close()
+        client = None
     if client is None:
         if not mongo_url:
             raise ValueError("MONGO_URL environment variable is required")
-        client = AsyncIOMotorClient(mongo_url)
+        client = AsyncIOMotorClient(mongo_url, **MONGO_CLIENT_OPTIONS)
         db = client[db_name]
+        _client_loop = loop
     return db
 
-# JWT Configuration
-SECRET_KEY = os.environ.get('JWT_SECRET', secrets.token_urlsafe(32))
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_HOURS = 24
-
 app = FastAPI(
     title="KAYICOM Wallet API",
     description="API for KAYICOM digital wallet platform",
     version="1.0.0",
     docs_url="/api/docs",
     redoc_url="/api/redoc",
-    openapi_url="/api/openapi.json"
+    openapi_url="/api/openapi.json",
+    default_response_class=ORJSONResponse,
 )
 
 api_router = APIRouter(prefix="/api")
-security = HTTPBearer()
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# ==================== KYC IMAGE STORAGE (OPTIONAL CLOUDINARY) ====================
-
-_DATA_URL_IMAGE_RE = re.compile(
-    r"^data:(image/(?:png|jpe?g|webp));base64,(.+)$",
-    flags=re.IGNORECASE | re.DOTALL,
-)
-
-def _cloudinary_creds(settings: Optional[dict]) -> Dict[str, Optional[str]]:
-    s = settings or {}
-    cloud_name = (s.get("cloudinary_cloud_name") or os.environ.get("CLOUDINARY_CLOUD_NAME") or "").strip() or None
-    api_key = (s.get("cloudinary_api_key") or os.environ.get("CLOUDINARY_API_KEY") or "").strip() or None
-    api_secret = (s.get("cloudinary_api_secret") or os.environ.get("CLOUDINARY_API_SECRET") or "").strip() or None
-    folder = (s.get("cloudinary_folder") or os.environ.get("CLOUDINARY_FOLDER") or "kayicom/kyc").strip().strip("/") or "kayicom/kyc"
-    return {"cloud_name": cloud_name, "api_key": api_key, "api_secret": api_secret, "folder": folder}
-
-
-def _cloudinary_is_configured(settings: Optional[dict]) -> bool:
-    c = _cloudinary_creds(settings)
-    return bool(c.get("cloud_name") and c.get("api_key") and c.get("api_secret"))
-
-
-def _cloudinary_setup(settings: Optional[dict]) -> bool:
-    if not _cloudinary_is_configured(settings):
-        return False
-    import cloudinary  # type: ignore
-    c = _cloudinary_creds(settings)
-
-    cloudinary.config(
-        cloud_name=c["cloud_name"],
-        api_key=c["api_key"],
-        api_secret=c["api_secret"],
-        secure=True,
-    )
-    return True
-
-
-def _parse_image_data_url(value: str) -> Optional[Dict[str, Any]]:
-    if not isinstance(value, str):
-        return None
-    m = _DATA_URL_IMAGE_RE.match(value.strip())
-    if not m:
-        return None
-    mime = (m.group(1) or "").lower().replace("image/jpg", "image/jpeg")
-    b64 = m.group(2) or ""
-    try:
-        raw = base64.b64decode(b64, validate=True)
-    except (binascii.Error, ValueError):
-        raise HTTPException(status_code=400, detail="Invalid image encoding (base64)")
-    return {"mime": mime, "bytes": raw, "data_url": value.strip()}
-
-
-async def _cloudinary_upload_data_url(*, settings: Optional[dict], data_url: str, folder: str, public_id: str) -> str:
-    if not _cloudinary_setup(settings):
-        raise RuntimeError("Cloudinary not configured")
-    import cloudinary.uploader  # type: ignore
-
-    result = await asyncio.to_thread(
-        cloudinary.uploader.upload,
-        data_url,
-        folder=folder,
-        public_id=public_id,
-        overwrite=True,
-        unique_filename=False,
-        resource_type="image",
-    )
-    url = (result or {}).get("secure_url") or (result or {}).get("url")
-    if not url:
-        raise RuntimeError("Cloudinary upload did not return a URL")
-    return str(url)
-
-
-async def _kyc_store_image_value(
-    value: Optional[str],
-    *,
-    user_id: str,
-    kyc_id: str,
-    field_name: str,
-    settings: Optional[dict] = None,
-) -> Dict[str, Any]:
-    if not value:
-        return {"value": value, "meta": None}
-
-    parsed = _parse_image_data_url(value)
-    if not parsed:
-        return {
-            "value": value,
-            "meta": {
-                "storage": "external",
-                "mime": None,
-                "bytes": None,
-                "uploaded_at": datetime.now(timezone.utc).isoformat(),
-            },
-        }
-
-    mime = parsed["mime"]
-    raw = parsed["bytes"]
-    max_bytes = int((settings or {}).get("kyc_max_image_bytes") or os.environ.get("KYC_MAX_IMAGE_BYTES") or 5 * 1024 * 1024)
-    if len(raw) > max_bytes:
-        raise HTTPException(status_code=413, detail="Image too large")
-    if mime not in {"image/jpeg", "image/png", "image/webp"}:
-        raise HTTPException(status_code=400, detail="Unsupported image type")
-
-    if _cloudinary_is_configured(settings):
-        folder = _cloudinary_creds(settings).get("folder") or "kayicom/kyc"
-        public_id = f"{kyc_id}_{field_name}"
-        try:
-            url = await _cloudinary_upload_data_url(settings=settings, data_url=parsed["data_url"], folder=folder, public_id=public_id)
-            return {
-                "value": url,
-                "meta": {
-                    "storage": "cloudinary",
-                    "mime": mime,
-                    "bytes": len(raw),
-                    "public_id": f"{folder}/{public_id}" if folder else public_id,
-                    "uploaded_at": datetime.now(timezone.utc).isoformat(),
-                },
-            }
-        except Exception as e:
-            logger.exception("Cloudinary upload failed; falling back to inline storage: %s", e)
-
-    return {
-        "value": parsed["data_url"],
-        "meta": {
-            "storage": "inline",
-            "mime": mime,
-            "bytes": len(raw),
-            "uploaded_at": datetime.now(timezone.utc).isoformat(),
-        },
-    }
-
 # ==================== MODELS ====================
 
-class UserCreate(BaseModel):
-    email: EmailStr
-    password: str
-    full_name: str
-    phone: str
-    language: str = "fr"
-
-class UserLogin(BaseModel):
-    email: EmailStr
-    password: str
-
-class UserResponse(BaseModel):
-    user_id: str
-    client_id: str
-    email: str
-    full_name: str
-    phone: str
-    language: str
-    kyc_status: str
-    wallet_htg: float
-    wallet_usd: float
-    affiliate_code: str
-    affiliate_earnings: float
-    is_active: bool
-    is_admin: bool
-    created_at: str
-
-class PasswordReset(BaseModel):
-    email: EmailStr
-
-class PasswordResetConfirm(BaseModel):
-    token: str
-    new_password: str
-
 class DepositRequest(BaseModel):
     amount: float
     currency: str
@@ -400,169 +261,6 @@ class AdminProfileUpdate(BaseModel):
     phone: Optional[str] = None
     email: Optional[EmailStr] = None
 
-class HelpArticleCreate(BaseModel):
-    title_ht: Optional[str] = None
-    title_fr: Optional[str] = None
-    title_en: Optional[str] = None
-    content_ht: Optional[str] = None
-    content_fr: Optional[str] = None
-    content_en: Optional[str] = None
-    category: Optional[str] = None
-    order: Optional[int] = None
-    is_active: Optional[bool] = True
-
-class HelpArticleUpdate(BaseModel):
-    title_ht: Optional[str] = None
-    title_fr: Optional[str] = None
-    title_en: Optional[str] = None
-    content_ht: Optional[str] = None
-    content_fr: Optional[str] = None
-    content_en: Optional[str] = None
-    category: Optional[str] = None
-    order: Optional[int] = None
-    is_active: Optional[bool] = None
-
-async def seed_help_articles_if_empty(db):
-    count = await db.help_articles.count_documents({})
-    if count > 0:
-        return
-
-    now = datetime.now(timezone.utc).isoformat()
-    defaults = [
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kijan pou kreye yon kont",
-            "content_ht": "Sou paj Enskripsyon, ranpli non konplè, imel ak nimewo telefòn. Valide, epi konekte ak imel ou ak modpas ou.",
-            "category": "Kòmanse",
-            "order": 1,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kijan pou verifye KYC",
-            "content_ht": "Nan meni KYC, telechaje yon pyès idantite ki klè ansanm ak selfie a. Asire non yo matche. Admin ap revize dosye a.",
-            "category": "Kont & Sekirite",
-            "order": 2,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kijan pou fè depo lajan",
-            "content_ht": "Nan Depo, chwazi metòd la, suiv enstriksyon yo, epi soumèt prèv la si li mande. Admin ap valide depo a.",
-            "category": "Depo & Retrè",
-            "order": 3,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kijan pou fè retrè lajan",
-            "content_ht": "Nan Retrè, chwazi metòd la, antre montan an, verifye frè yo, epi soumèt. Admin ap trete demann lan.",
-            "category": "Depo & Retrè",
-            "order": 4,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kijan pou fè transfè lajan",
-            "content_ht": "Nan Transfè, antre ID kliyan an oswa nimewo telefòn li, antre montan an, epi konfime.",
-            "category": "Transfè & Swap",
-            "order": 5,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kijan pou fè swap HTG/USD",
-            "content_ht": "Nan Swap, chwazi deviz ou bay ak deviz ou vle resevwa, verifye to chanj lan, epi konfime.",
-            "category": "Transfè & Swap",
-            "order": 6,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kat Vityèl: kòmande kat la",
-            "content_ht": "Nan Kat Vityèl, klike Kòmande. KYC dwe apwouve. Frè kòmand lan ap parèt avan ou konfime.",
-            "category": "Kat Vityèl",
-            "order": 7,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kat Vityèl: ajoute kòb (top-up)",
-            "content_ht": "Chwazi kat la, antre montan an, verifye frè ak minimòm yo, epi konfime top-up la.",
-            "category": "Kat Vityèl",
-            "order": 8,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kat Vityèl: fè retrè sou bous",
-            "content_ht": "Chwazi kat la, antre montan an, epi soumèt. Lajan an retounen nan bous USD ou si kat la sipòte li.",
-            "category": "Kat Vityèl",
-            "order": 9,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kijan pou achte minit (TopUp)",
-            "content_ht": "Nan TopUp, chwazi peyi a, antre nimewo telefòn nan, mete montan an, epi konfime.",
-            "category": "Lòt sèvis",
-            "order": 10,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Mwen bliye modpas mwen",
-            "content_ht": "Sou paj Koneksyon, klike “Mwen bliye modpas”, antre imel ou, epi swiv etap yo nan imel la.",
-            "category": "Kont & Sekirite",
-            "order": 11,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kijan pou kontakte sipò",
-            "content_ht": "Sèvi ak bouton chat oswa WhatsApp si li aktif. Sinon, kontakte sipò a dirèkteman.",
-            "category": "Sipò",
-            "order": 12,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kijan pou enstale app la sou telefòn",
-            "content_ht": "Sou Android (Chrome), klike “Enstale App KAYICOM” oswa Menu (⋮) → Add to Home screen. Sou iPhone, itilize Share → Add to Home Screen.",
-            "category": "Kòmanse",
-            "order": 13,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-    ]
-
-    await db.help_articles.insert_many(defaults)
-
 class BulkEmailRequest(BaseModel):
     subject: str
     html_content: str
@@ -605,199 +303,15 @@ class RBACPermissionsUpdate(BaseModel):
 
 # ==================== HELPERS ====================
 
-def generate_client_id():
-    return f"KC{secrets.token_hex(4).upper()}"
-
-def generate_affiliate_code():
-    return secrets.token_urlsafe(8)
-
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
-
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode(), hashed.encode())
-
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS))
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    db = get_db()
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        user = await db.users.find_one({"user_id": user_id}, {"_id": 0})
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        if not user.get("is_active", True):
-            raise HTTPException(status_code=403, detail="Account is suspended")
-        return user
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-def _normalize_admin_role(user: dict) -> str:
-    if not user or not user.get("is_admin"):
-        return ""
-    role = str(user.get("admin_role") or "").strip().lower()
-    return role or "admin"
-
-
-def _rbac_is_allowed(*, role: str, path: str) -> bool:
-    """
-    Server-side RBAC for /api/admin/* endpoints.
-    Keep frontend route/menu permissions aligned with this.
-    """
-    if not role:
-        return False
-    if role == "superadmin":
-        return True
-
-    allow: Dict[str, List[str]] = {
-        "support": [
-            "/api/admin/dashboard",
-            "/api/admin/users",
-            "/api/admin/kyc",
-            "/api/admin/kyc-image-storage-status",
-            "/api/admin/virtual-cards",
-            "/api/admin/virtual-card-orders",
-            "/api/admin/card-topups",
-            "/api/admin/topup-orders",
-        ],
-        "finance": [
-            "/api/admin/dashboard",
-            "/api/admin/deposits",
-            "/api/admin/withdrawals",
-            "/api/admin/exchange-rates",
-            "/api/admin/rates",
-            "/api/admin/fees",
-            "/api/admin/card-fees",
-            "/api/admin/withdrawal-limits",
-            "/api/admin/payment-gateway",
-            "/api/admin/virtual-cards",
-            "/api/admin/virtual-card-orders",
-            "/api/admin/card-topups",
-            "/api/admin/topup-orders",
-            "/api/admin/agent-deposits",
-            "/api/admin/agent-settings",
-            "/api/admin/agent-commission-withdrawals",
-            "/api/admin/agent-requests",
-            "/api/admin/agents",
-            "/api/admin/recharge-agent",
-            "/api/admin/client-reports",
-        ],
-        "manager": [
-            "/api/admin/dashboard",
-            "/api/admin/users",
-            "/api/admin/kyc",
-            "/api/admin/kyc-image-storage-status",
-            "/api/admin/deposits",
-            "/api/admin/withdrawals",
-            "/api/admin/virtual-cards",
-            "/api/admin/virtual-card-orders",
-            "/api/admin/card-topups",
-            "/api/admin/topup-orders",
-            "/api/admin/bulk-email",
-            "/api/admin/logs",
-            "/api/admin/webhook-events",
-            "/api/admin/payment-gateway",
-            "/api/admin/agent-deposits",
-            "/api/admin/agent-settings",
-            "/api/admin/agent-commission-withdrawals",
-            "/api/admin/agent-requests",
-            "/api/admin/agents",
-            "/api/admin/recharge-agent",
-            "/api/admin/client-reports",
-            "/api/admin/whatsapp-notifications",
-            "/api/admin/test-whatsapp",
-            "/api/admin/test-telegram",
-            "/api/admin/telegram/setup-webhook",
-        ],
-        "admin": [
-            "/api/admin/dashboard",
-            "/api/admin/users",
-            "/api/admin/kyc",
-            "/api/admin/kyc-image-storage-status",
-            "/api/admin/deposits",
-            "/api/admin/withdrawals",
-            "/api/admin/exchange-rates",
-            "/api/admin/rates",
-            "/api/admin/fees",
-            "/api/admin/card-fees",
-            "/api/admin/withdrawal-limits",
-            "/api/admin/payment-gateway",
-            "/api/admin/settings",
-            "/api/admin/virtual-cards",
-            "/api/admin/virtual-card-orders",
-            "/api/admin/card-topups",
-            "/api/admin/topup-orders",
-            "/api/admin/bulk-email",
-            "/api/admin/logs",
-            "/api/admin/webhook-events",
-            "/api/admin/agent-deposits",
-            "/api/admin/agent-settings",
-            "/api/admin/agent-commission-withdrawals",
-            "/api/admin/agent-requests",
-            "/api/admin/agents",
-            "/api/admin/recharge-agent",
-            "/api/admin/client-reports",
-            "/api/admin/whatsapp-notifications",
-            "/api/admin/test-whatsapp",
-            "/api/admin/test-telegram",
-            "/api/admin/telegram/setup-webhook",
-            "/api/admin/strowallet",
-            "/api/admin/team",
-            "/api/admin/rbac-permissions",
-            "/api/admin/setup-superadmin",
-        ],
-    }
-
-    blocked_prefixes = [
-        "/api/admin/purge-old-records",
-    ]
-    for bp in blocked_prefixes:
-        if path.startswith(bp):
-            return False
-
-    prefixes = allow.get(role, [])
-    return any(path == p or path.startswith(p + "/") for p in prefixes)
-
-
-async def get_admin_user(request: Request, current_user: dict = Depends(get_current_user)):
-    if not current_user.get("is_admin"):
-        raise HTTPException(status_code=403, detail="Admin access required")
-
-    # Primary admin always has superadmin access
-    primary_admin_email = "kayicom509@gmail.com"
-    user_email = (current_user.get("email") or "").lower()
-    
-    if user_email == primary_admin_email.lower():
-        # Ensure superadmin role in memory for this request
-        current_user["admin_role"] = "superadmin"
-        return current_user
-
-    role = _normalize_admin_role(current_user)
-    path = str(request.url.path or "")
-
-    if path.startswith("/api/admin"):
-        if not _rbac_is_allowed(role=role, path=path):
-            raise HTTPException(status_code=403, detail="Insufficient role permissions")
-
-    return current_user
+# Auth and the admin RBAC check are shared with the Render API (kayicom_core.routers.auth), including
+# the DB-backed permissions in settings.rbac_permissions (defaults: rbac.DEFAULT_PERMISSIONS).
+admin_permissions = rbac.PermissionStore(get_db)
+get_current_user = auth_routes.current_user_dependency(get_db)
+get_admin_user = auth_routes.admin_user_dependency(get_current_user, admin_permissions)
 
 async def log_action(user_id: str, action: str, details: dict):
     db = get_db()
-    log_entry = {
-        "log_id": str(uuid.uuid4()),
-        "user_id": user_id,
-        "action": action,
-        "details": details,
-        "timestamp": datetime.now(timezone.utc).isoformat()
-    }
-    await db.logs.insert_one(log_entry)
+    await db.logs.insert_one(audit.new_log_entry(user_id, action, details))
 
 async def send_email(to_email: str, subject: str, html_content: str):
     db = get_db()
@@ -843,88 +357,14 @@ async def notify_admin(subject: str, html: str):
         logger.error(f"Admin email notify error: {e}")
 
 # ==================== AUTH ROUTES ====================
+# /auth/* is served by kayicom_core.routers.auth, mounted next to api_router below.
 
-@api_router.post("/auth/register")
-async def register(user: UserCreate):
-    db = get_db()
-    existing = await db.users.find_one({"email": user.email.lower()}, {"_id": 0})
-    if existing:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
-    user_id = str(uuid.uuid4())
-    client_id = generate_client_id()
-    
-    user_doc = {
-        "user_id": user_id,
-        "client_id": client_id,
-        "email": user.email.lower(),
-        "password_hash": hash_password(user.password),
-        "full_name": user.full_name,
-        "phone": user.phone,
-        "language": user.language,
-        "kyc_status": "pending",
-        "wallet_htg": 0.0,
-        "wallet_usd": 0.0,
-        "affiliate_code": generate_affiliate_code(),
-        "affiliate_earnings": 0.0,
-        "referred_by": None,
-        "is_active": True,
-        "is_admin": False,
-        "two_factor_enabled": False,
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    
-    await db.users.insert_one(user_doc)
-    await log_action(user_id, "register", {"email": user.email})
-    
-    token = create_access_token({"sub": user_id})
-    
-    del user_doc["password_hash"]
-    if "_id" in user_doc:
-        del user_doc["_id"]
-    
-    return {"token": token, "user": user_doc}
-
-@api_router.post("/auth/login")
-async def login(credentials: UserLogin):
-    db = get_db()
-    user = await db.users.find_one({"email": credentials.email.lower()}, {"_id": 0})
-    if not user or not verify_password(credentials.password, user["password_hash"]):
-        raise HTTPException(status_code=401, detail="Invalid credentials")
-    
-    if not user.get("is_active", True):
-        raise HTTPException(status_code=403, detail="Account is suspended")
-    
-    await log_action(user["user_id"], "login", {"email": credentials.email})
-    
-    token = create_access_token({"sub": user["user_id"]})
-    
-    user_response = {k: v for k, v in user.items() if k != "password_hash"}
-    
-    return {"token": token, "user": user_response}
-
-@api_router.post("/auth/forgot-password")
-async def forgot_password(request: PasswordReset):
-    db = get_db()
-    user = await db.users.find_one({"email": request.email.lower()}, {"_id": 0})
-    if not user:
-        return {"message": "If email exists, reset link will be sent"}
-    
-    reset_token = secrets.token_urlsafe(32)
-    expires = datetime.now(timezone.utc) + timedelta(hours=1)
-    
-    await db.password_resets.insert_one({
-        "token": reset_token,
-        "user_id": user["user_id"],
-        "expires": expires.isoformat(),
-        "used": False
-    })
-    
+async def send_password_reset_email(user: dict, token: str) -> None:
+    """Password reset link for the shared /auth/forgot-password route."""
     frontend_url = os.environ.get('FRONTEND_URL', 'https://kayicom.vercel.app')
-    reset_link = f"{frontend_url}/reset-password?token={reset_token}"
-    
+    reset_link = f"{frontend_url}/reset-password?token={token}"
     await send_email(
-        request.email,
+        user["email"],
         "KAYICOM - Réinitialisation du mot de passe",
         f"""
         <h2>Réinitialisation de votre mot de passe</h2>
@@ -933,32 +373,6 @@ async def forgot_password(request: PasswordReset):
         <p>Ce lien expire dans 1 heure.</p>
         """
     )
-    
-    return {"message": "If email exists, reset link will be sent"}
-
-@api_router.post("/auth/reset-password")
-async def reset_password(request: PasswordResetConfirm):
-    db = get_db()
-    reset_doc = await db.password_resets.find_one({"token": request.token, "used": False}, {"_id": 0})
-    if not reset_doc:
-        raise HTTPException(status_code=400, detail="Invalid or expired reset token")
-    
-    if datetime.fromisoformat(reset_doc["expires"]) < datetime.now(timezone.utc):
-        raise HTTPException(status_code=400, detail="Reset token has expired")
-    
-    await db.users.update_one(
-        {"user_id": reset_doc["user_id"]},
-        {"$set": {"password_hash": hash_password(request.new_password)}}
-    )
-    
-    await db.password_resets.update_one({"token": request.token}, {"$set": {"used": True}})
-    await log_action(reset_doc["user_id"], "password_reset", {})
-    
-    return {"message": "Password reset successfully"}
-
-@api_router.get("/auth/me", response_model=UserResponse)
-async def get_me(current_user: dict = Depends(get_current_user)):
-    return UserResponse(**current_user)
 
 # ==================== WALLET ROUTES ====================
 
@@ -1345,21 +759,21 @@ async def submit_kyc(request: KYCSubmit, current_user: dict = Depends(get_curren
     kyc_id = str(uuid.uuid4())
     settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
 
-    id_front = await _kyc_store_image_value(
+    id_front = await kyc_store_image_value(
         request.id_front_image,
         user_id=current_user["user_id"],
         kyc_id=kyc_id,
         field_name="id_front_image",
         settings=settings,
     )
-    id_back = await _kyc_store_image_value(
+    id_back = await kyc_store_image_value(
         request.id_back_image,
         user_id=current_user["user_id"],
         kyc_id=kyc_id,
         field_name="id_back_image",
         settings=settings,
     )
-    selfie = await _kyc_store_image_value(
+    selfie = await kyc_store_image_value(
         request.selfie_with_id,
         user_id=current_user["user_id"],
         kyc_id=kyc_id,
@@ -1685,13 +1099,6 @@ async def get_public_chat_settings():
         "whatsapp_number": settings.get("whatsapp_number") if settings.get("whatsapp_enabled") else None
     }
 
-@api_router.get("/public/help-center")
-async def get_public_help_center():
-    db = get_db()
-    await seed_help_articles_if_empty(db)
-    articles = await db.help_articles.find({"is_active": True}, {"_id": 0}).sort("order", 1).to_list(500)
-    return {"articles": articles}
-
 # ==================== ADMIN ROUTES ====================
 
 @api_router.get("/admin/dashboard")
@@ -1959,7 +1366,7 @@ async def admin_migrate_kyc_images(
 ):
     db = get_db()
     settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
-    if not _cloudinary_is_configured(settings):
+    if not cloudinary_is_configured(settings):
         raise HTTPException(status_code=400, detail="Cloudinary is not configured (set in Admin Settings or CLOUDINARY_* env vars)")
 
     base_filter: Dict[str, Any] = {}
@@ -2012,7 +1419,7 @@ async def admin_migrate_kyc_images(
             if not isinstance(val, str) or not val.lower().startswith("data:image/"):
                 continue
             try:
-                stored = await _kyc_store_image_value(val, user_id=user_id, kyc_id=kyc_id, field_name=field_name, settings=settings)
+                stored = await kyc_store_image_value(val, user_id=user_id, kyc_id=kyc_id, field_name=field_name, settings=settings)
                 if stored["value"] and stored["value"] != val:
                     update_fields[field_name] = stored["value"]
                     meta[field_name] = stored["meta"]
@@ -2039,14 +1446,14 @@ async def admin_migrate_kyc_images(
 async def admin_kyc_image_storage_status(admin: dict = Depends(get_admin_user)):
     db = get_db()
     settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
-    c = _cloudinary_creds(settings)
+    c = cloudinary_creds(settings)
     source = "none"
     if settings and any((settings.get("cloudinary_cloud_name"), settings.get("cloudinary_api_key"), settings.get("cloudinary_api_secret"))):
         source = "settings"
     elif any((os.environ.get("CLOUDINARY_CLOUD_NAME"), os.environ.get("CLOUDINARY_API_KEY"), os.environ.get("CLOUDINARY_API_SECRET"))):
         source = "env"
     return {
-        "cloudinary_configured": _cloudinary_is_configured(settings),
+        "cloudinary_configured": cloudinary_is_configured(settings),
         "source": source,
         "cloudinary_folder": c.get("folder"),
         "kyc_max_image_bytes": int((settings or {}).get("kyc_max_image_bytes") or os.environ.get("KYC_MAX_IMAGE_BYTES") or 5242880),
@@ -2066,7 +1473,7 @@ async def admin_get_deposits(
     deposits = await db.deposits.find(query, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(limit)
     
     # Filter by RBAC permissions (if not superadmin)
-    role = _normalize_admin_role(admin)
+    role = rbac.normalize_admin_role(admin)
     if role != "superadmin":
         rbac_doc = await db.rbac_permissions.find_one({"config_id": "main"}, {"_id": 0})
         if rbac_doc and rbac_doc.get("permissions"):
@@ -2138,7 +1545,7 @@ async def admin_get_withdrawals(
     withdrawals = await db.withdrawals.find(query, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(limit)
     
     # Filter by RBAC permissions (if not superadmin)
-    role = _normalize_admin_role(admin)
+    role = rbac.normalize_admin_role(admin)
     if role != "superadmin":
         rbac_doc = await db.rbac_permissions.find_one({"config_id": "main"}, {"_id": 0})
         if rbac_doc and rbac_doc.get("permissions"):
@@ -2393,66 +1800,6 @@ async def admin_update_profile(payload: AdminProfileUpdate, admin: dict = Depend
     updated_user = await db.users.find_one({"user_id": admin["user_id"]}, {"_id": 0, "password_hash": 0})
     return {"user": updated_user, "message": "Admin profile updated"}
 
-@api_router.get("/admin/help-center")
-async def admin_get_help_center(admin: dict = Depends(get_admin_user)):
-    db = get_db()
-    await seed_help_articles_if_empty(db)
-    articles = await db.help_articles.find({}, {"_id": 0}).sort("order", 1).to_list(500)
-    return {"articles": articles}
-
-@api_router.post("/admin/help-center")
-async def admin_create_help_article(payload: HelpArticleCreate, admin: dict = Depends(get_admin_user)):
-    db = get_db()
-    title_values = [payload.title_ht, payload.title_fr, payload.title_en]
-    if not any(t and str(t).strip() for t in title_values):
-        raise HTTPException(status_code=400, detail="At least one title is required")
-
-    now = datetime.now(timezone.utc).isoformat()
-    article = {
-        "article_id": str(uuid.uuid4()),
-        "title_ht": payload.title_ht,
-        "title_fr": payload.title_fr,
-        "title_en": payload.title_en,
-        "content_ht": payload.content_ht,
-        "content_fr": payload.content_fr,
-        "content_en": payload.content_en,
-        "category": (payload.category or "General").strip(),
-        "order": int(payload.order or 0),
-        "is_active": bool(payload.is_active if payload.is_active is not None else True),
-        "created_at": now,
-        "updated_at": now,
-    }
-    await db.help_articles.insert_one(article)
-    await log_action(admin["user_id"], "help_article_create", {"article_id": article["article_id"]})
-    return {"article": article}
-
-@api_router.put("/admin/help-center/{article_id}")
-async def admin_update_help_article(article_id: str, payload: HelpArticleUpdate, admin: dict = Depends(get_admin_user)):
-    db = get_db()
-    update_doc = {k: v for k, v in payload.model_dump().items() if v is not None}
-    if "category" in update_doc:
-        update_doc["category"] = (update_doc["category"] or "General").strip()
-    if "order" in update_doc:
-        update_doc["order"] = int(update_doc["order"] or 0)
-    update_doc["updated_at"] = datetime.now(timezone.utc).isoformat()
-
-    result = await db.help_articles.update_one({"article_id": article_id}, {"$set": update_doc})
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Article not found")
-
-    article = await db.help_articles.find_one({"article_id": article_id}, {"_id": 0})
-    await log_action(admin["user_id"], "help_article_update", {"article_id": article_id})
-    return {"article": article}
-
-@api_router.delete("/admin/help-center/{article_id}")
-async def admin_delete_help_article(article_id: str, admin: dict = Depends(get_admin_user)):
-    db = get_db()
-    result = await db.help_articles.delete_one({"article_id": article_id})
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Article not found")
-    await log_action(admin["user_id"], "help_article_delete", {"article_id": article_id})
-    return {"success": True}
-
 @api_router.post("/admin/bulk-email")
 async def admin_send_bulk_email(request: BulkEmailRequest, admin: dict = Depends(get_admin_user)):
     db = get_db()
@@ -2976,7 +2323,7 @@ async def admin_get_logs(
     if action:
         query["action"] = action
     
-    logs = await db.logs.find(query, {"_id": 0}).sort("timestamp", -1).limit(limit).to_list(limit)
+    logs = await db.logs.find(query, {"_id": 0, "ts": 0}).sort("timestamp", -1).limit(limit).to_list(limit)
     return {"logs": logs}
 
 # ==================== ADMIN TEAM ROUTES ====================
@@ -3154,7 +2501,7 @@ async def admin_get_payment_gateway_methods(
     
     methods = await db.payment_gateway_methods.find(query, {"_id": 0}).sort("sort_order", 1).to_list(100)
     
-    role = _normalize_admin_role(admin)
+    role = rbac.normalize_admin_role(admin)
     
     # Skip RBAC filtering if:
     # - skip_rbac=true is passed (for RBAC config page)
@@ -3295,7 +2642,7 @@ async def cleanup_other_admins(admin: dict = Depends(get_admin_user)):
     protected_email = "kayicom509@gmail.com"
     
     # Only superadmin can do this
-    if _normalize_admin_role(admin) != "superadmin":
+    if rbac.normalize_admin_role(admin) != "superadmin":
         raise HTTPException(status_code=403, detail="Only superadmin can perform this action")
     
     # Delete all other admin users
@@ -3308,15 +2655,6 @@ async def cleanup_other_admins(admin: dict = Depends(get_admin_user)):
     return {"message": f"Deleted {result.deleted_count} other admin users"}
 
 
-# ==================== MAIN ROUTES ====================
-
-@api_router.get("/")
-async def root():
-    return {"message": "KAYICOM Wallet API", "version": "1.0.0"}
-
-@api_router.get("/health")
-async def health():
-    return {"status": "healthy"}
 
 
 @api_router.get("/run-admin-migration")
@@ -3353,7 +2691,15 @@ async def run_admin_migration():
     
     return results
 
-# Include router
+# Include routers
+app.include_router(system_routes.router)
+app.include_router(help_center_routes.build_router(get_db=get_db, admin_user=get_admin_user, log_action=log_action))
+app.include_router(auth_routes.build_router(
+    get_db=get_db, current_user=get_current_user, log_action=log_action, send_password_reset=send_password_reset_email,
+))
+app.include_router(admin_rbac_routes.build_router(
+    get_db=get_db, admin_user=get_admin_user, permissions=admin_permissions, log_action=log_action,
+))
 app.include_router(api_router)
 
 # CORS middleware
@@ -3365,9 +2711,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Startup event for creating indexes and default data
-@app.on_event("startup")
-async def startup():
+# ==================== SCHEMA MIGRATIONS ====================
+# Index creation and seeding run once per SCHEMA_VERSION instead of on every cold start:
+# `python api/index.py migrate` runs them out of band (run it on deploy), and startup only reads
+# `schema_meta` and warns when it is behind.
+# Bump SCHEMA_VERSION whenever run_migrations() gains a step.
+SCHEMA_VERSION = 1
+SCHEMA_META_ID = "vercel"
+
+
+async def run_migrations():
+    """Create indexes and default data, then record SCHEMA_VERSION in `schema_meta`."""
     db = get_db()
     
     # Create indexes
@@ -3439,6 +2793,29 @@ async def startup():
             "swap_usd_to_htg": 132.0,
             "updated_at": datetime.now(timezone.utc).isoformat()
         })
+    
+    await db.schema_meta.update_one(
+        {"_id": SCHEMA_META_ID},
+        {"$set": {"version": SCHEMA_VERSION, "migrated_at": datetime.now(timezone.utc).isoformat()}},
+        upsert=True
+    )
+
+# Startup: one read of the schema version. Migrations never run here: several cold starts can
+# happen at once and there is no lease to serialise them, so a stale schema is only reported.
+@app.on_event("startup")
+async def startup():
+    db = get_db()
+    meta = await db.schema_meta.find_one({"_id": SCHEMA_META_ID}) or {}
+    if int(meta.get("version") or 0) < SCHEMA_VERSION:
+        logger.warning(
+            f"Database schema version {meta.get('version') or 0} is behind {SCHEMA_VERSION}; run `python api/index.py migrate`"
+        )
 
 # Export handler for Vercel
 handler = app
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["migrate"]:
+        sys.exit("usage: python api/index.py migrate")
+    asyncio.run(run_migrations())
+    print(f"schema migrated to version {SCHEMA_VERSION}")
@@ -0,0 +1,90 @@
+"""
+Cold-start benchmark for the Vercel handler (api/index.py).
+
+Each sample runs in a fresh interpreter, like a new serverless instance: it times the module
+import, then the first request through the ASGI app (no network, no lifespan). The run fails
+when a median exceeds its budget or when a module that should load lazily is imported eagerly,
+so it can gate CI:
+
+    python bench_cold_start.py                      # 5 samples, default budgets
+    python bench_cold_start.py --samples 10 --max-import-ms 1500 --path /api/health
+
+The first-request path should not need MongoDB unless MONGO_URL points at a reachable server.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+API_DIR = Path(__file__).resolve().parent.parent / "api"
+
+# Optional integrations that api/index.py must import on first use, not at load time.
+# (bcrypt is left out: pymongo's TLS stack pulls it in through cryptography.)
+LAZY_MODULES = ["jose", "cloudinary", "resend", "reportlab", "httpx"]
+
+_SAMPLE = """
+import json, sys, time
+t0 = time.perf_counter()
+import index
+t1 = time.perf_counter()
+eager = [m for m in {lazy!r} if m in sys.modules]
+import asyncio, httpx
+async def first_request():
+    transport = httpx.ASGITransport(app=index.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as c:
+        t = time.perf_counter()
+        r = await c.get({path!r})
+        return r.status_code, time.perf_counter() - t
+status, elapsed = asyncio.run(first_request())
+print(json.dumps({{"import_ms": (t1 - t0) * 1000, "first_request_ms": elapsed * 1000, "status": status, "eager": eager}}))
+"""
+
+
+def run_sample(path: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    code = _SAMPLE.format(lazy=LAZY_MODULES, path=path)
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=API_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Cold-start benchmark for api/index.py")
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--path", default="/api/health", help="request timed after import")
+    parser.add_argument("--max-import-ms", type=float, default=2000.0)
+    parser.add_argument("--max-first-request-ms", type=float, default=250.0)
+    args = parser.parse_args(argv)
+
+    run_sample(args.path)  # warm the bytecode cache so every sample measures the same thing
+    samples = [run_sample(args.path) for _ in range(max(1, args.samples))]
+    import_ms = statistics.median(s["import_ms"] for s in samples)
+    request_ms = statistics.median(s["first_request_ms"] for s in samples)
+    eager = sorted({m for s in samples for m in s["eager"]})
+    statuses = sorted({s["status"] for s in samples})
+
+    print(f"import       median {import_ms:8.1f} ms  (budget {args.max_import_ms:.0f} ms)")
+    print(f"first request median {request_ms:7.1f} ms  (budget {args.max_first_request_ms:.0f} ms)  GET {args.path} -> {statuses}")
+
+    failures = []
+    if import_ms > args.max_import_ms:
+        failures.append("import time over budget")
+    if request_ms > args.max_first_request_ms:
+        failures.append("first request over budget")
+    if eager:
+        failures.append(f"imported at load time: {', '.join(eager)}")
+    if any(status >= 500 for status in statuses):
+        failures.append(f"GET {args.path} returned {statuses}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
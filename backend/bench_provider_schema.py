@@ -0,0 +1,66 @@
+"""
+Microbenchmark for the provider response schema: per-response cost of normalize_strowallet_card()
+on the payload shapes Strowallet returns, next to the _extract_first() chains it replaced.
+
+    python bench_provider_schema.py                  # 20000 iterations per case
+    python bench_provider_schema.py --iterations 5000
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")  # server connects lazily
+
+import server  # noqa: E402
+
+_CARD = {
+    "card_id": "c-1", "card_number": "5399000011112222", "expiry": "09/27", "cvv": "123",
+    "name_on_card": "JEAN BAPTISTE", "card_brand": "mastercard", "balance": "42.10", "currency": "USD",
+    "status": "active", "billing_address": {"street": "12 Rue Capois", "city": "Port-au-Prince", "state": "Ouest",
+                                            "country": "HT", "zip_code": "HT6110"},
+}
+
+PAYLOADS: Dict[str, Dict[str, Any]] = {
+    "response.card_detail": {"status": "success", "response": {"card_detail": dict(_CARD)}},
+    "data (flat card)": {"success": True, "data": dict(_CARD)},
+    "top-level card": dict(_CARD),
+    "masked only": {"status": "success", "response": {"card_detail": {
+        k: v for k, v in _CARD.items() if k != "card_number"} | {"masked_pan": "539900******2222"}}},
+}
+
+# The or-chains normalize_strowallet_card() replaced (card number, expiry, holder, brand).
+_LEGACY_CHAINS = [
+    ("response.card_detail.card_number", "response.card_detail.pan", "response.card_number", "data.card_number",
+     "message.card_number", "card_number"),
+    ("response.card_detail.expiry", "response.card_detail.expiry_date", "response.card_detail.validity",
+     "response.card_detail.valid_thru"),
+    ("response.card_detail.card_holder_name", "response.card_holder_name", "data.card_holder_name"),
+    ("response.card_detail.card_type", "response.card_detail.card_brand", "data.card_type", "data.cardType",
+     "data.type", "data.brand", "card_type", "cardType", "type", "brand"),
+]
+
+
+def _us_per_call(fn: Callable[[], Any], iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) * 1e6 / iterations
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Provider response schema microbenchmark")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    print(f"{'payload':24} {'normalize us':>13} {'extract_first chains us':>24}")
+    for name, payload in PAYLOADS.items():
+        normalize = lambda: server.normalize_strowallet_card(payload)  # noqa: E731
+        chains = lambda: [server._extract_first(payload, *paths) for paths in _LEGACY_CHAINS]  # noqa: E731
+        print(f"{name:24} {_us_per_call(normalize, args.iterations):13.2f} {_us_per_call(chains, args.iterations):24.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
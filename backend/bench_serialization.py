@@ -0,0 +1,145 @@
+"""
+Serialization benchmark for the list endpoints.
+
+For each endpoint, a synthetic page shaped like its real documents is rendered two ways and the
+CPU time per response is compared:
+
+    before  FastAPI's path for a returned dict: jsonable_encoder() + stdlib json (JSONResponse)
+    after   model_response(): model_construct() + orjson (kayicom_core.responses)
+
+Both bodies are decoded and compared, so a rendering difference fails the run as well:
+
+    python bench_serialization.py                       # 200 iterations per endpoint
+    python bench_serialization.py --iterations 50 --min-speedup 2
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")  # server connects lazily
+
+import server  # noqa: E402
+from kayicom_core.responses import model_response  # noqa: E402
+from kayicom_core.routers import help_center  # noqa: E402
+
+_T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _ts(i: int) -> str:
+    return (_T0 + timedelta(minutes=i)).isoformat()
+
+
+def _transaction(i: int) -> Dict[str, Any]:
+    return {
+        "transaction_id": f"tx-{i:08d}", "user_id": "u-1", "type": "deposit" if i % 3 else "withdrawal",
+        "amount": 125.5 + i, "currency": "HTG" if i % 2 else "USD", "status": "completed",
+        "reference_id": f"ref-{i:08d}", "description": f"Deposit via MonCash #{i}", "created_at": _ts(i),
+    }
+
+
+def _deposit(i: int) -> Dict[str, Any]:
+    return {
+        "deposit_id": f"dep-{i:08d}", "user_id": f"u-{i % 40}", "client_id": f"KC{i:08X}",
+        "amount": 50.0 + i, "currency": "USD", "method": "usdt", "network": "TRC20", "status": "pending",
+        "proof_image": "https://res.cloudinary.com/kayicom/image/upload/v1/kyc/proof.jpg",
+        "wallet_address": "TQ5nC9gN3w8Yk4p7hK2vF1rT6mX0sLzAbc", "created_at": _ts(i), "processed_at": None,
+    }
+
+
+def _kyc(i: int) -> Dict[str, Any]:
+    return {
+        "kyc_id": f"kyc-{i:08d}", "user_id": f"u-{i}", "client_id": f"KC{i:08X}", "full_name": "Jean Baptiste",
+        "date_of_birth": "1990-05-12", "full_address": "12 Rue Capois", "city": "Port-au-Prince", "state": "Ouest",
+        "country": "Haiti", "nationality": "Haitian", "id_type": "id_card", "phone_number": "+509 3700 0000",
+        "whatsapp_number": "+509 3700 0000", "submitted_at": _ts(i), "status": "pending",
+        "user_email": f"user{i}@example.com",
+    }
+
+
+def _log(i: int) -> Dict[str, Any]:
+    return {
+        "log_id": f"log-{i:08d}", "user_id": f"u-{i % 50}", "action": "admin_process_deposit",
+        "details": {"deposit_id": f"dep-{i:08d}", "action": "approve", "amount": 100.0 + i, "notes": None},
+        "timestamp": _ts(i),
+    }
+
+
+def _event(i: int) -> Dict[str, Any]:
+    return {
+        "event_id": f"evt-{i:08d}", "provider": "strowallet", "received_at": _ts(i), "summary": "card.transaction",
+        "payload": {"event": "card.transaction", "status": "success", "reference": f"r-{i}",
+                    "data": {"card_id": f"c-{i % 20}", "amount": "12.50", "currency": "USD", "merchant": "NETFLIX.COM"}},
+    }
+
+
+def _article(i: int) -> Dict[str, Any]:
+    body = "Pou depoze lajan, ale nan paj Depo a epi chwazi metòd ou a. " * 12
+    return {
+        "article_id": f"art-{i:04d}", "order": i, "is_active": True, "category": "deposits",
+        "title_ht": f"Kijan pou depoze #{i}", "title_fr": f"Comment déposer #{i}", "title_en": f"How to deposit #{i}",
+        "content_ht": body, "content_fr": body, "content_en": body, "updated_at": _ts(i),
+    }
+
+
+# endpoint -> (response model, builder of the handler's payload)
+CASES: Dict[str, tuple] = {
+    "GET /wallet/transactions (100)": (server.TransactionsPage, lambda: {"transactions": [_transaction(i) for i in range(100)]}),
+    "GET /admin/users (200)": (server.AdminUsersPage, lambda: {
+        "users": [{**_kyc(i), "email": f"user{i}@example.com", "wallet_htg": 1500.0, "wallet_usd": 12.5,
+                   "is_active": True, "created_at": _ts(i)} for i in range(200)],
+        "total": 5400,
+    }),
+    "GET /admin/kyc (200)": (server.AdminKYCPage, lambda: {
+        "submissions": [_kyc(i) for i in range(200)],
+        "stats": {"pending": 200, "approved": 4100, "rejected": 85, "total": 4385},
+        "meta": {"page": 1, "limit": 200, "total_matches": 200, "query": None},
+    }),
+    "GET /admin/deposits (200)": (server.AdminDepositsPage, lambda: {"deposits": [_deposit(i) for i in range(200)]}),
+    "GET /admin/logs (500)": (server.LogsPage, lambda: {"logs": [_log(i) for i in range(500)]}),
+    "GET /admin/webhook-events (500)": (server.WebhookEventsPage, lambda: {"events": [_event(i) for i in range(500)]}),
+    "GET /public/help-center (40)": (help_center.HelpArticlesPage, lambda: {"articles": [_article(i) for i in range(40)]}),
+}
+
+
+def _cpu_ms(fn: Callable[[], bytes], iterations: int) -> float:
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - start) * 1000 / iterations
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="List endpoint serialization benchmark")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--min-speedup", type=float, default=1.0, help="fail when an endpoint is slower than this")
+    args = parser.parse_args(argv)
+
+    failures = []
+    print(f"{'endpoint':34} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for name, (model, build) in CASES.items():
+        payload = build()
+        before = lambda: JSONResponse(jsonable_encoder(payload)).body  # noqa: E731
+        after = lambda: model_response(model, **payload).body  # noqa: E731
+        if json.loads(before()) != json.loads(after()):
+            failures.append(f"{name}: bodies differ")
+            continue
+        before_ms = _cpu_ms(before, args.iterations)
+        after_ms = _cpu_ms(after, args.iterations)
+        speedup = before_ms / after_ms if after_ms else float("inf")
+        print(f"{name:34} {before_ms:10.3f} {after_ms:10.3f} {speedup:7.1f}x")
+        if speedup < args.min_speedup:
+            failures.append(f"{name}: {speedup:.1f}x is below {args.min_speedup}x")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""
+Index registry for the KAYICOM MongoDB database.
+
+Every index the API relies on is declared here, next to a sample of the query that needs it.
+`ensure_indexes()` builds whatever is missing (startup / migrations); the CLI does the same
+out of band and can verify the registry against a local mongod:
+
+    python db_indexes.py migrate [--dry-run]        # build missing indexes on MONGO_URL/DB_NAME
+    python db_indexes.py verify [--mongo-url URL]   # explain() every sample query, fail on COLLSCAN
+
+Archive partitions are created dynamically and manage their own indexes in server.py. The event
+stores in TIMESERIES are time-series collections in production (server.py EVENT STORAGE), read
+newest-first on `ts`; verify creates them the same way, so their sample plans are the real ones.
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import IndexModel
+
+VERIFY_DB_NAME = "kayicom_index_verify"
+
+
+def ix(keys, *, unique: bool = False, query: Optional[dict] = None, sort: Optional[List[Tuple[str, int]]] = None) -> Dict[str, Any]:
+    """One index: key pattern, options and the sample query (filter + sort) it serves."""
+    if isinstance(keys, str):
+        keys = [(keys, 1)]
+    return {
+        "keys": list(keys),
+        "unique": unique,
+        "query": query if query is not None else {keys[0][0]: "sample"},
+        "sort": sort,
+    }
+
+
+# Event stores: collection -> time-series options (kept in line with server.EVENT_STORES).
+TIMESERIES: Dict[str, Dict[str, str]] = {
+    "logs": {"timeField": "ts", "metaField": "action"},
+    "webhook_events": {"timeField": "ts", "metaField": "provider"},
+    "whatsapp_notifications": {"timeField": "ts", "metaField": "status"},
+}
+
+INDEXES: Dict[str, List[Dict[str, Any]]] = {
+    "users": [
+        ix("email", unique=True),  # login / register
+        ix("client_id", unique=True),  # transfers, agent deposits, admin search
+        ix("affiliate_code", unique=True),  # referral lookup, withdrawal commissions
+        ix("phone"),
+        ix("is_agent", query={"is_agent": True}),
+        ix("user_id"),  # get_current_user on every request
+        ix("referred_by"),  # affiliate dashboard: referrals of a code
+    ],
+    "transactions": [
+        ix([("user_id", 1), ("created_at", -1)], query={"user_id": "u"}, sort=[("created_at", -1)]),  # wallet history, statements
+        ix("reference_id", query={"reference_id": "r", "type": "withdrawal"}),  # status updates when a request is processed
+    ],
+    "deposits": [
+        ix([("user_id", 1), ("status", 1)], query={"user_id": "u", "status": "pending"}),
+        ix([("status", 1), ("created_at", -1)], query={"status": "pending"}, sort=[("created_at", -1)]),  # admin queue
+        ix([("created_at", -1)], query={}, sort=[("created_at", -1)]),  # admin list, no filter
+        ix([("provider", 1), ("status", 1), ("plisio_next_check_at", 1)],
+           query={"provider": "plisio", "status": "pending", "plisio_next_check_at": {"$lte": "2026"}}),  # Plisio reconciler
+        ix("deposit_id"),
+    ],
+    "withdrawals": [
+        ix([("user_id", 1), ("status", 1)], query={"user_id": "u", "status": "pending"}),
+        ix([("status", 1), ("created_at", -1)], query={"status": "pending"}, sort=[("created_at", -1)]),  # admin queue
+        ix([("created_at", -1)], query={}, sort=[("created_at", -1)]),
+        ix("withdrawal_id"),
+    ],
+    "kyc": [
+        ix("user_id", unique=True),
+        ix([("status", 1), ("submitted_at", -1)], query={"status": "pending"}, sort=[("submitted_at", -1)]),
+        ix([("submitted_at", -1)], query={}, sort=[("submitted_at", -1)]),
+        ix("client_id"),
+    ],
+    "agent_deposits": [
+        ix([("agent_id", 1), ("status", 1)], query={"agent_id": "a", "status": "pending"}),
+        ix("client_user_id"),
+        ix([("agent_id", 1), ("created_at", -1)], query={"agent_id": "a", "created_at": {"$gte": "2026"}},
+           sort=[("created_at", -1)]),  # agent history export
+        ix([("status", 1), ("created_at", -1)], query={"status": "pending"}, sort=[("created_at", -1)]),  # admin queue
+        ix("deposit_id"),
+    ],
+    "agent_requests": [
+        ix("user_id"),
+    ],
+    "payment_gateway_methods": [
+        ix("payment_method_id", unique=True),
+        ix([("payment_type", 1), ("status", 1)], query={"payment_type": "deposit", "status": "active"}),
+    ],
+    "webhook_events": [
+        ix([("ts", -1)], query={}, sort=[("ts", -1)]),  # admin event list
+        ix([("provider", 1), ("ts", -1)], query={"provider": "strowallet"}, sort=[("ts", -1)]),
+        ix("event_id"),
+    ],
+    "whatsapp_notifications": [
+        ix([("ts", -1)], query={}, sort=[("ts", -1)]),  # admin history
+        ix([("status", 1), ("ts", -1)], query={"status": "failed"}, sort=[("ts", -1)]),
+    ],
+    "logs": [
+        ix([("ts", -1)], query={}, sort=[("ts", -1)]),  # admin logs
+        ix([("user_id", 1), ("ts", -1)], query={"user_id": "u"}, sort=[("ts", -1)]),
+        ix([("action", 1), ("ts", -1)], query={"action": "login"}, sort=[("ts", -1)]),
+        ix([("timestamp", 1)], query={"timestamp": {"$lt": "2026"}}, sort=[("timestamp", 1)]),  # archiver
+    ],
+    "campaigns": [
+        ix("campaign_id", unique=True),
+        ix([("status", 1), ("created_at", -1)], query={"status": "sending"}, sort=[("created_at", -1)]),
+    ],
+    "campaign_recipients": [
+        ix([("campaign_id", 1), ("user_id", 1)], unique=True, query={"campaign_id": "c", "user_id": "u"}),
+        ix([("campaign_id", 1), ("status", 1)], query={"campaign_id": "c", "status": "pending"}),
+    ],
+    "card_transactions": [
+        ix([("card_id", 1), ("txn_key", 1)], unique=True, query={"card_id": "c", "txn_key": "k"}),
+        ix([("card_id", 1), ("occurred_at", -1), ("txn_key", -1)], query={"card_id": "c"},
+           sort=[("occurred_at", -1), ("txn_key", -1)]),
+        ix([("card_id", 1), ("status", 1), ("occurred_at", -1)], query={"card_id": "c", "status": "completed"},
+           sort=[("occurred_at", -1)]),
+        ix([("card_id", 1), ("type", 1), ("occurred_at", -1)], query={"card_id": "c", "type": "debit"},
+           sort=[("occurred_at", -1)]),
+    ],
+    "virtual_card_orders": [
+        ix("provider_card_id"),  # webhooks, transaction mirror
+        ix("order_id"),
+        ix([("user_id", 1), ("status", 1)], query={"user_id": "u", "status": "approved"}),  # card pages, referral rewards
+        ix([("status", 1), ("created_at", -1)], query={"status": "pending"}, sort=[("created_at", -1)]),  # admin list
+    ],
+    "virtual_card_deposits": [
+        ix("deposit_id"),
+        ix([("user_id", 1), ("created_at", -1)], query={"user_id": "u"}, sort=[("created_at", -1)]),
+        ix([("status", 1), ("created_at", -1)], query={"status": "pending"}, sort=[("created_at", -1)]),
+    ],
+    "topup_orders": [
+        ix("order_id"),
+        ix([("user_id", 1), ("created_at", -1)], query={"user_id": "u"}, sort=[("created_at", -1)]),
+    ],
+    "password_resets": [
+        ix("token", query={"token": "t", "used": False}),
+    ],
+    "telegram_activations": [
+        ix("activation_code", query={"activation_code": {"$in": ["a", "b"]}, "used": False}),  # /start batch
+        ix([("user_id", 1), ("used", 1)], query={"user_id": "u", "used": False}),
+    ],
+    "worker_leases": [
+        ix("lease_id", unique=True),
+    ],
+    "balance_snapshots": [
+        ix([("user_id", 1), ("as_of", 1)], unique=True, query={"user_id": "u", "as_of": "2026-01-01"}),
+    ],
+    "balance_snapshot_runs": [
+        ix("as_of", unique=True),
+    ],
+    "archive_index": [
+        ix([("collection", 1), ("key", 1)], unique=True, query={"collection": "deposits", "key": "k"}),
+    ],
+    "archive_partitions": [
+        ix([("collection", 1), ("partition", 1)], unique=True, query={"collection": "transactions"},
+           sort=[("partition", 1)]),
+    ],
+    "archive_runs": [
+        ix([("status", 1), ("started_at", -1)], query={"status": "running", "started_at": {"$gt": "2026"}}),
+    ],
+}
+
+
+def _key_signature(keys) -> Tuple[Tuple[str, Any], ...]:
+    return tuple((str(k), v if isinstance(v, str) else int(v)) for k, v in keys)
+
+
+async def missing_indexes(db) -> Dict[str, List[Dict[str, Any]]]:
+    """Registry entries whose key pattern does not exist yet, per collection."""
+    existing_names = set(await db.list_collection_names())
+    missing: Dict[str, List[Dict[str, Any]]] = {}
+    for collection, specs in INDEXES.items():
+        existing = set()
+        if collection in existing_names:
+            info = await db[collection].index_information()
+            existing = {_key_signature(i["key"]) for i in info.values()}
+        todo = [s for s in specs if _key_signature(s["keys"]) not in existing]
+        if todo:
+            missing[collection] = todo
+    return missing
+
+
+async def ensure_indexes(db, *, dry_run: bool = False) -> List[str]:
+    """Build every missing registry index (background builds). Returns "collection.index" names."""
+    built: List[str] = []
+    for collection, specs in (await missing_indexes(db)).items():
+        models = [IndexModel(s["keys"], unique=s["unique"], background=True) for s in specs]
+        if dry_run:
+            built.extend(f"{collection}.{m.document['name']}" for m in models)
+            continue
+        names = await db[collection].create_indexes(models)
+        built.extend(f"{collection}.{name}" for name in names)
+    return built
+
+
+def _has_collscan(plan: Any) -> bool:
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(_has_collscan(v) for v in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collscan(v) for v in plan)
+    return False
+
+
+async def verify_query_plans(db) -> List[str]:
+    """
+    Create the TIMESERIES stores, build the registry on `db`, then explain() every sample query.
+    Returns one failure message per query whose winning plan contains a COLLSCAN.
+    """
+    existing = set(await db.list_collection_names())
+    for collection, options in TIMESERIES.items():
+        if collection not in existing:
+            await db.create_collection(collection, timeseries={**options, "granularity": "seconds"})
+    await ensure_indexes(db)
+    failures: List[str] = []
+    for collection, specs in INDEXES.items():
+        # The planner needs a non-empty collection to produce a real plan.
+        if not await db[collection].find_one({}, {"_id": 1}):
+            sample: Dict[str, Any] = {"__verify__": True}
+            if collection in TIMESERIES:
+                sample[TIMESERIES[collection]["timeField"]] = datetime.now(timezone.utc)
+            await db[collection].insert_one(sample)
+        for spec in specs:
+            cursor = db[collection].find(spec["query"]).limit(20)
+            if spec["sort"]:
+                cursor = cursor.sort(spec["sort"])
+            plan = (await cursor.explain()).get("queryPlanner", {}).get("winningPlan", {})
+            if _has_collscan(plan):
+                failures.append(f"{collection}: COLLSCAN for find({spec['query']}) sort={spec['sort']}")
+    return failures
+
+
+async def _cli_migrate(dry_run: bool) -> int:
+    from server import client, db  # reuse the API's connection settings (authSource handling etc.)
+
+    try:
+        built = await ensure_indexes(db, dry_run=dry_run)
+    finally:
+        client.close()
+    for name in built:
+        print(("would build " if dry_run else "built ") + name)
+    print(f"{len(built)} index(es) {'missing' if dry_run else 'built'}")
+    return 0
+
+
+async def _cli_verify(mongo_url: str) -> int:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(mongo_url, serverSelectionTimeoutMS=5000)
+    try:
+        await client.drop_database(VERIFY_DB_NAME)
+        failures = await verify_query_plans(client[VERIFY_DB_NAME])
+        await client.drop_database(VERIFY_DB_NAME)
+    finally:
+        client.close()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    total = sum(len(specs) for specs in INDEXES.values())
+    print(f"{total - len(failures)}/{total} sample queries use an index")
+    return 1 if failures else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="KAYICOM MongoDB index registry")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="build missing indexes on MONGO_URL / DB_NAME")
+    migrate.add_argument("--dry-run", action="store_true", help="only list missing indexes")
+    verify = sub.add_parser("verify", help="explain() sample queries on a scratch database, fail on COLLSCAN")
+    verify.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    args = parser.parse_args(argv)
+
+    if args.command == "migrate":
+        return asyncio.run(_cli_migrate(args.dry_run))
+    return asyncio.run(_cli_verify(args.mongo_url))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,16 @@
+"""
+Code shared by the two KAYICOM entry points: the Render API (backend/server.py) and the Vercel
+function (api/index.py).
+
+    audit         audit log entries for the `logs` collection
+    security      password hashing, ids, JWT encode/decode (auth libraries imported on first use)
+    rbac          admin role normalisation, default permissions, the DB-backed PermissionStore
+                  and the prefix-trie permission check
+    kyc_images    KYC image validation and optional Cloudinary storage
+    routers/      APIRouters an entry point mounts with app.include_router(): system (health),
+                  auth (/auth routes plus the current-user and admin dependencies), admin_rbac
+                  (role permission editor), help_center (public help articles and their admin editor)
+
+Modules here take their database handle and settings as arguments instead of importing an
+entry point, so either deployment can import only what it serves.
+"""
@@ -0,0 +1,20 @@
+"""Audit log entries (`logs` collection), built the same way by both entry points."""
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+
+def new_log_entry(user_id: str, action: str, details: dict) -> Dict[str, Any]:
+    """
+    `ts` is the BSON datetime time field of the time-series `logs` store (an insert without it is
+    rejected); `timestamp` keeps the ISO string the API has always returned.
+    """
+    now = datetime.now(timezone.utc)
+    return {
+        "log_id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "action": action,
+        "details": details,
+        "timestamp": now.isoformat(),
+        "ts": now,
+    }
@@ -0,0 +1,210 @@
+"""
+Response compression (ASGI middleware).
+
+Negotiates zstd, brotli or gzip from Accept-Encoding. zstd and brotli are used only when their
+packages (`zstandard`, `brotli`) are installed; gzip is always available. Rules:
+
+- bodies under `minimum_size` and responses that already carry a Content-Encoding, or whose
+  media type is compressed already (images, PDFs, archives...), are passed through untouched;
+- single-body responses are compressed in one go, in a worker thread when the body is at least
+  `thread_threshold` bytes, so large admin lists do not stall the event loop;
+- streamed responses (StreamingResponse exports) are compressed chunk by chunk with a flush after
+  each chunk, so the client keeps receiving data while the export is produced.
+"""
+import asyncio
+import gzip
+import zlib
+from typing import Callable, Dict, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:  # optional
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover - depends on the deployment
+    brotli = None
+
+try:  # optional
+    import zstandard  # type: ignore
+except ImportError:  # pragma: no cover - depends on the deployment
+    zstandard = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # dynamic content: 4-6 is the usual ratio/CPU sweet spot
+ZSTD_LEVEL = 3
+
+# Server preference when the client accepts several encodings with the same q-value.
+_PREFERENCE = ("zstd", "br", "gzip")
+
+_COMPRESSED_MEDIA_PREFIXES = ("image/", "video/", "audio/", "font/woff")
+_COMPRESSED_MEDIA_TYPES = {
+    "application/pdf",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/zstd",
+    "application/octet-stream",
+    "text/event-stream",  # compressing SSE delays events
+}
+
+
+def available_encodings() -> Tuple[str, ...]:
+    return tuple(
+        e for e in _PREFERENCE
+        if (e == "gzip") or (e == "br" and brotli is not None) or (e == "zstd" and zstandard is not None)
+    )
+
+
+def negotiate_encoding(accept_encoding: str, available: Tuple[str, ...]) -> Optional[str]:
+    """Pick the best available encoding for an Accept-Encoding header (q-values honoured)."""
+    weights: Dict[str, float] = {}
+    for part in (accept_encoding or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip()] = q
+    star = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = weights.get(encoding, star)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _is_compressible(headers: Headers) -> bool:
+    if "content-encoding" in headers:
+        return False
+    media_type = headers.get("content-type", "").split(";", 1)[0].strip().lower()
+    if media_type in _COMPRESSED_MEDIA_TYPES:
+        return False
+    return not media_type.startswith(_COMPRESSED_MEDIA_PREFIXES)
+
+
+def compress_body(encoding: str, body: bytes) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class _StreamCompressor:
+    """Incremental compressor: `chunk()` returns everything decodable so far, `finish()` the trailer."""
+
+    def __init__(self, encoding: str):
+        if encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+            self._chunk: Callable[[bytes], bytes] = lambda data: (
+                self._obj.compress(data) + self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            )
+            self._finish: Callable[[], bytes] = self._obj.flush
+        elif encoding == "br":
+            self._obj = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._chunk = lambda data: self._obj.process(data) + self._obj.flush()
+            self._finish = self._obj.finish
+        else:
+            self._obj = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+            self._chunk = lambda data: self._obj.compress(data) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = self._obj.flush
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._chunk(data) if data else b""
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, *, minimum_size: int = 1024, thread_threshold: int = 64 * 1024) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.thread_threshold = thread_threshold
+        self.available = available_encodings()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), self.available)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressedResponder(self, encoding, send).run(scope, receive)
+
+
+class _CompressedResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.mw = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start: Optional[Message] = None
+        self.passthrough = False
+        self.stream: Optional[_StreamCompressor] = None
+
+    async def run(self, scope: Scope, receive: Receive) -> None:
+        await self.mw.app(scope, receive, self.on_send)
+
+    async def _compress(self, fn: Callable, *args) -> bytes:
+        size = sum(len(a) for a in args if isinstance(a, (bytes, bytearray)))
+        if size >= self.mw.thread_threshold:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def _set_encoding_headers(self, start: Message, length: Optional[int]) -> None:
+        headers = MutableHeaders(raw=start["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if length is None:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(length)
+
+    async def on_send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            status = int(message.get("status") or 200)
+            self.passthrough = status < 200 or status in (204, 304) or not _is_compressible(
+                Headers(raw=message.get("headers") or [])
+            )
+            if self.passthrough:
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body: bytes = message.get("body", b"")
+        more_body = bool(message.get("more_body", False))
+
+        if self.stream is None and not more_body:
+            # Whole body in one message.
+            start, self.start = self.start, None
+            if len(body) >= self.mw.minimum_size:
+                body = await self._compress(compress_body, self.encoding, body)
+                self._set_encoding_headers(start, len(body))
+                message = {"type": "http.response.body", "body": body}
+            await self.send(start)
+            await self.send(message)
+            return
+
+        if self.stream is None:
+            # First chunk of a streamed response: switch to incremental compression.
+            self.stream = _StreamCompressor(self.encoding)
+            start, self.start = self.start, None
+            self._set_encoding_headers(start, None)
+            await self.send(start)
+
+        out = await self._compress(self.stream.chunk, body)
+        if not more_body:
+            out += self.stream.finish()
+        if out or not more_body:
+            await self.send({"type": "http.response.body", "body": out, "more_body": more_body})
+
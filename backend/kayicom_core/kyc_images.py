@@ -0,0 +1,159 @@
+"""KYC image validation and storage: Cloudinary when configured, inline data URL otherwise."""
+import asyncio
+import base64
+import binascii
+import logging
+import os
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+DATA_URL_IMAGE_RE = re.compile(
+    r"^data:(image/(?:png|jpe?g|webp));base64,(.+)$",
+    flags=re.IGNORECASE | re.DOTALL,
+)
+
+
+def cloudinary_creds(settings: Optional[dict]) -> Dict[str, Optional[str]]:
+    """
+    Prefer DB settings (admin-configured) over environment variables.
+    This allows non-technical admins to configure KYC storage without redeploys.
+    """
+    s = settings or {}
+    cloud_name = (s.get("cloudinary_cloud_name") or os.environ.get("CLOUDINARY_CLOUD_NAME") or "").strip() or None
+    api_key = (s.get("cloudinary_api_key") or os.environ.get("CLOUDINARY_API_KEY") or "").strip() or None
+    api_secret = (s.get("cloudinary_api_secret") or os.environ.get("CLOUDINARY_API_SECRET") or "").strip() or None
+    folder = (s.get("cloudinary_folder") or os.environ.get("CLOUDINARY_FOLDER") or "kayicom/kyc").strip().strip("/") or "kayicom/kyc"
+    return {"cloud_name": cloud_name, "api_key": api_key, "api_secret": api_secret, "folder": folder}
+
+
+def cloudinary_is_configured(settings: Optional[dict]) -> bool:
+    c = cloudinary_creds(settings)
+    return bool(c.get("cloud_name") and c.get("api_key") and c.get("api_secret"))
+
+
+def _cloudinary_setup(settings: Optional[dict]) -> bool:
+    if not cloudinary_is_configured(settings):
+        return False
+    # Lazy import so the backend still starts even if the dependency is missing locally.
+    import cloudinary  # type: ignore
+    c = cloudinary_creds(settings)
+
+    cloudinary.config(
+        cloud_name=c["cloud_name"],
+        api_key=c["api_key"],
+        api_secret=c["api_secret"],
+        secure=True,
+    )
+    return True
+
+
+def parse_image_data_url(value: str) -> Optional[Dict[str, Any]]:
+    """
+    Parse `data:image/...;base64,....` and return mime + bytes.
+    Returns None if the input is not a data URL.
+    """
+    if not isinstance(value, str):
+        return None
+    m = DATA_URL_IMAGE_RE.match(value.strip())
+    if not m:
+        return None
+    mime = (m.group(1) or "").lower().replace("image/jpg", "image/jpeg")
+    b64 = m.group(2) or ""
+    try:
+        raw = base64.b64decode(b64, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid image encoding (base64)")
+    return {"mime": mime, "bytes": raw, "data_url": value.strip()}
+
+
+async def _cloudinary_upload_data_url(*, settings: Optional[dict], data_url: str, folder: str, public_id: str) -> str:
+    if not _cloudinary_setup(settings):
+        raise RuntimeError("Cloudinary not configured")
+    import cloudinary.uploader  # type: ignore
+
+    result = await asyncio.to_thread(
+        cloudinary.uploader.upload,
+        data_url,
+        folder=folder,
+        public_id=public_id,
+        overwrite=True,
+        unique_filename=False,
+        resource_type="image",
+    )
+    url = (result or {}).get("secure_url") or (result or {}).get("url")
+    if not url:
+        raise RuntimeError("Cloudinary upload did not return a URL")
+    return str(url)
+
+
+async def kyc_store_image_value(
+    value: Optional[str],
+    *,
+    user_id: str,
+    kyc_id: str,
+    field_name: str,
+    settings: Optional[dict] = None,
+) -> Dict[str, Any]:
+    """
+    Returns a dict:
+      - value: stored string (URL or data URL)
+      - meta: metadata for auditing
+    """
+    if not value:
+        return {"value": value, "meta": None}
+
+    parsed = parse_image_data_url(value)
+    if not parsed:
+        # Already a URL or non-data string. Keep as-is.
+        return {
+            "value": value,
+            "meta": {
+                "storage": "external",
+                "mime": None,
+                "bytes": None,
+                "uploaded_at": datetime.now(timezone.utc).isoformat(),
+            },
+        }
+
+    mime = parsed["mime"]
+    raw = parsed["bytes"]
+    max_bytes = int((settings or {}).get("kyc_max_image_bytes") or os.environ.get("KYC_MAX_IMAGE_BYTES") or 5 * 1024 * 1024)
+    if len(raw) > max_bytes:
+        raise HTTPException(status_code=413, detail="Image too large")
+
+    if mime not in {"image/jpeg", "image/png", "image/webp"}:
+        raise HTTPException(status_code=400, detail="Unsupported image type")
+
+    # Prefer Cloudinary when configured; fall back to inline storage.
+    if cloudinary_is_configured(settings):
+        folder = cloudinary_creds(settings).get("folder") or "kayicom/kyc"
+        public_id = f"{kyc_id}_{field_name}"
+        try:
+            url = await _cloudinary_upload_data_url(settings=settings, data_url=parsed["data_url"], folder=folder, public_id=public_id)
+            return {
+                "value": url,
+                "meta": {
+                    "storage": "cloudinary",
+                    "mime": mime,
+                    "bytes": len(raw),
+                    "public_id": f"{folder}/{public_id}" if folder else public_id,
+                    "uploaded_at": datetime.now(timezone.utc).isoformat(),
+                },
+            }
+        except Exception as e:
+            logger.exception("Cloudinary upload failed; falling back to inline storage: %s", e)
+
+    return {
+        "value": parsed["data_url"],
+        "meta": {
+            "storage": "inline",
+            "mime": mime,
+            "bytes": len(raw),
+            "uploaded_at": datetime.now(timezone.utc).isoformat(),
+        },
+    }
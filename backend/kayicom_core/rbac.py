@@ -0,0 +1,217 @@
+"""
+Admin RBAC: the default permission table, the DB-backed PermissionStore both entry points read
+it through, and the compiled per-role path tries that answer allow/deny.
+"""
+import logging
+import time
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Explicitly blocked paths for non-superadmin roles (raw prefix match, not segment-aligned).
+BLOCKED_PREFIXES = (
+    "/api/admin/purge-old-records",
+    "/api/admin/storage",
+)
+
+# Default permissions per role; an admin can override them (settings.rbac_permissions).
+DEFAULT_PERMISSIONS: Dict[str, List[str]] = {
+    # Support: KYC + users + virtual cards operations (non-financial config)
+    "support": [
+        "/api/admin/dashboard",
+        "/api/admin/users",
+        "/api/admin/kyc",
+        "/api/admin/kyc-image-storage-status",
+        "/api/admin/virtual-cards",
+        "/api/admin/virtual-card-orders",
+        "/api/admin/card-topups",
+        "/api/admin/topup-orders",
+    ],
+    # Finance: ONLY deposits and withdrawals (restricted)
+    "finance": [
+        "/api/admin/dashboard",
+        "/api/admin/deposits",
+        "/api/admin/withdrawals",
+    ],
+    # Manager: broad ops (no system-level settings/team)
+    "manager": [
+        "/api/admin/dashboard",
+        "/api/admin/users",
+        "/api/admin/kyc",
+        "/api/admin/deposits",
+        "/api/admin/withdrawals",
+        "/api/admin/virtual-cards",
+        "/api/admin/virtual-card-orders",
+        "/api/admin/card-topups",
+        "/api/admin/topup-orders",
+        "/api/admin/logs",
+    ],
+    # Admin: broad ops (still blocked from system-level team/settings)
+    "admin": [
+        "/api/admin/dashboard",
+        "/api/admin/users",
+        "/api/admin/kyc",
+        "/api/admin/kyc-image-storage-status",
+        "/api/admin/deposits",
+        "/api/admin/withdrawals",
+        "/api/admin/exchange-rates",
+        "/api/admin/rates",
+        "/api/admin/fees",
+        "/api/admin/card-fees",
+        "/api/admin/withdrawal-limits",
+        "/api/admin/payment-gateway",
+        "/api/admin/settings",
+        "/api/admin/virtual-cards",
+        "/api/admin/virtual-card-orders",
+        "/api/admin/card-topups",
+        "/api/admin/topup-orders",
+        "/api/admin/bulk-email",
+        "/api/admin/logs",
+        "/api/admin/webhook-events",
+        "/api/admin/agent-deposits",
+        "/api/admin/agent-settings",
+        "/api/admin/agent-commission-withdrawals",
+        "/api/admin/strowallet",
+        "/api/admin/agent-requests",
+        "/api/admin/agents",
+        "/api/admin/recharge-agent",
+        "/api/admin/client-reports",
+        "/api/admin/whatsapp-notifications",
+        "/api/admin/test-whatsapp",
+        "/api/admin/test-telegram",
+        "/api/admin/telegram/setup-webhook",
+        "/api/admin/team",
+        "/api/admin/rbac",
+    ],
+}
+
+# Marker key inside a trie node: "this prefix and everything below it is allowed".
+# Path segments are always strings, so None can never collide with a real segment.
+_TRIE_END = None
+
+
+def normalize_admin_role(user: dict) -> str:
+    if not user or not user.get("is_admin"):
+        return ""
+    role = str(user.get("admin_role") or "").strip().lower()
+    return role or "admin"
+
+
+def compile_trie(prefixes: List[str]) -> Dict[Any, Any]:
+    """
+    Compile a role's allowed prefixes into a nested dict keyed by path segment.
+    "/api/admin/users" allows "/api/admin/users" and "/api/admin/users/...", never "/api/admin/users-x".
+    """
+    root: Dict[Any, Any] = {}
+    for prefix in prefixes or []:
+        if not isinstance(prefix, str):
+            continue
+        node = root
+        for seg in prefix.split("/"):
+            node = node.setdefault(seg, {})
+        node[_TRIE_END] = True
+    return root
+
+
+def compile_permissions(permissions: Dict[str, List[str]]) -> Dict[str, Dict[Any, Any]]:
+    return {
+        str(role): compile_trie(prefixes)
+        for role, prefixes in (permissions or {}).items()
+        if isinstance(prefixes, list)
+    }
+
+
+def trie_match(trie: Dict[Any, Any], path: str) -> bool:
+    """Walk the trie one segment at a time: O(path depth), independent of the number of prefixes."""
+    node = trie
+    for seg in path.split("/"):
+        node = node.get(seg)
+        if node is None:
+            return False
+        if _TRIE_END in node:
+            return True
+    return False
+
+
+def is_allowed(*, role: str, path: str, tries: Dict[str, Dict[Any, Any]]) -> bool:
+    """Check if role may access path, against compiled tries."""
+    if not role:
+        return False
+    if role == "superadmin":
+        return True
+
+    if path.startswith(BLOCKED_PREFIXES):
+        return False
+
+    trie = tries.get(role)
+    if not trie:
+        return False
+    # Only allow exact match or sub-paths (prefix + "/..."), never raw startswith(prefix)
+    return trie_match(trie, path)
+
+
+class PermissionStore:
+    """
+    Role permissions from settings.rbac_permissions (DEFAULT_PERMISSIONS when unset), cached for
+    `ttl` seconds. The compiled tries are rebuilt only when the permissions change: on store(),
+    invalidate(), or when a refresh finds that another worker saved different permissions.
+    """
+
+    def __init__(self, get_db: Callable[[], Any], *, ttl: float = 60.0):
+        self.get_db = get_db
+        self.ttl = ttl
+        self._permissions: Any = None
+        self._last_fetch = 0.0
+        self._version = 0
+        self._tries: Any = None
+        self._tries_version = -1
+        self._compiled_from: Any = None
+
+    def invalidate(self) -> None:
+        """Drop cached permissions and bump the version so compiled tries are rebuilt on next use."""
+        self._permissions = None
+        self._last_fetch = 0.0
+        self._compiled_from = None
+        self._version += 1
+
+    def store(self, permissions: Dict[str, List[str]]) -> None:
+        """Cache freshly saved permissions and compile them right away (no DB round trip on the next request)."""
+        self.invalidate()
+        self._permissions = permissions
+        self._last_fetch = time.time()
+        self._compiled_from = permissions
+        self._tries = compile_permissions(permissions)
+        self._tries_version = self._version
+
+    async def permissions(self) -> Dict[str, List[str]]:
+        if self._permissions and (time.time() - self._last_fetch) < self.ttl:
+            return self._permissions
+
+        permissions: Dict[str, List[str]] = DEFAULT_PERMISSIONS
+        try:
+            settings = await self.get_db().settings.find_one({"setting_id": "main"}, {"_id": 0, "rbac_permissions": 1})
+            if settings and settings.get("rbac_permissions"):
+                permissions = settings["rbac_permissions"]
+        except Exception as e:
+            logger.warning("Failed to fetch RBAC permissions from DB: %s", e)
+            return DEFAULT_PERMISSIONS
+
+        # Another worker may have saved new permissions; bump the version so our tries get rebuilt.
+        if permissions != self._compiled_from:
+            self._compiled_from = permissions
+            self._version += 1
+
+        self._permissions = permissions
+        self._last_fetch = time.time()
+        return permissions
+
+    async def tries(self) -> Dict[str, Dict[Any, Any]]:
+        """Compiled per-role tries for the current permissions version."""
+        permissions = await self.permissions()
+        if self._tries is None or self._tries_version != self._version:
+            self._tries = compile_permissions(permissions)
+            self._tries_version = self._version
+        return self._tries
+
+    async def is_allowed(self, *, role: str, path: str) -> bool:
+        return is_allowed(role=role, path=path, tries=await self.tries())
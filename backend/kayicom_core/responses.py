@@ -0,0 +1,45 @@
+"""
+JSON rendering with orjson.
+
+`ORJSONResponse` is the default response class of both apps. Handlers that return dicts still
+go through FastAPI's `jsonable_encoder` first; list endpoints that return trusted DB documents
+use `model_response()` instead, which builds the response model with `model_construct` (no
+validation) and hands it straight to orjson, skipping both the encoder walk and re-validation.
+"""
+from typing import Any, Type, TypeVar
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _orjson_default(obj: Any) -> Any:
+    # Constructed models carry their (already JSON-shaped) field values in __dict__.
+    if isinstance(obj, BaseModel):
+        return obj.__dict__
+    # Anything else orjson does not know (ObjectId, Decimal128, sets, bytes...) gets FastAPI's encoding.
+    encoded = jsonable_encoder(obj)
+    if encoded is obj:
+        raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+    return encoded
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_orjson_default, option=_ORJSON_OPTIONS)
+
+
+class ORJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def model_response(model: Type[ModelT], /, *, status_code: int = 200, **fields: Any) -> ORJSONResponse:
+    """Render `model(**fields)` built without validation; for data read back from our own collections."""
+    return ORJSONResponse(model.model_construct(**fields), status_code=status_code)
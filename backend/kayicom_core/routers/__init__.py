@@ -0,0 +1 @@
+"""Domain routers shared by both entry points (mounted under the /api prefix)."""
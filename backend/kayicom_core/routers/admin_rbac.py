@@ -0,0 +1,123 @@
+"""
+Admin role management (/admin/rbac): view, edit and reset which /api/admin paths each role may use.
+
+build_router() takes the entry point's database getter, admin dependency, PermissionStore and
+audit logger; saving goes through the store so the new permissions apply on the next request.
+"""
+from typing import Any, Awaitable, Callable, List
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+
+from kayicom_core import rbac
+
+# All available admin routes/permissions
+AVAILABLE_ADMIN_PERMISSIONS = [
+    {"path": "/api/admin/dashboard", "label": "Dashboard", "category": "general"},
+    {"path": "/api/admin/users", "label": "Itilizatè yo", "category": "users"},
+    {"path": "/api/admin/kyc", "label": "KYC", "category": "users"},
+    {"path": "/api/admin/deposits", "label": "Depo", "category": "finance"},
+    {"path": "/api/admin/withdrawals", "label": "Retrè", "category": "finance"},
+    {"path": "/api/admin/exchange-rates", "label": "To echanj", "category": "finance"},
+    {"path": "/api/admin/rates", "label": "Rates", "category": "finance"},
+    {"path": "/api/admin/fees", "label": "Frè", "category": "finance"},
+    {"path": "/api/admin/card-fees", "label": "Frè Kat", "category": "cards"},
+    {"path": "/api/admin/virtual-cards", "label": "Kat Vityèl", "category": "cards"},
+    {"path": "/api/admin/virtual-card-orders", "label": "Komand Kat", "category": "cards"},
+    {"path": "/api/admin/card-topups", "label": "Top-up Kat", "category": "cards"},
+    {"path": "/api/admin/topup-orders", "label": "Komand Top-up", "category": "cards"},
+    {"path": "/api/admin/payment-gateway", "label": "Gateway Peman", "category": "settings"},
+    {"path": "/api/admin/settings", "label": "Paramèt", "category": "settings"},
+    {"path": "/api/admin/bulk-email", "label": "Imèl an mas", "category": "communication"},
+    {"path": "/api/admin/logs", "label": "Lòg", "category": "system"},
+    {"path": "/api/admin/webhook-events", "label": "Webhook Events", "category": "system"},
+    {"path": "/api/admin/agent-deposits", "label": "Depo Ajan", "category": "agents"},
+    {"path": "/api/admin/agent-settings", "label": "Paramèt Ajan", "category": "agents"},
+    {"path": "/api/admin/agent-commission-withdrawals", "label": "Retrè Komisyon Ajan", "category": "agents"},
+    {"path": "/api/admin/agents", "label": "Ajan yo", "category": "agents"},
+    {"path": "/api/admin/team", "label": "Ekip Admin", "category": "system"},
+    {"path": "/api/admin/rbac", "label": "Jesyon Wòl", "category": "system"},
+    {"path": "/api/admin/rbac-permissions", "label": "Pèmisyon Metòd", "category": "system"},
+]
+
+EDITABLE_ROLES = ("support", "finance", "manager")
+
+
+class RBACUpdate(BaseModel):
+    role: str
+    permissions: List[str]
+
+
+def _require_rbac_manager(admin: dict) -> None:
+    # Only superadmin or admin can view/modify RBAC
+    if rbac.normalize_admin_role(admin) not in ("superadmin", "admin"):
+        raise HTTPException(status_code=403, detail="Only admin or superadmin can manage RBAC")
+
+
+def build_router(
+    *,
+    get_db: Callable[[], Any],
+    admin_user: Callable[..., Any],
+    permissions: rbac.PermissionStore,
+    log_action: Callable[[str, str, dict], Awaitable[None]],
+) -> APIRouter:
+    router = APIRouter(prefix="/api", tags=["admin-rbac"])
+
+    @router.get("/admin/rbac")
+    async def get_rbac_config(admin: dict = Depends(admin_user)):
+        """Get current RBAC configuration."""
+        _require_rbac_manager(admin)
+        return {
+            "roles": ["support", "finance", "manager", "admin"],
+            "permissions": await permissions.permissions(),
+            "available_permissions": AVAILABLE_ADMIN_PERMISSIONS,
+            "default_permissions": rbac.DEFAULT_PERMISSIONS,
+        }
+
+    @router.patch("/admin/rbac")
+    async def update_rbac_config(payload: RBACUpdate, admin: dict = Depends(admin_user)):
+        """Update RBAC permissions for a role."""
+        _require_rbac_manager(admin)
+
+        target_role = payload.role.lower()
+        if target_role not in EDITABLE_ROLES:
+            raise HTTPException(status_code=400, detail="Can only modify permissions for: support, finance, manager")
+
+        # Validate permission paths
+        valid_paths = {p["path"] for p in AVAILABLE_ADMIN_PERMISSIONS}
+        for perm in payload.permissions:
+            if perm not in valid_paths:
+                raise HTTPException(status_code=400, detail=f"Invalid permission path: {perm}")
+
+        # Get current permissions or defaults (copy: the cached dict may be DEFAULT_PERMISSIONS)
+        current = dict(await permissions.permissions())
+        current[target_role] = payload.permissions
+
+        await get_db().settings.update_one(
+            {"setting_id": "main"},
+            {"$set": {"rbac_permissions": current}},
+            upsert=True,
+        )
+        permissions.store(current)
+
+        await log_action(admin["user_id"], "rbac_update", {"role": target_role, "permissions": payload.permissions})
+
+        return {"message": f"Permissions for {target_role} updated", "permissions": current}
+
+    @router.post("/admin/rbac/reset")
+    async def reset_rbac_to_defaults(admin: dict = Depends(admin_user)):
+        """Reset RBAC permissions to defaults."""
+        _require_rbac_manager(admin)
+
+        await get_db().settings.update_one(
+            {"setting_id": "main"},
+            {"$unset": {"rbac_permissions": ""}},
+            upsert=True,
+        )
+        permissions.store(rbac.DEFAULT_PERMISSIONS)
+
+        await log_action(admin["user_id"], "rbac_reset", {})
+
+        return {"message": "RBAC permissions reset to defaults", "permissions": rbac.DEFAULT_PERMISSIONS}
+
+    return router
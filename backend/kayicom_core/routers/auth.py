@@ -0,0 +1,235 @@
+"""
+Authentication: the /auth routes and the current-user / admin dependencies every other route
+depends on.
+
+Both are built per entry point: current_user_dependency() and admin_user_dependency() take that
+entry point's database getter and PermissionStore, build_router() also takes its audit logger and
+how it sends the password reset email.
+"""
+import logging
+import secrets
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from pydantic import BaseModel, EmailStr
+
+from kayicom_core import rbac
+from kayicom_core.security import (
+    create_access_token,
+    decode_access_token,
+    generate_affiliate_code,
+    generate_client_id,
+    hash_password,
+    verify_password,
+)
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_RESET_TTL = timedelta(hours=1)
+
+bearer = HTTPBearer()
+
+
+class UserCreate(BaseModel):
+    email: EmailStr
+    password: str
+    full_name: str
+    phone: str
+    language: str = "fr"
+    referral_code: Optional[str] = None
+
+
+class UserLogin(BaseModel):
+    email: EmailStr
+    password: str
+
+
+class UserResponse(BaseModel):
+    user_id: str
+    client_id: str
+    email: str
+    full_name: str
+    phone: str
+    language: str
+    kyc_status: str
+    wallet_htg: float
+    wallet_usd: float
+    affiliate_code: str
+    affiliate_earnings: float
+    is_active: bool
+    is_admin: bool
+    created_at: str
+    telegram_chat_id: Optional[str] = None
+
+
+class PasswordReset(BaseModel):
+    email: EmailStr
+
+
+class PasswordResetConfirm(BaseModel):
+    token: str
+    new_password: str
+
+
+def current_user_dependency(get_db: Callable[[], Any]) -> Callable[..., Awaitable[dict]]:
+    async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(bearer)) -> dict:
+        payload = decode_access_token(credentials.credentials)
+        user_id = (payload or {}).get("sub")
+        if not user_id:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        user = await get_db().users.find_one({"user_id": user_id}, {"_id": 0})
+        if not user:
+            raise HTTPException(status_code=401, detail="User not found")
+        if not user.get("is_active", True):
+            raise HTTPException(status_code=403, detail="Account is suspended")
+        return user
+
+    return get_current_user
+
+
+def admin_user_dependency(
+    current_user: Callable[..., Awaitable[dict]],
+    permissions: rbac.PermissionStore,
+) -> Callable[..., Awaitable[dict]]:
+    async def get_admin_user(request: Request, user: dict = Depends(current_user)) -> dict:
+        if not user.get("is_admin"):
+            raise HTTPException(status_code=403, detail="Admin access required")
+
+        role = rbac.normalize_admin_role(user)
+        path = str(request.url.path or "")
+
+        # Only enforce RBAC on /api/admin/*.
+        if path.startswith("/api/admin"):
+            if not await permissions.is_allowed(role=role, path=path):
+                raise HTTPException(status_code=403, detail="Insufficient role permissions")
+
+        return user
+
+    return get_admin_user
+
+
+def build_router(
+    *,
+    get_db: Callable[[], Any],
+    current_user: Callable[..., Awaitable[dict]],
+    log_action: Callable[[str, str, dict], Awaitable[None]],
+    send_password_reset: Callable[[dict, str], Awaitable[Any]],
+) -> APIRouter:
+    """`send_password_reset(user, token)` emails the reset link for `token` to `user`."""
+    router = APIRouter(prefix="/api", tags=["auth"])
+
+    @router.post("/auth/register")
+    async def register(user: UserCreate):
+        db = get_db()
+        existing = await db.users.find_one({"email": user.email.lower()}, {"_id": 0})
+        if existing:
+            raise HTTPException(status_code=400, detail="Email already registered")
+
+        user_id = str(uuid.uuid4())
+        client_id = generate_client_id()
+
+        # Process referral code if provided
+        referred_by = None
+        if user.referral_code:
+            referrer = await db.users.find_one({"affiliate_code": user.referral_code}, {"_id": 0})
+            if referrer:
+                referred_by = user.referral_code
+            else:
+                logger.warning("Invalid referral code provided: %s", user.referral_code)
+
+        user_doc = {
+            "user_id": user_id,
+            "client_id": client_id,
+            "email": user.email.lower(),
+            "password_hash": hash_password(user.password),
+            "full_name": user.full_name,
+            "phone": user.phone,
+            "language": user.language,
+            "kyc_status": "pending",
+            "wallet_htg": 0.0,
+            "wallet_usd": 0.0,
+            "affiliate_code": generate_affiliate_code(),
+            "affiliate_earnings": 0.0,
+            "referred_by": referred_by,
+            "is_active": True,
+            "is_admin": False,
+            "two_factor_enabled": False,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+        await db.users.insert_one(user_doc)
+        await log_action(user_id, "register", {"email": user.email, "referred_by": referred_by})
+
+        token = create_access_token({"sub": user_id})
+
+        del user_doc["password_hash"]
+        user_doc.pop("_id", None)
+
+        return {"token": token, "user": user_doc}
+
+    @router.post("/auth/login")
+    async def login(credentials: UserLogin):
+        user = await get_db().users.find_one({"email": credentials.email.lower()}, {"_id": 0})
+        if not user or not verify_password(credentials.password, user["password_hash"]):
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+
+        if not user.get("is_active", True):
+            raise HTTPException(status_code=403, detail="Account is suspended")
+
+        await log_action(user["user_id"], "login", {"email": credentials.email})
+
+        token = create_access_token({"sub": user["user_id"]})
+
+        user_response = {k: v for k, v in user.items() if k != "password_hash"}
+
+        return {"token": token, "user": user_response}
+
+    @router.post("/auth/forgot-password")
+    async def forgot_password(request: PasswordReset):
+        db = get_db()
+        user = await db.users.find_one({"email": request.email.lower()}, {"_id": 0})
+        if not user:
+            return {"message": "If email exists, reset link will be sent"}
+
+        reset_token = secrets.token_urlsafe(32)
+        expires = datetime.now(timezone.utc) + PASSWORD_RESET_TTL
+
+        await db.password_resets.insert_one({
+            "token": reset_token,
+            "user_id": user["user_id"],
+            "expires": expires.isoformat(),
+            "used": False,
+        })
+
+        await send_password_reset({**user, "email": request.email}, reset_token)
+
+        return {"message": "If email exists, reset link will be sent"}
+
+    @router.post("/auth/reset-password")
+    async def reset_password(request: PasswordResetConfirm):
+        db = get_db()
+        reset_doc = await db.password_resets.find_one({"token": request.token, "used": False}, {"_id": 0})
+        if not reset_doc:
+            raise HTTPException(status_code=400, detail="Invalid or expired reset token")
+
+        if datetime.fromisoformat(reset_doc["expires"]) < datetime.now(timezone.utc):
+            raise HTTPException(status_code=400, detail="Reset token has expired")
+
+        await db.users.update_one(
+            {"user_id": reset_doc["user_id"]},
+            {"$set": {"password_hash": hash_password(request.new_password)}},
+        )
+
+        await db.password_resets.update_one({"token": request.token}, {"$set": {"used": True}})
+        await log_action(reset_doc["user_id"], "password_reset", {})
+
+        return {"message": "Password reset successfully"}
+
+    @router.get("/auth/me", response_model=UserResponse)
+    async def get_me(user: dict = Depends(current_user)):
+        return UserResponse(**user)
+
+    return router
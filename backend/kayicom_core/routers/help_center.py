@@ -0,0 +1,263 @@
+"""
+Help center articles (`help_articles`): the public list and the admin editor.
+
+The router is built per entry point with build_router(), which takes that entry point's database
+getter, admin dependency and audit logger.
+"""
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, ConfigDict
+
+from kayicom_core.responses import model_response
+
+
+class HelpArticleCreate(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    title_ht: Optional[str] = None
+    title_fr: Optional[str] = None
+    title_en: Optional[str] = None
+    content_ht: Optional[str] = None
+    content_fr: Optional[str] = None
+    content_en: Optional[str] = None
+    category: Optional[str] = None
+    order: Optional[int] = None
+    is_active: Optional[bool] = True
+
+
+class HelpArticleUpdate(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    title_ht: Optional[str] = None
+    title_fr: Optional[str] = None
+    title_en: Optional[str] = None
+    content_ht: Optional[str] = None
+    content_fr: Optional[str] = None
+    content_en: Optional[str] = None
+    category: Optional[str] = None
+    order: Optional[int] = None
+    is_active: Optional[bool] = None
+
+
+class HelpArticlesPage(BaseModel):
+    articles: List[Dict[str, Any]]
+
+
+async def seed_help_articles_if_empty(db) -> None:
+    count = await db.help_articles.count_documents({})
+    if count > 0:
+        return
+
+    now = datetime.now(timezone.utc).isoformat()
+    defaults = [
+        {
+            "article_id": str(uuid.uuid4()),
+            "title_ht": "Kijan pou kreye yon kont",
+            "content_ht": "Sou paj Enskripsyon, ranpli non konplè, imel ak nimewo telefòn. Valide, epi konekte ak imel ou ak modpas ou.",
+            "category": "Kòmanse",
+            "order": 1,
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now,
+        },
+        {
+            "article_id": str(uuid.uuid4()),
+            "title_ht": "Kijan pou verifye KYC",
+            "content_ht": "Nan meni KYC, telechaje yon pyès idantite ki klè ansanm ak selfie a. Asire non yo matche. Admin ap revize dosye a.",
+            "category": "Kont & Sekirite",
+            "order": 2,
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now,
+        },
+        {
+            "article_id": str(uuid.uuid4()),
+            "title_ht": "Kijan pou fè depo lajan",
+            "content_ht": "Nan Depo, chwazi metòd la, suiv enstriksyon yo, epi soumèt prèv la si li mande. Admin ap valide depo a.",
+            "category": "Depo & Retrè",
+            "order": 3,
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now,
+        },
+        {
+            "article_id": str(uuid.uuid4()),
+            "title_ht": "Kijan pou fè retrè lajan",
+            "content_ht": "Nan Retrè, chwazi metòd la, antre montan an, verifye frè yo, epi soumèt. Admin ap trete demann lan.",
+            "category": "Depo & Retrè",
+            "order": 4,
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now,
+        },
+        {
+            "article_id": str(uuid.uuid4()),
+            "title_ht": "Kijan pou fè transfè lajan",
+            "content_ht": "Nan Transfè, antre ID kliyan an oswa nimewo telefòn li, antre montan an, epi konfime.",
+            "category": "Transfè & Swap",
+            "order": 5,
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now,
+        },
+        {
+            "article_id": str(uuid.uuid4()),
+            "title_ht": "Kijan pou fè swap HTG/USD",
+            "content_ht": "Nan Swap, chwazi deviz ou bay ak deviz ou vle resevwa, verifye to chanj lan, epi konfime.",
+            "category": "Transfè & Swap",
+            "order": 6,
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now,
+        },
+        {
+            "article_id": str(uuid.uuid4()),
+            "title_ht": "Kat Vityèl: kòmande kat la",
+            "content_ht": "Nan Kat Vityèl, klike Kòmande. KYC dwe apwouve. Frè kòmand lan ap parèt avan ou konfime.",
+            "category": "Kat Vityèl",
+            "order": 7,
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now,
+        },
+        {
+            "article_id": str(uuid.uuid4()),
+            "title_ht": "Kat Vityèl: ajoute kòb (top-up)",
+            "content_ht": "Chwazi kat la, antre montan an, verifye frè ak minimòm yo, epi konfime top-up la.",
+            "category": "Kat Vityèl",
+            "order": 8,
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now,
+        },
+        {
+            "article_id": str(uuid.uuid4()),
+            "title_ht": "Kat Vityèl: fè retrè sou bous",
+            "content_ht": "Chwazi kat la, antre montan an, epi soumèt. Lajan an retounen nan bous USD ou si kat la sipòte li.",
+            "category": "Kat Vityèl",
+            "order": 9,
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now,
+        },
+        {
+            "article_id": str(uuid.uuid4()),
+            "title_ht": "Kijan pou achte minit (TopUp)",
+            "content_ht": "Nan TopUp, chwazi peyi a, antre nimewo telefòn nan, mete montan an, epi konfime.",
+            "category": "Lòt sèvis",
+            "order": 10,
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now,
+        },
+        {
+            "article_id": str(uuid.uuid4()),
+            "title_ht": "Mwen bliye modpas mwen",
+            "content_ht": "Sou paj Koneksyon, klike “Mwen bliye modpas”, antre imel ou, epi swiv etap yo nan imel la.",
+            "category": "Kont & Sekirite",
+            "order": 11,
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now,
+        },
+        {
+            "article_id": str(uuid.uuid4()),
+            "title_ht": "Kijan pou kontakte sipò",
+            "content_ht": "Sèvi ak bouton chat oswa WhatsApp si li aktif. Sinon, kontakte sipò a dirèkteman.",
+            "category": "Sipò",
+            "order": 12,
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now,
+        },
+        {
+            "article_id": str(uuid.uuid4()),
+            "title_ht": "Kijan pou enstale app la sou telefòn",
+            "content_ht": "Sou Android (Chrome), klike “Enstale App KAYICOM” oswa Menu (⋮) → Add to Home screen. Sou iPhone, itilize Share → Add to Home Screen.",
+            "category": "Kòmanse",
+            "order": 13,
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now,
+        },
+    ]
+
+    await db.help_articles.insert_many(defaults)
+
+
+def build_router(
+    *,
+    get_db: Callable[[], Any],
+    admin_user: Callable[..., Any],
+    log_action: Callable[[str, str, dict], Awaitable[None]],
+) -> APIRouter:
+    router = APIRouter(prefix="/api", tags=["help-center"])
+
+    @router.get("/public/help-center", response_model=HelpArticlesPage)
+    async def get_public_help_center():
+        db = get_db()
+        await seed_help_articles_if_empty(db)
+        articles = await db.help_articles.find({"is_active": True}, {"_id": 0}).sort("order", 1).to_list(500)
+        return model_response(HelpArticlesPage, articles=articles)
+
+    @router.get("/admin/help-center", response_model=HelpArticlesPage)
+    async def admin_get_help_center(admin: dict = Depends(admin_user)):
+        db = get_db()
+        await seed_help_articles_if_empty(db)
+        articles = await db.help_articles.find({}, {"_id": 0}).sort("order", 1).to_list(500)
+        return model_response(HelpArticlesPage, articles=articles)
+
+    @router.post("/admin/help-center")
+    async def admin_create_help_article(payload: HelpArticleCreate, admin: dict = Depends(admin_user)):
+        title_values = [payload.title_ht, payload.title_fr, payload.title_en]
+        if not any(t and str(t).strip() for t in title_values):
+            raise HTTPException(status_code=400, detail="At least one title is required")
+
+        now = datetime.now(timezone.utc).isoformat()
+        article = {
+            "article_id": str(uuid.uuid4()),
+            "title_ht": payload.title_ht,
+            "title_fr": payload.title_fr,
+            "title_en": payload.title_en,
+            "content_ht": payload.content_ht,
+            "content_fr": payload.content_fr,
+            "content_en": payload.content_en,
+            "category": (payload.category or "General").strip(),
+            "order": int(payload.order or 0),
+            "is_active": bool(payload.is_active if payload.is_active is not None else True),
+            "created_at": now,
+            "updated_at": now,
+        }
+        await get_db().help_articles.insert_one(article)
+        article.pop("_id", None)
+        await log_action(admin["user_id"], "help_article_create", {"article_id": article["article_id"]})
+        return {"article": article}
+
+    @router.put("/admin/help-center/{article_id}")
+    async def admin_update_help_article(article_id: str, payload: HelpArticleUpdate, admin: dict = Depends(admin_user)):
+        db = get_db()
+        update_doc = {k: v for k, v in payload.model_dump().items() if v is not None}
+        if "category" in update_doc:
+            update_doc["category"] = (update_doc["category"] or "General").strip()
+        if "order" in update_doc:
+            update_doc["order"] = int(update_doc["order"] or 0)
+        update_doc["updated_at"] = datetime.now(timezone.utc).isoformat()
+
+        result = await db.help_articles.update_one({"article_id": article_id}, {"$set": update_doc})
+        if result.matched_count == 0:
+            raise HTTPException(status_code=404, detail="Article not found")
+
+        article = await db.help_articles.find_one({"article_id": article_id}, {"_id": 0})
+        await log_action(admin["user_id"], "help_article_update", {"article_id": article_id})
+        return {"article": article}
+
+    @router.delete("/admin/help-center/{article_id}")
+    async def admin_delete_help_article(article_id: str, admin: dict = Depends(admin_user)):
+        result = await get_db().help_articles.delete_one({"article_id": article_id})
+        if result.deleted_count == 0:
+            raise HTTPException(status_code=404, detail="Article not found")
+        await log_action(admin["user_id"], "help_article_delete", {"article_id": article_id})
+        return {"success": True}
+
+    return router
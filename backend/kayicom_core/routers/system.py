@@ -0,0 +1,16 @@
+"""Service metadata and health check."""
+from fastapi import APIRouter
+
+API_VERSION = "1.0.0"
+
+router = APIRouter(prefix="/api", tags=["system"])
+
+
+@router.get("/")
+async def root():
+    return {"message": "KAYICOM Wallet API", "version": API_VERSION}
+
+
+@router.get("/health")
+async def health():
+    return {"status": "healthy"}
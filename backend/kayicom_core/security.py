@@ -0,0 +1,55 @@
+"""Password hashing, account identifiers and access tokens."""
+import os
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_HOURS = 24
+
+# Read at use time: entry points load their .env after importing this module.
+_FALLBACK_SECRET_KEY = secrets.token_urlsafe(32)
+
+
+def _secret_key() -> str:
+    return os.environ.get("JWT_SECRET", _FALLBACK_SECRET_KEY)
+
+
+def generate_client_id() -> str:
+    return f"KC{secrets.token_hex(4).upper()}"
+
+
+def generate_affiliate_code() -> str:
+    return secrets.token_urlsafe(8)
+
+
+# bcrypt and jose are imported on first use (not at module load) to keep cold starts short;
+# after the first call the import is a sys.modules lookup.
+
+def hash_password(password: str) -> str:
+    import bcrypt
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    import bcrypt
+    return bcrypt.checkpw(password.encode(), hashed.encode())
+
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+    from jose import jwt
+
+    to_encode = data.copy()
+    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS))
+    to_encode.update({"exp": expire})
+    return jwt.encode(to_encode, _secret_key(), algorithm=ALGORITHM)
+
+
+def decode_access_token(token: str) -> Optional[Dict[str, Any]]:
+    """Token claims, or None when the token is malformed, forged or expired."""
+    from jose import jwt, JWTError
+
+    try:
+        return jwt.decode(token, _secret_key(), algorithms=[ALGORITHM])
+    except JWTError:
+        return None
@@ -0,0 +1,43 @@
+"""
+One-shot schema migration for the KAYICOM API.
+
+Builds indexes and event stores, seeds defaults and runs data backfills (see `run_migrations`
+in server.py), then records SCHEMA_VERSION so web workers skip all of it at boot. Run it as a
+deploy step, before the new release starts serving:
+
+    python migrate.py            # migrate MONGO_URL / DB_NAME
+    python migrate.py --check    # exit 1 if the database is behind SCHEMA_VERSION
+"""
+import argparse
+import asyncio
+import sys
+from typing import List, Optional
+
+
+async def _migrate(check_only: bool) -> int:
+    from server import SCHEMA_META_ID, SCHEMA_VERSION, client, db, run_migrations
+
+    try:
+        if check_only:
+            meta = await db.schema_meta.find_one({"_id": SCHEMA_META_ID}) or {}
+            current = int(meta.get("version") or 0)
+            print(f"schema version {current} (code expects {SCHEMA_VERSION})")
+            return 0 if current >= SCHEMA_VERSION else 1
+        meta = await run_migrations()
+    finally:
+        client.close()
+    for name in meta["indexes_built"]:
+        print(f"built {name}")
+    print(f"schema migrated to version {meta['version']}")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="KAYICOM schema migration")
+    parser.add_argument("--check", action="store_true", help="only compare the stored schema version")
+    args = parser.parse_args(argv)
+    return asyncio.run(_migrate(args.check))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""
+PDF rendering for KAYICOM documents (account statements, receipts).
+
+These functions run inside a process pool (see `run_pdf_render` in server.py), so they only
+take plain, picklable arguments and import nothing from the API server. Rows are read from a
+file line by line and drawn page by page, so the parent never holds the whole document.
+"""
+import csv
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.pdfgen import canvas
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 15 * mm
+LINE_HEIGHT = 5.2 * mm
+BRAND_COLOR = colors.HexColor("#EA580C")
+
+# (header, csv column, x offset in mm, max characters, right aligned)
+STATEMENT_COLUMNS = [
+    ("Date", "date", 0, 16, False),
+    ("Type", "type", 30, 18, False),
+    ("Description", "description", 62, 40, False),
+    ("Status", "status", 135, 10, False),
+    ("Amount", "amount", 180, 16, True),
+]
+
+
+def _fit(value: Any, limit: int) -> str:
+    text = "" if value is None else str(value)
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def _format_balances(balances: Optional[Dict[str, Any]]) -> str:
+    if not balances:
+        return "n/a"
+    parts = [f"{float(balances.get('wallet_htg') or 0):,.2f} HTG", f"{float(balances.get('wallet_usd') or 0):,.2f} USD"]
+    as_of = balances.get("as_of")
+    return "  /  ".join(parts) + (f"  (as of {as_of})" if as_of else "")
+
+
+class _StatementCanvas:
+    def __init__(self, out_path: str, header: Dict[str, Any]):
+        self.c = canvas.Canvas(out_path, pagesize=A4, pageCompression=1)
+        self.c.setTitle(f"Statement {header.get('client_id') or ''}".strip())
+        self.header = header
+        self.pages = 0
+        self.y = 0.0
+        self._new_page()
+
+    def _new_page(self) -> None:
+        if self.pages:
+            self.c.showPage()
+        self.pages += 1
+        c = self.c
+        top = PAGE_HEIGHT - MARGIN
+        c.setFillColor(BRAND_COLOR)
+        c.setFont("Helvetica-Bold", 14)
+        c.drawString(MARGIN, top, "KAYICOM - Account statement")
+        c.setFillColor(colors.black)
+        c.setFont("Helvetica", 8)
+        c.drawRightString(PAGE_WIDTH - MARGIN, top, f"Page {self.pages}")
+        y = top - 7 * mm
+        if self.pages == 1:
+            h = self.header
+            c.setFont("Helvetica", 9)
+            for line in (
+                f"{h.get('full_name') or ''}  -  {h.get('client_id') or ''}",
+                f"Period: {h.get('start')} to {h.get('end')}",
+                f"Opening balance: {_format_balances(h.get('opening'))}",
+            ):
+                c.drawString(MARGIN, y, line)
+                y -= LINE_HEIGHT
+            y -= 2 * mm
+        c.setFont("Helvetica-Bold", 8)
+        for title, _, x, _, right in STATEMENT_COLUMNS:
+            if right:
+                c.drawRightString(PAGE_WIDTH - MARGIN, y, title)
+            else:
+                c.drawString(MARGIN + x * mm, y, title)
+        c.setStrokeColor(colors.lightgrey)
+        c.line(MARGIN, y - 1.5 * mm, PAGE_WIDTH - MARGIN, y - 1.5 * mm)
+        c.setFont("Helvetica", 8)
+        self.y = y - LINE_HEIGHT
+
+    def row(self, row: Dict[str, str]) -> None:
+        if self.y < MARGIN + LINE_HEIGHT:
+            self._new_page()
+        c = self.c
+        for _, key, x, limit, right in STATEMENT_COLUMNS:
+            value = row.get(key)
+            if key == "amount":
+                value = f"{float(value or 0):,.2f} {row.get('currency') or ''}"
+            if right:
+                c.drawRightString(PAGE_WIDTH - MARGIN, self.y, _fit(value, limit))
+            else:
+                c.drawString(MARGIN + x * mm, self.y, _fit(value, limit))
+        self.y -= LINE_HEIGHT
+
+    def footer(self, lines: List[str]) -> None:
+        if self.y < MARGIN + LINE_HEIGHT * (len(lines) + 2):
+            self._new_page()
+        c = self.c
+        self.y -= 2 * mm
+        c.line(MARGIN, self.y + 3 * mm, PAGE_WIDTH - MARGIN, self.y + 3 * mm)
+        c.setFont("Helvetica-Bold", 9)
+        for line in lines:
+            c.drawString(MARGIN, self.y, line)
+            self.y -= LINE_HEIGHT
+
+    def save(self) -> None:
+        self.c.save()
+
+
+def render_statement_pdf(rows_path: str, out_path: str, header: Dict[str, Any]) -> int:
+    """
+    Render a statement from a CSV of ledger rows (columns: see STATEMENT_COLUMNS + currency).
+    `header` carries full_name, client_id, start, end, opening, closing and totals.
+    Returns the page count.
+    """
+    doc = _StatementCanvas(out_path, header)
+    with open(rows_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            doc.row(row)
+    lines = [f"Closing balance: {_format_balances(header.get('closing'))}"]
+    for currency, t in sorted((header.get("totals") or {}).items()):
+        lines.append(
+            f"{currency}: credits {t['credits']:,.2f}  debits {t['debits']:,.2f}  ({t['count']} completed transactions)"
+        )
+    doc.footer(lines)
+    doc.save()
+    return doc.pages
+
+
+# ==================== RECEIPTS ====================
+# Bump RECEIPT_TEMPLATE_VERSION whenever a template or the layout changes: it is part of the
+# cache key, so previously rendered receipts are not served with the old layout.
+RECEIPT_TEMPLATE_VERSION = 1
+
+# kind -> (title, [(label, key, format)]). format: text | money (receipt currency) | htg | datetime
+RECEIPT_TEMPLATES: Dict[str, tuple] = {
+    "deposit": ("Deposit receipt", [
+        ("Reference", "reference_id", "text"),
+        ("Date", "created_at", "datetime"),
+        ("Customer", "customer", "text"),
+        ("Method", "method", "text"),
+        ("Amount", "amount", "money"),
+        ("Fee", "fee", "money"),
+        ("Credited", "net_amount", "money"),
+        ("Status", "status", "text"),
+        ("Processed", "processed_at", "datetime"),
+    ]),
+    "withdrawal": ("Withdrawal receipt", [
+        ("Reference", "reference_id", "text"),
+        ("Date", "created_at", "datetime"),
+        ("Customer", "customer", "text"),
+        ("Method", "method", "text"),
+        ("Amount", "amount", "money"),
+        ("Fee", "fee", "money"),
+        ("Debited", "amount_deducted", "money"),
+        ("Status", "status", "text"),
+        ("Processed", "processed_at", "datetime"),
+    ]),
+    "transfer": ("Transfer receipt", [
+        ("Reference", "reference_id", "text"),
+        ("Date", "created_at", "datetime"),
+        ("Customer", "customer", "text"),
+        ("Details", "description", "text"),
+        ("Amount", "amount", "money"),
+        ("Fee", "fee", "money"),
+        ("Status", "status", "text"),
+    ]),
+    "card_topup": ("Card top-up receipt", [
+        ("Reference", "reference_id", "text"),
+        ("Date", "created_at", "datetime"),
+        ("Customer", "customer", "text"),
+        ("Card", "card", "text"),
+        ("Amount", "amount", "money"),
+        ("Fee", "fee", "money"),
+        ("Total charged", "total_amount", "money"),
+        ("Status", "status", "text"),
+        ("Processed", "processed_at", "datetime"),
+    ]),
+    "agent_deposit": ("Agent deposit receipt", [
+        ("Reference", "reference_id", "text"),
+        ("Date", "created_at", "datetime"),
+        ("Agent", "agent", "text"),
+        ("Client", "customer", "text"),
+        ("Amount", "amount", "money"),
+        ("HTG received", "amount_htg_received", "htg"),
+        ("Commission", "commission", "money"),
+        ("Status", "status", "text"),
+        ("Processed", "processed_at", "datetime"),
+    ]),
+}
+
+
+def _format_receipt_value(value: Any, fmt: str, currency: str) -> str:
+    if value is None or value == "":
+        return "-"
+    if fmt in ("money", "htg"):
+        try:
+            return f"{float(value):,.2f} {'HTG' if fmt == 'htg' else currency}".strip()
+        except (TypeError, ValueError):
+            return str(value)
+    if fmt == "datetime":
+        return str(value)[:19].replace("T", " ") + " UTC"
+    return str(value)
+
+
+@lru_cache(maxsize=None)
+def _compiled_receipt_template(kind: str) -> tuple:
+    """(title, [(label, key, formatter)]) - built once per worker process."""
+    title, fields = RECEIPT_TEMPLATES[kind]
+    compiled = []
+    for label, key, fmt in fields:
+        compiled.append((label, key, lambda v, c, fmt=fmt: _format_receipt_value(v, fmt, c)))
+    return title, tuple(compiled)
+
+
+def _draw_receipt(c: "canvas.Canvas", receipt: Dict[str, Any]) -> None:
+    title, fields = _compiled_receipt_template(receipt["kind"])
+    top = PAGE_HEIGHT - MARGIN
+    c.setFillColor(BRAND_COLOR)
+    c.setFont("Helvetica-Bold", 16)
+    c.drawString(MARGIN, top, "KAYICOM")
+    c.setFillColor(colors.black)
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(MARGIN, top - 9 * mm, title)
+    c.setStrokeColor(colors.lightgrey)
+    c.line(MARGIN, top - 12 * mm, PAGE_WIDTH - MARGIN, top - 12 * mm)
+    y = top - 20 * mm
+    currency = receipt.get("currency") or ""
+    for label, key, fmt in fields:
+        value = receipt.get(key)
+        if value is None and key not in receipt:
+            continue
+        c.setFont("Helvetica", 10)
+        c.drawString(MARGIN, y, label)
+        c.setFont("Helvetica-Bold", 10)
+        c.drawRightString(PAGE_WIDTH - MARGIN, y, _fit(fmt(value, currency), 60))
+        y -= 8 * mm
+    c.setFont("Helvetica", 8)
+    c.setFillColor(colors.grey)
+    c.drawString(MARGIN, MARGIN, "This receipt was generated electronically by KAYICOM.")
+
+
+def render_receipts_pdf(receipts: List[Dict[str, Any]], out_path: str) -> int:
+    """Render one receipt per page (a single receipt or an end-of-day bundle). Returns the page count."""
+    c = canvas.Canvas(out_path, pagesize=A4, pageCompression=1)
+    c.setTitle("KAYICOM receipt" if len(receipts) == 1 else "KAYICOM receipts")
+    for i, receipt in enumerate(receipts):
+        if i:
+            c.showPage()
+        _draw_receipt(c, receipt)
+    c.save()
+    return len(receipts)
@@ -1,26 +1,46 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, Query, Request
-from fastapi.responses import RedirectResponse
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
 from dotenv import load_dotenv
+from starlette.background import BackgroundTask
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, CollectionInvalid, DuplicateKeyError, OperationFailure
 import os
 import logging
 import asyncio
+import csv
+import io
+import multiprocessing
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
 from pydantic.config import ConfigDict
-from typing import Any, Dict, List, Literal, Optional
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Literal, Mapping, Optional
 import uuid
+import functools
 from datetime import datetime, timezone, timedelta
-import bcrypt
-from jose import jwt, JWTError
 import secrets
 import base64
-import binascii
+import hashlib
 import httpx
+import json
 import re
 
+import pdf_render
+from db_indexes import ensure_indexes
+from kayicom_core import audit, rbac
+from kayicom_core.compression import CompressionMiddleware
+from kayicom_core.kyc_images import cloudinary_creds, cloudinary_is_configured, kyc_store_image_value, parse_image_data_url
+from kayicom_core.responses import ORJSONResponse, model_response
+from kayicom_core.routers import admin_rbac as admin_rbac_routes
+from kayicom_core.routers import auth as auth_routes
+from kayicom_core.routers import help_center as help_center_routes
+from kayicom_core.routers import system as system_routes
+from kayicom_core.security import generate_affiliate_code, generate_client_id, hash_password
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
@@ -66,165 +86,275 @@ if 'mongodb+srv://' in mongo_url or 'mongodb://' in mongo_url:
 client = AsyncIOMotorClient(mongo_url)
 db = client[db_name]
 
-# JWT Configuration
-SECRET_KEY = os.environ.get('JWT_SECRET', secrets.token_urlsafe(32))
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_HOURS = 24
-
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 api_router = APIRouter(prefix="/api")
-security = HTTPBearer()
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# ==================== KYC IMAGE STORAGE (OPTIONAL CLOUDINARY) ====================
+# ==================== SETTINGS SNAPSHOT ====================
+# Hot paths (notification gateways, provider clients) read `db.settings` through this short-lived
+# snapshot instead of querying Mongo on every call. `version` changes only when the settings
+# content changes, so anything compiled from settings can be rebuilt lazily by comparing versions.
 
-_DATA_URL_IMAGE_RE = re.compile(
-    r"^data:(image/(?:png|jpe?g|webp));base64,(.+)$",
-    flags=re.IGNORECASE | re.DOTALL,
-)
+SETTINGS_SNAPSHOT_TTL_SECONDS = 15.0
 
-def _cloudinary_creds(settings: Optional[dict]) -> Dict[str, Optional[str]]:
-    """
-    Prefer DB settings (admin-configured) over environment variables.
-    This allows non-technical admins to configure KYC storage without redeploys.
-    """
-    s = settings or {}
-    cloud_name = (s.get("cloudinary_cloud_name") or os.environ.get("CLOUDINARY_CLOUD_NAME") or "").strip() or None
-    api_key = (s.get("cloudinary_api_key") or os.environ.get("CLOUDINARY_API_KEY") or "").strip() or None
-    api_secret = (s.get("cloudinary_api_secret") or os.environ.get("CLOUDINARY_API_SECRET") or "").strip() or None
-    folder = (s.get("cloudinary_folder") or os.environ.get("CLOUDINARY_FOLDER") or "kayicom/kyc").strip().strip("/") or "kayicom/kyc"
-    return {"cloud_name": cloud_name, "api_key": api_key, "api_secret": api_secret, "folder": folder}
+_settings_snapshot: Dict[str, Any] = {"settings": None, "fetched_at": 0.0, "version": 0}
 
 
-def _cloudinary_is_configured(settings: Optional[dict]) -> bool:
-    c = _cloudinary_creds(settings)
-    return bool(c.get("cloud_name") and c.get("api_key") and c.get("api_secret"))
+async def get_settings_snapshot() -> Dict[str, Any]:
+    """Return the main settings document (possibly up to SETTINGS_SNAPSHOT_TTL_SECONDS old)."""
+    import time
 
+    now = time.monotonic()
+    if _settings_snapshot["settings"] is not None and (now - _settings_snapshot["fetched_at"]) < SETTINGS_SNAPSHOT_TTL_SECONDS:
+        return _settings_snapshot["settings"]
 
-def _cloudinary_setup(settings: Optional[dict]) -> bool:
-    if not _cloudinary_is_configured(settings):
-        return False
-    # Lazy import so the backend still starts even if the dependency is missing locally.
-    import cloudinary  # type: ignore
-    c = _cloudinary_creds(settings)
-
-    cloudinary.config(
-        cloud_name=c["cloud_name"],
-        api_key=c["api_key"],
-        api_secret=c["api_secret"],
-        secure=True,
-    )
-    return True
+    settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0}) or {}
+    if settings != _settings_snapshot["settings"]:
+        _settings_snapshot["version"] += 1
+    _settings_snapshot["settings"] = settings
+    _settings_snapshot["fetched_at"] = now
+    return settings
 
 
-def _parse_image_data_url(value: str) -> Optional[Dict[str, Any]]:
-    """
-    Parse `data:image/...;base64,....` and return mime + bytes.
-    Returns None if the input is not a data URL.
-    """
-    if not isinstance(value, str):
-        return None
-    m = _DATA_URL_IMAGE_RE.match(value.strip())
-    if not m:
-        return None
-    mime = (m.group(1) or "").lower().replace("image/jpg", "image/jpeg")
-    b64 = m.group(2) or ""
-    try:
-        raw = base64.b64decode(b64, validate=True)
-    except (binascii.Error, ValueError):
-        raise HTTPException(status_code=400, detail="Invalid image encoding (base64)")
-    return {"mime": mime, "bytes": raw, "data_url": value.strip()}
-
-
-async def _cloudinary_upload_data_url(*, settings: Optional[dict], data_url: str, folder: str, public_id: str) -> str:
-    if not _cloudinary_setup(settings):
-        raise RuntimeError("Cloudinary not configured")
-    import cloudinary.uploader  # type: ignore
-
-    result = await asyncio.to_thread(
-        cloudinary.uploader.upload,
-        data_url,
-        folder=folder,
-        public_id=public_id,
-        overwrite=True,
-        unique_filename=False,
-        resource_type="image",
-    )
-    url = (result or {}).get("secure_url") or (result or {}).get("url")
-    if not url:
-        raise RuntimeError("Cloudinary upload did not return a URL")
-    return str(url)
+def settings_snapshot_version() -> int:
+    return int(_settings_snapshot["version"])
 
 
-async def _kyc_store_image_value(
-    value: Optional[str],
-    *,
-    user_id: str,
-    kyc_id: str,
-    field_name: str,
-    settings: Optional[dict] = None,
-) -> Dict[str, Any]:
+def invalidate_settings_snapshot() -> None:
+    """Force the next get_settings_snapshot() to re-read Mongo (call after writing settings)."""
+    _settings_snapshot["fetched_at"] = 0.0
+
+async def acquire_worker_lease(lease_id: str, owner: str, seconds: float) -> bool:
     """
-    Returns a dict:
-      - value: stored string (URL or data URL)
-      - meta: metadata for auditing
+    Take or renew a singleton-job lease in `worker_leases` (one process runs the job at a time).
+    Returns True while `owner` holds the lease. The lease document's `_id` is the lease id, so
+    two processes racing to create it cannot both succeed, whatever indexes exist.
     """
-    if not value:
-        return {"value": value, "meta": None}
+    now = datetime.now(timezone.utc)
+    for _ in range(2):
+        try:
+            lease = await db.worker_leases.find_one_and_update(
+                {"_id": lease_id, "$or": [{"owner": owner}, {"expires_at": {"$lt": now.isoformat()}}]},
+                {"$set": {"lease_id": lease_id, "owner": owner, "expires_at": (now + timedelta(seconds=seconds)).isoformat()}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # Another process holds the lease, or an older lease document (ObjectId _id) for the
+            # same job conflicts on the lease_id index: remove that one once it has expired.
+            stale = await db.worker_leases.delete_one(
+                {"lease_id": lease_id, "_id": {"$ne": lease_id}, "expires_at": {"$lt": now.isoformat()}}
+            )
+            if not stale.deleted_count:
+                return False
+            continue
+        except Exception:
+            return False
+        return bool(lease and lease.get("owner") == owner)
+    return False
+
+# ==================== PROVIDER RESILIENCE ====================
+# Per-provider bulkhead (bounded concurrency), adaptive timeout and circuit breaker. While a
+# provider's breaker is open, calls fail fast with 503 instead of holding a worker on a 30s
+# timeout; after PROVIDER_BREAKER_OPEN_SECONDS a single half-open probe decides whether to close it.
+# Provider base URLs stay overridable (STROWALLET_BASE_URL, PLISIO_API_BASE, TELEGRAM_API_BASE,
+# CALLMEBOT_API_BASE) so this can be exercised against local stand-in HTTP servers.
+
+PLISIO_API_BASE = (os.environ.get("PLISIO_API_BASE") or "https://plisio.net/api/v1").rstrip("/")
+CALLMEBOT_API_BASE = (os.environ.get("CALLMEBOT_API_BASE") or "https://api.callmebot.com").rstrip("/")
+
+PROVIDER_BREAKER_FAILURES = int(os.environ.get("PROVIDER_BREAKER_FAILURES") or 5)
+PROVIDER_BREAKER_OPEN_SECONDS = float(os.environ.get("PROVIDER_BREAKER_OPEN_SECONDS") or 30)
+PROVIDER_BULKHEAD_WAIT_SECONDS = float(os.environ.get("PROVIDER_BULKHEAD_WAIT_SECONDS") or 2)
+# Adaptive timeouts only apply to idempotent reads. Calls that move money or create resources
+# (card create/fund/withdraw, freeze, limits...) keep a fixed, long timeout: cutting them short
+# would report a failure for an operation the provider may still complete.
+STROWALLET_WRITE_TIMEOUT_SECONDS = float(os.environ.get("STROWALLET_WRITE_TIMEOUT_SECONDS") or 30)
+# Same rule for the other providers' non-idempotent calls (Resend sends, Plisio invoices/new).
+PROVIDER_WRITE_TIMEOUT_SECONDS = float(os.environ.get("PROVIDER_WRITE_TIMEOUT_SECONDS") or 30)
+_PROVIDER_LATENCY_SAMPLES = 200
+
+
+class ProviderUnavailableError(HTTPException):
+    """Raised without calling the provider (breaker open or bulkhead full)."""
+
+    def __init__(self, provider: str, reason: str):
+        super().__init__(status_code=503, detail=f"{provider} is temporarily unavailable ({reason}). Please try again shortly.")
+        self.provider = provider
+        self.reason = reason
+
+
+class _ProviderAttempt:
+    __slots__ = ("guard", "timeout", "probe", "started", "failed")
+
+    def __init__(self, guard: "ProviderGuard", timeout: float, probe: bool):
+        self.guard = guard
+        self.timeout = timeout
+        self.probe = probe
+        self.started = 0.0
+        self.failed = False
+
+    def fail(self) -> None:
+        """Count this call as a provider failure (e.g. 5xx) even though no exception was raised."""
+        self.failed = True
+
+    async def __aenter__(self) -> "_ProviderAttempt":
+        import time
+
+        guard = self.guard
+        try:
+            await asyncio.wait_for(guard.semaphore.acquire(), timeout=PROVIDER_BULKHEAD_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            if self.probe:
+                guard.probing = False
+            guard.rejected += 1
+            raise ProviderUnavailableError(guard.name, "busy")
+        guard.in_flight += 1
+        self.started = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        import time
+
+        guard = self.guard
+        guard.in_flight -= 1
+        guard.semaphore.release()
+        if exc_type is not None and issubclass(exc_type, asyncio.CancelledError):
+            # Cancelled (e.g. a losing hedged request): no verdict on the provider.
+            if self.probe:
+                guard.probing = False
+            return False
+        # Only transport-level problems (and explicit fail()) count against the provider;
+        # anything else means the provider answered and the caller rejected the answer.
+        failed = self.failed or (exc_type is not None and issubclass(exc_type, (httpx.HTTPError, asyncio.TimeoutError, OSError)))
+        guard._record(time.monotonic() - self.started, failed, self.probe)
+        return False
+
 
-    parsed = _parse_image_data_url(value)
-    if not parsed:
-        # Already a URL or non-data string. Keep as-is.
+class ProviderGuard:
+    def __init__(self, name: str, *, max_concurrency: int, max_timeout: float, min_timeout: float = 3.0):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_timeout = max_timeout
+        self.min_timeout = min_timeout
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probing = False
+        self.consecutive_failures = 0
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.latencies: Any = None
+
+    def timeout(self) -> float:
+        """
+        p99 of recent successful calls x3, clamped to [min_timeout, max_timeout].
+        For idempotent calls only; non-idempotent calls pass their own fixed timeout to attempt().
+        """
+        samples = self.latencies
+        if not samples or len(samples) < 20:
+            return self.max_timeout
+        ordered = sorted(samples)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        return max(self.min_timeout, min(self.max_timeout, p99 * 3))
+
+    def attempt(self, timeout: Optional[float] = None) -> _ProviderAttempt:
+        """`async with guard.attempt() as att:` then pass `att.timeout` to the HTTP call."""
+        import time
+
+        probe = False
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < PROVIDER_BREAKER_OPEN_SECONDS:
+                self.rejected += 1
+                raise ProviderUnavailableError(self.name, "circuit open")
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self.probing:
+                self.rejected += 1
+                raise ProviderUnavailableError(self.name, "circuit half-open")
+            self.probing = True
+            probe = True
+        return _ProviderAttempt(self, timeout or self.timeout(), probe)
+
+    def _record(self, seconds: float, failed: bool, probe: bool) -> None:
+        import time
+        from collections import deque
+
+        self.calls += 1
+        if probe:
+            self.probing = False
+        if failed:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if probe or self.consecutive_failures >= PROVIDER_BREAKER_FAILURES:
+                if self.state != "open":
+                    logger.warning(f"Circuit for {self.name} opened after {self.consecutive_failures} consecutive failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+            return
+        if self.latencies is None:
+            self.latencies = deque(maxlen=_PROVIDER_LATENCY_SAMPLES)
+        self.latencies.append(seconds)
+        self.consecutive_failures = 0
+        if self.state != "closed":
+            logger.info(f"Circuit for {self.name} closed")
+        self.state = "closed"
+
+    def snapshot(self) -> Dict[str, Any]:
+        import time
+
+        samples = sorted(self.latencies or [])
+
+        def pct(p: float) -> Optional[float]:
+            if not samples:
+                return None
+            return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 1)
+
+        retry_in = None
+        if self.state == "open":
+            retry_in = max(0.0, round(PROVIDER_BREAKER_OPEN_SECONDS - (time.monotonic() - self.opened_at), 1))
         return {
-            "value": value,
-            "meta": {
-                "storage": "external",
-                "mime": None,
-                "bytes": None,
-                "uploaded_at": datetime.now(timezone.utc).isoformat(),
-            },
+            "provider": self.name,
+            "state": self.state,
+            "retry_in_seconds": retry_in,
+            "consecutive_failures": self.consecutive_failures,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "timeout_seconds": round(self.timeout(), 2),
+            "calls": self.calls,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "latency_p50_ms": pct(0.5),
+            "latency_p95_ms": pct(0.95),
         }
 
-    mime = parsed["mime"]
-    raw = parsed["bytes"]
-    max_bytes = int((settings or {}).get("kyc_max_image_bytes") or os.environ.get("KYC_MAX_IMAGE_BYTES") or 5 * 1024 * 1024)
-    if len(raw) > max_bytes:
-        raise HTTPException(status_code=413, detail="Image too large")
 
-    if mime not in {"image/jpeg", "image/png", "image/webp"}:
-        raise HTTPException(status_code=400, detail="Unsupported image type")
+def _provider_concurrency(name: str, default: int) -> int:
+    return max(1, int(os.environ.get(f"{name.upper()}_MAX_CONCURRENCY") or default))
 
-    # Prefer Cloudinary when configured; fall back to inline storage.
-    if _cloudinary_is_configured(settings):
-        folder = _cloudinary_creds(settings).get("folder") or "kayicom/kyc"
-        public_id = f"{kyc_id}_{field_name}"
-        try:
-            url = await _cloudinary_upload_data_url(settings=settings, data_url=parsed["data_url"], folder=folder, public_id=public_id)
-            return {
-                "value": url,
-                "meta": {
-                    "storage": "cloudinary",
-                    "mime": mime,
-                    "bytes": len(raw),
-                    "public_id": f"{folder}/{public_id}" if folder else public_id,
-                    "uploaded_at": datetime.now(timezone.utc).isoformat(),
-                },
-            }
-        except Exception as e:
-            logger.exception("Cloudinary upload failed; falling back to inline storage: %s", e)
 
-    return {
-        "value": parsed["data_url"],
-        "meta": {
-            "storage": "inline",
-            "mime": mime,
-            "bytes": len(raw),
-            "uploaded_at": datetime.now(timezone.utc).isoformat(),
-        },
-    }
+PROVIDER_GUARDS: Dict[str, ProviderGuard] = {
+    "strowallet": ProviderGuard("strowallet", max_concurrency=_provider_concurrency("strowallet", 16), max_timeout=30.0),
+    "strowallet_alt": ProviderGuard("strowallet_alt", max_concurrency=_provider_concurrency("strowallet", 16), max_timeout=30.0),
+    "plisio": ProviderGuard("plisio", max_concurrency=_provider_concurrency("plisio", 8), max_timeout=30.0),
+    "resend": ProviderGuard("resend", max_concurrency=_provider_concurrency("resend", 8), max_timeout=30.0),
+    "telegram": ProviderGuard("telegram", max_concurrency=_provider_concurrency("telegram", 8), max_timeout=10.0),
+    "callmebot": ProviderGuard("callmebot", max_concurrency=_provider_concurrency("callmebot", 4), max_timeout=30.0),
+}
+
+
+def provider_guard(name: str) -> ProviderGuard:
+    return PROVIDER_GUARDS[name]
+
+
+def provider_health() -> List[Dict[str, Any]]:
+    return [g.snapshot() for g in PROVIDER_GUARDS.values()]
+
 
 # ==================== STROWALLET (VIRTUAL CARDS) HELPERS ====================
 
@@ -248,122 +378,391 @@ def _virtual_cards_enabled(settings: Optional[dict]) -> bool:
     """
     return _strowallet_enabled(settings)
 
-def _strowallet_config(settings: Optional[dict]) -> Dict[str, str]:
-    # Default to strowallet.com to avoid silent "enabled but no base_url" misconfig.
-    base_url = ((settings or {}).get("strowallet_base_url") or os.environ.get("STROWALLET_BASE_URL") or "https://strowallet.com").strip()
-    api_key = ((settings or {}).get("strowallet_api_key") or os.environ.get("STROWALLET_API_KEY") or "").strip()
-    api_secret = ((settings or {}).get("strowallet_api_secret") or os.environ.get("STROWALLET_API_SECRET") or "").strip()
-    brand_name = ((settings or {}).get("strowallet_brand_name") or os.environ.get("STROWALLET_BRAND_NAME") or "").strip()
-    if not brand_name:
-        brand_name = "KAYICOM"
-
-    # Some Strowallet deployments require passing `mode` and an initial `amount` when creating cards.
-    stw_mode = ((settings or {}).get("strowallet_mode") or os.environ.get("STROWALLET_MODE") or "live").strip().lower()
-    if stw_mode not in {"live", "sandbox"}:
-        stw_mode = "live"
-    try:
-        stw_amount = float((settings or {}).get("strowallet_create_card_amount_usd") or os.environ.get("STROWALLET_CREATE_CARD_AMOUNT_USD") or 5)
-    except Exception:
-        stw_amount = 5.0
+# Endpoint path settings: (profile key, settings key, env var, default path).
+_STROWALLET_PATH_SPECS = (
+    ("create_user_path", "strowallet_create_user_path", "STROWALLET_CREATE_USER_PATH", "/api/bitvcard/create-user/"),
+    ("create_path", "strowallet_create_card_path", "STROWALLET_CREATE_CARD_PATH", "/api/bitvcard/create-card/"),
+    ("fund_path", "strowallet_fund_card_path", "STROWALLET_FUND_CARD_PATH", "/api/bitvcard/fund-card/"),
+    ("withdraw_path", "strowallet_withdraw_card_path", "STROWALLET_WITHDRAW_CARD_PATH", ""),
+    ("fetch_detail_path", "strowallet_fetch_card_detail_path", "STROWALLET_FETCH_CARD_DETAIL_PATH", "/api/bitvcard/fetch-card-detail/"),
+    ("card_tx_path", "strowallet_card_transactions_path", "STROWALLET_CARD_TRANSACTIONS_PATH", "/api/bitvcard/card-transactions/"),
+    ("set_limit_path", "strowallet_set_limit_path", "STROWALLET_SET_LIMIT_PATH", ""),
+    ("freeze_path", "strowallet_freeze_card_path", "STROWALLET_FREEZE_CARD_PATH", ""),
+    ("unfreeze_path", "strowallet_unfreeze_card_path", "STROWALLET_UNFREEZE_CARD_PATH", ""),
+    ("freeze_unfreeze_path", "strowallet_freeze_unfreeze_path", "STROWALLET_FREEZE_UNFREEZE_PATH", ""),
+    ("full_history_path", "strowallet_full_card_history_path", "STROWALLET_FULL_CARD_HISTORY_PATH", ""),
+    ("withdraw_status_path", "strowallet_withdraw_status_path", "STROWALLET_WITHDRAW_STATUS_PATH", ""),
+    ("upgrade_limit_path", "strowallet_upgrade_limit_path", "STROWALLET_UPGRADE_LIMIT_PATH", ""),
+)
 
-    # Endpoint paths can vary by Strowallet plan; allow overrides.
-    # Defaults tuned for Strowallet bitvcard endpoints.
-    create_user_path = _normalize_strowallet_path(
-        (settings or {}).get("strowallet_create_user_path") or os.environ.get("STROWALLET_CREATE_USER_PATH"),
-        "/api/bitvcard/create-user/",
-    )
-    create_path = _normalize_strowallet_path(
-        (settings or {}).get("strowallet_create_card_path") or os.environ.get("STROWALLET_CREATE_CARD_PATH"),
-        "/api/bitvcard/create-card/",
-    )
-    fund_path = _normalize_strowallet_path(
-        (settings or {}).get("strowallet_fund_card_path") or os.environ.get("STROWALLET_FUND_CARD_PATH"),
-        "/api/bitvcard/fund-card/",
-    )
-    withdraw_path = _normalize_strowallet_path(
-        (settings or {}).get("strowallet_withdraw_card_path") or os.environ.get("STROWALLET_WITHDRAW_CARD_PATH"),
-        "",
-    )
-    fetch_detail_path = _normalize_strowallet_path(
-        (settings or {}).get("strowallet_fetch_card_detail_path") or os.environ.get("STROWALLET_FETCH_CARD_DETAIL_PATH"),
-        "/api/bitvcard/fetch-card-detail/",
-    )
-    card_tx_path = _normalize_strowallet_path(
-        (settings or {}).get("strowallet_card_transactions_path") or os.environ.get("STROWALLET_CARD_TRANSACTIONS_PATH"),
-        "/api/bitvcard/card-transactions/",
-    )
-    set_limit_path = _normalize_strowallet_path(
-        (settings or {}).get("strowallet_set_limit_path") or os.environ.get("STROWALLET_SET_LIMIT_PATH"),
-        "",
-    )
-    freeze_path = _normalize_strowallet_path(
-        (settings or {}).get("strowallet_freeze_card_path") or os.environ.get("STROWALLET_FREEZE_CARD_PATH"),
-        "",
-    )
-    unfreeze_path = _normalize_strowallet_path(
-        (settings or {}).get("strowallet_unfreeze_card_path") or os.environ.get("STROWALLET_UNFREEZE_CARD_PATH"),
-        "",
-    )
-    freeze_unfreeze_path = _normalize_strowallet_path(
-        (settings or {}).get("strowallet_freeze_unfreeze_path") or os.environ.get("STROWALLET_FREEZE_UNFREEZE_PATH"),
-        "",
-    )
-    full_history_path = _normalize_strowallet_path(
-        (settings or {}).get("strowallet_full_card_history_path") or os.environ.get("STROWALLET_FULL_CARD_HISTORY_PATH"),
-        "",
-    )
-    withdraw_status_path = _normalize_strowallet_path(
-        (settings or {}).get("strowallet_withdraw_status_path") or os.environ.get("STROWALLET_WITHDRAW_STATUS_PATH"),
-        "",
-    )
-    upgrade_limit_path = _normalize_strowallet_path(
-        (settings or {}).get("strowallet_upgrade_limit_path") or os.environ.get("STROWALLET_UPGRADE_LIMIT_PATH"),
-        "",
-    )
+# Every settings key the profile depends on (used to fingerprint non-snapshot settings dicts).
+_STROWALLET_SETTING_KEYS = (
+    "strowallet_base_url",
+    "strowallet_api_key",
+    "strowallet_api_secret",
+    "strowallet_brand_name",
+    "strowallet_mode",
+    "strowallet_create_card_amount_usd",
+) + tuple(spec[1] for spec in _STROWALLET_PATH_SPECS)
 
-    base_url = base_url.rstrip("/")
-    # (paths already normalized)
 
-    return {
-        "base_url": base_url,
-        "api_key": api_key,
-        "api_secret": api_secret,
-        "create_user_path": create_user_path,
-        "create_path": create_path,
-        "fund_path": fund_path,
-        "withdraw_path": withdraw_path,
-        "fetch_detail_path": fetch_detail_path,
-        "card_tx_path": card_tx_path,
-        "brand_name": brand_name,
-        "mode": stw_mode,
-        "create_card_amount_usd": stw_amount,
-        "set_limit_path": set_limit_path,
-        "freeze_path": freeze_path,
-        "unfreeze_path": unfreeze_path,
-        "freeze_unfreeze_path": freeze_unfreeze_path,
-        "full_history_path": full_history_path,
-        "withdraw_status_path": withdraw_status_path,
-        "upgrade_limit_path": upgrade_limit_path,
-    }
+class StrowalletProfile(Mapping):
+    """
+    Strowallet configuration compiled once from settings + env.
+    Holds pre-built endpoint URLs, frozen auth headers and the body auth fragment.
+    Still readable as a dict (`cfg["fund_path"]`) for existing call sites.
+    """
+
+    __slots__ = ("_fields", "base_url", "api_key", "api_secret", "mode", "urls", "post_headers", "get_headers", "auth_fields")
+
+    def __init__(self, settings: Optional[dict]):
+        from types import MappingProxyType
+
+        s = settings or {}
+        # Default to strowallet.com to avoid silent "enabled but no base_url" misconfig.
+        base_url = (s.get("strowallet_base_url") or os.environ.get("STROWALLET_BASE_URL") or "https://strowallet.com").strip().rstrip("/")
+        api_key = (s.get("strowallet_api_key") or os.environ.get("STROWALLET_API_KEY") or "").strip()
+        api_secret = (s.get("strowallet_api_secret") or os.environ.get("STROWALLET_API_SECRET") or "").strip()
+        brand_name = (s.get("strowallet_brand_name") or os.environ.get("STROWALLET_BRAND_NAME") or "").strip() or "KAYICOM"
+
+        # Some Strowallet deployments require passing `mode` and an initial `amount` when creating cards.
+        stw_mode = (s.get("strowallet_mode") or os.environ.get("STROWALLET_MODE") or "live").strip().lower()
+        if stw_mode not in {"live", "sandbox"}:
+            stw_mode = "live"
+        try:
+            stw_amount = float(s.get("strowallet_create_card_amount_usd") or os.environ.get("STROWALLET_CREATE_CARD_AMOUNT_USD") or 5)
+        except Exception:
+            stw_amount = 5.0
+
+        fields: Dict[str, Any] = {
+            "base_url": base_url,
+            "api_key": api_key,
+            "api_secret": api_secret,
+            "brand_name": brand_name,
+            "mode": stw_mode,
+            "create_card_amount_usd": stw_amount,
+        }
+        # Endpoint paths can vary by Strowallet plan; allow overrides.
+        for key, setting_key, env_key, default in _STROWALLET_PATH_SPECS:
+            fields[key] = _normalize_strowallet_path(s.get(setting_key) or os.environ.get(env_key), default)
+
+        self._fields = fields
+        self.base_url = base_url
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.mode = stw_mode
+        self.urls = {fields[key]: f"{base_url}{fields[key]}" for key, *_ in _STROWALLET_PATH_SPECS if fields[key]}
+
+        get_headers = {
+            "x-api-key": api_key,
+            "api-key": api_key,
+            "public_key": api_key,
+            "Accept": "application/json",
+        }
+        post_headers = {
+            # Different Strowallet deployments use different auth schemes; send both.
+            "Authorization": f"Bearer {api_key}",
+            "X-API-Key": api_key,
+            **get_headers,
+            "Content-Type": "application/json",
+        }
+        # Optional extra secret header (some Strowallet setups require key + secret).
+        if api_secret:
+            for h in ("X-API-Secret", "x-api-secret", "api-secret", "secret_key"):
+                get_headers[h] = api_secret
+                post_headers[h] = api_secret
+        self.get_headers = MappingProxyType(get_headers)
+        self.post_headers = MappingProxyType(post_headers)
+
+        auth_fields: List[tuple] = []
+        if api_key:
+            auth_fields += [("public_key", api_key), ("api_key", api_key), ("key", api_key)]
+        if api_secret:
+            auth_fields += [("secret_key", api_secret), ("api_secret", api_secret), ("secret", api_secret)]
+        # Many SDK calls include `mode`; add it if configured.
+        if stw_mode:
+            auth_fields.append(("mode", stw_mode))
+        self.auth_fields = tuple(auth_fields)
+
+    def __getitem__(self, key: str) -> Any:
+        return self._fields[key]
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+    def url(self, path: str) -> str:
+        url = self.urls.get(path)
+        if url is None:
+            url = f"{self.base_url}{path}"
+        return url
+
+    def apply_auth(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Add body auth fields if missing (do not overwrite user-provided values)."""
+        for k, v in self.auth_fields:
+            if k not in payload:
+                payload[k] = v
+        return payload
+
+
+_strowallet_profile_cache: Dict[str, Any] = {"version": None, "fingerprint": None, "profile": None}
+
+
+def _strowallet_config(settings: Optional[dict]) -> StrowalletProfile:
+    """
+    Return the compiled StrowalletProfile for these settings.
+    Settings from get_settings_snapshot() are keyed by snapshot version; any other settings dict
+    is keyed by the values of the Strowallet keys, so the profile is rebuilt only when they change.
+    """
+    cache = _strowallet_profile_cache
+    profile = cache["profile"]
+    if settings is not None and settings is _settings_snapshot["settings"]:
+        version = _settings_snapshot["version"]
+        if profile is not None and cache["version"] == version:
+            return profile
+    else:
+        version = None
+    s = settings or {}
+    fingerprint = tuple(s.get(k) for k in _STROWALLET_SETTING_KEYS)
+    if profile is None or cache["fingerprint"] != fingerprint:
+        profile = StrowalletProfile(settings)
+        cache["profile"] = profile
+        cache["fingerprint"] = fingerprint
+    cache["version"] = version
+    return profile
+
+_compiled_paths: Dict[str, tuple] = {}
+
+
+def _compile_path(path: str) -> tuple:
+    keys = _compiled_paths.get(path)
+    if keys is None:
+        keys = tuple(path.split("."))
+        if len(_compiled_paths) < 4096:
+            _compiled_paths[path] = keys
+    return keys
+
 
 def _extract_first(d: Any, *paths: str) -> Optional[Any]:
     """
     Best-effort extractor for varying API responses.
-    paths are dot-separated keys (e.g. 'data.card.id').
+    paths are dot-separated keys (e.g. 'data.card.id'); each is split once and cached.
     """
     for path in paths:
         cur: Any = d
-        ok = True
-        for key in path.split("."):
+        for key in _compile_path(path):
             if isinstance(cur, dict) and key in cur:
                 cur = cur[key]
             else:
-                ok = False
                 break
-        if ok and cur is not None:
-            return cur
+        else:
+            if cur is not None:
+                return cur
     return None
 
+# ==================== PROVIDER RESPONSE SCHEMA ====================
+# Declarative field schema for provider card payloads. Paths are compiled once into key tuples and
+# always tried in declared order: the order is the priority (full PAN before masked PAN, card
+# status before anything else), so it must not adapt to whatever the previous response looked like.
+# Root paths are dotted paths into the response envelope; single keys belong in `local`, which
+# is read from the located card object (envelope-level `status`, `type`, `balance` describe the
+# API call, not the card).
+
+
+class ProviderField:
+    """
+    One normalized field: `local` keys are read from the located card object,
+    `root` dotted paths from the full response. First truthy value wins.
+    """
+
+    __slots__ = ("name", "paths")
+
+    def __init__(self, name: str, local: tuple = (), root: tuple = ()):
+        self.name = name
+        self.paths: tuple = tuple([(0, (k,), k) for k in local] + [(1, _compile_path(p), p) for p in root])
+
+    def match(self, *sources: Any) -> tuple:
+        """(value, matched path) for the first path with a truthy value, (None, None) otherwise."""
+        for source_index, keys, path in self.paths:
+            cur: Any = sources[source_index] if source_index < len(sources) else None
+            for key in keys:
+                if isinstance(cur, dict):
+                    cur = cur.get(key)
+                else:
+                    cur = None
+                    break
+            if cur:
+                return cur, path
+        return None, None
+
+    def get(self, *sources: Any) -> Any:
+        return self.match(*sources)[0]
+
+
+def _provider_fields(spec: Dict[str, Dict[str, tuple]]) -> Dict[str, ProviderField]:
+    return {name: ProviderField(name, **paths) for name, paths in spec.items()}
+
+
+STROWALLET_CARD_SCHEMA = _provider_fields({
+    "card_number": {
+        "local": ("card_number", "cardNumber", "pan", "card_pan", "unmasked_pan", "full_card_number", "number",
+                  "card_no", "account_number", "cardNo"),
+        "root": ("response.card_detail.card_number", "response.card_detail.pan", "response.card_number",
+                 "data.card_number", "message.card_number"),
+    },
+    # Only used when no full PAN is present anywhere (see normalize_strowallet_card).
+    "masked_card_number": {
+        "local": ("masked_pan", "masked_card_number"),
+    },
+    # Combined expiry, e.g. "12/26" or "2026-12"
+    "expiry": {
+        "local": ("expiry", "expiry_date", "valid_thru", "validity", "card_expiry", "expiration", "expiration_date", "exp_date"),
+        "root": ("response.card_detail.expiry", "response.card_detail.expiry_date",
+                 "response.card_detail.validity", "response.card_detail.valid_thru"),
+    },
+    "expiry_month": {
+        "local": ("expiry_month", "expiryMonth", "exp_month", "expMonth", "month", "expiry_mm", "card_expiry_month",
+                  "validity_month", "expiration_month"),
+        "root": ("response.card_detail.expiry_month", "response.expiry_month", "data.expiry_month"),
+    },
+    "expiry_year": {
+        "local": ("expiry_year", "expiryYear", "exp_year", "expYear", "year", "expiry_yy", "card_expiry_year",
+                  "validity_year", "expiration_year"),
+        "root": ("response.card_detail.expiry_year", "response.expiry_year", "data.expiry_year"),
+    },
+    "cvv": {
+        "local": ("cvv", "cvc", "cvv2", "security_code", "cvv_code", "cvc2", "card_cvv", "card_cvc"),
+        "root": ("response.card_detail.cvv", "response.cvv", "data.cvv"),
+    },
+    "card_holder_name": {
+        # Sometimes card_name is used for holder name
+        "local": ("card_holder_name", "cardHolderName", "name_on_card", "cardholder_name", "card_name"),
+        "root": ("response.card_detail.card_holder_name", "response.card_holder_name", "data.card_holder_name"),
+    },
+    "balance": {
+        "local": ("balance", "card_balance"),
+        "root": ("response.card_detail.balance", "data.balance", "data.card.balance"),
+    },
+    "currency": {
+        "local": ("currency", "card_currency"),
+        "root": ("response.card_detail.currency", "data.currency", "data.card.currency"),
+    },
+    "card_status": {
+        "local": ("status", "card_status", "is_active"),
+        "root": ("response.card_detail.status", "data.status", "data.card.status"),
+    },
+    "card_type": {
+        "local": ("card_type", "cardType", "card_brand", "brand", "type"),
+        "root": ("response.card_detail.card_type", "response.card_detail.card_brand", "data.card_type", "data.cardType",
+                 "data.type", "data.brand"),
+    },
+})
+
+# Address components inside a nested address object (billing_address, meta_data, ...).
+STROWALLET_ADDRESS_SCHEMA = _provider_fields({
+    "billing_address": {"local": ("street", "address", "street_address", "address_line1", "address_line_1", "line1",
+                                  "address1", "address_1", "billing_street", "street_line_1", "house_no", "house_number")},
+    "billing_city": {"local": ("city", "town", "city_name", "billing_city", "locality")},
+    "billing_state": {"local": ("state", "region", "province", "billing_state", "state_name", "state_code")},
+    "billing_country": {"local": ("country", "country_code", "country_name", "billing_country", "nation")},
+    "billing_zip": {"local": ("zip", "zip_code", "zipCode", "postal_code", "postcode", "postalCode", "billing_zip", "postal")},
+})
+
+# Address components directly on the card object.
+STROWALLET_CARD_ADDRESS_SCHEMA = _provider_fields({
+    "billing_address": {"local": ("street", "street_address", "address_line1", "address_line_1", "line1", "address1", "house_no")},
+    "billing_city": {"local": ("billing_city", "city", "town", "locality")},
+    "billing_state": {"local": ("billing_state", "state", "region", "province")},
+    "billing_country": {"local": ("billing_country", "country", "country_code", "country_name")},
+    "billing_zip": {"local": ("billing_zip", "zip_code", "zipCode", "postal_code", "postcode", "zip", "postal")},
+})
+
+_STROWALLET_ADDRESS_CONTAINERS = ("billing_address", "address", "billing", "meta_data", "metadata",
+                                  "card_address", "user_address", "billing_info", "address_info")
+
+
+def _strowallet_locate_card(stw_detail: Dict[str, Any]) -> Dict[str, Any]:
+    """Find the card object in a fetch-card-detail response (Strowallet uses response.card_detail)."""
+    for wrapper in ("response", "data"):
+        w = stw_detail.get(wrapper)
+        if isinstance(w, dict):
+            if isinstance(w.get("card_detail"), dict):
+                return w["card_detail"]
+            if w.get("card_number") or w.get("cardNumber") or w.get("pan"):
+                return w
+    if isinstance(stw_detail.get("card_detail"), dict):
+        return stw_detail["card_detail"]
+    return stw_detail
+
+
+def _parse_combined_expiry(value: Any) -> tuple:
+    """MM/YY, MM/YYYY, YYYY/MM, YYYY-MM, MM-YY -> (month, year)."""
+    exp_str = str(value)
+    if "/" in exp_str:
+        parts = exp_str.split("/")
+        if len(parts) == 2:
+            if len(parts[0]) <= 2:
+                return parts[0], parts[1]
+            return parts[1], parts[0]
+    elif "-" in exp_str:
+        parts = exp_str.split("-")
+        if len(parts) >= 2:
+            if len(parts[0]) == 4:
+                return parts[1], parts[0]
+            return parts[0], parts[1]
+    return None, None
+
+
+def normalize_strowallet_card(stw_detail: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normalized card DTO from a Strowallet card-detail response.
+    Values are raw provider values (None when absent); billing defaults are left to callers.
+    """
+    card = _strowallet_locate_card(stw_detail)
+    f = STROWALLET_CARD_SCHEMA
+    dto: Dict[str, Any] = {name: field.get(card, stw_detail) for name, field in f.items()}
+
+    expiry_month = expiry_year = None
+    if dto["expiry"]:
+        expiry_month, expiry_year = _parse_combined_expiry(dto["expiry"])
+    dto["expiry_month"] = expiry_month or dto["expiry_month"]
+    dto["expiry_year"] = expiry_year or dto["expiry_year"]
+    card_expiry = None
+    if dto["expiry_month"] and dto["expiry_year"]:
+        em = str(dto["expiry_month"]).zfill(2)
+        ey = str(dto["expiry_year"])
+        card_expiry = f"{em}/{ey[-2:] if len(ey) == 4 else ey}"
+    dto["card_expiry"] = card_expiry
+
+    address: Dict[str, Any] = dict.fromkeys(STROWALLET_ADDRESS_SCHEMA)
+    response = stw_detail.get("response") if isinstance(stw_detail.get("response"), dict) else {}
+    for holder in (card, response):
+        for key in _STROWALLET_ADDRESS_CONTAINERS:
+            obj = holder.get(key)
+            if not isinstance(obj, dict):
+                continue
+            found = {name: field.get(obj) for name, field in STROWALLET_ADDRESS_SCHEMA.items()}
+            if found["billing_address"] or found["billing_city"] or found["billing_country"] or found["billing_zip"]:
+                for name, value in found.items():
+                    address[name] = address[name] or value
+    if not address["billing_address"]:
+        for key in ("billing_address", "address"):
+            v = card.get(key)
+            if v and not isinstance(v, dict):
+                address["billing_address"] = v
+                break
+    for name, field in STROWALLET_CARD_ADDRESS_SCHEMA.items():
+        if not address[name]:
+            address[name] = field.get(card)
+    dto.update(address)
+    # Listings may show a masked PAN; the PIN-gated reveal checks card_number_masked and never returns it.
+    dto["card_number_masked"] = not dto["card_number"] and bool(dto["masked_card_number"])
+    dto["card_number"] = dto["card_number"] or dto["masked_card_number"]
+    dto["card_last4"] = _extract_last4(dto["card_number"])
+    return dto
+
 def _with_aliases(payload: Dict[str, Any], key: str, *aliases: str) -> Dict[str, Any]:
     """
     Add common alias keys for a given payload field if present.
@@ -421,6 +820,8 @@ def _ensure_strowallet_auth_payload(payload: Dict[str, Any], cfg: Dict[str, str]
     """
     if not isinstance(payload, dict):
         return payload
+    if isinstance(cfg, StrowalletProfile):
+        return cfg.apply_auth(payload)
     api_key = (cfg.get("api_key") or "").strip()
     api_secret = (cfg.get("api_secret") or "").strip()
 
@@ -437,38 +838,45 @@ def _ensure_strowallet_auth_payload(payload: Dict[str, Any], cfg: Dict[str, str]
         payload.setdefault("mode", cfg["mode"])
     return payload
 
-async def _strowallet_post(settings: Optional[dict], path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+async def _strowallet_post(
+    settings: Optional[dict],
+    path: str,
+    payload: Dict[str, Any],
+    *,
+    idempotent: bool = False,
+) -> Dict[str, Any]:
+    """
+    POST to Strowallet. Only `idempotent=True` calls (detail/status lookups) use the adaptive
+    timeout; everything else waits up to STROWALLET_WRITE_TIMEOUT_SECONDS.
+    """
     cfg = _strowallet_config(settings)
-    if not cfg["base_url"] or not cfg["api_key"]:
+    if not cfg.base_url or not cfg.api_key:
         raise ValueError("Strowallet is enabled but STROWALLET_BASE_URL / STROWALLET_API_KEY is not configured")
 
-    url = f"{cfg['base_url']}{path}"
-    headers = {
-        # Different Strowallet deployments use different auth schemes; send both.
-        "Authorization": f"Bearer {cfg['api_key']}",
-        "X-API-Key": cfg["api_key"],
-        "x-api-key": cfg["api_key"],
-        "api-key": cfg["api_key"],
-        "public_key": cfg["api_key"],
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-    }
-    # Optional extra secret header (some Strowallet setups require key + secret).
-    if cfg.get("api_secret"):
-        headers["X-API-Secret"] = cfg["api_secret"]
-        headers["x-api-secret"] = cfg["api_secret"]
-        headers["api-secret"] = cfg["api_secret"]
-        headers["secret_key"] = cfg["api_secret"]
+    url = cfg.url(path)
+    headers = cfg.post_headers
 
     # Also include auth keys in JSON body (many Strowallet endpoints require `public_key` field).
-    payload = _ensure_strowallet_auth_payload(payload or {}, cfg)
+    payload = cfg.apply_auth(payload if isinstance(payload, dict) else {})
 
-    async with httpx.AsyncClient(timeout=httpx.Timeout(30.0)) as client:
-        resp = await client.post(url, json=payload, headers=headers)
-        try:
-            data = resp.json()
-        except Exception:
-            data = {"raw": resp.text}
+    timeout = None if idempotent else STROWALLET_WRITE_TIMEOUT_SECONDS
+    try:
+        async with provider_guard("strowallet").attempt(timeout) as att:
+            async with httpx.AsyncClient(timeout=httpx.Timeout(att.timeout)) as client:
+                resp = await client.post(url, json=payload, headers=headers)
+                try:
+                    data = resp.json()
+                except Exception:
+                    data = {"raw": resp.text}
+            if resp.status_code >= 500:
+                att.fail()
+    except httpx.TimeoutException:
+        if not idempotent:
+            logger.error(
+                f"Strowallet POST {path} timed out after {timeout}s; the provider may still complete it "
+                f"(reference={payload.get('reference') or payload.get('card_id')})"
+            )
+        raise
 
     if resp.status_code >= 400:
         raise HTTPException(status_code=502, detail=f"Strowallet API error ({resp.status_code}): {data}")
@@ -485,25 +893,19 @@ async def _strowallet_post(settings: Optional[dict], path: str, payload: Dict[st
 
 async def _strowallet_get(settings: Optional[dict], path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     cfg = _strowallet_config(settings)
-    url = cfg["base_url"].rstrip("/") + "/" + str(path or "").lstrip("/")
-    headers = {
-        "x-api-key": cfg["api_key"],
-        "api-key": cfg["api_key"],
-        "public_key": cfg["api_key"],
-        "Accept": "application/json",
-    }
-    if cfg.get("api_secret"):
-        headers["X-API-Secret"] = cfg["api_secret"]
-        headers["x-api-secret"] = cfg["api_secret"]
-        headers["api-secret"] = cfg["api_secret"]
-        headers["secret_key"] = cfg["api_secret"]
+    path = str(path or "")
+    url = cfg.url(path) if path.startswith("/") else f"{cfg.base_url}/{path}"
+    headers = cfg.get_headers
 
-    async with httpx.AsyncClient(timeout=httpx.Timeout(30.0)) as client:
-        resp = await client.get(url, params=(params or {}), headers=headers)
-        try:
-            data = resp.json()
-        except Exception:
-            data = {"raw": resp.text}
+    async with provider_guard("strowallet").attempt() as att:
+        async with httpx.AsyncClient(timeout=httpx.Timeout(att.timeout)) as client:
+            resp = await client.get(url, params=(params or {}), headers=headers)
+            try:
+                data = resp.json()
+            except Exception:
+                data = {"raw": resp.text}
+        if resp.status_code >= 500:
+            att.fail()
 
     if resp.status_code >= 400:
         raise HTTPException(status_code=502, detail=f"Strowallet API error ({resp.status_code}): {data}")
@@ -517,6 +919,117 @@ async def _strowallet_get(settings: Optional[dict], path: str, params: Optional[
     return data
 
 
+# Card-detail endpoint variants differ by Strowallet account/plan. Remember which variant last
+# answered for each account and try it first; optionally hedge by firing the next variant when
+# the current one has not answered within its observed p95 latency.
+STROWALLET_HEDGE_REQUESTS = _env_bool("STROWALLET_HEDGE_REQUESTS", True)
+STROWALLET_HEDGE_DEFAULT_DELAY_SECONDS = 3.0
+STROWALLET_HEDGE_MIN_DELAY_SECONDS = 0.5
+_STROWALLET_LATENCY_SAMPLES = 50
+
+_stw_endpoint_routes: Dict[str, str] = {}
+_stw_endpoint_latency: Dict[str, Any] = {}
+
+
+def _strowallet_detail_variants(cfg: Dict[str, Any]) -> List[tuple]:
+    """(name, url) candidates for fetch-card-detail, in the legacy fallback order."""
+    base_url = (cfg.get("base_url") or "https://strowallet.com").rstrip("/")
+    variants: List[tuple] = []
+    # 1. Configured endpoint (if any)
+    if cfg.get("fetch_detail_path"):
+        variants.append(("configured", base_url + "/" + cfg["fetch_detail_path"].lstrip("/")))
+    # 2. Alternative Strowallet API (api.strowallet.com)
+    variants.append(("api_v1", "https://api.strowallet.com/card/fetch-details/"))
+    # 3. Standard bitvcard endpoint
+    variants.append(("bitvcard", base_url + "/api/bitvcard/fetch-card-detail/"))
+    return variants
+
+
+def _stw_record_latency(name: str, seconds: float) -> None:
+    from collections import deque
+
+    samples = _stw_endpoint_latency.get(name)
+    if samples is None:
+        samples = _stw_endpoint_latency[name] = deque(maxlen=_STROWALLET_LATENCY_SAMPLES)
+    samples.append(seconds)
+
+
+def _stw_hedge_delay(name: str) -> float:
+    samples = _stw_endpoint_latency.get(name)
+    if not samples or len(samples) < 5:
+        return STROWALLET_HEDGE_DEFAULT_DELAY_SECONDS
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return max(STROWALLET_HEDGE_MIN_DELAY_SECONDS, p95)
+
+
+async def _strowallet_fetch_detail_routed(
+    cfg: Dict[str, Any],
+    payload: Dict[str, Any],
+    headers: Dict[str, str],
+    accept,
+) -> tuple:
+    """
+    POST `payload` to the fetch-card-detail variants until one is accepted.
+    `accept(status_code, data)` returns None when the response is usable, else an error string.
+    Returns (data, endpoint_name, last_error); data is None when every variant failed.
+    """
+    import time
+
+    account = cfg.get("api_key") or ""
+    variants = _strowallet_detail_variants(cfg)
+    preferred = _stw_endpoint_routes.get(account)
+    if preferred:
+        variants.sort(key=lambda v: v[0] != preferred)
+
+    async def attempt(name: str, url: str) -> tuple:
+        started = time.monotonic()
+        # The api.strowallet.com variant gets its own breaker so a dead alternate host can't trip the main one.
+        guard = provider_guard("strowallet" if url.startswith(cfg.get("base_url") or "https://strowallet.com") else "strowallet_alt")
+        async with guard.attempt() as att:
+            async with httpx.AsyncClient(timeout=httpx.Timeout(att.timeout)) as client:
+                resp = await client.post(url, json=payload, headers=headers)
+            if resp.status_code >= 500:
+                att.fail()
+        try:
+            data = resp.json()
+        except Exception:
+            data = {"raw": resp.text}
+        error = accept(resp.status_code, data)
+        if error is None:
+            _stw_record_latency(name, time.monotonic() - started)
+        return name, data, error
+
+    last_error: Optional[str] = None
+    pending: Dict[asyncio.Task, str] = {}
+    remaining = list(variants)
+    try:
+        while remaining or pending:
+            if remaining and (not pending or STROWALLET_HEDGE_REQUESTS):
+                name, url = remaining.pop(0)
+                pending[asyncio.create_task(attempt(name, url))] = name
+                timeout = _stw_hedge_delay(name) if (remaining and STROWALLET_HEDGE_REQUESTS) else None
+            else:
+                timeout = None
+            done, _ = await asyncio.wait(pending.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = pending.pop(task)
+                try:
+                    _, data, error = task.result()
+                except Exception as e:
+                    error = str(e)
+                    data = None
+                if error is None:
+                    _stw_endpoint_routes[account] = name
+                    return data, name, None
+                logger.warning(f"Strowallet fetch-detail via {name} failed: {error}")
+                last_error = error
+    finally:
+        for task in pending:
+            task.cancel()
+    return None, None, last_error
+
+
 def _stw_error_text(detail: Any) -> str:
     try:
         return str(detail or "").lower()
@@ -665,7 +1178,7 @@ async def _strowallet_create_customer_id(
             return value
         kyc_id = str(kyc.get("kyc_id") or f"kyc_{user.get('user_id') or 'unknown'}")
         try:
-            stored = await _kyc_store_image_value(
+            stored = await kyc_store_image_value(
                 value,
                 user_id=str(user.get("user_id") or ""),
                 kyc_id=kyc_id,
@@ -696,7 +1209,7 @@ async def _strowallet_create_customer_id(
 
     # Optional: also include pure base64 without the data-url prefix (some provider deployments expect this).
     def _data_url_to_b64(val: str) -> Optional[str]:
-        parsed = _parse_image_data_url(val)
+        parsed = parse_image_data_url(val)
         if not parsed:
             return None
         try:
@@ -875,42 +1388,6 @@ async def _strowallet_create_customer_id(
 
 # ==================== MODELS ====================
 
-class UserCreate(BaseModel):
-    email: EmailStr
-    password: str
-    full_name: str
-    phone: str
-    language: str = "fr"
-    referral_code: Optional[str] = None
-
-class UserLogin(BaseModel):
-    email: EmailStr
-    password: str
-
-class UserResponse(BaseModel):
-    user_id: str
-    client_id: str
-    email: str
-    full_name: str
-    phone: str
-    language: str
-    kyc_status: str
-    wallet_htg: float
-    wallet_usd: float
-    affiliate_code: str
-    affiliate_earnings: float
-    is_active: bool
-    is_admin: bool
-    created_at: str
-    telegram_chat_id: Optional[str] = None
-
-class PasswordReset(BaseModel):
-    email: EmailStr
-
-class PasswordResetConfirm(BaseModel):
-    token: str
-    new_password: str
-
 class ProfileUpdate(BaseModel):
     telegram_chat_id: Optional[str] = None
 
@@ -1129,170 +1606,10 @@ class AdminSettingsUpdate(BaseModel):
     cloudinary_folder: Optional[str] = None
     kyc_max_image_bytes: Optional[int] = None
 
-class HelpArticleCreate(BaseModel):
-    model_config = ConfigDict(extra="ignore")
-    title_ht: Optional[str] = None
-    title_fr: Optional[str] = None
-    title_en: Optional[str] = None
-    content_ht: Optional[str] = None
-    content_fr: Optional[str] = None
-    content_en: Optional[str] = None
-    category: Optional[str] = None
-    order: Optional[int] = None
-    is_active: Optional[bool] = True
-
-class HelpArticleUpdate(BaseModel):
-    model_config = ConfigDict(extra="ignore")
-    title_ht: Optional[str] = None
-    title_fr: Optional[str] = None
-    title_en: Optional[str] = None
-    content_ht: Optional[str] = None
-    content_fr: Optional[str] = None
-    content_en: Optional[str] = None
-    category: Optional[str] = None
-    order: Optional[int] = None
-    is_active: Optional[bool] = None
-
-async def _seed_help_articles_if_empty() -> None:
-    count = await db.help_articles.count_documents({})
-    if count > 0:
-        return
-
-    now = datetime.now(timezone.utc).isoformat()
-    defaults = [
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kijan pou kreye yon kont",
-            "content_ht": "Sou paj Enskripsyon, ranpli non konplè, imel ak nimewo telefòn. Valide, epi konekte ak imel ou ak modpas ou.",
-            "category": "Kòmanse",
-            "order": 1,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kijan pou verifye KYC",
-            "content_ht": "Nan meni KYC, telechaje yon pyès idantite ki klè ansanm ak selfie a. Asire non yo matche. Admin ap revize dosye a.",
-            "category": "Kont & Sekirite",
-            "order": 2,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kijan pou fè depo lajan",
-            "content_ht": "Nan Depo, chwazi metòd la, suiv enstriksyon yo, epi soumèt prèv la si li mande. Admin ap valide depo a.",
-            "category": "Depo & Retrè",
-            "order": 3,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kijan pou fè retrè lajan",
-            "content_ht": "Nan Retrè, chwazi metòd la, antre montan an, verifye frè yo, epi soumèt. Admin ap trete demann lan.",
-            "category": "Depo & Retrè",
-            "order": 4,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kijan pou fè transfè lajan",
-            "content_ht": "Nan Transfè, antre ID kliyan an oswa nimewo telefòn li, antre montan an, epi konfime.",
-            "category": "Transfè & Swap",
-            "order": 5,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kijan pou fè swap HTG/USD",
-            "content_ht": "Nan Swap, chwazi deviz ou bay ak deviz ou vle resevwa, verifye to chanj lan, epi konfime.",
-            "category": "Transfè & Swap",
-            "order": 6,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kat Vityèl: kòmande kat la",
-            "content_ht": "Nan Kat Vityèl, klike Kòmande. KYC dwe apwouve. Frè kòmand lan ap parèt avan ou konfime.",
-            "category": "Kat Vityèl",
-            "order": 7,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kat Vityèl: ajoute kòb (top-up)",
-            "content_ht": "Chwazi kat la, antre montan an, verifye frè ak minimòm yo, epi konfime top-up la.",
-            "category": "Kat Vityèl",
-            "order": 8,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kat Vityèl: fè retrè sou bous",
-            "content_ht": "Chwazi kat la, antre montan an, epi soumèt. Lajan an retounen nan bous USD ou si kat la sipòte li.",
-            "category": "Kat Vityèl",
-            "order": 9,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kijan pou achte minit (TopUp)",
-            "content_ht": "Nan TopUp, chwazi peyi a, antre nimewo telefòn nan, mete montan an, epi konfime.",
-            "category": "Lòt sèvis",
-            "order": 10,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Mwen bliye modpas mwen",
-            "content_ht": "Sou paj Koneksyon, klike “Mwen bliye modpas”, antre imel ou, epi swiv etap yo nan imel la.",
-            "category": "Kont & Sekirite",
-            "order": 11,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kijan pou kontakte sipò",
-            "content_ht": "Sèvi ak bouton chat oswa WhatsApp si li aktif. Sinon, kontakte sipò a dirèkteman.",
-            "category": "Sipò",
-            "order": 12,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-        {
-            "article_id": str(uuid.uuid4()),
-            "title_ht": "Kijan pou enstale app la sou telefòn",
-            "content_ht": "Sou Android (Chrome), klike “Enstale App KAYICOM” oswa Menu (⋮) → Add to Home screen. Sou iPhone, itilize Share → Add to Home Screen.",
-            "category": "Kòmanse",
-            "order": 13,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now,
-        },
-    ]
-
-    await db.help_articles.insert_many(defaults)
+    # Admin alert digest (0 = send every alert immediately)
+    admin_alert_digest_seconds: Optional[int] = None
+    admin_alert_immediate_usd: Optional[float] = None
+    admin_alert_immediate_htg: Optional[float] = None
 
 class TeamMemberCreate(BaseModel):
     email: str
@@ -1386,13 +1703,37 @@ class CardApprovalWithDetails(BaseModel):
     card_last4: Optional[str] = None
     admin_notes: Optional[str] = None
 
-# ==================== HELPERS ====================
+# List responses: documents come straight from our collections, so items stay schemaless dicts
+# and the envelope is built with model_response() (no re-validation, rendered by orjson).
+
+class TransactionsPage(BaseModel):
+    transactions: List[Dict[str, Any]]
+
+class AdminUsersPage(BaseModel):
+    users: List[Dict[str, Any]]
+    total: int
+
+class AdminKYCPage(BaseModel):
+    submissions: List[Dict[str, Any]]
+    stats: Dict[str, int]
+    meta: Dict[str, Any]
+
+class AdminDepositsPage(BaseModel):
+    deposits: List[Dict[str, Any]]
 
-def generate_client_id():
-    return f"KC{secrets.token_hex(4).upper()}"
+class AdminWithdrawalsPage(BaseModel):
+    withdrawals: List[Dict[str, Any]]
 
-def generate_affiliate_code():
-    return secrets.token_urlsafe(8)
+class AdminCardOrdersPage(BaseModel):
+    orders: List[Dict[str, Any]]
+
+class LogsPage(BaseModel):
+    logs: List[Dict[str, Any]]
+
+class WebhookEventsPage(BaseModel):
+    events: List[Dict[str, Any]]
+
+# ==================== HELPERS ====================
 
 def generate_card_number():
     """Generate a virtual card number (Visa-like)"""
@@ -1409,217 +1750,437 @@ def generate_expiry():
     future = datetime.now() + timedelta(days=365*3)
     return future.strftime("%m/%y")
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+# Auth and the admin RBAC check are shared with the Vercel entry point (kayicom_core.routers.auth).
+# Admin permissions come from settings.rbac_permissions (defaults: rbac.DEFAULT_PERMISSIONS).
+admin_permissions = rbac.PermissionStore(lambda: db)
+get_current_user = auth_routes.current_user_dependency(lambda: db)
+get_admin_user = auth_routes.admin_user_dependency(get_current_user, admin_permissions)
+
+# ==================== AUDIT LOG WRITER ====================
+# log_action() no longer awaits a Mongo write: entries go into a bounded in-memory queue and a
+# background task writes them with insert_many every AUDIT_LOG_BATCH_SIZE entries or
+# AUDIT_LOG_FLUSH_SECONDS, whichever comes first. When the queue is full, when a write fails, or
+# on shutdown, entries are appended to a JSONL spill file instead; spill files are replayed on
+# the next startup. Entries carry a BSON datetime `ts` for the time-series store (see EVENT STORAGE).
+
+AUDIT_LOG_BATCH_SIZE = int(os.environ.get("AUDIT_LOG_BATCH_SIZE") or 200)
+AUDIT_LOG_FLUSH_SECONDS = float(os.environ.get("AUDIT_LOG_FLUSH_SECONDS") or 1.0)
+AUDIT_LOG_QUEUE_MAX = int(os.environ.get("AUDIT_LOG_QUEUE_MAX") or 10000)
+AUDIT_LOG_SPILL_DIR = Path(os.environ.get("AUDIT_LOG_SPILL_DIR") or os.path.join(tempfile.gettempdir(), "kayicom-audit-spill"))
+
+_audit_state: Dict[str, Any] = {"queue": None, "flusher": None}
+_AUDIT_STOP = object()  # queued by flush_audit_log_now(): the flusher writes its batch and exits
+
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode(), hashed.encode())
+def _audit_queue() -> asyncio.Queue:
+    if _audit_state["queue"] is None:
+        _audit_state["queue"] = asyncio.Queue(maxsize=AUDIT_LOG_QUEUE_MAX)
+    return _audit_state["queue"]
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS))
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def _audit_spill(entries: List[dict], name: Optional[str] = None) -> bool:
+    """Append entries to this process's spill file (replayed by replay_audit_spill)."""
+    if not entries:
+        return True
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        user = await db.users.find_one({"user_id": user_id}, {"_id": 0})
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        if not user.get("is_active", True):
-            raise HTTPException(status_code=403, detail="Account is suspended")
-        return user
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-def _normalize_admin_role(user: dict) -> str:
-    if not user or not user.get("is_admin"):
-        return ""
-    role = str(user.get("admin_role") or "").strip().lower()
-    return role or "admin"
-
-
-# Default RBAC permissions (can be overridden in database)
-DEFAULT_RBAC_PERMISSIONS: Dict[str, List[str]] = {
-    # Support: KYC + users + virtual cards operations (non-financial config)
-    "support": [
-        "/api/admin/dashboard",
-        "/api/admin/users",
-        "/api/admin/kyc",
-        "/api/admin/kyc-image-storage-status",
-        "/api/admin/virtual-cards",
-        "/api/admin/virtual-card-orders",
-        "/api/admin/card-topups",
-        "/api/admin/topup-orders",
-    ],
-    # Finance: ONLY deposits and withdrawals (restricted)
-    "finance": [
-        "/api/admin/dashboard",
-        "/api/admin/deposits",
-        "/api/admin/withdrawals",
-    ],
-    # Manager: broad ops (no system-level settings/team)
-    "manager": [
-        "/api/admin/dashboard",
-        "/api/admin/users",
-        "/api/admin/kyc",
-        "/api/admin/deposits",
-        "/api/admin/withdrawals",
-        "/api/admin/virtual-cards",
-        "/api/admin/virtual-card-orders",
-        "/api/admin/card-topups",
-        "/api/admin/topup-orders",
-        "/api/admin/logs",
-    ],
-    # Admin: broad ops (still blocked from system-level team/settings)
-    "admin": [
-        "/api/admin/dashboard",
-        "/api/admin/users",
-        "/api/admin/kyc",
-        "/api/admin/kyc-image-storage-status",
-        "/api/admin/deposits",
-        "/api/admin/withdrawals",
-        "/api/admin/exchange-rates",
-        "/api/admin/rates",
-        "/api/admin/fees",
-        "/api/admin/card-fees",
-        "/api/admin/withdrawal-limits",
-        "/api/admin/payment-gateway",
-        "/api/admin/settings",
-        "/api/admin/virtual-cards",
-        "/api/admin/virtual-card-orders",
-        "/api/admin/card-topups",
-        "/api/admin/topup-orders",
-        "/api/admin/bulk-email",
-        "/api/admin/logs",
-        "/api/admin/webhook-events",
-        "/api/admin/agent-deposits",
-        "/api/admin/agent-settings",
-        "/api/admin/agent-commission-withdrawals",
-        "/api/admin/strowallet",
-        "/api/admin/agent-requests",
-        "/api/admin/agents",
-        "/api/admin/recharge-agent",
-        "/api/admin/client-reports",
-        "/api/admin/whatsapp-notifications",
-        "/api/admin/test-whatsapp",
-        "/api/admin/test-telegram",
-        "/api/admin/telegram/setup-webhook",
-        "/api/admin/team",
-        "/api/admin/rbac",
-    ],
-}
+        AUDIT_LOG_SPILL_DIR.mkdir(parents=True, exist_ok=True)
+        with open(AUDIT_LOG_SPILL_DIR / (name or f"audit-{os.getpid()}.jsonl"), "a", encoding="utf-8") as f:
+            for entry in entries:
+                row = {k: v for k, v in entry.items() if k not in ("_id", "ts")}
+                f.write(json.dumps(row, default=str) + "\n")
+    except OSError as e:
+        logger.error(f"Audit log spill failed, {len(entries)} entries lost: {e}")
+        return False
+    return True
 
-# Cache for RBAC permissions from database
-_rbac_cache: Dict[str, Any] = {"permissions": None, "last_fetch": 0}
 
-async def _get_rbac_permissions() -> Dict[str, List[str]]:
-    """Get RBAC permissions from database or use defaults."""
-    import time
-    
-    # Cache for 60 seconds
-    if _rbac_cache["permissions"] and (time.time() - _rbac_cache["last_fetch"]) < 60:
-        return _rbac_cache["permissions"]
-    
+async def _audit_write(batch: List[dict]) -> None:
     try:
-        settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0, "rbac_permissions": 1})
-        if settings and settings.get("rbac_permissions"):
-            _rbac_cache["permissions"] = settings["rbac_permissions"]
-            _rbac_cache["last_fetch"] = time.time()
-            return settings["rbac_permissions"]
+        await db.logs.insert_many(batch, ordered=False)
+    except BulkWriteError as e:
+        failed = {err.get("index") for err in e.details.get("writeErrors", [])}
+        _audit_spill([entry for i, entry in enumerate(batch) if i in failed])
     except Exception as e:
-        logger.warning(f"Failed to fetch RBAC permissions from DB: {e}")
-    
-    return DEFAULT_RBAC_PERMISSIONS
+        logger.error(f"Audit log write failed, spilling {len(batch)} entries: {e}")
+        _audit_spill(batch)
+
+
+async def _audit_flusher() -> None:
+    queue = _audit_queue()
+    loop = asyncio.get_running_loop()
+    while True:
+        entry = await queue.get()
+        if entry is _AUDIT_STOP:
+            return
+        batch = [entry]
+        stop = False
+        deadline = loop.time() + AUDIT_LOG_FLUSH_SECONDS
+        while len(batch) < AUDIT_LOG_BATCH_SIZE:
+            try:
+                entry = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if entry is _AUDIT_STOP:
+                stop = True
+                break
+            batch.append(entry)
+        await _audit_write(batch)
+        if stop:
+            return
 
-def _rbac_is_allowed_sync(*, role: str, path: str, permissions: Dict[str, List[str]]) -> bool:
-    """Synchronous check if role is allowed to access path."""
-    if not role:
-        return False
-    if role == "superadmin":
-        return True
 
-    # Explicitly blocked paths for non-superadmin roles.
-    blocked_prefixes = [
-        "/api/admin/purge-old-records",
-    ]
-    for bp in blocked_prefixes:
-        if path.startswith(bp):
-            return False
+def audit_log_enqueue(entry: dict) -> None:
+    try:
+        _audit_queue().put_nowait(entry)
+    except asyncio.QueueFull:
+        # Backpressure: Mongo is not keeping up; keep the entry on disk rather than block the request.
+        _audit_spill([entry])
+        return
+    flusher = _audit_state["flusher"]
+    if flusher is None or flusher.done():
+        _audit_state["flusher"] = asyncio.create_task(_audit_flusher())
+
+
+async def flush_audit_log_now() -> None:
+    """Write everything still queued (used on shutdown); spills to disk if Mongo is unavailable."""
+    queue = _audit_queue()
+    flusher = _audit_state.get("flusher")
+    _audit_state["flusher"] = None
+    if flusher is not None and not flusher.done():
+        # Not cancel(): the flusher may be holding a batch it has taken off the queue. The stop
+        # marker goes in behind the queued entries, so it writes them all before exiting.
+        await queue.put(_AUDIT_STOP)
+        await flusher
+    batch: List[dict] = []
+    while not queue.empty():
+        entry = queue.get_nowait()
+        if entry is _AUDIT_STOP:
+            continue
+        batch.append(entry)
+        if len(batch) >= AUDIT_LOG_BATCH_SIZE:
+            await _audit_write(batch)
+            batch = []
+    if batch:
+        await _audit_write(batch)
 
-    prefixes = permissions.get(role, [])
-    # Only allow exact match or sub-paths (prefix + "/..."), never raw startswith(prefix)
-    return any(path == p or path.startswith(p + "/") for p in prefixes)
 
-async def _rbac_is_allowed_async(*, role: str, path: str) -> bool:
-    """Async check if role is allowed to access path (fetches from DB)."""
-    permissions = await _get_rbac_permissions()
-    return _rbac_is_allowed_sync(role=role, path=path, permissions=permissions)
+async def _audit_replay_batch(batch: List[dict]) -> List[dict]:
+    """Insert a replayed batch; returns the entries that still need a later attempt."""
+    try:
+        await db.logs.insert_many(batch, ordered=False)
+    except BulkWriteError as e:
+        # Duplicate key: the entry was written by an earlier, interrupted replay.
+        failed = {err.get("index") for err in e.details.get("writeErrors", []) if err.get("code") != 11000}
+        return [entry for i, entry in enumerate(batch) if i in failed]
+    except Exception as e:
+        logger.error(f"Audit spill replay failed, keeping {len(batch)} entries for the next attempt: {e}")
+        return batch
+    return []
 
 
-async def get_admin_user(request: Request, current_user: dict = Depends(get_current_user)):
-    if not current_user.get("is_admin"):
-        raise HTTPException(status_code=403, detail="Admin access required")
+async def replay_audit_spill() -> int:
+    """
+    Insert entries spilled by earlier processes, then remove their files. Entries that cannot be
+    written go back to a spill file for the next startup. A replayed entry's `_id` is its log_id,
+    so on a regular `logs` collection a second insert is a duplicate-key error, not a second copy.
+    """
+    if not AUDIT_LOG_SPILL_DIR.is_dir():
+        return 0
+    replayed = 0
+    for path in sorted(AUDIT_LOG_SPILL_DIR.glob("audit-*.jsonl")):
+        # Claim the file first so a live process appending to it starts a fresh one.
+        claimed = path.with_suffix(f".{uuid.uuid4().hex}.replaying")
+        try:
+            os.replace(path, claimed)
+        except OSError:
+            continue
+        entries: List[dict] = []
+        with open(claimed, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("log_id"):
+                    entry["_id"] = entry["log_id"]
+                if entry.get("timestamp"):
+                    entry["ts"] = datetime.fromisoformat(entry["timestamp"])
+                entries.append(entry)
+        pending: List[dict] = []
+        for i in range(0, len(entries), AUDIT_LOG_BATCH_SIZE):
+            batch = entries[i:i + AUDIT_LOG_BATCH_SIZE]
+            failed = await _audit_replay_batch(batch)
+            replayed += len(batch) - len(failed)
+            pending.extend(failed)
+            if failed and len(failed) == len(batch):
+                # Mongo is unavailable: keep the rest of the file for the next startup as well.
+                pending.extend(entries[i + AUDIT_LOG_BATCH_SIZE:])
+                break
+        # Leftovers go under a new name, since a live process may have started a fresh file at `path`.
+        retry_name = f"audit-replay-{uuid.uuid4().hex}.jsonl"
+        if pending and not _audit_spill(pending, name=retry_name):
+            os.replace(claimed, AUDIT_LOG_SPILL_DIR / retry_name)  # replay the whole file again
+            continue
+        claimed.unlink()
+    return replayed
+
+
+# ==================== EVENT STORAGE ====================
+# `logs`, `webhook_events` and `whatsapp_notifications` are append-only and read newest-first,
+# so they are stored as MongoDB time-series collections: each record carries a BSON datetime
+# `ts` (the ISO string field is kept for API compatibility), the metaField groups records into
+# compressed buckets, and expireAfterSeconds drops old buckets. New deployments get time-series
+# collections at startup; existing regular collections are converted by migrate_event_stores()
+# (POST /admin/storage/migrate-event-stores), which moves the old collection aside to
+# `<name>_legacy`, creates the time-series collection under the original name and moves the
+# history over in batches. Writers keep running during the migration: a write that lands between
+# the rename and the create recreates a regular collection, which is moved aside as another
+# `<name>_legacy_<id>` source before the create is retried (time-series collections cannot be
+# renamed, so building one under a temporary name is not an option). Capped collections were
+# not used: they cannot expire by age and would silently drop webhook payloads under bursts.
+
+EVENT_STORE_TIMESERIES = (os.environ.get("EVENT_STORE_TIMESERIES") or "true").strip().lower() in ("1", "true", "yes")
+EVENT_STORE_COPY_BATCH = 1000
+EVENT_STORE_MIGRATION_LEASE_SECONDS = 600
+
+
+def _ttl_days(env_key: str, default: int) -> int:
+    return int(os.environ.get(env_key) or default)
+
+
+# name -> ISO time field, metaField, TTL in days (0 = keep forever), extra secondary indexes
+EVENT_STORES: Dict[str, Dict[str, Any]] = {
+    "logs": {"iso_field": "timestamp", "meta_field": "action", "ttl_days": _ttl_days("LOGS_TTL_DAYS", 0),
+             "indexes": [[("user_id", 1), ("ts", -1)]]},
+    "webhook_events": {"iso_field": "received_at", "meta_field": "provider", "ttl_days": _ttl_days("WEBHOOK_EVENTS_TTL_DAYS", 90),
+                       "indexes": [[("event_id", 1)]]},
+    "whatsapp_notifications": {"iso_field": "created_at", "meta_field": "status", "ttl_days": _ttl_days("WHATSAPP_NOTIFICATIONS_TTL_DAYS", 90),
+                               "indexes": []},
+}
+# Filled by refresh_event_store_modes(): name -> True when the collection is time-series.
+_event_store_timeseries: Dict[str, bool] = {}
 
-    role = _normalize_admin_role(current_user)
-    path = str(request.url.path or "")
 
-    # Only enforce RBAC on /api/admin/*.
-    if path.startswith("/api/admin"):
-        if not await _rbac_is_allowed_async(role=role, path=path):
-            raise HTTPException(status_code=403, detail="Insufficient role permissions")
+def event_sort_field(name: str) -> str:
+    """`ts` for time-series stores (bucket order), the ISO field for legacy regular collections."""
+    return "ts" if _event_store_timeseries.get(name) else EVENT_STORES[name]["iso_field"]
 
-    return current_user
 
-async def log_action(user_id: str, action: str, details: dict):
-    log_entry = {
-        "log_id": str(uuid.uuid4()),
-        "user_id": user_id,
-        "action": action,
-        "details": details,
-        "timestamp": datetime.now(timezone.utc).isoformat()
+def _event_timeseries_options(name: str) -> Dict[str, Any]:
+    spec = EVENT_STORES[name]
+    options: Dict[str, Any] = {
+        "timeseries": {"timeField": "ts", "metaField": spec["meta_field"], "granularity": "seconds"},
     }
-    await db.logs.insert_one(log_entry)
+    if spec["ttl_days"] > 0:
+        options["expireAfterSeconds"] = spec["ttl_days"] * 86400
+    return options
+
+
+async def _collection_types() -> Dict[str, str]:
+    """Types of the event stores and of their `<name>_legacy*` migration sources."""
+    pattern = "^(" + "|".join(re.escape(n) for n in EVENT_STORES) + ")(_legacy(_[0-9a-f]+)?)?$"
+    cursor = await db.list_collections(filter={"name": {"$regex": pattern}})
+    return {c["name"]: c.get("type", "collection") async for c in cursor}
+
+
+async def refresh_event_store_modes() -> Dict[str, bool]:
+    types = await _collection_types()
+    for name in EVENT_STORES:
+        _event_store_timeseries[name] = types.get(name) == "timeseries"
+    return dict(_event_store_timeseries)
+
+
+async def _ensure_event_store_indexes(name: str) -> None:
+    spec = EVENT_STORES[name]
+    await db[name].create_index([(spec["meta_field"], 1), ("ts", -1)])
+    for keys in spec["indexes"]:
+        await db[name].create_index(keys)
+
+
+async def ensure_event_stores() -> None:
+    """Create missing event stores as time-series collections (when enabled) and record each store's mode."""
+    types = await _collection_types()
+    for name in EVENT_STORES:
+        if name not in types and EVENT_STORE_TIMESERIES:
+            await db.create_collection(name, **_event_timeseries_options(name))
+            await _ensure_event_store_indexes(name)
+        elif types.get(name) == "timeseries":
+            # Keep the retention in line with the configured TTL.
+            ttl = EVENT_STORES[name]["ttl_days"]
+            await db.command("collMod", name, expireAfterSeconds=ttl * 86400 if ttl > 0 else "off")
+    await refresh_event_store_modes()
+
+
+def _event_ts(doc: dict, iso_field: str) -> Optional[datetime]:
+    value = doc.get("ts") or doc.get(iso_field)
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    try:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+async def _create_event_store(name: str) -> None:
+    """Create `name` as time-series; a regular collection that a live writer recreated meanwhile is moved aside."""
+    for _ in range(5):
+        try:
+            await db.create_collection(name, **_event_timeseries_options(name))
+            return
+        except (CollectionInvalid, OperationFailure):
+            types = await _collection_types()
+            if types.get(name) == "timeseries":
+                return  # created by a concurrent ensure_event_stores()
+            if types.get(name) == "collection":
+                await db[name].rename(f"{name}_legacy_{uuid.uuid4().hex[:12]}")
+                continue
+            raise
+    raise HTTPException(status_code=503, detail=f"{name} keeps being recreated by writers; retry the migration")
+
+
+async def migrate_event_store(name: str) -> Dict[str, Any]:
+    """Convert one regular event collection to time-series (see section comment). Safe to re-run."""
+    lease_id = f"migrate_event_store:{name}"
+    owner = str(uuid.uuid4())
+    if not await acquire_worker_lease(lease_id, owner, EVENT_STORE_MIGRATION_LEASE_SECONDS):
+        raise HTTPException(status_code=409, detail=f"{name} is being migrated by another process")
+    try:
+        return await _migrate_event_store(name, lease_id, owner)
+    finally:
+        await db.worker_leases.delete_one({"_id": lease_id, "owner": owner})
+
+
+async def _migrate_event_store(name: str, lease_id: str, owner: str) -> Dict[str, Any]:
+    spec = EVENT_STORES[name]
+    legacy = f"{name}_legacy"
+    types = await _collection_types()
+    if types.get(name) == "collection":
+        # A resumed migration already has `<name>_legacy`; the current collection becomes one more source.
+        await db[name].rename(legacy if legacy not in types else f"{legacy}_{uuid.uuid4().hex[:12]}")
+    if types.get(name) != "timeseries":
+        await _create_event_store(name)
+        await _ensure_event_store_indexes(name)
+    _event_store_timeseries[name] = True
+
+    # The legacy collection, plus any collection a writer recreated between the rename and the create.
+    sources = sorted(n for n, t in (await _collection_types()).items() if n.startswith(legacy) and t == "collection")
+    if not sources:
+        return {"collection": name, "status": "already_timeseries", "copied": 0}
+
+    copied = expired = 0
+    ttl_cutoff = (
+        datetime.now(timezone.utc) - timedelta(days=spec["ttl_days"]) if spec["ttl_days"] > 0 else None
+    )
+    for source in sources:
+        # Records are moved (copied, then removed from the legacy collection) batch by batch, so an
+        # interrupted migration resumes where it stopped without duplicating anything.
+        while True:
+            await acquire_worker_lease(lease_id, owner, EVENT_STORE_MIGRATION_LEASE_SECONDS)
+            docs = await db[source].find({}).sort(spec["iso_field"], 1).limit(EVENT_STORE_COPY_BATCH).to_list(
+                EVENT_STORE_COPY_BATCH
+            )
+            if not docs:
+                break
+            rows, done_ids = [], []
+            for doc in docs:
+                done_ids.append(doc.pop("_id"))
+                ts = _event_ts(doc, spec["iso_field"])
+                if ts is None:
+                    ts = datetime.now(timezone.utc)
+                if ttl_cutoff and ts < ttl_cutoff:
+                    expired += 1
+                    continue
+                doc["ts"] = ts
+                rows.append(doc)
+            if rows:
+                await db[name].insert_many(rows, ordered=False)
+                copied += len(rows)
+            await db[source].delete_many({"_id": {"$in": done_ids}})
+            await asyncio.sleep(0)
+        await db[source].drop()
+    return {"collection": name, "status": "migrated", "copied": copied, "expired": expired}
+
+
+async def migrate_event_stores() -> List[Dict[str, Any]]:
+    return [await migrate_event_store(name) for name in EVENT_STORES]
+
+
+async def log_action(user_id: str, action: str, details: dict):
+    audit_log_enqueue(audit.new_log_entry(user_id, action, details))
+
+
+def _resend_config(settings: Optional[dict]) -> Optional[Dict[str, str]]:
+    """
+    Resolve Resend credentials from settings (preferred) or env.
+    Returns {"api_key", "sender"} or None when email is disabled / not configured.
+    """
+    # Check if Resend is enabled (handle both boolean and string values)
+    resend_enabled = False
+    if settings:
+        resend_enabled_val = settings.get("resend_enabled", False)
+        # Handle string "true"/"True" or boolean True
+        if isinstance(resend_enabled_val, bool):
+            resend_enabled = resend_enabled_val
+        elif isinstance(resend_enabled_val, str):
+            resend_enabled = resend_enabled_val.lower() in ("true", "1", "yes")
+        elif isinstance(resend_enabled_val, (int, float)):
+            resend_enabled = bool(resend_enabled_val)
+        
+        if not resend_enabled:
+            logger.info(f"Resend email disabled in settings (value: {resend_enabled_val}, type: {type(resend_enabled_val).__name__})")
+            return None
+    else:
+        # If no settings, check environment variable
+        if not os.environ.get("RESEND_API_KEY"):
+            logger.info("Resend not configured - no settings found and no RESEND_API_KEY env var")
+            return None
+
+    resend_key = (settings.get("resend_api_key") if settings else None) or os.environ.get("RESEND_API_KEY")
+    sender = (settings.get("sender_email") if settings else None) or os.environ.get("SENDER_EMAIL", "onboarding@resend.dev")
+    
+    if not resend_key or resend_key.strip() == "":
+        logger.warning("Resend API key not configured or empty")
+        return None
+    
+    if not sender or sender.strip() == "":
+        logger.warning("Sender email not configured or empty")
+        return None
+
+    return {"api_key": resend_key.strip(), "sender": sender.strip()}
+
+def _resend_configure(resend, api_key: str) -> None:
+    """
+    Set the API key and a fixed HTTP timeout on the Resend SDK. Sends run in a worker thread that
+    cannot be cancelled, so the timeout has to live in the HTTP client itself: the guard slot is
+    held until the thread returns and a timed-out call never leaves a send running in the background.
+    """
+    from resend.http_client_requests import RequestsClient
+
+    resend.api_key = api_key
+    resend.default_http_client = RequestsClient(timeout=int(PROVIDER_WRITE_TIMEOUT_SECONDS))
+
+
+def _resend_is_outage(e: BaseException) -> bool:
+    """Resend errors with a 4xx code (bad address, bad key) are not provider outages."""
+    code = getattr(e, "code", None)
+    try:
+        return not (400 <= int(code) < 500 and int(code) != 429)
+    except (TypeError, ValueError):
+        return True
 
 async def send_email(to_email: str, subject: str, html_content: str):
     """Send email notification using Resend"""
     try:
         settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
-        
-        # Check if Resend is enabled (handle both boolean and string values)
-        resend_enabled = False
-        if settings:
-            resend_enabled_val = settings.get("resend_enabled", False)
-            # Handle string "true"/"True" or boolean True
-            if isinstance(resend_enabled_val, bool):
-                resend_enabled = resend_enabled_val
-            elif isinstance(resend_enabled_val, str):
-                resend_enabled = resend_enabled_val.lower() in ("true", "1", "yes")
-            elif isinstance(resend_enabled_val, (int, float)):
-                resend_enabled = bool(resend_enabled_val)
-            
-            if not resend_enabled:
-                logger.info(f"Resend email disabled in settings (value: {resend_enabled_val}, type: {type(resend_enabled_val).__name__})")
-                return False
-        else:
-            # If no settings, check environment variable
-            if not os.environ.get("RESEND_API_KEY"):
-                logger.info("Resend not configured - no settings found and no RESEND_API_KEY env var")
-                return False
-
-        resend_key = (settings.get("resend_api_key") if settings else None) or os.environ.get("RESEND_API_KEY")
-        sender = (settings.get("sender_email") if settings else None) or os.environ.get("SENDER_EMAIL", "onboarding@resend.dev")
-        
-        if not resend_key or resend_key.strip() == "":
-            logger.warning("Resend API key not configured or empty")
-            return False
-        
-        if not sender or sender.strip() == "":
-            logger.warning("Sender email not configured or empty")
+        cfg = _resend_config(settings)
+        if not cfg:
             return False
         
         # Import resend and set API key
@@ -1629,17 +2190,23 @@ async def send_email(to_email: str, subject: str, html_content: str):
             logger.error("Resend package not installed. Run: pip install resend")
             return False
         
-        resend.api_key = resend_key.strip()
+        _resend_configure(resend, cfg["api_key"])
         
         params = {
-            "from": sender.strip(),
+            "from": cfg["sender"],
             "to": [to_email.strip()],
             "subject": subject,
             "html": html_content
         }
         
-        logger.info(f"Attempting to send email to {to_email} from {sender.strip()}")
-        result = await asyncio.to_thread(resend.Emails.send, params)
+        logger.info(f"Attempting to send email to {to_email} from {cfg['sender']}")
+        async with provider_guard("resend").attempt(timeout=PROVIDER_WRITE_TIMEOUT_SECONDS) as att:
+            try:
+                result = await asyncio.to_thread(resend.Emails.send, params)
+            except Exception as e:
+                if _resend_is_outage(e):
+                    att.fail()
+                raise
         logger.info(f"Email sent successfully to {to_email}. Result: {result}")
         return True
     except Exception as e:
@@ -1649,17 +2216,184 @@ async def send_email(to_email: str, subject: str, html_content: str):
         logger.exception("Full traceback:")
         return False
 
-async def send_telegram_notification(message: str, chat_id: Optional[str] = None):
+# ==================== TELEGRAM GATEWAY ====================
+# One shared HTTP client, an outgoing queue paced by token buckets (Telegram allows ~30 msg/s
+# per bot, ~1 msg/s per private chat and ~20 msg/min per group or channel), 429 `retry_after`
+# handling that pauses the chat's bucket, and update processing shared by the webhook and the
+# optional getUpdates long-poll worker (TELEGRAM_MODE=polling).
+
+TELEGRAM_API_BASE = (os.environ.get("TELEGRAM_API_BASE") or "https://api.telegram.org").rstrip("/")
+TELEGRAM_GLOBAL_RATE_PER_SEC = float(os.environ.get("TELEGRAM_GLOBAL_RATE_PER_SEC") or 25)
+TELEGRAM_CHAT_RATE_PER_SEC = float(os.environ.get("TELEGRAM_CHAT_RATE_PER_SEC") or 1)
+# Groups and channels (negative chat ids) have a much lower limit.
+TELEGRAM_GROUP_RATE_PER_MIN = float(os.environ.get("TELEGRAM_GROUP_RATE_PER_MIN") or 20)
+TELEGRAM_SEND_WORKERS = max(1, int(os.environ.get("TELEGRAM_SEND_WORKERS") or 4))
+TELEGRAM_SEND_RETRIES = 3
+TELEGRAM_POLL_TIMEOUT_SECONDS = 25
+TELEGRAM_POLL_ERROR_BACKOFF_SECONDS = 5
+
+
+class _TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "paused_until", "lock")
+
+    def __init__(self, rate: float, capacity: float):
+        import time
+
+        self.rate = max(0.01, float(rate))
+        self.capacity = max(1.0, float(capacity))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Hand out no tokens for `seconds` (e.g. a 429 `retry_after`); the bucket is empty afterwards."""
+        import time
+
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    async def acquire(self) -> None:
+        import time
+
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+_telegram_state: Dict[str, Any] = {
+    "client": None,
+    "queue": None,
+    "workers": [],
+    "poller": None,
+    "global_bucket": None,
+    "chat_buckets": {},
+}
+
+
+def _telegram_client() -> httpx.AsyncClient:
+    if _telegram_state["client"] is None:
+        _telegram_state["client"] = httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0, read=TELEGRAM_POLL_TIMEOUT_SECONDS + 10.0),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return _telegram_state["client"]
+
+
+def _telegram_chat_bucket(chat_id: str) -> _TokenBucket:
+    buckets: Dict[str, _TokenBucket] = _telegram_state["chat_buckets"]
+    bucket = buckets.get(chat_id)
+    if bucket is None:
+        if len(buckets) > 10000:
+            buckets.clear()
+        if str(chat_id).startswith("-"):
+            bucket = _TokenBucket(TELEGRAM_GROUP_RATE_PER_MIN / 60.0, 1)
+        else:
+            bucket = _TokenBucket(TELEGRAM_CHAT_RATE_PER_SEC, 1)
+        buckets[chat_id] = bucket
+    return bucket
+
+
+async def _telegram_api(bot_token: str, method: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    url = f"{TELEGRAM_API_BASE}/bot{bot_token}/{method}"
+    if method == "getUpdates":
+        # Long-poll: deliberately slow, so it bypasses the breaker's adaptive timeout.
+        resp = await _telegram_client().post(url, json=payload)
+    else:
+        async with provider_guard("telegram").attempt() as att:
+            resp = await _telegram_client().post(url, json=payload, timeout=att.timeout)
+            if resp.status_code >= 500:
+                att.fail()
+    try:
+        data = resp.json()
+    except Exception:
+        data = {"ok": False, "description": resp.text}
+    data.setdefault("http_status", resp.status_code)
+    return data
+
+
+async def _telegram_send_now(bot_token: str, chat_id: str, payload: Dict[str, Any]) -> bool:
+    """Paced send with 429 handling. Returns True when Telegram accepted the message."""
+    for _ in range(TELEGRAM_SEND_RETRIES):
+        await _telegram_state["global_bucket"].acquire()
+        await _telegram_chat_bucket(chat_id).acquire()
+        try:
+            data = await _telegram_api(bot_token, "sendMessage", payload)
+        except Exception as e:
+            logger.error(f"Failed to send Telegram notification: {e}")
+            return False
+        if data.get("ok"):
+            logger.info(f"Telegram notification sent successfully to chat_id: {chat_id}")
+            return True
+        if data.get("http_status") == 429:
+            retry_after = float(((data.get("parameters") or {}).get("retry_after")) or 1)
+            logger.warning(f"Telegram rate limited; pausing chat {chat_id} for {retry_after}s")
+            # Pause the chat itself, so the other workers do not keep sending to it meanwhile.
+            _telegram_chat_bucket(chat_id).pause(retry_after)
+            continue
+        logger.error(f"Telegram error: {data}")
+        return False
+    return False
+
+
+async def _telegram_send_worker() -> None:
+    queue: asyncio.Queue = _telegram_state["queue"]
+    while True:
+        bot_token, chat_id, payload, fut = await queue.get()
+        try:
+            ok = await _telegram_send_now(bot_token, chat_id, payload)
+            if not fut.done():
+                fut.set_result(ok)
+        except Exception as e:
+            logger.error(f"Telegram send worker error: {e}")
+            if not fut.done():
+                fut.set_result(False)
+        finally:
+            queue.task_done()
+
+
+def _telegram_ensure_workers() -> None:
+    if _telegram_state["queue"] is None:
+        _telegram_state["queue"] = asyncio.Queue()
+        _telegram_state["global_bucket"] = _TokenBucket(TELEGRAM_GLOBAL_RATE_PER_SEC, TELEGRAM_GLOBAL_RATE_PER_SEC)
+    workers = [w for w in _telegram_state["workers"] if not w.done()]
+    while len(workers) < TELEGRAM_SEND_WORKERS:
+        workers.append(asyncio.create_task(_telegram_send_worker()))
+    _telegram_state["workers"] = workers
+
+
+async def telegram_enqueue(bot_token: str, chat_id: str, text: str, *, parse_mode: Optional[str] = "HTML") -> "asyncio.Future":
+    """Queue a message; the returned future resolves to True/False once it was sent."""
+    _telegram_ensure_workers()
+    payload: Dict[str, Any] = {"chat_id": chat_id, "text": text}
+    if parse_mode:
+        payload["parse_mode"] = parse_mode
+    fut = asyncio.get_running_loop().create_future()
+    await _telegram_state["queue"].put((bot_token, str(chat_id), payload, fut))
+    return fut
+
+
+async def send_telegram_notification(message: str, chat_id: Optional[str] = None, *, wait: bool = True):
     """Send Telegram notification using bot
     
     Args:
         message: The message to send
         chat_id: Optional chat ID. If not provided, uses the default chat_id from settings
+        wait: If False, return as soon as the message is queued
     """
-    import httpx
-    
     try:
-        settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
+        settings = await get_settings_snapshot()
         if not settings or not settings.get("telegram_enabled"):
             return False
         
@@ -1673,51 +2407,330 @@ async def send_telegram_notification(message: str, chat_id: Optional[str] = None
             logger.warning("Telegram bot token or chat_id not configured")
             return False
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"https://api.telegram.org/bot{bot_token}/sendMessage",
-                json={
-                    "chat_id": chat_id,
-                    "text": message,
-                    "parse_mode": "HTML"
-                },
-                timeout=30.0
-            )
-            
-            if response.status_code == 200:
-                logger.info(f"Telegram notification sent successfully to chat_id: {chat_id}")
-                return True
-            else:
-                logger.error(f"Telegram error: {response.text}")
-                return False
+        fut = await telegram_enqueue(bot_token, str(chat_id), message)
+        if not wait:
+            return True
+        return await fut
     except Exception as e:
         logger.error(f"Failed to send Telegram notification: {e}")
         return False
 
 
-async def notify_admin(subject: str, html: str, telegram_message: Optional[str] = None):
+_TELEGRAM_TEXT_EXPIRED = "❌ Activation code has expired. Please generate a new one from your account settings."
+_TELEGRAM_TEXT_INVALID = "❌ Invalid activation code. Please check your code and try again, or generate a new one from your account settings."
+_TELEGRAM_TEXT_WELCOME = "👋 Welcome to KAYICOM Telegram Notifications!\n\nTo activate notifications:\n1. Go to your account settings\n2. Click 'Activate Telegram'\n3. Send /start YOUR_CODE to this bot\n\nExample: /start ABC12345"
+
+
+async def telegram_handle_updates(updates: List[Dict[str, Any]]) -> None:
     """
-    Notify all active admins by email (Resend) and Telegram (settings.telegram_chat_id).
+    Process a batch of bot updates (webhook passes one, long-poll up to 100).
+    All `/start CODE` activations in the batch are resolved with one lookup and applied with bulk writes.
     """
-    # Email admins
+    starts: List[tuple] = []
+    for update in updates or []:
+        message = (update or {}).get("message")
+        if not message:
+            continue
+        text = (message.get("text") or "").strip()
+        if not text.startswith("/start"):
+            continue
+        parts = text.split()
+        code = parts[1].upper() if len(parts) > 1 else None
+        starts.append((str(message["chat"]["id"]), code))
+    if not starts:
+        return
+
+    settings = await get_settings_snapshot()
+    bot_token = settings.get("telegram_bot_token") if settings else None
+
+    codes = list({code for _, code in starts if code})
+    activations: Dict[str, dict] = {}
+    if codes:
+        async for a in db.telegram_activations.find({"activation_code": {"$in": codes}, "used": False}, {"_id": 0}):
+            activations[a["activation_code"]] = a
+    user_ids = list({a["user_id"] for a in activations.values()})
+    users: Dict[str, dict] = {}
+    if user_ids:
+        async for u in db.users.find({"user_id": {"$in": user_ids}}, {"_id": 0, "user_id": 1, "full_name": 1, "client_id": 1}):
+            users[u["user_id"]] = u
+
+    now = datetime.now(timezone.utc)
+    user_ops = []
+    activation_ops = []
+    replies: List[tuple] = []
+    activated: List[tuple] = []
+    for chat_id, code in starts:
+        if not code:
+            # /start without code - send instructions
+            replies.append((chat_id, _TELEGRAM_TEXT_WELCOME, None))
+            continue
+        activation = activations.pop(code, None)
+        if not activation:
+            replies.append((chat_id, _TELEGRAM_TEXT_INVALID, None))
+            continue
+        if now > datetime.fromisoformat(activation["expires_at"]):
+            replies.append((chat_id, _TELEGRAM_TEXT_EXPIRED, None))
+            continue
+        user_ops.append(UpdateOne({"user_id": activation["user_id"]}, {"$set": {"telegram_chat_id": chat_id}}))
+        activation_ops.append(UpdateOne(
+            {"activation_code": code},
+            {"$set": {"used": True, "activated_at": now.isoformat()}},
+        ))
+        user = users.get(activation["user_id"]) or {}
+        user_name = user.get("full_name", "User")
+        client_id = user.get("client_id", "")
+        replies.append((
+            chat_id,
+            f"✅ <b>Telegram Notifications Activated!</b>\n\nHello {user_name}!\n\nYour Telegram notifications have been successfully activated. You will now receive notifications for:\n• Agent deposit approvals\n• Transaction updates\n\nYour Client ID: <code>{client_id}</code>\n\nThank you for using KAYICOM! 🎉",
+            "HTML",
+        ))
+        activated.append((activation["user_id"], chat_id))
+
+    if user_ops:
+        await db.users.bulk_write(user_ops, ordered=False)
+        await db.telegram_activations.bulk_write(activation_ops, ordered=False)
+    for user_id, chat_id in activated:
+        await log_action(user_id, "telegram_activated", {"chat_id": chat_id})
+
+    if bot_token:
+        for chat_id, text, parse_mode in replies:
+            await telegram_enqueue(bot_token, chat_id, text, parse_mode=parse_mode)
+
+
+async def _telegram_poll_loop() -> None:
+    """getUpdates long-poll worker (only one process should run it; guarded by a Mongo lease)."""
+    lease_id = "telegram_poller"
+    owner = str(uuid.uuid4())
+    offset: Optional[int] = None
+    webhook_cleared_for: Optional[str] = None
+    while True:
+        try:
+            if not await acquire_worker_lease(lease_id, owner, TELEGRAM_POLL_TIMEOUT_SECONDS * 3):
+                await asyncio.sleep(TELEGRAM_POLL_TIMEOUT_SECONDS)
+                continue
+
+            settings = await get_settings_snapshot()
+            bot_token = settings.get("telegram_bot_token") if settings else None
+            if not settings.get("telegram_enabled") or not bot_token:
+                await asyncio.sleep(30)
+                continue
+            if webhook_cleared_for != bot_token:
+                # getUpdates is rejected while a webhook is set.
+                await _telegram_api(bot_token, "deleteWebhook", {"drop_pending_updates": False})
+                webhook_cleared_for = bot_token
+
+            payload: Dict[str, Any] = {"timeout": TELEGRAM_POLL_TIMEOUT_SECONDS, "allowed_updates": ["message"]}
+            if offset is not None:
+                payload["offset"] = offset
+            data = await _telegram_api(bot_token, "getUpdates", payload)
+            if not data.get("ok"):
+                logger.warning(f"Telegram getUpdates failed: {data}")
+                await asyncio.sleep(TELEGRAM_POLL_ERROR_BACKOFF_SECONDS)
+                continue
+            updates = data.get("result") or []
+            if updates:
+                await telegram_handle_updates(updates)
+                # Confirm the batch only once it was handled; on error the same updates are fetched again.
+                offset = max(int(u.get("update_id", 0)) for u in updates) + 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Telegram poll loop error: {e}")
+            await asyncio.sleep(TELEGRAM_POLL_ERROR_BACKOFF_SECONDS)
+
+
+def telegram_start_gateway() -> None:
+    _telegram_ensure_workers()
+    mode = (os.environ.get("TELEGRAM_MODE") or "webhook").strip().lower()
+    if mode == "polling" and _telegram_state["poller"] is None:
+        _telegram_state["poller"] = asyncio.create_task(_telegram_poll_loop())
+
+
+async def telegram_stop_gateway() -> None:
+    poller = _telegram_state.get("poller")
+    if poller is not None:
+        poller.cancel()
+        _telegram_state["poller"] = None
+    queue = _telegram_state.get("queue")
+    if queue is not None:
+        # Give queued notifications a moment to drain.
+        try:
+            await asyncio.wait_for(queue.join(), timeout=5)
+        except asyncio.TimeoutError:
+            logger.warning("Telegram queue not drained before shutdown")
+    for w in _telegram_state["workers"]:
+        w.cancel()
+    _telegram_state["workers"] = []
+    if _telegram_state["client"] is not None:
+        await _telegram_state["client"].aclose()
+        _telegram_state["client"] = None
+
+# ==================== ADMIN ALERT DIGEST ====================
+# Admin alerts are coalesced per window (default 30 s): one digest email per admin and one
+# Telegram message per window instead of one of each per event. Alerts at or above the
+# high-value thresholds (or with the window set to 0) are still delivered immediately.
+
+ADMIN_ALERT_DIGEST_SECONDS = float(os.environ.get("ADMIN_ALERT_DIGEST_SECONDS") or 30)
+ADMIN_ALERT_IMMEDIATE_USD = float(os.environ.get("ADMIN_ALERT_IMMEDIATE_USD") or 1000)
+ADMIN_ALERT_IMMEDIATE_HTG = float(os.environ.get("ADMIN_ALERT_IMMEDIATE_HTG") or 130000)
+# Telegram rejects messages longer than 4096 characters.
+TELEGRAM_MAX_MESSAGE_CHARS = 4000
+
+_admin_alert_state: Dict[str, Any] = {
+    "pending": [],
+    "flusher": None,
+    "sending": False,  # the flusher holds a batch taken from `pending` (must not be cancelled)
+    # Refreshed from db.settings at every flush; env values until the first flush.
+    "window_seconds": ADMIN_ALERT_DIGEST_SECONDS,
+    "immediate_usd": ADMIN_ALERT_IMMEDIATE_USD,
+    "immediate_htg": ADMIN_ALERT_IMMEDIATE_HTG,
+}
+
+
+def _admin_alert_is_high_value(amount: Optional[float], currency: Optional[str]) -> bool:
+    if amount is None:
+        return False
+    try:
+        amt = abs(float(amount))
+    except (TypeError, ValueError):
+        return False
+    if str(currency or "USD").upper() == "HTG":
+        return amt >= float(_admin_alert_state["immediate_htg"])
+    return amt >= float(_admin_alert_state["immediate_usd"])
+
+
+def _split_telegram_messages(parts: List[str]) -> List[str]:
+    """Join messages with a separator, starting a new message before the Telegram size limit."""
+    chunks: List[str] = []
+    current = ""
+    for part in parts:
+        part = part[:TELEGRAM_MAX_MESSAGE_CHARS]
+        candidate = f"{current}\n\n➖➖➖\n\n{part}" if current else part
+        if len(candidate) > TELEGRAM_MAX_MESSAGE_CHARS:
+            chunks.append(current)
+            current = part
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def _deliver_admin_alert(subject: str, html: str, telegram_messages: List[str]) -> None:
+    # Email admins (concurrently; one digest each)
     try:
         admins = await db.users.find(
             {"is_admin": True, "is_active": True},
             {"_id": 0, "email": 1},
         ).to_list(50)
-        for a in admins:
-            if a.get("email"):
-                await send_email(a["email"], subject, html)
+        await asyncio.gather(*[send_email(a["email"], subject, html) for a in admins if a.get("email")])
     except Exception as e:
         logger.error(f"Admin email notify error: {e}")
 
     # Telegram admin channel/group
-    if telegram_message:
+    for message in telegram_messages:
         try:
-            await send_telegram_notification(telegram_message)
+            await send_telegram_notification(message)
         except Exception as e:
             logger.error(f"Admin telegram notify error: {e}")
 
+
+async def _flush_admin_alerts() -> None:
+    pending: List[Dict[str, Any]] = _admin_alert_state["pending"]
+    _admin_alert_state["pending"] = []
+    if not pending:
+        return
+    if len(pending) == 1:
+        alert = pending[0]
+        await _deliver_admin_alert(alert["subject"], alert["html"], [alert["telegram"]] if alert["telegram"] else [])
+        return
+
+    subject = f"KAYICOM - {len(pending)} new admin alerts"
+    sections = "".join(
+        f"<div style=\"margin-bottom:16px;\"><h3>{a['subject']}</h3>{a['html']}</div><hr/>"
+        for a in pending
+    )
+    html = f"<h2>{len(pending)} new admin alerts</h2>{sections}"
+    telegram_parts = [a["telegram"] for a in pending if a["telegram"]]
+    await _deliver_admin_alert(subject, html, _split_telegram_messages(telegram_parts))
+
+
+async def _refresh_admin_alert_settings() -> None:
+    try:
+        settings = await db.settings.find_one(
+            {"setting_id": "main"},
+            {"_id": 0, "admin_alert_digest_seconds": 1, "admin_alert_immediate_usd": 1, "admin_alert_immediate_htg": 1},
+        ) or {}
+    except Exception as e:
+        logger.warning(f"Failed to load admin alert settings: {e}")
+        return
+    for key, setting in (
+        ("window_seconds", "admin_alert_digest_seconds"),
+        ("immediate_usd", "admin_alert_immediate_usd"),
+        ("immediate_htg", "admin_alert_immediate_htg"),
+    ):
+        if settings.get(setting) is not None:
+            try:
+                _admin_alert_state[key] = max(0.0, float(settings[setting]))
+            except (TypeError, ValueError):
+                pass
+
+
+async def _admin_alert_flusher() -> None:
+    """Wait one window, then send everything collected during it."""
+    try:
+        await asyncio.sleep(float(_admin_alert_state["window_seconds"]))
+        _admin_alert_state["sending"] = True
+        try:
+            await _flush_admin_alerts()
+        finally:
+            _admin_alert_state["sending"] = False
+        await _refresh_admin_alert_settings()
+    except Exception as e:
+        logger.error(f"Admin alert digest flush failed: {e}")
+    finally:
+        # Not when flush_admin_alerts_now() has taken over (shutdown).
+        if _admin_alert_state["flusher"] is asyncio.current_task():
+            _admin_alert_state["flusher"] = None
+            # Alerts that arrived while we were sending start the next window.
+            if _admin_alert_state["pending"]:
+                _admin_alert_state["flusher"] = asyncio.create_task(_admin_alert_flusher())
+
+
+async def notify_admin(
+    subject: str,
+    html: str,
+    telegram_message: Optional[str] = None,
+    *,
+    amount: Optional[float] = None,
+    currency: Optional[str] = None,
+    immediate: bool = False,
+):
+    """
+    Notify all active admins by email (Resend) and Telegram (settings.telegram_chat_id).
+    Alerts are coalesced into a digest per window unless high-value or `immediate`.
+    """
+    if immediate or float(_admin_alert_state["window_seconds"]) <= 0 or _admin_alert_is_high_value(amount, currency):
+        await _deliver_admin_alert(subject, html, [telegram_message] if telegram_message else [])
+        return
+
+    _admin_alert_state["pending"].append({"subject": subject, "html": html, "telegram": telegram_message})
+    if _admin_alert_state["flusher"] is None:
+        _admin_alert_state["flusher"] = asyncio.create_task(_admin_alert_flusher())
+
+
+async def flush_admin_alerts_now() -> None:
+    """Send pending alerts without waiting for the window (used on shutdown)."""
+    flusher = _admin_alert_state.get("flusher")
+    _admin_alert_state["flusher"] = None
+    if flusher is not None and not flusher.done():
+        if _admin_alert_state["sending"]:
+            # Cancelling now would drop the batch it has taken off `pending`; let it finish.
+            await asyncio.wait([flusher])
+        else:
+            flusher.cancel()  # still waiting out the window: everything is in `pending`
+    await _flush_admin_alerts()
+
 async def send_whatsapp_notification(phone_number: str, message: str):
     """Send WhatsApp notification using CallMeBot (free)"""
     import httpx
@@ -1746,22 +2759,26 @@ async def send_whatsapp_notification(phone_number: str, message: str):
         
         if api_key:
             encoded_message = message.replace(" ", "+").replace("\n", "%0A")
-            url = f"https://api.callmebot.com/whatsapp.php?phone={phone_for_api}&text={encoded_message}&apikey={api_key}"
+            url = f"{CALLMEBOT_API_BASE}/whatsapp.php?phone={phone_for_api}&text={encoded_message}&apikey={api_key}"
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, timeout=30.0)
-                api_response = response.text
-                if response.status_code == 200 and "Message queued" in response.text:
-                    notification_status = "sent"
-                    logger.info(f"WhatsApp sent via CallMeBot to {clean_phone}")
-                else:
-                    notification_status = "failed"
-                    logger.error(f"CallMeBot error: {response.text}")
+            async with provider_guard("callmebot").attempt() as att:
+                async with httpx.AsyncClient() as client:
+                    response = await client.get(url, timeout=att.timeout)
+                if response.status_code >= 500:
+                    att.fail()
+            api_response = response.text
+            if response.status_code == 200 and "Message queued" in response.text:
+                notification_status = "sent"
+                logger.info(f"WhatsApp sent via CallMeBot to {clean_phone}")
+            else:
+                notification_status = "failed"
+                logger.error(f"CallMeBot error: {response.text}")
         else:
             logger.warning(f"No CallMeBot API key configured")
             notification_status = "not_configured"
         
         # Store notification for tracking
+        created_at = datetime.now(timezone.utc)
         await db.whatsapp_notifications.insert_one({
             "notification_id": notification_id,
             "phone_number": clean_phone,
@@ -1769,7 +2786,8 @@ async def send_whatsapp_notification(phone_number: str, message: str):
             "status": notification_status,
             "provider": "callmebot",
             "api_response": api_response,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": created_at.isoformat(),
+            "ts": created_at,
         })
         
         return notification_status == "sent"
@@ -1777,231 +2795,690 @@ async def send_whatsapp_notification(phone_number: str, message: str):
         logger.error(f"Failed to send WhatsApp notification: {e}")
         return False
 
-# Default commission tiers (can be overridden in database)
-DEFAULT_COMMISSION_TIERS = [
-    {"min": 5, "max": 19.99, "commission": 1.0, "is_percentage": False},
-    {"min": 20, "max": 39.99, "commission": 1.2, "is_percentage": False},
-    {"min": 40, "max": 99.99, "commission": 1.3, "is_percentage": False},
-    {"min": 100, "max": 199.99, "commission": 1.8, "is_percentage": False},
-    {"min": 200, "max": 299.99, "commission": 3.0, "is_percentage": False},
-    {"min": 300, "max": 399.99, "commission": 4.5, "is_percentage": False},
-    {"min": 400, "max": 499.99, "commission": 5.0, "is_percentage": False},
-    {"min": 500, "max": 599.99, "commission": 6.0, "is_percentage": False},
-    {"min": 600, "max": 1499.99, "commission": 7.0, "is_percentage": False},
-    {"min": 1500, "max": 999999, "commission": 1.0, "is_percentage": True}  # 1%
-]
-
-async def get_commission_tiers():
-    """Get commission tiers from database or return defaults"""
-    settings = await db.agent_settings.find_one({"setting_id": "main"}, {"_id": 0})
-    if settings and settings.get("commission_tiers"):
-        return settings.get("commission_tiers")
-    return DEFAULT_COMMISSION_TIERS
-
-async def calculate_agent_commission_async(amount_usd: float) -> float:
-    """Calculate agent commission based on configurable tiered structure"""
-    if amount_usd < 5:
-        return 0.0
-    
-    tiers = await get_commission_tiers()
-    
-    for tier in tiers:
-        if tier["min"] <= amount_usd <= tier["max"]:
-            if tier.get("is_percentage", False):
-                return round(amount_usd * (tier["commission"] / 100), 2)
-            else:
-                return tier["commission"]
-    
-    # Fallback: 1% for any amount not covered
-    return round(amount_usd * 0.01, 2)
-
-def calculate_agent_commission_sync(amount_usd: float, tiers: list) -> float:
-    """Synchronous version for use when tiers are already loaded"""
-    if amount_usd < 5:
-        return 0.0
-    
-    for tier in tiers:
-        if tier["min"] <= amount_usd <= tier["max"]:
-            if tier.get("is_percentage", False):
-                return round(amount_usd * (tier["commission"] / 100), 2)
-            else:
-                return tier["commission"]
-    
-    return round(amount_usd * 0.01, 2)
-
-def calculate_tiered_fee(amount: float, tiers: list) -> float:
-    """Calculate a tiered fee (fixed or percentage) based on amount."""
-    try:
-        amt = float(amount)
-    except Exception:
-        return 0.0
-    if amt <= 0:
-        return 0.0
-
-    for tier in tiers or []:
-        try:
-            min_a = float(tier.get("min_amount", 0))
-            max_a = float(tier.get("max_amount", 0))
-            fee_v = float(tier.get("fee_value", 0))
-            is_pct = bool(tier.get("is_percentage", False))
-        except Exception:
-            continue
+# ==================== NOTIFICATION TEMPLATES ====================
+# Email/Telegram bodies keyed by event and language ("ht", "fr", "en"). Every template is parsed
+# once at import into literal chunks + field lookups, so rendering is a single join. Values are
+# HTML-escaped unless the field name ends with `_html` (pre-rendered fragments).
 
-        if min_a <= amt <= max_a:
-            if is_pct:
-                return round(amt * (fee_v / 100.0), 2)
-            return round(fee_v, 2)
+NOTIFICATION_LANGUAGES = ("ht", "fr", "en")
+NOTIFICATION_DEFAULT_LANGUAGE = "en"
 
-    return 0.0
+_EMAIL_FOOTER = {
+    "ht": "<p>Mèsi paske ou itilize KAYICOM!</p>",
+    "fr": "<p>Merci d'utiliser KAYICOM !</p>",
+    "en": "<p>Thank you for using KAYICOM!</p>",
+}
+_EMAIL_SUPPORT = {
+    "ht": "<p>Kontakte sipò a si ou gen nenpòt kesyon.</p>",
+    "fr": "<p>Veuillez contacter le support si vous avez des questions.</p>",
+    "en": "<p>Please contact support if you have any questions.</p>",
+}
 
-async def get_commission_tier_label(amount_usd: float) -> str:
-    """Get the commission tier description for display"""
-    if amount_usd < 5:
-        return "Pa kalifye (minimòm $5)"
-    
-    tiers = await get_commission_tiers()
-    
-    for tier in tiers:
-        if tier["min"] <= amount_usd <= tier["max"]:
-            if tier.get("is_percentage", False):
-                return f"${tier['min']}+ → {tier['commission']}%"
-            else:
-                return f"${tier['min']}-${tier['max']:.0f} → ${tier['commission']}"
-    
-    return "1%"
+NOTIFICATION_TEMPLATES: Dict[str, Dict[str, Dict[str, str]]] = {
+    # ---- Admin alerts (admins read English) ----
+    "admin_new_deposit": {
+        "en": {
+            "subject": "KAYICOM - New Deposit Request",
+            "html": (
+                "<h2>New Deposit Request</h2>"
+                "<p><strong>Client:</strong> {full_name} ({client_id})</p>"
+                "<p><strong>Amount:</strong> {amount} {currency}</p>"
+                "<p><strong>Fee:</strong> {fee} {currency}</p>"
+                "<p><strong>Total to pay:</strong> {total_amount} {currency}</p>"
+                "<p><strong>Method:</strong> {method}</p>"
+                "<p><strong>Status:</strong> pending</p>"
+                "<p>Deposit ID: <code>{deposit_id}</code></p>"
+            ),
+            "telegram": (
+                "💰 <b>New Deposit Request</b>\n"
+                "Client: <b>{full_name}</b> ({client_id})\n"
+                "Amount: <b>{amount} {currency}</b>\n"
+                "Fee: <b>{fee} {currency}</b>\n"
+                "Total: <b>{total_amount} {currency}</b>\n"
+                "Method: <b>{method}</b>\n"
+                "ID: <code>{deposit_id}</code>"
+            ),
+        },
+    },
+    "admin_new_withdrawal": {
+        "en": {
+            "subject": "KAYICOM - New Withdrawal Request",
+            "html": (
+                "<h2>New Withdrawal Request</h2>"
+                "<p><strong>Client:</strong> {full_name} ({client_id})</p>"
+                "<p><strong>Amount:</strong> {amount} {currency}</p>"
+                "<p><strong>Fee:</strong> {fee} {currency}</p>"
+                "<p><strong>Total deducted:</strong> {total_amount} {currency}</p>"
+                "<p><strong>Method:</strong> {method}</p>"
+                "<p><strong>Status:</strong> pending</p>"
+                "<p>Withdrawal ID: <code>{withdrawal_id}</code></p>"
+            ),
+            "telegram": (
+                "🏧 <b>New Withdrawal Request</b>\n"
+                "Client: <b>{full_name}</b> ({client_id})\n"
+                "Amount: <b>{amount} {currency}</b>\n"
+                "Fee: <b>{fee} {currency}</b>\n"
+                "Total: <b>{total_amount} {currency}</b>\n"
+                "Method: <b>{method}</b>\n"
+                "ID: <code>{withdrawal_id}</code>"
+            ),
+        },
+    },
+    "admin_new_agent_deposit": {
+        "en": {
+            "subject": "KAYICOM - New Agent Deposit Request",
+            "html": (
+                "<h2>New Agent Deposit Request</h2>"
+                "<p><strong>Agent:</strong> {agent_name} ({agent_client_id})</p>"
+                "<p><strong>Client:</strong> {client_name} ({client_id})</p>"
+                "<p><strong>Amount USD:</strong> {amount_usd}</p>"
+                "<p><strong>HTG Received:</strong> {amount_htg_received}</p>"
+                "<p><strong>Commission:</strong> ${commission_usd:.2f}</p>"
+                "<p>Deposit ID: <code>{deposit_id}</code></p>"
+            ),
+            "telegram": (
+                "🧾 <b>New Agent Deposit</b>\n"
+                "Agent: <b>{agent_name}</b> ({agent_client_id})\n"
+                "Client: <b>{client_name}</b> ({client_id})\n"
+                "USD: <b>${amount_usd}</b> | HTG: <b>G {amount_htg_received}</b>\n"
+                "Commission: <b>${commission_usd:.2f}</b>\n"
+                "ID: <code>{deposit_id}</code>"
+            ),
+        },
+    },
+    "admin_new_agent_commission_withdrawal": {
+        "en": {
+            "subject": "KAYICOM - New Agent Commission Withdrawal",
+            "html": (
+                "<h2>New Agent Commission Withdrawal</h2>"
+                "<p><strong>Agent:</strong> {agent_name} ({agent_client_id})</p>"
+                "<p><strong>Amount:</strong> ${amount:.2f} USD</p>"
+                "<p><strong>Fee:</strong> ${fee:.2f} USD</p>"
+                "<p><strong>Net:</strong> ${net_amount:.2f} USD</p>"
+                "<p><strong>Method:</strong> {method}</p>"
+                "<p>Withdrawal ID: <code>{withdrawal_id}</code></p>"
+            ),
+            "telegram": (
+                "💸 <b>Agent Commission Withdrawal</b>\n"
+                "Agent: <b>{agent_name}</b> ({agent_client_id})\n"
+                "Amount: <b>${amount:.2f}</b> | Fee: <b>${fee:.2f}</b> | Net: <b>${net_amount:.2f}</b>\n"
+                "Method: <b>{method}</b>\n"
+                "ID: <code>{withdrawal_id}</code>"
+            ),
+        },
+    },
+    # ---- User notifications ----
+    "password_reset": {
+        "ht": {
+            "subject": "KAYICOM - Reyinisyalize modpas",
+            "html": (
+                "<h2>Reyinisyalize modpas ou</h2>"
+                "<p>Klike sou lyen ki anba a pou chanje modpas ou:</p>"
+                '<a href="{reset_link}">Reyinisyalize modpas la</a>'
+                "<p>Lyen sa a ekspire nan 1 èdtan.</p>"
+            ),
+        },
+        "fr": {
+            "subject": "KAYICOM - Réinitialisation du mot de passe",
+            "html": (
+                "<h2>Réinitialisation de votre mot de passe</h2>"
+                "<p>Cliquez sur le lien ci-dessous pour réinitialiser votre mot de passe:</p>"
+                '<a href="{reset_link}">Réinitialiser le mot de passe</a>'
+                "<p>Ce lien expire dans 1 heure.</p>"
+            ),
+        },
+        "en": {
+            "subject": "KAYICOM - Password reset",
+            "html": (
+                "<h2>Reset your password</h2>"
+                "<p>Click the link below to reset your password:</p>"
+                '<a href="{reset_link}">Reset password</a>'
+                "<p>This link expires in 1 hour.</p>"
+            ),
+        },
+    },
+    "deposit_approved": {
+        "ht": {
+            "subject": "KAYICOM - Depo Apwouve",
+            "html": (
+                "<h2>Depo Apwouve</h2>"
+                "<p>Bonjou {full_name},</p>"
+                "<p>Depo <strong>{amount} {currency}</strong> ou an via <strong>{method}</strong> apwouve.</p>"
+                "<p>Frè: <strong>{fee} {currency}</strong> | Total peye: <strong>{total_amount} {currency}</strong></p>"
+                "<p>ID tranzaksyon: <code>{deposit_id}</code></p>"
+            ) + _EMAIL_FOOTER["ht"],
+        },
+        "fr": {
+            "subject": "KAYICOM - Dépôt approuvé",
+            "html": (
+                "<h2>Dépôt approuvé</h2>"
+                "<p>Bonjour {full_name},</p>"
+                "<p>Votre dépôt de <strong>{amount} {currency}</strong> via <strong>{method}</strong> a été approuvé.</p>"
+                "<p>Frais: <strong>{fee} {currency}</strong> | Total payé: <strong>{total_amount} {currency}</strong></p>"
+                "<p>ID de transaction: <code>{deposit_id}</code></p>"
+            ) + _EMAIL_FOOTER["fr"],
+        },
+        "en": {
+            "subject": "KAYICOM - Deposit Approved",
+            "html": (
+                "<h2>Deposit Approved</h2>"
+                "<p>Hello {full_name},</p>"
+                "<p>Your deposit of <strong>{amount} {currency}</strong> via <strong>{method}</strong> has been approved.</p>"
+                "<p>Fee: <strong>{fee} {currency}</strong> | Total paid: <strong>{total_amount} {currency}</strong></p>"
+                "<p>Transaction ID: <code>{deposit_id}</code></p>"
+            ) + _EMAIL_FOOTER["en"],
+        },
+    },
+    "deposit_rejected": {
+        "ht": {
+            "subject": "KAYICOM - Depo Rejte",
+            "html": (
+                "<h2>Depo Rejte</h2>"
+                "<p>Bonjou {full_name},</p>"
+                "<p>Depo <strong>{amount} {currency}</strong> ou an via <strong>{method}</strong> rejte.</p>"
+                "<p>ID tranzaksyon: <code>{deposit_id}</code></p>"
+            ) + _EMAIL_SUPPORT["ht"],
+        },
+        "fr": {
+            "subject": "KAYICOM - Dépôt rejeté",
+            "html": (
+                "<h2>Dépôt rejeté</h2>"
+                "<p>Bonjour {full_name},</p>"
+                "<p>Votre dépôt de <strong>{amount} {currency}</strong> via <strong>{method}</strong> a été rejeté.</p>"
+                "<p>ID de transaction: <code>{deposit_id}</code></p>"
+            ) + _EMAIL_SUPPORT["fr"],
+        },
+        "en": {
+            "subject": "KAYICOM - Deposit Rejected",
+            "html": (
+                "<h2>Deposit Rejected</h2>"
+                "<p>Hello {full_name},</p>"
+                "<p>Your deposit of <strong>{amount} {currency}</strong> via <strong>{method}</strong> has been rejected.</p>"
+                "<p>Transaction ID: <code>{deposit_id}</code></p>"
+            ) + _EMAIL_SUPPORT["en"],
+        },
+    },
+    "withdrawal_processed": {
+        "ht": {
+            "subject": "KAYICOM - Retrè Trete",
+            "html": (
+                "<h2>Retrè Trete</h2>"
+                "<p>Bonjou {full_name},</p>"
+                "<p>Retrè <strong>{amount} {currency}</strong> ou an via <strong>{method}</strong> trete.</p>"
+                "<p>Frè: <strong>{fee} {currency}</strong> | Total retire: <strong>{total_amount} {currency}</strong></p>"
+                "<p>ID tranzaksyon: <code>{withdrawal_id}</code></p>"
+            ) + _EMAIL_FOOTER["ht"],
+        },
+        "fr": {
+            "subject": "KAYICOM - Retrait traité",
+            "html": (
+                "<h2>Retrait traité</h2>"
+                "<p>Bonjour {full_name},</p>"
+                "<p>Votre retrait de <strong>{amount} {currency}</strong> via <strong>{method}</strong> a été traité.</p>"
+                "<p>Frais: <strong>{fee} {currency}</strong> | Total débité: <strong>{total_amount} {currency}</strong></p>"
+                "<p>ID de transaction: <code>{withdrawal_id}</code></p>"
+            ) + _EMAIL_FOOTER["fr"],
+        },
+        "en": {
+            "subject": "KAYICOM - Withdrawal Processed",
+            "html": (
+                "<h2>Withdrawal Processed</h2>"
+                "<p>Hello {full_name},</p>"
+                "<p>Your withdrawal of <strong>{amount} {currency}</strong> via <strong>{method}</strong> has been processed.</p>"
+                "<p>Fee: <strong>{fee} {currency}</strong> | Total deducted: <strong>{total_amount} {currency}</strong></p>"
+                "<p>Transaction ID: <code>{withdrawal_id}</code></p>"
+            ) + _EMAIL_FOOTER["en"],
+        },
+    },
+    "withdrawal_rejected": {
+        "ht": {
+            "subject": "KAYICOM - Retrè Rejte",
+            "html": (
+                "<h2>Retrè Rejte</h2>"
+                "<p>Bonjou {full_name},</p>"
+                "<p>Retrè <strong>{amount} {currency}</strong> ou an via <strong>{method}</strong> rejte.</p>"
+                "<p>Montan an remèt nan kont ou.</p>"
+                "<p>ID tranzaksyon: <code>{withdrawal_id}</code></p>"
+            ) + _EMAIL_SUPPORT["ht"],
+        },
+        "fr": {
+            "subject": "KAYICOM - Retrait rejeté",
+            "html": (
+                "<h2>Retrait rejeté</h2>"
+                "<p>Bonjour {full_name},</p>"
+                "<p>Votre retrait de <strong>{amount} {currency}</strong> via <strong>{method}</strong> a été rejeté.</p>"
+                "<p>Le montant a été remboursé sur votre compte.</p>"
+                "<p>ID de transaction: <code>{withdrawal_id}</code></p>"
+            ) + _EMAIL_SUPPORT["fr"],
+        },
+        "en": {
+            "subject": "KAYICOM - Withdrawal Rejected",
+            "html": (
+                "<h2>Withdrawal Rejected</h2>"
+                "<p>Hello {full_name},</p>"
+                "<p>Your withdrawal of <strong>{amount} {currency}</strong> via <strong>{method}</strong> has been rejected.</p>"
+                "<p>The amount has been refunded to your account.</p>"
+                "<p>Transaction ID: <code>{withdrawal_id}</code></p>"
+            ) + _EMAIL_SUPPORT["en"],
+        },
+    },
+    "swap_completed": {
+        "ht": {
+            "subject": "KAYICOM - Swap Fini",
+            "html": (
+                "<h2>Swap Fini</h2>"
+                "<p>Bonjou {full_name},</p>"
+                "<p>Swap ou an fèt avèk siksè.</p>"
+                "<p><strong>Soti:</strong> {from_amount} {from_currency}</p>"
+                "<p><strong>Ale:</strong> {to_amount} {to_currency}</p>"
+                "<p><strong>To itilize:</strong> {rate}</p>"
+                "<p>ID tranzaksyon: <code>{swap_id}</code></p>"
+            ) + _EMAIL_FOOTER["ht"],
+        },
+        "fr": {
+            "subject": "KAYICOM - Échange de devises effectué",
+            "html": (
+                "<h2>Échange de devises effectué</h2>"
+                "<p>Bonjour {full_name},</p>"
+                "<p>Votre échange de devises a été effectué avec succès.</p>"
+                "<p><strong>De:</strong> {from_amount} {from_currency}</p>"
+                "<p><strong>Vers:</strong> {to_amount} {to_currency}</p>"
+                "<p><strong>Taux appliqué:</strong> {rate}</p>"
+                "<p>ID de transaction: <code>{swap_id}</code></p>"
+            ) + _EMAIL_FOOTER["fr"],
+        },
+        "en": {
+            "subject": "KAYICOM - Currency Swap Completed",
+            "html": (
+                "<h2>Currency Swap Completed</h2>"
+                "<p>Hello {full_name},</p>"
+                "<p>Your currency swap has been completed successfully.</p>"
+                "<p><strong>From:</strong> {from_amount} {from_currency}</p>"
+                "<p><strong>To:</strong> {to_amount} {to_currency}</p>"
+                "<p><strong>Rate Used:</strong> {rate}</p>"
+                "<p>Transaction ID: <code>{swap_id}</code></p>"
+            ) + _EMAIL_FOOTER["en"],
+        },
+    },
+    "transfer_sent": {
+        "ht": {
+            "subject": "KAYICOM - Transfè Voye",
+            "html": (
+                "<h2>Transfè Voye</h2>"
+                "<p>Bonjou {full_name},</p>"
+                "<p>Ou voye <strong>{amount} {currency}</strong> bay <strong>{recipient_client_id}</strong> avèk siksè.</p>"
+                "<p>Frè: <strong>{fee} {currency}</strong></p>"
+                "<p>ID tranzaksyon: <code>{transfer_id}</code></p>"
+            ) + _EMAIL_FOOTER["ht"],
+        },
+        "fr": {
+            "subject": "KAYICOM - Transfert envoyé",
+            "html": (
+                "<h2>Transfert envoyé</h2>"
+                "<p>Bonjour {full_name},</p>"
+                "<p>Vous avez envoyé <strong>{amount} {currency}</strong> à <strong>{recipient_client_id}</strong> avec succès.</p>"
+                "<p>Frais: <strong>{fee} {currency}</strong></p>"
+                "<p>ID de transaction: <code>{transfer_id}</code></p>"
+            ) + _EMAIL_FOOTER["fr"],
+        },
+        "en": {
+            "subject": "KAYICOM - Transfer Sent",
+            "html": (
+                "<h2>Transfer Sent</h2>"
+                "<p>Hello {full_name},</p>"
+                "<p>You have successfully sent <strong>{amount} {currency}</strong> to <strong>{recipient_client_id}</strong>.</p>"
+                "<p>Fee: <strong>{fee} {currency}</strong></p>"
+                "<p>Transaction ID: <code>{transfer_id}</code></p>"
+            ) + _EMAIL_FOOTER["en"],
+        },
+    },
+    "transfer_received": {
+        "ht": {
+            "subject": "KAYICOM - Transfè Resevwa",
+            "html": (
+                "<h2>Transfè Resevwa</h2>"
+                "<p>Bonjou {full_name},</p>"
+                "<p>Ou resevwa <strong>{amount} {currency}</strong> nan men <strong>{sender_client_id}</strong>.</p>"
+                "<p>ID tranzaksyon: <code>{transfer_id}</code></p>"
+            ) + _EMAIL_FOOTER["ht"],
+        },
+        "fr": {
+            "subject": "KAYICOM - Transfert reçu",
+            "html": (
+                "<h2>Transfert reçu</h2>"
+                "<p>Bonjour {full_name},</p>"
+                "<p>Vous avez reçu <strong>{amount} {currency}</strong> de <strong>{sender_client_id}</strong>.</p>"
+                "<p>ID de transaction: <code>{transfer_id}</code></p>"
+            ) + _EMAIL_FOOTER["fr"],
+        },
+        "en": {
+            "subject": "KAYICOM - Transfer Received",
+            "html": (
+                "<h2>Transfer Received</h2>"
+                "<p>Hello {full_name},</p>"
+                "<p>You have received <strong>{amount} {currency}</strong> from <strong>{sender_client_id}</strong>.</p>"
+                "<p>Transaction ID: <code>{transfer_id}</code></p>"
+            ) + _EMAIL_FOOTER["en"],
+        },
+    },
+    "agent_deposit_approved": {
+        "ht": {
+            "subject": "KAYICOM - Depo Ajan Apwouve",
+            "html": (
+                "<h2>Depo Ajan Apwouve</h2>"
+                "<p>Bonjou {full_name},</p>"
+                "<p>Depo ou fè pou kliyan <strong>{client_name}</strong> apwouve.</p>"
+                "<p><strong>Montan:</strong> ${amount_usd:.2f} USD</p>"
+                "<p><strong>Komisyon ou:</strong> ${commission_usd:.2f} USD</p>"
+                "<p>ID tranzaksyon: <code>{deposit_id}</code></p>"
+                "<p>Mèsi pou sèvis ou ak KAYICOM!</p>"
+            ),
+            "telegram": (
+                "✅ <b>Depo Apwouve!</b>\n\n"
+                "Kliyan: {client_name}\n"
+                "Montan: ${amount_usd:.2f} USD\n"
+                "Komisyon ou: ${commission_usd:.2f} USD\n\n"
+                "Mèsi pou sèvis ou ak KAYICOM!"
+            ),
+        },
+        "fr": {
+            "subject": "KAYICOM - Dépôt agent approuvé",
+            "html": (
+                "<h2>Dépôt agent approuvé</h2>"
+                "<p>Bonjour {full_name},</p>"
+                "<p>Votre dépôt pour le client <strong>{client_name}</strong> a été approuvé.</p>"
+                "<p><strong>Montant:</strong> ${amount_usd:.2f} USD</p>"
+                "<p><strong>Votre commission:</strong> ${commission_usd:.2f} USD</p>"
+                "<p>ID de transaction: <code>{deposit_id}</code></p>"
+                "<p>Merci pour votre service avec KAYICOM !</p>"
+            ),
+            "telegram": (
+                "✅ <b>Dépôt approuvé !</b>\n\n"
+                "Client: {client_name}\n"
+                "Montant: ${amount_usd:.2f} USD\n"
+                "Votre commission: ${commission_usd:.2f} USD\n\n"
+                "Merci pour votre service avec KAYICOM !"
+            ),
+        },
+        "en": {
+            "subject": "KAYICOM - Agent Deposit Approved",
+            "html": (
+                "<h2>Agent Deposit Approved</h2>"
+                "<p>Hello {full_name},</p>"
+                "<p>Your deposit for client <strong>{client_name}</strong> has been approved.</p>"
+                "<p><strong>Amount:</strong> ${amount_usd:.2f} USD</p>"
+                "<p><strong>Your Commission:</strong> ${commission_usd:.2f} USD</p>"
+                "<p>Transaction ID: <code>{deposit_id}</code></p>"
+                "<p>Thank you for your service with KAYICOM!</p>"
+            ),
+            "telegram": (
+                "✅ <b>Deposit Approved!</b>\n\n"
+                "Client: {client_name}\n"
+                "Amount: ${amount_usd:.2f} USD\n"
+                "Your commission: ${commission_usd:.2f} USD\n\n"
+                "Thank you for your service with KAYICOM!"
+            ),
+        },
+    },
+    "agent_deposit_received": {
+        "ht": {
+            "subject": "KAYICOM - Depo Resevwa",
+            "html": (
+                "<h2>Depo Resevwa</h2>"
+                "<p>Bonjou {full_name},</p>"
+                "<p>Depo <strong>${amount_usd:.2f} USD</strong> ajan <strong>{agent_name}</strong> fè pou ou a apwouve epi li antre nan kont ou.</p>"
+                "<p>ID tranzaksyon: <code>{deposit_id}</code></p>"
+            ) + _EMAIL_FOOTER["ht"],
+        },
+        "fr": {
+            "subject": "KAYICOM - Dépôt reçu",
+            "html": (
+                "<h2>Dépôt reçu</h2>"
+                "<p>Bonjour {full_name},</p>"
+                "<p>Votre dépôt de <strong>${amount_usd:.2f} USD</strong> de l'agent <strong>{agent_name}</strong> a été approuvé et crédité sur votre compte.</p>"
+                "<p>ID de transaction: <code>{deposit_id}</code></p>"
+            ) + _EMAIL_FOOTER["fr"],
+        },
+        "en": {
+            "subject": "KAYICOM - Deposit Received",
+            "html": (
+                "<h2>Deposit Received</h2>"
+                "<p>Hello {full_name},</p>"
+                "<p>Your deposit of <strong>${amount_usd:.2f} USD</strong> from agent <strong>{agent_name}</strong> has been approved and credited to your account.</p>"
+                "<p>Transaction ID: <code>{deposit_id}</code></p>"
+            ) + _EMAIL_FOOTER["en"],
+        },
+    },
+    "kyc_reviewed": {
+        "ht": {
+            "subject": "KAYICOM - Verifikasyon KYC {status_label}",
+            "html": "<h2>Mizajou Verifikasyon KYC</h2><p>Verifikasyon KYC ou a {status_label}.</p>{reason_html}",
+        },
+        "fr": {
+            "subject": "KAYICOM - Vérification KYC {status_label}",
+            "html": "<h2>Mise à jour de la vérification KYC</h2><p>Votre vérification KYC a été {status_label}.</p>{reason_html}",
+        },
+        "en": {
+            "subject": "KAYICOM - KYC Verification {status_label}",
+            "html": "<h2>KYC Verification Update</h2><p>Your KYC verification has been {status_label}.</p>{reason_html}",
+        },
+    },
+    "kyc_reason": {
+        "ht": {"html": "<p>Rezon: {reason}</p>"},
+        "fr": {"html": "<p>Raison: {reason}</p>"},
+        "en": {"html": "<p>Reason: {reason}</p>"},
+    },
+}
 
-async def get_agent_user(current_user: dict = Depends(get_current_user)):
-    """Verify user is an approved agent"""
-    if not current_user.get("is_agent"):
-        raise HTTPException(status_code=403, detail="Agent access required")
-    if current_user.get("kyc_status") != "approved":
-        raise HTTPException(status_code=403, detail="KYC verification required for agents")
-    return current_user
+# Localized words substituted into other templates (e.g. KYC status).
+NOTIFICATION_LABELS: Dict[str, Dict[str, str]] = {
+    "approved": {"ht": "apwouve", "fr": "approuvée", "en": "approved"},
+    "rejected": {"ht": "rejte", "fr": "rejetée", "en": "rejected"},
+}
 
-# ==================== AUTH ROUTES ====================
 
-@api_router.post("/auth/register")
-async def register(user: UserCreate):
-    existing = await db.users.find_one({"email": user.email.lower()}, {"_id": 0})
-    if existing:
-        raise HTTPException(status_code=400, detail="Email already registered")
+class _CompiledTemplate:
+    """A template pre-parsed into (literal, field, format_spec) parts."""
+
+    __slots__ = ("parts",)
+
+    def __init__(self, source: str):
+        from string import Formatter
+
+        self.parts = tuple(
+            (literal, field, spec or "", bool(field) and not field.endswith("_html"))
+            for literal, field, spec, _conv in Formatter().parse(source)
+        )
+
+    def render(self, values: Dict[str, Any]) -> str:
+        from html import escape
+
+        out: List[str] = []
+        for literal, field, spec, escaped in self.parts:
+            out.append(literal)
+            if not field:
+                continue
+            value = values.get(field)
+            if value is None:
+                value = ""
+            try:
+                text = format(value, spec) if spec else str(value)
+            except (TypeError, ValueError):
+                text = str(value)
+            out.append(escape(text, quote=False) if escaped else text)
+        return "".join(out)
+
+
+def _compile_notification_templates() -> Dict[tuple, _CompiledTemplate]:
+    compiled: Dict[tuple, _CompiledTemplate] = {}
+    for event, by_lang in NOTIFICATION_TEMPLATES.items():
+        for lang, channels in by_lang.items():
+            for channel, source in channels.items():
+                compiled[(event, lang, channel)] = _CompiledTemplate(source)
+    return compiled
+
+
+# Rendered output is not cached: values carry names, amounts and one-time reset links.
+_compiled_notification_templates = _compile_notification_templates()
+
+
+def notification_language(user: Optional[dict]) -> str:
+    lang = str((user or {}).get("language") or "").strip().lower()[:2]
+    return lang if lang in NOTIFICATION_LANGUAGES else NOTIFICATION_DEFAULT_LANGUAGE
+
+
+def render_notification(event: str, lang: str, channel: str, **values: Any) -> str:
+    """
+    Render `channel` ("subject" | "html" | "telegram") of `event` in `lang`,
+    falling back to English when a translation is missing.
+    """
+    tpl = _compiled_notification_templates.get((event, lang, channel)) or _compiled_notification_templates.get(
+        (event, NOTIFICATION_DEFAULT_LANGUAGE, channel)
+    )
+    if tpl is None:
+        raise KeyError(f"Unknown notification template: {event}/{lang}/{channel}")
+    return tpl.render(values)
+
+
+def notification_label(key: str, lang: str) -> str:
+    labels = NOTIFICATION_LABELS.get(key) or {}
+    return labels.get(lang) or labels.get(NOTIFICATION_DEFAULT_LANGUAGE) or key
+
+
+async def send_templated_email(to_email: str, event: str, lang: str, **values: Any) -> bool:
+    return await send_email(
+        to_email,
+        render_notification(event, lang, "subject", **values),
+        render_notification(event, lang, "html", **values),
+    )
+
+
+async def notify_admin_event(event: str, **values: Any) -> None:
+    """Admin alert rendered from the template registry (email + Telegram when a Telegram template exists)."""
+    telegram_message = None
+    if (event, NOTIFICATION_DEFAULT_LANGUAGE, "telegram") in _compiled_notification_templates:
+        telegram_message = render_notification(event, NOTIFICATION_DEFAULT_LANGUAGE, "telegram", **values)
+    # Amount used for the high-value (immediate delivery) threshold.
+    if values.get("amount_usd") is not None:
+        amount, currency = values["amount_usd"], "USD"
+    else:
+        amount, currency = values.get("amount"), values.get("currency") or "USD"
+    await notify_admin(
+        subject=render_notification(event, NOTIFICATION_DEFAULT_LANGUAGE, "subject", **values),
+        html=render_notification(event, NOTIFICATION_DEFAULT_LANGUAGE, "html", **values),
+        telegram_message=telegram_message,
+        amount=amount,
+        currency=currency,
+    )
+
+# Default commission tiers (can be overridden in database)
+DEFAULT_COMMISSION_TIERS = [
+    {"min": 5, "max": 19.99, "commission": 1.0, "is_percentage": False},
+    {"min": 20, "max": 39.99, "commission": 1.2, "is_percentage": False},
+    {"min": 40, "max": 99.99, "commission": 1.3, "is_percentage": False},
+    {"min": 100, "max": 199.99, "commission": 1.8, "is_percentage": False},
+    {"min": 200, "max": 299.99, "commission": 3.0, "is_percentage": False},
+    {"min": 300, "max": 399.99, "commission": 4.5, "is_percentage": False},
+    {"min": 400, "max": 499.99, "commission": 5.0, "is_percentage": False},
+    {"min": 500, "max": 599.99, "commission": 6.0, "is_percentage": False},
+    {"min": 600, "max": 1499.99, "commission": 7.0, "is_percentage": False},
+    {"min": 1500, "max": 999999, "commission": 1.0, "is_percentage": True}  # 1%
+]
+
+async def get_commission_tiers():
+    """Get commission tiers from database or return defaults"""
+    settings = await db.agent_settings.find_one({"setting_id": "main"}, {"_id": 0})
+    if settings and settings.get("commission_tiers"):
+        return settings.get("commission_tiers")
+    return DEFAULT_COMMISSION_TIERS
+
+async def calculate_agent_commission_async(amount_usd: float) -> float:
+    """Calculate agent commission based on configurable tiered structure"""
+    if amount_usd < 5:
+        return 0.0
     
-    user_id = str(uuid.uuid4())
-    client_id = generate_client_id()
+    tiers = await get_commission_tiers()
     
-    # Process referral code if provided
-    referred_by = None
-    if user.referral_code:
-        referrer = await db.users.find_one({"affiliate_code": user.referral_code}, {"_id": 0})
-        if referrer:
-            if referrer["user_id"] != user_id:  # Can't refer yourself (though user_id doesn't exist yet, this is a safety check)
-                referred_by = user.referral_code
+    for tier in tiers:
+        if tier["min"] <= amount_usd <= tier["max"]:
+            if tier.get("is_percentage", False):
+                return round(amount_usd * (tier["commission"] / 100), 2)
             else:
-                logger.warning(f"User tried to refer themselves with code {user.referral_code}")
-        else:
-            logger.warning(f"Invalid referral code provided: {user.referral_code}")
-    
-    user_doc = {
-        "user_id": user_id,
-        "client_id": client_id,
-        "email": user.email.lower(),
-        "password_hash": hash_password(user.password),
-        "full_name": user.full_name,
-        "phone": user.phone,
-        "language": user.language,
-        "kyc_status": "pending",
-        "wallet_htg": 0.0,
-        "wallet_usd": 0.0,
-        "affiliate_code": generate_affiliate_code(),
-        "affiliate_earnings": 0.0,
-        "referred_by": referred_by,
-        "is_active": True,
-        "is_admin": False,
-        "two_factor_enabled": False,
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    
-    await db.users.insert_one(user_doc)
-    await log_action(user_id, "register", {"email": user.email, "referred_by": referred_by})
-    
-    token = create_access_token({"sub": user_id})
-    
-    del user_doc["password_hash"]
-    if "_id" in user_doc:
-        del user_doc["_id"]
+                return tier["commission"]
     
-    return {"token": token, "user": user_doc}
+    # Fallback: 1% for any amount not covered
+    return round(amount_usd * 0.01, 2)
 
-@api_router.post("/auth/login")
-async def login(credentials: UserLogin):
-    user = await db.users.find_one({"email": credentials.email.lower()}, {"_id": 0})
-    if not user or not verify_password(credentials.password, user["password_hash"]):
-        raise HTTPException(status_code=401, detail="Invalid credentials")
-    
-    if not user.get("is_active", True):
-        raise HTTPException(status_code=403, detail="Account is suspended")
-    
-    await log_action(user["user_id"], "login", {"email": credentials.email})
-    
-    token = create_access_token({"sub": user["user_id"]})
+def calculate_agent_commission_sync(amount_usd: float, tiers: list) -> float:
+    """Synchronous version for use when tiers are already loaded"""
+    if amount_usd < 5:
+        return 0.0
     
-    user_response = {k: v for k, v in user.items() if k != "password_hash"}
+    for tier in tiers:
+        if tier["min"] <= amount_usd <= tier["max"]:
+            if tier.get("is_percentage", False):
+                return round(amount_usd * (tier["commission"] / 100), 2)
+            else:
+                return tier["commission"]
     
-    return {"token": token, "user": user_response}
+    return round(amount_usd * 0.01, 2)
 
-@api_router.post("/auth/forgot-password")
-async def forgot_password(request: PasswordReset):
-    user = await db.users.find_one({"email": request.email.lower()}, {"_id": 0})
-    if not user:
-        return {"message": "If email exists, reset link will be sent"}
-    
-    reset_token = secrets.token_urlsafe(32)
-    expires = datetime.now(timezone.utc) + timedelta(hours=1)
-    
-    await db.password_resets.insert_one({
-        "token": reset_token,
-        "user_id": user["user_id"],
-        "expires": expires.isoformat(),
-        "used": False
-    })
-    
-    reset_link = f"{os.environ.get('FRONTEND_URL', 'https://wallet.kayicom.com')}/reset-password?token={reset_token}"
-    
-    await send_email(
-        request.email,
-        "KAYICOM - Réinitialisation du mot de passe",
-        f"""
-        <h2>Réinitialisation de votre mot de passe</h2>
-        <p>Cliquez sur le lien ci-dessous pour réinitialiser votre mot de passe:</p>
-        <a href="{reset_link}">Réinitialiser le mot de passe</a>
-        <p>Ce lien expire dans 1 heure.</p>
-        """
-    )
-    
-    return {"message": "If email exists, reset link will be sent"}
+def calculate_tiered_fee(amount: float, tiers: list) -> float:
+    """Calculate a tiered fee (fixed or percentage) based on amount."""
+    try:
+        amt = float(amount)
+    except Exception:
+        return 0.0
+    if amt <= 0:
+        return 0.0
 
-@api_router.post("/auth/reset-password")
-async def reset_password(request: PasswordResetConfirm):
-    reset_doc = await db.password_resets.find_one({"token": request.token, "used": False}, {"_id": 0})
-    if not reset_doc:
-        raise HTTPException(status_code=400, detail="Invalid or expired reset token")
-    
-    if datetime.fromisoformat(reset_doc["expires"]) < datetime.now(timezone.utc):
-        raise HTTPException(status_code=400, detail="Reset token has expired")
+    for tier in tiers or []:
+        try:
+            min_a = float(tier.get("min_amount", 0))
+            max_a = float(tier.get("max_amount", 0))
+            fee_v = float(tier.get("fee_value", 0))
+            is_pct = bool(tier.get("is_percentage", False))
+        except Exception:
+            continue
+
+        if min_a <= amt <= max_a:
+            if is_pct:
+                return round(amt * (fee_v / 100.0), 2)
+            return round(fee_v, 2)
+
+    return 0.0
+
+async def get_commission_tier_label(amount_usd: float) -> str:
+    """Get the commission tier description for display"""
+    if amount_usd < 5:
+        return "Pa kalifye (minimòm $5)"
     
-    await db.users.update_one(
-        {"user_id": reset_doc["user_id"]},
-        {"$set": {"password_hash": hash_password(request.new_password)}}
-    )
+    tiers = await get_commission_tiers()
     
-    await db.password_resets.update_one({"token": request.token}, {"$set": {"used": True}})
-    await log_action(reset_doc["user_id"], "password_reset", {})
+    for tier in tiers:
+        if tier["min"] <= amount_usd <= tier["max"]:
+            if tier.get("is_percentage", False):
+                return f"${tier['min']}+ → {tier['commission']}%"
+            else:
+                return f"${tier['min']}-${tier['max']:.0f} → ${tier['commission']}"
     
-    return {"message": "Password reset successfully"}
+    return "1%"
+
+async def get_agent_user(current_user: dict = Depends(get_current_user)):
+    """Verify user is an approved agent"""
+    if not current_user.get("is_agent"):
+        raise HTTPException(status_code=403, detail="Agent access required")
+    if current_user.get("kyc_status") != "approved":
+        raise HTTPException(status_code=403, detail="KYC verification required for agents")
+    return current_user
+
+# ==================== AUTH ROUTES ====================
+# /auth/* is served by kayicom_core.routers.auth, mounted at the bottom of this file.
 
-@api_router.get("/auth/me", response_model=UserResponse)
-async def get_me(current_user: dict = Depends(get_current_user)):
-    return UserResponse(**current_user)
+async def send_password_reset_email(user: dict, token: str) -> None:
+    """Password reset link for the shared /auth/forgot-password route."""
+    reset_link = f"{os.environ.get('FRONTEND_URL', 'https://wallet.kayicom.com')}/reset-password?token={token}"
+    await send_templated_email(user["email"], "password_reset", notification_language(user), reset_link=reset_link)
 
 @api_router.patch("/profile")
 async def update_profile(
@@ -2030,7 +3507,7 @@ async def admin_update_profile(
     update: AdminProfileUpdate,
     admin: dict = Depends(get_admin_user)
 ):
-    role = _normalize_admin_role(admin)
+    role = rbac.normalize_admin_role(admin)
     if role != "superadmin":
         raise HTTPException(status_code=403, detail="Only superadmin can update admin profile")
 
@@ -2083,113 +3560,8 @@ async def generate_telegram_activation_code(current_user: dict = Depends(get_cur
 @api_router.post("/telegram/webhook")
 async def telegram_webhook(request: dict):
     """Webhook endpoint for Telegram bot to receive updates"""
-    import httpx
-    
     try:
-        # Get update from Telegram
-        if "message" not in request:
-            return {"ok": True}
-        
-        message = request["message"]
-        chat_id = str(message["chat"]["id"])
-        text = message.get("text", "").strip()
-        
-        # Check if it's a /start command with activation code
-        if text.startswith("/start"):
-            parts = text.split()
-            activation_code = parts[1] if len(parts) > 1 else None
-            
-            if activation_code:
-                # Find activation code in database
-                activation = await db.telegram_activations.find_one(
-                    {
-                        "activation_code": activation_code.upper(),
-                        "used": False
-                    },
-                    {"_id": 0}
-                )
-                
-                if activation:
-                    # Check if expired
-                    expires_at = datetime.fromisoformat(activation["expires_at"])
-                    if datetime.now(timezone.utc) > expires_at:
-                        # Send expired message
-                        settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
-                        bot_token = settings.get("telegram_bot_token") if settings else None
-                        
-                        if bot_token:
-                            async with httpx.AsyncClient() as client:
-                                await client.post(
-                                    f"https://api.telegram.org/bot{bot_token}/sendMessage",
-                                    json={
-                                        "chat_id": chat_id,
-                                        "text": "❌ Activation code has expired. Please generate a new one from your account settings."
-                                    }
-                                )
-                        return {"ok": True}
-                    
-                    # Update user with chat_id
-                    await db.users.update_one(
-                        {"user_id": activation["user_id"]},
-                        {"$set": {"telegram_chat_id": chat_id}}
-                    )
-                    
-                    # Mark activation as used
-                    await db.telegram_activations.update_one(
-                        {"activation_code": activation_code.upper()},
-                        {"$set": {"used": True, "activated_at": datetime.now(timezone.utc).isoformat()}}
-                    )
-                    
-                    # Get user info
-                    user = await db.users.find_one({"user_id": activation["user_id"]}, {"_id": 0, "full_name": 1, "client_id": 1})
-                    
-                    # Send success message
-                    settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
-                    bot_token = settings.get("telegram_bot_token") if settings else None
-                    
-                    if bot_token:
-                        user_name = user.get("full_name", "User") if user else "User"
-                        client_id = user.get("client_id", "") if user else ""
-                        async with httpx.AsyncClient() as client:
-                            await client.post(
-                                f"https://api.telegram.org/bot{bot_token}/sendMessage",
-                                json={
-                                    "chat_id": chat_id,
-                                    "text": f"✅ <b>Telegram Notifications Activated!</b>\n\nHello {user_name}!\n\nYour Telegram notifications have been successfully activated. You will now receive notifications for:\n• Agent deposit approvals\n• Transaction updates\n\nYour Client ID: <code>{client_id}</code>\n\nThank you for using KAYICOM! 🎉",
-                                    "parse_mode": "HTML"
-                                }
-                            )
-                    
-                    await log_action(activation["user_id"], "telegram_activated", {"chat_id": chat_id})
-                else:
-                    # Invalid activation code
-                    settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
-                    bot_token = settings.get("telegram_bot_token") if settings else None
-                    
-                    if bot_token:
-                        async with httpx.AsyncClient() as client:
-                            await client.post(
-                                f"https://api.telegram.org/bot{bot_token}/sendMessage",
-                                json={
-                                    "chat_id": chat_id,
-                                    "text": "❌ Invalid activation code. Please check your code and try again, or generate a new one from your account settings."
-                                }
-                            )
-            else:
-                # /start without code - send instructions
-                settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
-                bot_token = settings.get("telegram_bot_token") if settings else None
-                
-                if bot_token:
-                    async with httpx.AsyncClient() as client:
-                        await client.post(
-                            f"https://api.telegram.org/bot{bot_token}/sendMessage",
-                            json={
-                                "chat_id": chat_id,
-                                "text": "👋 Welcome to KAYICOM Telegram Notifications!\n\nTo activate notifications:\n1. Go to your account settings\n2. Click 'Activate Telegram'\n3. Send /start YOUR_CODE to this bot\n\nExample: /start ABC12345"
-                            }
-                        )
-        
+        await telegram_handle_updates([request])
         return {"ok": True}
     except Exception as e:
         logger.error(f"Telegram webhook error: {e}")
@@ -2229,7 +3601,7 @@ async def get_balance(current_user: dict = Depends(get_current_user)):
         "wallet_usd": current_user["wallet_usd"]
     }
 
-@api_router.get("/wallet/transactions")
+@api_router.get("/wallet/transactions", response_model=TransactionsPage)
 async def get_transactions(
     currency: Optional[str] = None,
     transaction_type: Optional[str] = None,
@@ -2243,14 +3615,583 @@ async def get_transactions(
         query["type"] = transaction_type
     
     transactions = await db.transactions.find(query, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(limit)
-    return {"transactions": transactions}
+    return model_response(TransactionsPage, transactions=transactions)
+
+# ==================== ACCOUNT STATEMENTS ====================
+# Statements stream straight from `transactions` cursors (hot + archive partitions, merged in
+# order), so memory stays flat however long the range is. Opening/closing balances come from
+# `balance_snapshots`: one row per user per UTC day, taken shortly after midnight by
+# `_balance_snapshot_loop`. PDFs are rendered by `pdf_render` in a process pool (reportlab is
+# CPU-bound) from a spooled temp file.
+
+STATEMENT_MAX_DAYS = int(os.environ.get("STATEMENT_MAX_DAYS", "366"))
+STATEMENT_CURSOR_BATCH = 500
+STATEMENT_CHUNK_BYTES = 64 * 1024
+BALANCE_SNAPSHOT_CHECK_SECONDS = 900
+BALANCE_SNAPSHOT_BATCH = 1000
+PDF_RENDER_WORKERS = int(os.environ.get("PDF_RENDER_WORKERS", "2"))
+STATEMENT_COLUMNS = ["date", "transaction_id", "type", "description", "currency", "amount", "status", "reference_id"]
+_STATEMENT_PROJECTION = {
+    "_id": 0, "created_at": 1, "transaction_id": 1, "type": 1, "description": 1,
+    "currency": 1, "amount": 1, "status": 1, "reference_id": 1,
+}
+_pdf_executor: Optional[ProcessPoolExecutor] = None
 
-# ==================== DEPOSIT ROUTES ====================
 
-@api_router.post("/deposits/create")
-async def create_deposit(request: DepositRequest, current_user: dict = Depends(get_current_user)):
-    if current_user["kyc_status"] != "approved":
-        raise HTTPException(status_code=403, detail="KYC verification required for deposits")
+def _pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_executor
+    if _pdf_executor is None:
+        # spawn: workers import only pdf_render, never a forked copy of the event loop / Mongo client.
+        _pdf_executor = ProcessPoolExecutor(
+            max_workers=PDF_RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pdf_executor
+
+
+async def run_pdf_render(fn: Callable[..., Any], *args: Any) -> Any:
+    """Run a pdf_render function in the PDF process pool."""
+    return await asyncio.get_running_loop().run_in_executor(_pdf_pool(), fn, *args)
+
+
+def shutdown_pdf_pool() -> None:
+    global _pdf_executor
+    if _pdf_executor is not None:
+        _pdf_executor.shutdown(wait=False, cancel_futures=True)
+        _pdf_executor = None
+
+
+def _parse_export_range(start: str, end: str, max_days: int) -> tuple:
+    """
+    Parse an inclusive YYYY-MM-DD (or ISO datetime) range.
+    Returns (start_dt, end_dt_exclusive) in UTC.
+    """
+    def parse(value: str, field: str) -> datetime:
+        try:
+            dt = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        except (AttributeError, ValueError):
+            raise HTTPException(status_code=400, detail=f"Invalid {field} date")
+        return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+    start_dt = parse(start, "start")
+    end_dt = parse(end, "end")
+    if len(end.strip()) <= 10:
+        end_dt += timedelta(days=1)  # a bare date includes the whole day
+    if end_dt <= start_dt:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if end_dt - start_dt > timedelta(days=max_days):
+        raise HTTPException(status_code=400, detail=f"Range cannot exceed {max_days} days")
+    return start_dt, end_dt
+
+
+async def take_balance_snapshots(as_of: str) -> int:
+    """Record every user's wallet balances for the UTC day `as_of` (idempotent)."""
+    taken_at = datetime.now(timezone.utc).isoformat()
+    ops: List[UpdateOne] = []
+    count = 0
+    cursor = db.users.find(
+        {}, {"_id": 0, "user_id": 1, "wallet_htg": 1, "wallet_usd": 1}
+    ).batch_size(BALANCE_SNAPSHOT_BATCH)
+    async for user in cursor:
+        ops.append(UpdateOne(
+            {"user_id": user["user_id"], "as_of": as_of},
+            {"$setOnInsert": {
+                "wallet_htg": float(user.get("wallet_htg") or 0),
+                "wallet_usd": float(user.get("wallet_usd") or 0),
+                "taken_at": taken_at,
+            }},
+            upsert=True,
+        ))
+        if len(ops) >= BALANCE_SNAPSHOT_BATCH:
+            await db.balance_snapshots.bulk_write(ops, ordered=False)
+            count += len(ops)
+            ops = []
+    if ops:
+        await db.balance_snapshots.bulk_write(ops, ordered=False)
+        count += len(ops)
+    await db.balance_snapshot_runs.update_one(
+        {"as_of": as_of},
+        {"$set": {"completed_at": datetime.now(timezone.utc).isoformat(), "users": count}},
+        upsert=True,
+    )
+    return count
+
+
+async def _balance_snapshot_loop() -> None:
+    owner = str(uuid.uuid4())
+    while True:
+        try:
+            as_of = datetime.now(timezone.utc).date().isoformat()
+            if not await db.balance_snapshot_runs.find_one({"as_of": as_of, "completed_at": {"$ne": None}}, {"_id": 1}):
+                if await acquire_worker_lease("balance_snapshots", owner, BALANCE_SNAPSHOT_CHECK_SECONDS * 2):
+                    count = await take_balance_snapshots(as_of)
+                    logger.info(f"Balance snapshots for {as_of}: {count} users")
+        except Exception as e:
+            logger.error(f"Balance snapshot loop error: {e}")
+        try:
+            # Per process (each one has its own receipt cache), so outside the lease.
+            removed = await asyncio.to_thread(prune_receipt_cache)
+            if removed:
+                logger.info(f"Receipt cache: evicted {removed} files")
+        except Exception as e:
+            logger.error(f"Receipt cache prune error: {e}")
+        await asyncio.sleep(BALANCE_SNAPSHOT_CHECK_SECONDS)
+
+
+async def _ledger_net(user_id: str, start_iso: str, end_iso: str) -> Dict[str, float]:
+    """Net of the user's completed ledger rows in [start_iso, end_iso), per currency."""
+    query = {"user_id": user_id, "status": "completed", "created_at": {"$gte": start_iso, "$lt": end_iso}}
+    hot, *archived = await archive_range_collections("transactions", query)
+    rows = await db[hot].aggregate([
+        {"$match": query},
+        *({"$unionWith": {"coll": name, "pipeline": [{"$match": query}]}} for name in archived),
+        {"$group": {"_id": "$currency", "net": {"$sum": "$amount"}}},
+    ]).to_list(None)
+    return {r["_id"]: float(r["net"] or 0) for r in rows}
+
+
+async def _snapshot_at_day_start(user_id: str, snapshot: Optional[dict]) -> Optional[dict]:
+    """
+    A snapshot is taken at `taken_at`, some time after midnight of its `as_of` day; back out the rows
+    booked in between so it is the balance at 00:00 UTC, where the statement range starts or ends.
+    """
+    if not snapshot or not snapshot.get("taken_at"):
+        return snapshot
+    day_start = datetime.fromisoformat(snapshot["as_of"]).replace(tzinfo=timezone.utc).isoformat()
+    net = await _ledger_net(user_id, day_start, snapshot["taken_at"])
+    return {
+        "as_of": snapshot["as_of"],
+        "wallet_htg": round(float(snapshot.get("wallet_htg") or 0) - net.get("HTG", 0.0), 2),
+        "wallet_usd": round(float(snapshot.get("wallet_usd") or 0) - net.get("USD", 0.0), 2),
+    }
+
+
+async def _statement_balances(user: dict, start_dt: datetime, end_dt: datetime) -> Dict[str, Optional[dict]]:
+    """Opening balance = snapshot for the first day; closing = snapshot for the day after the range (or live)."""
+    projection = {"_id": 0, "as_of": 1, "wallet_htg": 1, "wallet_usd": 1, "taken_at": 1}
+    opening = await _snapshot_at_day_start(user["user_id"], await db.balance_snapshots.find_one(
+        {"user_id": user["user_id"], "as_of": start_dt.date().isoformat()}, projection
+    ))
+    now = datetime.now(timezone.utc)
+    closing = None
+    if end_dt <= now:
+        closing = await _snapshot_at_day_start(user["user_id"], await db.balance_snapshots.find_one(
+            {"user_id": user["user_id"], "as_of": end_dt.date().isoformat()}, projection
+        ))
+    if closing is None and end_dt.date() >= now.date():
+        # Range reaches today (or today's snapshot is not taken yet): the live wallet is the closing balance.
+        closing = {
+            "as_of": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "wallet_htg": float(user.get("wallet_htg") or 0),
+            "wallet_usd": float(user.get("wallet_usd") or 0),
+        }
+    return {"opening": opening, "closing": closing}
+
+
+async def _merge_sorted(key: Callable[[dict], Any], *sources, reverse: bool = False):
+    """Merge async iterators that are each already sorted by `key` (descending when `reverse`)."""
+    heads = []
+    for i, source in enumerate(sources):
+        it = source.__aiter__()
+        try:
+            item = await it.__anext__()
+        except StopAsyncIteration:
+            continue
+        heads.append([key(item), i, item, it])
+    while heads:
+        if reverse:
+            head = max(heads, key=lambda h: (h[0], -h[1]))
+        else:
+            head = min(heads, key=lambda h: (h[0], h[1]))
+        yield head[2]
+        try:
+            head[2] = await head[3].__anext__()
+            head[0] = key(head[2])
+        except StopAsyncIteration:
+            heads.remove(head)
+
+
+def statement_transactions(query: dict):
+    """
+    Ledger rows matching `query` (which must carry a created_at $gte/$lt range) in created_at order,
+    across the hot `transactions` collection and any archive partitions overlapping the range.
+    """
+    return archive_find_range("transactions", query, _STATEMENT_PROJECTION)
+
+
+def _statement_row(tx: dict) -> List[Any]:
+    return [
+        tx.get("created_at") or "",
+        tx.get("transaction_id") or "",
+        tx.get("type") or "",
+        tx.get("description") or "",
+        tx.get("currency") or "",
+        tx.get("amount") or 0,
+        tx.get("status") or "",
+        tx.get("reference_id") or "",
+    ]
+
+
+def _statement_tally(totals: Dict[str, Dict[str, Any]], tx: dict) -> None:
+    if tx.get("status") != "completed":
+        return
+    t = totals.setdefault(tx.get("currency") or "", {"credits": 0.0, "debits": 0.0, "count": 0})
+    amount = float(tx.get("amount") or 0)
+    if amount >= 0:
+        t["credits"] += amount
+    else:
+        t["debits"] += -amount
+    t["count"] += 1
+
+
+def _balance_cells(balances: Optional[dict]) -> List[Any]:
+    if not balances:
+        return ["n/a", "", ""]
+    return [balances.get("as_of"), balances.get("wallet_htg"), balances.get("wallet_usd")]
+
+
+async def _statement_csv_stream(query: dict, header: Dict[str, Any]):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["statement", header["client_id"], header["start"], header["end"]])
+    writer.writerow(["opening_balance_as_of", "wallet_htg", "wallet_usd"])
+    writer.writerow(_balance_cells(header["opening"]))
+    writer.writerow([])
+    writer.writerow(STATEMENT_COLUMNS)
+    totals: Dict[str, Dict[str, Any]] = {}
+    async for tx in statement_transactions(query):
+        writer.writerow(_statement_row(tx))
+        _statement_tally(totals, tx)
+        if buf.tell() >= STATEMENT_CHUNK_BYTES:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    writer.writerow([])
+    writer.writerow(["currency", "completed_credits", "completed_debits", "completed_count"])
+    for currency, t in sorted(totals.items()):
+        writer.writerow([currency, round(t["credits"], 2), round(t["debits"], 2), t["count"]])
+    writer.writerow(["closing_balance_as_of", "wallet_htg", "wallet_usd"])
+    writer.writerow(_balance_cells(header["closing"]))
+    yield buf.getvalue()
+
+
+async def _statement_pdf_file(query: dict, header: Dict[str, Any]) -> tuple:
+    """Spool rows to a temp CSV, render the PDF in the process pool. Returns (pdf_path, tmp_dir)."""
+    tmp_dir = tempfile.mkdtemp(prefix="statement-")
+    try:
+        rows_path = os.path.join(tmp_dir, "rows.csv")
+        totals: Dict[str, Dict[str, Any]] = {}
+        with open(rows_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["date", "type", "description", "currency", "amount", "status"])
+            async for tx in statement_transactions(query):
+                writer.writerow([
+                    (tx.get("created_at") or "")[:16].replace("T", " "),
+                    tx.get("type") or "",
+                    tx.get("description") or "",
+                    tx.get("currency") or "",
+                    tx.get("amount") or 0,
+                    tx.get("status") or "",
+                ])
+                _statement_tally(totals, tx)
+        pdf_path = os.path.join(tmp_dir, "statement.pdf")
+        await run_pdf_render(pdf_render.render_statement_pdf, rows_path, pdf_path, {**header, "totals": totals})
+        return pdf_path, tmp_dir
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+@api_router.get("/wallet/statement")
+async def get_wallet_statement(
+    start: str,
+    end: str,
+    format: Literal["csv", "pdf"] = "csv",
+    currency: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Account statement for [start, end] (YYYY-MM-DD, inclusive) as a streamed CSV or PDF download."""
+    start_dt, end_dt = _parse_export_range(start, end, STATEMENT_MAX_DAYS)
+    query: Dict[str, Any] = {
+        "user_id": current_user["user_id"],
+        "created_at": {"$gte": start_dt.isoformat(), "$lt": end_dt.isoformat()},
+    }
+    if currency:
+        query["currency"] = currency.upper()
+
+    balances = await _statement_balances(current_user, start_dt, end_dt)
+    header = {
+        "full_name": current_user.get("full_name"),
+        "client_id": current_user.get("client_id"),
+        "start": start_dt.date().isoformat(),
+        "end": (end_dt - timedelta(seconds=1)).date().isoformat(),
+        **balances,
+    }
+    filename = f"statement-{header['client_id']}-{header['start']}-{header['end']}.{format}"
+    disposition = {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+    if format == "pdf":
+        pdf_path, tmp_dir = await _statement_pdf_file(query, header)
+        return FileResponse(
+            pdf_path,
+            media_type="application/pdf",
+            headers=disposition,
+            background=BackgroundTask(shutil.rmtree, tmp_dir, ignore_errors=True),
+        )
+    return StreamingResponse(_statement_csv_stream(query, header), media_type="text/csv", headers=disposition)
+
+# ==================== RECEIPTS ====================
+# PDF receipts for deposits, withdrawals, transfers, card top-ups and agent deposits. The receipt
+# data is hashed together with pdf_render.RECEIPT_TEMPLATE_VERSION; the rendered PDF is cached on
+# disk under that hash, so repeat downloads are a FileResponse (sendfile) with no rendering.
+# Receipts only contain settled fields, so a status change produces a new hash / new file.
+# The cache directory is private (0700: receipts carry names and amounts) and is pruned by the
+# balance snapshot loop: files not served for RECEIPT_CACHE_MAX_AGE_HOURS go first, then the
+# least recently served until the directory is under RECEIPT_CACHE_MAX_MB.
+
+RECEIPT_CACHE_DIR = Path(os.environ.get("RECEIPT_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "kayicom-receipts"))
+RECEIPT_CACHE_MAX_AGE_HOURS = float(os.environ.get("RECEIPT_CACHE_MAX_AGE_HOURS") or 24)
+RECEIPT_CACHE_MAX_MB = float(os.environ.get("RECEIPT_CACHE_MAX_MB") or 200)
+RECEIPT_BUNDLE_MAX = 500
+_receipt_renders: Dict[str, asyncio.Task] = {}
+
+
+def _receipt_cache_dir() -> Path:
+    RECEIPT_CACHE_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if RECEIPT_CACHE_DIR.stat().st_mode & 0o077:
+        RECEIPT_CACHE_DIR.chmod(0o700)  # created by an older version, or by mkdir under a loose umask
+    return RECEIPT_CACHE_DIR
+
+
+def prune_receipt_cache() -> int:
+    """Evict cached receipt PDFs by age, then by total size (see section comment). Returns files removed."""
+    import time
+
+    if not RECEIPT_CACHE_DIR.is_dir():
+        return 0
+    now = time.time()
+    max_age = RECEIPT_CACHE_MAX_AGE_HOURS * 3600
+    files = []
+    for path in RECEIPT_CACHE_DIR.iterdir():
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        files.append((st.st_mtime, st.st_size, path))
+    files.sort()  # least recently served first
+    budget = RECEIPT_CACHE_MAX_MB * 1024 * 1024
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for mtime, size, path in files:
+        if now - mtime <= max_age:
+            if total <= budget:
+                break
+            if path.suffix == ".tmp":
+                continue  # a render in progress
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def _receipt_person(name: Optional[str], client_id: Optional[str]) -> str:
+    return f"{name or ''} ({client_id})".strip() if client_id else (name or "")
+
+
+def _receipt_from_agent_deposit(d: dict, viewer_id: str) -> Dict[str, Any]:
+    receipt = {
+        "kind": "agent_deposit",
+        "reference_id": d["deposit_id"],
+        "created_at": d.get("created_at"),
+        "agent": _receipt_person(d.get("agent_name"), d.get("agent_client_id")),
+        "customer": _receipt_person(d.get("client_name"), d.get("client_id")),
+        "amount": d.get("amount_usd"),
+        "amount_htg_received": d.get("amount_htg_received"),
+        "currency": "USD",
+        "status": d.get("status"),
+        "processed_at": d.get("processed_at"),
+    }
+    # The commission is the agent's business, not the client's.
+    if d.get("agent_id") == viewer_id:
+        receipt["commission"] = d.get("commission_usd")
+    return receipt
+
+
+async def _resolve_receipt(reference_id: str, user: dict) -> Optional[Dict[str, Any]]:
+    uid = user["user_id"]
+    customer = _receipt_person(user.get("full_name"), user.get("client_id"))
+    deposit, withdrawal, topup, agent_deposit, transfer = await asyncio.gather(
+        db.deposits.find_one({"deposit_id": reference_id, "user_id": uid}, {"_id": 0}),
+        db.withdrawals.find_one({"withdrawal_id": reference_id, "user_id": uid}, {"_id": 0, "field_values": 0}),
+        db.virtual_card_deposits.find_one({"deposit_id": reference_id, "user_id": uid}, {"_id": 0}),
+        db.agent_deposits.find_one(
+            {"deposit_id": reference_id, "$or": [{"client_user_id": uid}, {"agent_id": uid}]},
+            {"_id": 0, "proof_image": 0},
+        ),
+        db.transactions.find_one(
+            {"reference_id": reference_id, "user_id": uid, "type": {"$in": ["transfer_in", "transfer_out"]}},
+            {"_id": 0},
+        ),
+    )
+    if not (deposit or withdrawal or topup or agent_deposit or transfer):
+        # Settled records may already have been moved to the archive tier.
+        deposit = await archive_find_one("deposits", reference_id, {"user_id": uid})
+        if not deposit:
+            withdrawal = await archive_find_one("withdrawals", reference_id, {"user_id": uid}, {"_id": 0, "field_values": 0})
+        if not (deposit or withdrawal):
+            agent_deposit = await archive_find_one(
+                "agent_deposits", reference_id,
+                {"$or": [{"client_user_id": uid}, {"agent_id": uid}]}, {"_id": 0, "proof_image": 0},
+            )
+    if deposit:
+        return {
+            "kind": "deposit",
+            "reference_id": reference_id,
+            "created_at": deposit.get("created_at"),
+            "customer": customer,
+            "method": deposit.get("payment_method_name") or deposit.get("method"),
+            "amount": deposit.get("amount"),
+            "fee": deposit.get("fee", 0),
+            "net_amount": deposit.get("net_amount", deposit.get("amount")),
+            "currency": deposit.get("currency"),
+            "status": deposit.get("status"),
+            "processed_at": deposit.get("processed_at"),
+        }
+    if withdrawal:
+        return {
+            "kind": "withdrawal",
+            "reference_id": reference_id,
+            "created_at": withdrawal.get("created_at"),
+            "customer": customer,
+            "method": withdrawal.get("payment_method_name") or withdrawal.get("method"),
+            "amount": withdrawal.get("amount"),
+            "fee": withdrawal.get("fee", 0),
+            "amount_deducted": withdrawal.get("amount_deducted", withdrawal.get("amount")),
+            "currency": withdrawal.get("currency"),
+            "status": withdrawal.get("status"),
+            "processed_at": withdrawal.get("processed_at"),
+        }
+    if topup:
+        card = " ".join(x for x in (topup.get("card_brand"), f"**** {topup['card_last4']}" if topup.get("card_last4") else None) if x)
+        return {
+            "kind": "card_topup",
+            "reference_id": reference_id,
+            "created_at": topup.get("created_at"),
+            "customer": customer,
+            "card": card or topup.get("card_email"),
+            "amount": topup.get("amount"),
+            "fee": topup.get("fee", 0),
+            "total_amount": topup.get("total_amount"),
+            "currency": "USD",
+            "status": topup.get("status"),
+            "processed_at": topup.get("processed_at"),
+        }
+    if agent_deposit:
+        return _receipt_from_agent_deposit(agent_deposit, uid)
+    if transfer:
+        return {
+            "kind": "transfer",
+            "reference_id": reference_id,
+            "created_at": transfer.get("created_at"),
+            "customer": customer,
+            "description": transfer.get("description"),
+            "amount": abs(float(transfer.get("amount") or 0)),
+            "fee": transfer.get("fee", 0),
+            "currency": transfer.get("currency"),
+            "status": transfer.get("status"),
+        }
+    return None
+
+
+def _receipt_key(receipts: List[Dict[str, Any]]) -> str:
+    payload = json.dumps(
+        {"v": pdf_render.RECEIPT_TEMPLATE_VERSION, "receipts": receipts}, sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def _receipt_render(receipts: List[Dict[str, Any]], path: Path) -> None:
+    _receipt_cache_dir()
+    tmp = path.with_name(f"{path.stem}.{uuid.uuid4().hex}.tmp")
+    try:
+        await run_pdf_render(pdf_render.render_receipts_pdf, receipts, str(tmp))
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+async def receipt_pdf_path(receipts: List[Dict[str, Any]]) -> Path:
+    """Return the cached PDF for these receipts, rendering it (once, even under concurrent requests) if needed."""
+    key = _receipt_key(receipts)
+    path = RECEIPT_CACHE_DIR / f"{key}.pdf"
+    try:
+        os.utime(path)  # a hit: mark it recently served for prune_receipt_cache()
+        return path
+    except FileNotFoundError:
+        pass
+    task = _receipt_renders.get(key)
+    if task is None:
+        task = asyncio.create_task(_receipt_render(receipts, path))
+        _receipt_renders[key] = task
+        task.add_done_callback(lambda _t, key=key: _receipt_renders.pop(key, None))
+    await asyncio.shield(task)
+    return path
+
+
+def _receipt_response(path: Path, filename: str) -> FileResponse:
+    return FileResponse(
+        path,
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f'inline; filename="{filename}"',
+            "Cache-Control": "private, max-age=3600",
+        },
+    )
+
+
+@api_router.get("/receipts/{reference_id}.pdf")
+async def get_receipt_pdf(reference_id: str, current_user: dict = Depends(get_current_user)):
+    receipt = await _resolve_receipt(reference_id, current_user)
+    if not receipt:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+    path = await receipt_pdf_path([receipt])
+    return _receipt_response(path, f"receipt-{reference_id}.pdf")
+
+
+@api_router.get("/agent/receipts/bundle")
+async def agent_receipts_bundle(
+    date: Optional[str] = None,
+    status: Optional[str] = "approved",
+    current_user: dict = Depends(get_agent_user)
+):
+    """End-of-day bundle: one PDF with a receipt page per agent deposit of the given UTC day (default: today)."""
+    day = date or datetime.now(timezone.utc).date().isoformat()
+    start_dt, end_dt = _parse_export_range(day, day, 1)
+    query: Dict[str, Any] = {
+        "agent_id": current_user["user_id"],
+        "created_at": {"$gte": start_dt.isoformat(), "$lt": end_dt.isoformat()},
+    }
+    if status:
+        query["status"] = status
+    deposits = [
+        d async for d in archive_find_range(
+            "agent_deposits", query, {"_id": 0, "proof_image": 0}, limit=RECEIPT_BUNDLE_MAX
+        )
+    ]
+    if not deposits:
+        raise HTTPException(status_code=404, detail="No deposits for this day")
+    path = await receipt_pdf_path([_receipt_from_agent_deposit(d, current_user["user_id"]) for d in deposits])
+    return _receipt_response(path, f"agent-receipts-{start_dt.date().isoformat()}.pdf")
+
+# ==================== DEPOSIT ROUTES ====================
+
+@api_router.post("/deposits/create")
+async def create_deposit(request: DepositRequest, current_user: dict = Depends(get_current_user)):
+    if current_user["kyc_status"] != "approved":
+        raise HTTPException(status_code=403, detail="KYC verification required for deposits")
 
     currency = request.currency.upper()
     if currency not in ["HTG", "USD"]:
@@ -2391,13 +4332,18 @@ async def create_deposit(request: DepositRequest, current_user: dict = Depends(g
             params: Dict[str, Any] = {"api_key": plisio_key, **payload}
             if extra_params:
                 params.update(extra_params)
-            async with httpx.AsyncClient() as client_http:
-                return await client_http.get(
-                    "https://plisio.net/api/v1/invoices/new",
-                    params=params,
-                    headers={"Accept": "application/json"},
-                    timeout=30.0,
-                )
+            # invoices/new creates an invoice: fixed write timeout, not the adaptive read timeout.
+            async with provider_guard("plisio").attempt(timeout=PROVIDER_WRITE_TIMEOUT_SECONDS) as att:
+                async with httpx.AsyncClient() as client_http:
+                    resp = await client_http.get(
+                        f"{PLISIO_API_BASE}/invoices/new",
+                        params=params,
+                        headers={"Accept": "application/json"},
+                        timeout=att.timeout,
+                    )
+                if resp.status_code >= 500:
+                    att.fail()
+                return resp
 
         try:
             resp = await _create_invoice()
@@ -2456,6 +4402,7 @@ async def create_deposit(request: DepositRequest, current_user: dict = Depends(g
             deposit["plisio_invoice_id"] = invoice_data.get("txn_id") or invoice_data.get("id") or invoice_data.get("invoice_id")
             deposit["plisio_invoice_url"] = invoice_data.get("invoice_url") or invoice_data.get("url")
             deposit["plisio_currency"] = plisio_currency
+            deposit["plisio_next_check_at"] = (datetime.now(timezone.utc) + timedelta(seconds=PLISIO_RECONCILE_FIRST_CHECK_SECONDS)).isoformat()
         except HTTPException:
             raise
         except Exception as e:
@@ -2466,27 +4413,16 @@ async def create_deposit(request: DepositRequest, current_user: dict = Depends(g
 
     # Notify admins (email + telegram)
     try:
-        await notify_admin(
-            subject="KAYICOM - New Deposit Request",
-            html=f"""
-            <h2>New Deposit Request</h2>
-            <p><strong>Client:</strong> {current_user.get('full_name', '')} ({current_user.get('client_id', '')})</p>
-            <p><strong>Amount:</strong> {deposit['amount']} {deposit['currency']}</p>
-            <p><strong>Fee:</strong> {deposit.get('fee', 0)} {deposit['currency']}</p>
-            <p><strong>Total to pay:</strong> {deposit.get('total_amount', (deposit.get('amount', 0) or 0) + (deposit.get('fee', 0) or 0))} {deposit['currency']}</p>
-            <p><strong>Method:</strong> {deposit.get('payment_method_name') or deposit.get('payment_method_id')}</p>
-            <p><strong>Status:</strong> pending</p>
-            <p>Deposit ID: <code>{deposit['deposit_id']}</code></p>
-            """,
-            telegram_message=(
-                f"💰 <b>New Deposit Request</b>\n"
-                f"Client: <b>{current_user.get('full_name','')}</b> ({current_user.get('client_id','')})\n"
-                f"Amount: <b>{deposit['amount']} {deposit['currency']}</b>\n"
-                f"Fee: <b>{deposit.get('fee', 0)} {deposit['currency']}</b>\n"
-                f"Total: <b>{deposit.get('total_amount', (deposit.get('amount', 0) or 0) + (deposit.get('fee', 0) or 0))} {deposit['currency']}</b>\n"
-                f"Method: <b>{deposit.get('payment_method_name') or deposit.get('payment_method_id')}</b>\n"
-                f"ID: <code>{deposit['deposit_id']}</code>"
-            ),
+        await notify_admin_event(
+            "admin_new_deposit",
+            full_name=current_user.get("full_name", ""),
+            client_id=current_user.get("client_id", ""),
+            amount=deposit["amount"],
+            currency=deposit["currency"],
+            fee=deposit.get("fee", 0),
+            total_amount=deposit.get("total_amount", (deposit.get("amount", 0) or 0) + (deposit.get("fee", 0) or 0)),
+            method=deposit.get("payment_method_name") or deposit.get("payment_method_id"),
+            deposit_id=deposit["deposit_id"],
         )
     except Exception as e:
         logger.error(f"Failed to notify admins for deposit: {e}")
@@ -2512,60 +4448,84 @@ async def get_deposits(
     deposits = await db.deposits.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
     return {"deposits": deposits}
 
-async def _plisio_sync_deposit_by_id(deposit_id: str, processed_by: str) -> Optional[dict]:
-    """
-    Sync a Plisio deposit by deposit_id. If confirmed and still pending, auto-completes and credits wallet.
-    Returns the updated deposit document (without _id) or None if not found.
-    """
-    deposit = await db.deposits.find_one({"deposit_id": deposit_id}, {"_id": 0})
-    if not deposit:
-        return None
-    if deposit.get("provider") != "plisio" or not deposit.get("plisio_invoice_id"):
-        return deposit
+# ==================== PLISIO RECONCILIATION ====================
+# Pending Plisio deposits are settled by whichever path sees the confirmation first (webhook,
+# return URL, manual sync or the reconciler below). `_plisio_apply_status` moves a deposit out of
+# "pending" with a conditional update, so the wallet is credited exactly once.
 
-    settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
+PLISIO_CONFIRMED_STATUSES = {"completed", "confirmed", "mismatch", "paid"}
+PLISIO_FAILED_STATUSES = {"expired", "cancelled", "failed"}
+PLISIO_RECONCILE_INTERVAL_SECONDS = int(os.environ.get("PLISIO_RECONCILE_INTERVAL_SECONDS") or 60)
+PLISIO_RECONCILE_CONCURRENCY = max(1, int(os.environ.get("PLISIO_RECONCILE_CONCURRENCY") or 5))
+PLISIO_RECONCILE_BATCH = 200
+PLISIO_RECONCILE_MAX_AGE_DAYS = 7
+PLISIO_RECONCILE_FIRST_CHECK_SECONDS = 120
+PLISIO_RECONCILE_MAX_BACKOFF_SECONDS = 1800
+
+# Which credential variant Plisio last accepted ("key" or "key+secret"), to avoid double fetches.
+_plisio_auth_state: Dict[str, str] = {"mode": "key"}
+
+
+def _plisio_credentials(settings: Optional[dict]) -> tuple:
     plisio_key = (settings.get("plisio_api_key") or "").strip() if settings else ""
     plisio_secret = (settings.get("plisio_secret_key") or "").strip() if settings else ""
     if not plisio_key and plisio_secret:
         plisio_key = plisio_secret
         plisio_secret = ""
-    if not settings or not settings.get("plisio_enabled") or not plisio_key:
-        return deposit
+    return plisio_key, plisio_secret
 
-    params = {"api_key": plisio_key}
-    try:
-        async with httpx.AsyncClient() as client_http:
-            resp = await client_http.get(
-                f"https://plisio.net/api/v1/operations/{deposit['plisio_invoice_id']}",
-                params=params,
-                headers={"Accept": "application/json"},
-                timeout=30.0,
-            )
-        if resp.status_code != 200 and plisio_secret and plisio_secret != plisio_key:
-            async with httpx.AsyncClient() as client_http:
+
+async def _plisio_fetch_operation(invoice_id: str, plisio_key: str, plisio_secret: str) -> Optional[dict]:
+    """GET /operations/{id}; returns Plisio's `data` dict or None."""
+    variants = [{"api_key": plisio_key}]
+    if plisio_secret and plisio_secret != plisio_key:
+        with_secret = {"api_key": plisio_key, "api_secret": plisio_secret}
+        variants = [with_secret, variants[0]] if _plisio_auth_state["mode"] == "key+secret" else [variants[0], with_secret]
+
+    async with httpx.AsyncClient() as client_http:
+        for params in variants:
+            async with provider_guard("plisio").attempt() as att:
                 resp = await client_http.get(
-                    f"https://plisio.net/api/v1/operations/{deposit['plisio_invoice_id']}",
-                    params={**params, "api_secret": plisio_secret},
+                    f"{PLISIO_API_BASE}/operations/{invoice_id}",
+                    params=params,
                     headers={"Accept": "application/json"},
-                    timeout=30.0,
+                    timeout=att.timeout,
                 )
-        if resp.status_code != 200:
-            return deposit
-
-        result = resp.json()
-        if result.get("status") != "success" or not result.get("data"):
-            return deposit
-
-        invoice_data = result["data"]
-        new_status = invoice_data.get("status", deposit.get("provider_status", "pending"))
+                if resp.status_code >= 500:
+                    att.fail()
+            if resp.status_code != 200:
+                continue
+            _plisio_auth_state["mode"] = "key+secret" if "api_secret" in params else "key"
+            result = resp.json()
+            if result.get("status") != "success" or not result.get("data"):
+                return None
+            return result["data"]
+    return None
 
-        update_data: Dict[str, Any] = {"provider_status": new_status}
-        confirmed_statuses = {"completed", "confirmed", "mismatch", "paid"}
-        if str(new_status).lower() in confirmed_statuses and deposit.get("status") == "pending":
-            update_data["status"] = "completed"
-            update_data["processed_at"] = datetime.now(timezone.utc).isoformat()
-            update_data["processed_by"] = processed_by
 
+async def _plisio_apply_status(
+    deposit: dict,
+    provider_status: Any,
+    processed_by: str,
+    *,
+    extra: Optional[Dict[str, Any]] = None,
+    notify_user: bool = True,
+) -> bool:
+    """
+    Record Plisio's status on the deposit; complete (and credit) or reject it if it is still pending.
+    Returns True when this call performed the pending -> completed/rejected transition.
+    """
+    deposit_id = deposit["deposit_id"]
+    now_iso = datetime.now(timezone.utc).isoformat()
+    update_data: Dict[str, Any] = {"provider_status": provider_status, **(extra or {})}
+    status_l = str(provider_status).lower()
+
+    if status_l in PLISIO_CONFIRMED_STATUSES:
+        result = await db.deposits.update_one(
+            {"deposit_id": deposit_id, "status": "pending"},
+            {"$set": {**update_data, "status": "completed", "processed_at": now_iso, "processed_by": processed_by}},
+        )
+        if result.modified_count:
             credit_amount = float(deposit.get("net_amount", deposit.get("amount", 0)) or 0)
             currency_key = f"wallet_{deposit['currency'].lower()}"
             await db.users.update_one({"user_id": deposit["user_id"]}, {"$inc": {currency_key: credit_amount}})
@@ -2579,24 +4539,60 @@ async def _plisio_sync_deposit_by_id(deposit_id: str, processed_by: str) -> Opti
                 "reference_id": deposit_id,
                 "status": "completed",
                 "description": f"Deposit via {deposit.get('payment_method_name') or 'Plisio'} (auto-approved)",
-                "created_at": datetime.now(timezone.utc).isoformat()
+                "created_at": now_iso
             })
 
-            # Notify user by email
-            user = await db.users.find_one({"user_id": deposit["user_id"]}, {"_id": 0, "email": 1, "full_name": 1})
-            if user and user.get("email"):
-                subject = "KAYICOM - Deposit Approved"
-                content = f"""
-                <h2>Deposit Approved</h2>
-                <p>Hello {user.get('full_name', 'User')},</p>
-                <p>Your deposit of <strong>{deposit.get('amount')} {deposit.get('currency')}</strong> has been approved.</p>
-                <p>Fee: <strong>{deposit.get('fee', 0)} {deposit.get('currency')}</strong> | Total paid: <strong>{deposit.get('total_amount', (deposit.get('amount', 0) or 0) + (deposit.get('fee', 0) or 0))} {deposit.get('currency')}</strong></p>
-                <p>Transaction ID: <code>{deposit_id}</code></p>
-                <p>Thank you for using KAYICOM!</p>
-                """
-                await send_email(user["email"], subject, content)
+            if notify_user:
+                user = await db.users.find_one({"user_id": deposit["user_id"]}, {"_id": 0, "email": 1, "full_name": 1, "language": 1})
+                if user and user.get("email"):
+                    await send_templated_email(
+                        user["email"],
+                        "deposit_approved",
+                        notification_language(user),
+                        full_name=user.get("full_name", "User"),
+                        amount=deposit.get("amount"),
+                        currency=deposit.get("currency"),
+                        method=deposit.get("payment_method_name") or "Plisio",
+                        fee=deposit.get("fee", 0),
+                        total_amount=deposit.get("total_amount", (deposit.get("amount", 0) or 0) + (deposit.get("fee", 0) or 0)),
+                        deposit_id=deposit_id,
+                    )
+            return True
+    elif status_l in PLISIO_FAILED_STATUSES:
+        result = await db.deposits.update_one(
+            {"deposit_id": deposit_id, "status": "pending"},
+            {"$set": {**update_data, "status": "rejected", "processed_at": now_iso, "processed_by": processed_by}},
+        )
+        if result.modified_count:
+            return True
+
+    await db.deposits.update_one({"deposit_id": deposit_id}, {"$set": update_data})
+    return False
+
+
+async def _plisio_sync_deposit_by_id(deposit_id: str, processed_by: str) -> Optional[dict]:
+    """
+    Sync a Plisio deposit by deposit_id. If confirmed and still pending, auto-completes and credits wallet.
+    Returns the updated deposit document (without _id) or None if not found.
+    """
+    deposit = await db.deposits.find_one({"deposit_id": deposit_id}, {"_id": 0})
+    if not deposit:
+        return None
+    if deposit.get("provider") != "plisio" or not deposit.get("plisio_invoice_id"):
+        return deposit
+
+    settings = await get_settings_snapshot()
+    plisio_key, plisio_secret = _plisio_credentials(settings)
+    if not settings or not settings.get("plisio_enabled") or not plisio_key:
+        return deposit
+
+    try:
+        invoice_data = await _plisio_fetch_operation(deposit["plisio_invoice_id"], plisio_key, plisio_secret)
+        if not invoice_data:
+            return deposit
 
-        await db.deposits.update_one({"deposit_id": deposit_id}, {"$set": update_data})
+        new_status = invoice_data.get("status", deposit.get("provider_status", "pending"))
+        await _plisio_apply_status(deposit, new_status, processed_by)
         deposit = await db.deposits.find_one({"deposit_id": deposit_id}, {"_id": 0})
         return deposit
     except Exception as e:
@@ -2604,6 +4600,73 @@ async def _plisio_sync_deposit_by_id(deposit_id: str, processed_by: str) -> Opti
         return deposit
 
 
+def _plisio_next_check(attempts: int) -> str:
+    delay = min(PLISIO_RECONCILE_MAX_BACKOFF_SECONDS, PLISIO_RECONCILE_FIRST_CHECK_SECONDS * (2 ** min(attempts, 10)))
+    return (datetime.now(timezone.utc) + timedelta(seconds=delay)).isoformat()
+
+
+async def _plisio_reconcile_once() -> Dict[str, int]:
+    """One sweep over due pending Plisio deposits (bounded concurrency, per-deposit backoff)."""
+    settings = await get_settings_snapshot()
+    plisio_key, plisio_secret = _plisio_credentials(settings)
+    if not settings or not settings.get("plisio_enabled") or not plisio_key:
+        return {"checked": 0, "settled": 0}
+
+    now = datetime.now(timezone.utc)
+    due = await db.deposits.find(
+        {
+            "provider": "plisio",
+            "status": "pending",
+            "plisio_next_check_at": {"$lte": now.isoformat()},
+            "created_at": {"$gte": (now - timedelta(days=PLISIO_RECONCILE_MAX_AGE_DAYS)).isoformat()},
+        },
+        {"_id": 0},
+    ).sort("plisio_next_check_at", 1).limit(PLISIO_RECONCILE_BATCH).to_list(PLISIO_RECONCILE_BATCH)
+
+    sem = asyncio.Semaphore(PLISIO_RECONCILE_CONCURRENCY)
+    settled = 0
+
+    async def check(deposit: dict) -> None:
+        nonlocal settled
+        attempts = int(deposit.get("plisio_check_attempts") or 0) + 1
+        async with sem:
+            try:
+                invoice_data = None
+                if deposit.get("plisio_invoice_id"):
+                    invoice_data = await _plisio_fetch_operation(deposit["plisio_invoice_id"], plisio_key, plisio_secret)
+                if invoice_data and invoice_data.get("status"):
+                    extra = {"plisio_check_attempts": attempts, "plisio_next_check_at": _plisio_next_check(attempts)}
+                    if await _plisio_apply_status(deposit, invoice_data["status"], "plisio_reconciler", extra=extra):
+                        settled += 1
+                    return
+            except ProviderUnavailableError:
+                # Breaker open: leave the schedule alone, the next sweep retries.
+                return
+            except Exception as e:
+                logger.warning(f"Plisio reconcile failed for deposit {deposit.get('deposit_id')}: {e}")
+            await db.deposits.update_one(
+                {"deposit_id": deposit["deposit_id"], "status": "pending"},
+                {"$set": {"plisio_check_attempts": attempts, "plisio_next_check_at": _plisio_next_check(attempts)}},
+            )
+
+    await asyncio.gather(*(check(d) for d in due))
+    return {"checked": len(due), "settled": settled}
+
+
+async def _plisio_reconcile_loop() -> None:
+    owner = str(uuid.uuid4())
+    while True:
+        await asyncio.sleep(PLISIO_RECONCILE_INTERVAL_SECONDS)
+        try:
+            if not await acquire_worker_lease("plisio_reconciler", owner, PLISIO_RECONCILE_INTERVAL_SECONDS * 2):
+                continue
+            result = await _plisio_reconcile_once()
+            if result["checked"]:
+                logger.info(f"Plisio reconcile: checked={result['checked']} settled={result['settled']}")
+        except Exception as e:
+            logger.error(f"Plisio reconcile loop error: {e}")
+
+
 @api_router.get("/plisio/return")
 async def plisio_return(deposit_id: Optional[str] = None, status: str = "success"):
     """
@@ -2671,39 +4734,13 @@ async def plisio_webhook(request: Request):
         if not plisio_status:
             return {"status": "error", "message": "Missing status"}
 
-        update_data: Dict[str, Any] = {
-            "provider_status": plisio_status,
-            "plisio_txn_id": txn_id,
-        }
-
-        confirmed_statuses = {"completed", "confirmed", "mismatch", "paid"}
-        if str(plisio_status).lower() in confirmed_statuses and deposit.get("status") == "pending":
-            update_data["status"] = "completed"
-            update_data["processed_at"] = datetime.now(timezone.utc).isoformat()
-            update_data["processed_by"] = "plisio_webhook"
-
-            credit_amount = float(deposit.get("net_amount", deposit.get("amount", 0)) or 0)
-            currency_key = f"wallet_{deposit['currency'].lower()}"
-            await db.users.update_one({"user_id": deposit["user_id"]}, {"$inc": {currency_key: credit_amount}})
-
-            await db.transactions.insert_one({
-                "transaction_id": str(uuid.uuid4()),
-                "user_id": deposit["user_id"],
-                "type": "deposit",
-                "amount": credit_amount,
-                "currency": deposit["currency"],
-                "reference_id": order_number,
-                "status": "completed",
-                "description": f"Deposit via {deposit.get('payment_method_name') or 'Plisio'} (auto-approved)",
-                "created_at": datetime.now(timezone.utc).isoformat()
-            })
-
-        elif str(plisio_status).lower() in {"expired", "cancelled", "failed"} and deposit.get("status") == "pending":
-            update_data["status"] = "rejected"
-            update_data["processed_at"] = datetime.now(timezone.utc).isoformat()
-            update_data["processed_by"] = "plisio_webhook"
-
-        await db.deposits.update_one({"deposit_id": order_number}, {"$set": update_data})
+        await _plisio_apply_status(
+            deposit,
+            plisio_status,
+            "plisio_webhook",
+            extra={"plisio_txn_id": txn_id},
+            notify_user=False,
+        )
         return {"status": "success"}
     except Exception as e:
         logger.error(f"Plisio webhook error: {e}", exc_info=True)
@@ -2833,27 +4870,16 @@ async def create_withdrawal(request: WithdrawalRequest, current_user: dict = Dep
 
     # Notify admins (email + telegram)
     try:
-        await notify_admin(
-            subject="KAYICOM - New Withdrawal Request",
-            html=f"""
-            <h2>New Withdrawal Request</h2>
-            <p><strong>Client:</strong> {current_user.get('full_name', '')} ({current_user.get('client_id', '')})</p>
-            <p><strong>Amount:</strong> {withdrawal['amount']} {withdrawal['currency']}</p>
-            <p><strong>Fee:</strong> {withdrawal.get('fee', 0)} {withdrawal['currency']}</p>
-            <p><strong>Total deducted:</strong> {withdrawal.get('total_amount', (withdrawal.get('amount', 0) or 0) + (withdrawal.get('fee', 0) or 0))} {withdrawal['currency']}</p>
-            <p><strong>Method:</strong> {withdrawal.get('payment_method_name') or withdrawal.get('payment_method_id')}</p>
-            <p><strong>Status:</strong> pending</p>
-            <p>Withdrawal ID: <code>{withdrawal['withdrawal_id']}</code></p>
-            """,
-            telegram_message=(
-                f"🏧 <b>New Withdrawal Request</b>\n"
-                f"Client: <b>{current_user.get('full_name','')}</b> ({current_user.get('client_id','')})\n"
-                f"Amount: <b>{withdrawal['amount']} {withdrawal['currency']}</b>\n"
-                f"Fee: <b>{withdrawal.get('fee', 0)} {withdrawal['currency']}</b>\n"
-                f"Total: <b>{withdrawal.get('total_amount', (withdrawal.get('amount', 0) or 0) + (withdrawal.get('fee', 0) or 0))} {withdrawal['currency']}</b>\n"
-                f"Method: <b>{withdrawal.get('payment_method_name') or withdrawal.get('payment_method_id')}</b>\n"
-                f"ID: <code>{withdrawal['withdrawal_id']}</code>"
-            ),
+        await notify_admin_event(
+            "admin_new_withdrawal",
+            full_name=current_user.get("full_name", ""),
+            client_id=current_user.get("client_id", ""),
+            amount=withdrawal["amount"],
+            currency=withdrawal["currency"],
+            fee=withdrawal.get("fee", 0),
+            total_amount=withdrawal.get("total_amount", (withdrawal.get("amount", 0) or 0) + (withdrawal.get("fee", 0) or 0)),
+            method=withdrawal.get("payment_method_name") or withdrawal.get("payment_method_id"),
+            withdrawal_id=withdrawal["withdrawal_id"],
         )
     except Exception as e:
         logger.error(f"Failed to notify admins for withdrawal: {e}")
@@ -3002,18 +5028,18 @@ async def swap_currency(request: SwapRequest, current_user: dict = Depends(get_c
     # Send email notification
     user_email = current_user.get("email")
     if user_email:
-        subject = "KAYICOM - Currency Swap Completed"
-        content = f"""
-        <h2>Currency Swap Completed</h2>
-        <p>Hello {current_user.get('full_name', 'User')},</p>
-        <p>Your currency swap has been completed successfully.</p>
-        <p><strong>From:</strong> {request.amount} {from_currency}</p>
-        <p><strong>To:</strong> {converted_amount} {to_currency}</p>
-        <p><strong>Rate Used:</strong> {rate_used}</p>
-        <p>Transaction ID: <code>{swap_id}</code></p>
-        <p>Thank you for using KAYICOM!</p>
-        """
-        await send_email(user_email, subject, content)
+        await send_templated_email(
+            user_email,
+            "swap_completed",
+            notification_language(current_user),
+            full_name=current_user.get("full_name", "User"),
+            from_amount=request.amount,
+            from_currency=from_currency,
+            to_amount=converted_amount,
+            to_currency=to_currency,
+            rate=rate_used,
+            swap_id=swap_id,
+        )
     
     return {
         "swap_id": swap_id,
@@ -3134,27 +5160,29 @@ async def send_transfer(request: TransferRequest, current_user: dict = Depends(g
     recipient_email = recipient.get("email")
     
     if sender_email:
-        subject = "KAYICOM - Transfer Sent"
-        content = f"""
-        <h2>Transfer Sent</h2>
-        <p>Hello {current_user.get('full_name', 'User')},</p>
-        <p>You have successfully sent <strong>{request.amount} {request.currency}</strong> to <strong>{request.recipient_client_id}</strong>.</p>
-        <p>Fee: <strong>{fee} {request.currency}</strong></p>
-        <p>Transaction ID: <code>{transfer_id}</code></p>
-        <p>Thank you for using KAYICOM!</p>
-        """
-        await send_email(sender_email, subject, content)
+        await send_templated_email(
+            sender_email,
+            "transfer_sent",
+            notification_language(current_user),
+            full_name=current_user.get("full_name", "User"),
+            amount=request.amount,
+            currency=request.currency,
+            recipient_client_id=request.recipient_client_id,
+            fee=fee,
+            transfer_id=transfer_id,
+        )
     
     if recipient_email:
-        subject = "KAYICOM - Transfer Received"
-        content = f"""
-        <h2>Transfer Received</h2>
-        <p>Hello {recipient.get('full_name', 'User')},</p>
-        <p>You have received <strong>{request.amount} {request.currency}</strong> from <strong>{current_user['client_id']}</strong>.</p>
-        <p>Transaction ID: <code>{transfer_id}</code></p>
-        <p>Thank you for using KAYICOM!</p>
-        """
-        await send_email(recipient_email, subject, content)
+        await send_templated_email(
+            recipient_email,
+            "transfer_received",
+            notification_language(recipient),
+            full_name=recipient.get("full_name", "User"),
+            amount=request.amount,
+            currency=request.currency,
+            sender_client_id=current_user["client_id"],
+            transfer_id=transfer_id,
+        )
     
     return {
         "transfer_id": transfer_id,
@@ -3176,21 +5204,21 @@ async def submit_kyc(request: KYCSubmit, current_user: dict = Depends(get_curren
     settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
 
     # Store images professionally (Cloudinary when configured). Keep backward-compatible field names.
-    id_front = await _kyc_store_image_value(
+    id_front = await kyc_store_image_value(
         request.id_front_image,
         user_id=current_user["user_id"],
         kyc_id=kyc_id,
         field_name="id_front_image",
         settings=settings,
     )
-    id_back = await _kyc_store_image_value(
+    id_back = await kyc_store_image_value(
         request.id_back_image,
         user_id=current_user["user_id"],
         kyc_id=kyc_id,
         field_name="id_back_image",
         settings=settings,
     )
-    selfie = await _kyc_store_image_value(
+    selfie = await kyc_store_image_value(
         request.selfie_with_id,
         user_id=current_user["user_id"],
         kyc_id=kyc_id,
@@ -3384,7 +5412,7 @@ def _calculate_card_fee_usd(amount: float, card_fees: List[Dict[str, Any]]) -> f
 
 @api_router.get("/virtual-cards")
 async def get_virtual_cards(current_user: dict = Depends(get_current_user)):
-    settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
+    settings = await get_settings_snapshot()
     if not _virtual_cards_enabled(settings):
         return {"cards": []}
     cards = await db.virtual_cards.find(
@@ -3396,7 +5424,7 @@ async def get_virtual_cards(current_user: dict = Depends(get_current_user)):
 @api_router.get("/virtual-cards/orders")
 async def get_card_orders(current_user: dict = Depends(get_current_user)):
     """Get user's virtual card orders"""
-    settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
+    settings = await get_settings_snapshot()
     if not _virtual_cards_enabled(settings):
         return {"orders": []}
     orders = await db.virtual_card_orders.find(
@@ -3412,91 +5440,125 @@ async def get_card_orders(current_user: dict = Depends(get_current_user)):
     return {"orders": orders}
 
 
-@api_router.get("/virtual-cards/{order_id}/detail")
-async def virtual_card_detail(
-    order_id: str,
-    current_user: dict = Depends(get_current_user),
-):
-    """
-    Fetch/refresh a user's card details (best-effort).
-    We never return full card number/CVV to clients.
-    """
-    settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
-    if not _virtual_cards_enabled(settings):
-        raise HTTPException(status_code=403, detail="Virtual cards are currently disabled")
+# Card detail cache: the card order document is the cached snapshot. Provider detail is refreshed
+# at most once per CARD_DETAIL_FRESH_SECONDS per card (stale-while-revalidate, deduplicated per
+# card), and only fields that actually changed are written back.
+CARD_DETAIL_FRESH_SECONDS = int(os.environ.get("CARD_DETAIL_FRESH_SECONDS") or 300)
+_CARD_DETAIL_CACHE_MAX = 10000
 
-    order = await db.virtual_card_orders.find_one(
-        {"order_id": order_id, "user_id": current_user["user_id"], "status": "approved"},
-        {"_id": 0, "card_number": 0, "card_cvv": 0, "provider_raw": 0},
-    )
-    if not order:
-        raise HTTPException(status_code=404, detail="Card not found or not approved")
+_card_detail_fetched_at: Dict[str, float] = {}
+_card_detail_refreshes: Dict[str, asyncio.Task] = {}
 
-    # Only Strowallet cards support provider refresh at the moment.
-    if order.get("provider") != "strowallet" or not order.get("provider_card_id"):
-        return {"card": order, "note": "No provider detail available for this card"}
 
-    cfg = _strowallet_config(settings)
-    if not cfg.get("fetch_detail_path"):
-        return {"card": order, "note": "Provider card detail endpoint not configured"}
+async def _card_detail_refresh_now(settings: Optional[dict], order: dict) -> Dict[str, Any]:
+    """Fetch provider detail for one card; returns the fields that changed (already persisted)."""
+    import time
 
+    cfg = _strowallet_config(settings)
+    order_id = order["order_id"]
     # Try fetch detail from provider to populate last4/expiry/etc.
     payload: Dict[str, Any] = {
         "card_id": order.get("provider_card_id"),
         "reference": f"detail-{order_id}",
     }
     # Include customer id if present (some deployments require it).
-    u = await db.users.find_one({"user_id": current_user["user_id"]}, {"_id": 0, "strowallet_customer_id": 1, "strowallet_user_id": 1})
+    u = await db.users.find_one({"user_id": order["user_id"]}, {"_id": 0, "strowallet_customer_id": 1, "strowallet_user_id": 1})
     stw_customer_id = (u or {}).get("strowallet_customer_id") or (u or {}).get("strowallet_user_id")
     if stw_customer_id:
         payload["customer_id"] = stw_customer_id
         payload["card_user_id"] = stw_customer_id
     payload = _with_aliases(payload, "card_id", "cardId", "id")
 
-    stw_detail = await _strowallet_post(settings, cfg["fetch_detail_path"], payload)
-    card_number = _extract_first(
-        stw_detail,
-        "data.card_number",
-        "data.cardNumber",
-        "data.number",
-        "data.pan",
-        "card_number",
-        "cardNumber",
-        "number",
-        "pan",
-        "data.card.card_number",
-        "data.card.cardNumber",
-        "data.card.number",
-        "data.card.pan",
-        "response.card_number",
-        "response.cardNumber",
-        "response.pan",
-        "data.response.card_number",
-        "data.response.cardNumber",
-        "data.response.pan",
-    )
-    card_expiry = _extract_first(stw_detail, "data.expiry", "data.expiry_date", "expiry", "expiry_date", "data.card.expiry", "data.card.expiry_date")
-    card_holder_name = _extract_first(stw_detail, "data.name_on_card", "data.card_name", "name_on_card", "card_name", "data.card.name_on_card")
-    card_brand = _extract_first(stw_detail, "data.brand", "brand", "data.card.brand")
-    card_type = _extract_first(stw_detail, "data.type", "type", "data.card.type")
+    stw_detail = await _strowallet_post(settings, cfg["fetch_detail_path"], payload, idempotent=True)
+    card = normalize_strowallet_card(stw_detail)
 
+    # Only normalized card fields are written back; the envelope's own "balance" is not the card's.
     update_doc: Dict[str, Any] = {}
-    last4 = _extract_last4(card_number)
-    if last4:
-        update_doc["card_last4"] = last4
-    if card_expiry:
-        update_doc["card_expiry"] = str(card_expiry)
-    if card_holder_name:
-        update_doc["card_holder_name"] = str(card_holder_name)
-    if card_brand and not order.get("card_brand"):
-        update_doc["card_brand"] = str(card_brand)
-    if card_type and not order.get("card_type"):
-        update_doc["card_type"] = str(card_type).lower()
+    if card["card_last4"]:
+        update_doc["card_last4"] = card["card_last4"]
+    if card["card_expiry"]:
+        update_doc["card_expiry"] = str(card["card_expiry"])
+    if card["card_holder_name"]:
+        update_doc["card_holder_name"] = str(card["card_holder_name"])
+    if card["card_type"] and not order.get("card_type"):
+        update_doc["card_type"] = str(card["card_type"]).lower()
+    try:
+        if card["balance"] not in (None, ""):
+            update_doc["balance"] = float(card["balance"])
+    except (TypeError, ValueError):
+        pass
 
-    if update_doc:
-        await db.virtual_card_orders.update_one({"order_id": order_id}, {"$set": update_doc})
-        order.update(update_doc)
+    # Only write back what changed.
+    changes = {k: v for k, v in update_doc.items() if order.get(k) != v}
+    if changes:
+        await db.virtual_card_orders.update_one({"order_id": order_id}, {"$set": changes})
+
+    if len(_card_detail_fetched_at) >= _CARD_DETAIL_CACHE_MAX:
+        _card_detail_fetched_at.pop(next(iter(_card_detail_fetched_at)), None)
+    _card_detail_fetched_at[order_id] = time.monotonic()
+    return changes
+
+
+def _card_detail_refresh(settings: Optional[dict], order: dict) -> asyncio.Task:
+    """Start (or join) the provider refresh for this card."""
+    order_id = order["order_id"]
+    task = _card_detail_refreshes.get(order_id)
+    if task is None or task.done():
+        task = asyncio.create_task(_card_detail_refresh_now(settings, order))
+        _card_detail_refreshes[order_id] = task
+        task.add_done_callback(_card_detail_log_failure)
+    return task
+
+
+def _card_detail_log_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Card detail refresh failed: {task.exception()}")
+
+
+@api_router.get("/virtual-cards/{order_id}/detail")
+async def virtual_card_detail(
+    order_id: str,
+    refresh: bool = False,
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Fetch/refresh a user's card details (best-effort).
+    Returns the stored card immediately and revalidates with the provider in the background
+    when it is older than CARD_DETAIL_FRESH_SECONDS; `refresh=true` waits for the provider.
+    We never return full card number/CVV to clients.
+    """
+    import time
+
+    settings = await get_settings_snapshot()
+    if not _virtual_cards_enabled(settings):
+        raise HTTPException(status_code=403, detail="Virtual cards are currently disabled")
+
+    order = await db.virtual_card_orders.find_one(
+        {"order_id": order_id, "user_id": current_user["user_id"], "status": "approved"},
+        {"_id": 0, "card_number": 0, "card_cvv": 0, "provider_raw": 0},
+    )
+    if not order:
+        raise HTTPException(status_code=404, detail="Card not found or not approved")
+
+    # Only Strowallet cards support provider refresh at the moment.
+    if order.get("provider") != "strowallet" or not order.get("provider_card_id"):
+        return {"card": order, "note": "No provider detail available for this card"}
+
+    cfg = _strowallet_config(settings)
+    if not cfg.get("fetch_detail_path"):
+        return {"card": order, "note": "Provider card detail endpoint not configured"}
+
+    fetched_at = _card_detail_fetched_at.get(order_id)
+    if not refresh and fetched_at is not None and (time.monotonic() - fetched_at) < CARD_DETAIL_FRESH_SECONDS:
+        return {"provider": "strowallet", "card": order}
 
+    if not refresh and order.get("card_last4"):
+        # Serve the stored snapshot now; revalidate in the background.
+        _card_detail_refresh(settings, order)
+        return {"provider": "strowallet", "card": order, "revalidating": True}
+
+    changes = await asyncio.shield(_card_detail_refresh(settings, order))
+    order.update(changes)
     return {"provider": "strowallet", "card": order}
 
 @api_router.get("/virtual-cards/deposits")
@@ -3707,7 +5769,7 @@ async def verify_card_pin_and_get_details(request: VerifyCardPinRequest, current
     """Verify PIN and return full card details including card number and CVV"""
     import hashlib
     
-    settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
+    settings = await get_settings_snapshot()
     if not _virtual_cards_enabled(settings):
         raise HTTPException(status_code=403, detail="Virtual cards are currently disabled")
     
@@ -3754,97 +5816,41 @@ async def verify_card_pin_and_get_details(request: VerifyCardPinRequest, current
                 if cfg.get("api_secret"):
                     payload["secret_key"] = cfg["api_secret"]
                 
-                # Try to fetch from Strowallet
-                endpoints_to_try = []
-                if cfg.get("fetch_detail_path"):
-                    endpoints_to_try.append((cfg.get("base_url", "https://strowallet.com"), cfg["fetch_detail_path"]))
-                endpoints_to_try.append(("https://api.strowallet.com", "/card/fetch-details/"))
-                endpoints_to_try.append((cfg.get("base_url", "https://strowallet.com"), "/api/bitvcard/fetch-card-detail/"))
-                
-                for base_url, path in endpoints_to_try:
-                    try:
-                        url = base_url.rstrip("/") + "/" + path.lstrip("/")
-                        headers = {"Content-Type": "application/json", "Accept": "application/json"}
-                        if cfg.get("api_key"):
-                            headers["x-api-key"] = cfg["api_key"]
-                        
-                        async with httpx.AsyncClient(timeout=httpx.Timeout(30.0)) as client:
-                            resp = await client.post(url, json=payload, headers=headers)
-                            if resp.status_code == 200:
-                                data = resp.json()
-                                if data.get("success") or data.get("status") == "success":
-                                    # Extract card data from response.card_detail
-                                    card_data = None
-                                    if isinstance(data.get("response"), dict):
-                                        r = data["response"]
-                                        if isinstance(r.get("card_detail"), dict):
-                                            card_data = r["card_detail"]
-                                        elif r.get("card_number") or r.get("pan"):
-                                            card_data = r
-                                    if not card_data:
-                                        card_data = data.get("data") or data
-                                    
-                                    if isinstance(card_data, dict):
-                                        # Extract sensitive data
-                                        card_number = (
-                                            card_data.get("card_number") or card_data.get("cardNumber") or 
-                                            card_data.get("pan") or card_data.get("unmasked_pan") or
-                                            card_data.get("number")
-                                        )
-                                        cvv = (
-                                            card_data.get("cvv") or card_data.get("cvc") or 
-                                            card_data.get("cvv2") or card_data.get("security_code")
-                                        )
-                                        
-                                        # Extract expiry
-                                        expiry_month = (
-                                            card_data.get("expiry_month") or card_data.get("expiryMonth") or
-                                            card_data.get("exp_month") or card_data.get("validity_month")
-                                        )
-                                        expiry_year = (
-                                            card_data.get("expiry_year") or card_data.get("expiryYear") or
-                                            card_data.get("exp_year") or card_data.get("validity_year")
-                                        )
-                                        
-                                        # Also check combined expiry
-                                        combined_expiry = card_data.get("expiry") or card_data.get("expiry_date") or card_data.get("validity")
-                                        if combined_expiry and not (expiry_month and expiry_year):
-                                            exp_str = str(combined_expiry)
-                                            if "/" in exp_str:
-                                                parts = exp_str.split("/")
-                                                if len(parts) == 2:
-                                                    expiry_month = parts[0]
-                                                    expiry_year = parts[1]
-                                        
-                                        card_expiry = None
-                                        if expiry_month and expiry_year:
-                                            em = str(expiry_month).zfill(2)
-                                            ey = str(expiry_year)[-2:] if len(str(expiry_year)) == 4 else str(expiry_year)
-                                            card_expiry = f"{em}/{ey}"
-                                        
-                                        balance = card_data.get("balance") or card_data.get("card_balance")
-                                        
-                                        # Return the fresh data
-                                        return {
-                                            "success": True,
-                                            "order_id": order["order_id"],
-                                            "card_number": str(card_number) if card_number else order.get("card_number"),
-                                            "cvv": str(cvv) if cvv else order.get("card_cvv"),
-                                            "card_expiry": card_expiry or order.get("card_expiry"),
-                                            "card_holder_name": order.get("card_holder_name"),
-                                            "card_type": order.get("card_type", "visa"),
-                                            "card_status": order.get("card_status", "active"),
-                                            "balance": float(balance) if balance else order.get("balance"),
-                                            "billing_address": order.get("billing_address") or "3401 N. Miami, Ave. Ste 230",
-                                            "billing_city": order.get("billing_city") or "Miami",
-                                            "billing_state": order.get("billing_state") or "Florida",
-                                            "billing_country": order.get("billing_country") or "United States",
-                                            "billing_zip": order.get("billing_zip") or "33127",
-                                        }
-                                    break
-                    except Exception as e:
-                        logger.warning(f"Failed to fetch card details from Strowallet: {e}")
-                        continue
+                # Try to fetch from Strowallet (last working endpoint first, hedged)
+                headers = {"Content-Type": "application/json", "Accept": "application/json"}
+                if cfg.get("api_key"):
+                    headers["x-api-key"] = cfg["api_key"]
+
+                def _accept(status_code: int, data: Any) -> Optional[str]:
+                    if status_code == 200 and isinstance(data, dict) and (data.get("success") or data.get("status") == "success"):
+                        return None
+                    return f"Status {status_code}"
+
+                data, _, _ = await _strowallet_fetch_detail_routed(cfg, payload, headers, _accept)
+                if data is not None:
+                    card = normalize_strowallet_card(data)
+                    card_number = None if card["card_number_masked"] else card["card_number"]
+                    cvv = card["cvv"]
+                    card_expiry = card["card_expiry"]
+                    balance = card["balance"]
+
+                    # Return the fresh data
+                    return {
+                        "success": True,
+                        "order_id": order["order_id"],
+                        "card_number": str(card_number) if card_number else order.get("card_number"),
+                        "cvv": str(cvv) if cvv else order.get("card_cvv"),
+                        "card_expiry": card_expiry or order.get("card_expiry"),
+                        "card_holder_name": order.get("card_holder_name"),
+                        "card_type": order.get("card_type", "visa"),
+                        "card_status": order.get("card_status", "active"),
+                        "balance": float(balance) if balance else order.get("balance"),
+                        "billing_address": order.get("billing_address") or "3401 N. Miami, Ave. Ste 230",
+                        "billing_city": order.get("billing_city") or "Miami",
+                        "billing_state": order.get("billing_state") or "Florida",
+                        "billing_country": order.get("billing_country") or "United States",
+                        "billing_zip": order.get("billing_zip") or "33127",
+                    }
             except Exception as e:
                 logger.error(f"Error fetching Strowallet card details: {e}")
     
@@ -4079,7 +6085,7 @@ async def update_virtual_card_controls(
     - Set spending limit (white-label control)
     - Lock/unlock (unlock not allowed if card has 3+ failed payments)
     """
-    settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
+    settings = await get_settings_snapshot()
     if not _virtual_cards_enabled(settings):
         raise HTTPException(status_code=403, detail="Virtual cards are currently disabled")
 
@@ -4247,18 +6253,354 @@ async def withdraw_from_virtual_card(request: CardWithdrawRequest, current_user:
     return {"withdrawal": record, "message": "Withdrawal processed successfully"}
 
 
+# ==================== CARD TRANSACTIONS MIRROR ====================
+# Strowallet card transactions are mirrored into `card_transactions`, so history pages are local
+# reads. Each sync walks provider pages (newest first) only until it reaches the card's high-water
+# mark. Webhooks mark cards for sync, a periodic job drains those marks, and page views trigger a
+# deduplicated background refresh only when the mirror is older than CARD_TX_FRESH_SECONDS.
+
+CARD_TX_FRESH_SECONDS = int(os.environ.get("CARD_TX_FRESH_SECONDS") or 60)
+CARD_TX_SYNC_INTERVAL_SECONDS = int(os.environ.get("CARD_TX_SYNC_INTERVAL_SECONDS") or 300)
+CARD_TX_SYNC_PAGE_SIZE = 100
+CARD_TX_SYNC_MAX_PAGES = 20
+# A card whose sync keeps failing is retried after CARD_TX_SYNC_INTERVAL_SECONDS, doubling per failure up to this.
+CARD_TX_SYNC_MAX_BACKOFF_SECONDS = 6 * 3600
+
+_card_tx_syncs: Dict[str, asyncio.Task] = {}
+
+_CARD_TX_ID_PATHS = ("id", "transaction_id", "transactionId", "txn_id", "trx_id", "reference", "ref")
+_CARD_TX_TIME_PATHS = ("createdAt", "created_at", "date", "transaction_date", "transactionDate", "updatedAt", "updated_at")
+
+
+def _card_tx_rows(resp: Any) -> List[dict]:
+    """Transaction rows from a provider response (same shapes the web app already understands)."""
+    import json
+
+    def parse(v: Any) -> Any:
+        if isinstance(v, str):
+            try:
+                return json.loads(v)
+            except Exception:
+                return None
+        return v
+
+    if not isinstance(resp, dict):
+        return []
+    inner = resp.get("response") if isinstance(resp.get("response"), dict) else {}
+    for holder in (resp, inner):
+        message = parse(holder.get("message"))
+        for candidate in (holder.get("data"), holder.get("transactions"), message.get("data") if isinstance(message, dict) else None):
+            rows = parse(candidate)
+            if isinstance(rows, list) and rows:
+                return [r for r in rows if isinstance(r, dict)]
+    return []
+
+
+def _card_tx_time(value: Any) -> Optional[str]:
+    """Provider timestamp (ISO string or epoch s/ms) -> UTC ISO string."""
+    if value in (None, ""):
+        return None
+    try:
+        if isinstance(value, (int, float)) or str(value).isdigit():
+            ts = float(value)
+            dt = datetime.fromtimestamp(ts / 1000 if ts > 1e12 else ts, tz=timezone.utc)
+        else:
+            dt = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00").replace(" ", "T", 1))
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=timezone.utc)
+        return dt.astimezone(timezone.utc).isoformat()
+    except Exception:
+        return None
+
+
+def _card_tx_doc(row: dict, order: dict, now_iso: str) -> Dict[str, Any]:
+    import hashlib
+    import json
+
+    txn_id = _extract_first(row, *_CARD_TX_ID_PATHS)
+    if txn_id in (None, ""):
+        txn_key = "h:" + hashlib.sha1(json.dumps(row, sort_keys=True, default=str).encode()).hexdigest()[:24]
+    else:
+        txn_key = str(txn_id)
+    status = _extract_first(row, "status", "transaction_status", "state")
+    txn_type = _extract_first(row, "type", "transaction_type", "transactionType", "category")
+    return {
+        "card_id": order["provider_card_id"],
+        "txn_key": txn_key,
+        "order_id": order["order_id"],
+        "user_id": order.get("user_id"),
+        "occurred_at": _card_tx_time(_extract_first(row, *_CARD_TX_TIME_PATHS)) or now_iso,
+        "amount": _extract_first(row, "amount", "value"),
+        "currency": _extract_first(row, "currency"),
+        "type": str(txn_type).lower() if txn_type is not None else None,
+        "status": str(status).lower() if status is not None else None,
+        "raw": row,
+        "synced_at": now_iso,
+    }
+
+
+async def _card_tx_sync_now(settings: Optional[dict], order: dict) -> Dict[str, Any]:
+    """Pull new provider transactions for one card down to its high-water mark."""
+    cfg = _strowallet_config(settings)
+    path = cfg.get("card_tx_path") or cfg.get("full_history_path")
+    if not path:
+        return {"synced": 0}
+
+    high_water = order.get("tx_high_water")
+    newest = high_water
+    synced = 0
+    try:
+        for page in range(1, CARD_TX_SYNC_MAX_PAGES + 1):
+            payload: Dict[str, Any] = {
+                "card_id": order["provider_card_id"],
+                "page": str(page),
+                "take": str(CARD_TX_SYNC_PAGE_SIZE),
+                "reference": f"tx-{order['order_id']}-{page}-{CARD_TX_SYNC_PAGE_SIZE}",
+            }
+            payload = _with_aliases(payload, "card_id", "cardId", "id")
+            resp = await _strowallet_post(settings, path, payload)
+            rows = _card_tx_rows(resp)
+            if not rows:
+                break
+            now_iso = datetime.now(timezone.utc).isoformat()
+            docs = [_card_tx_doc(r, order, now_iso) for r in rows]
+            await db.card_transactions.bulk_write([
+                UpdateOne(
+                    {"card_id": d["card_id"], "txn_key": d["txn_key"]},
+                    {"$set": d, "$setOnInsert": {"first_seen_at": now_iso}},
+                    upsert=True,
+                )
+                for d in docs
+            ], ordered=False)
+            synced += len(docs)
+            page_times = [d["occurred_at"] for d in docs]
+            newest = max([newest] + page_times) if newest else max(page_times)
+            # Provider pages are newest first: once a page reaches the high-water mark, the rest is known.
+            if len(rows) < CARD_TX_SYNC_PAGE_SIZE or (high_water and min(page_times) <= high_water):
+                break
+    except Exception as e:
+        failures = int(order.get("tx_sync_failures") or 0) + 1
+        backoff = min(CARD_TX_SYNC_INTERVAL_SECONDS * 2 ** (failures - 1), CARD_TX_SYNC_MAX_BACKOFF_SECONDS)
+        await db.virtual_card_orders.update_one(
+            {"order_id": order["order_id"]},
+            {"$set": {
+                "tx_sync_error": str(getattr(e, "detail", e))[:500],
+                "tx_sync_pending": True,
+                "tx_sync_failures": failures,
+                "tx_sync_next_at": (datetime.now(timezone.utc) + timedelta(seconds=backoff)).isoformat(),
+            }},
+        )
+        raise
+
+    await db.virtual_card_orders.update_one(
+        {"order_id": order["order_id"]},
+        {"$set": {
+            "tx_high_water": newest,
+            "tx_synced_at": datetime.now(timezone.utc).isoformat(),
+            "tx_sync_error": None,
+            "tx_sync_failures": 0,
+            "tx_sync_next_at": None,
+        }},
+    )
+    return {"synced": synced, "high_water": newest}
+
+
+def _card_tx_log_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Card transaction sync failed: {task.exception()}")
+
+
+def _card_tx_sync(settings: Optional[dict], order: dict) -> asyncio.Task:
+    """Start (or join) the sync for this card; concurrent callers share one provider walk."""
+    card_id = order["provider_card_id"]
+    task = _card_tx_syncs.get(card_id)
+    if task is None or task.done():
+        task = asyncio.create_task(_card_tx_sync_now(settings, order))
+        _card_tx_syncs[card_id] = task
+        task.add_done_callback(_card_tx_log_failure)
+    return task
+
+
+def _card_tx_is_fresh(order: dict) -> bool:
+    synced_at = order.get("tx_synced_at")
+    if not synced_at:
+        return False
+    try:
+        return (datetime.now(timezone.utc) - datetime.fromisoformat(synced_at)).total_seconds() < CARD_TX_FRESH_SECONDS
+    except Exception:
+        return False
+
+
+_CARD_TX_SYNC_PROJECTION = {
+    "_id": 0, "order_id": 1, "user_id": 1, "provider_card_id": 1, "tx_high_water": 1, "tx_sync_failures": 1,
+}
+
+
+async def _card_tx_claim(extra: Optional[dict] = None) -> Optional[dict]:
+    """
+    Atomically take one card flagged for sync (so only one worker syncs it).
+    Cards still backing off after a failed sync (tx_sync_next_at in the future) are left alone.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    return await db.virtual_card_orders.find_one_and_update(
+        {
+            "provider": "strowallet",
+            "status": "approved",
+            "tx_sync_pending": True,
+            "$or": [{"tx_sync_next_at": None}, {"tx_sync_next_at": {"$lte": now}}],
+            **(extra or {}),
+        },
+        {"$set": {"tx_sync_pending": False}},
+        projection=_CARD_TX_SYNC_PROJECTION,
+    )
+
+
+async def card_tx_mark_pending(provider_card_id: str) -> None:
+    """Webhook hook: flag the card for sync, then try to sync it right away in this process."""
+    if not provider_card_id:
+        return
+    result = await db.virtual_card_orders.update_one(
+        {"provider": "strowallet", "provider_card_id": provider_card_id, "status": "approved"},
+        {"$set": {"tx_sync_pending": True}},
+    )
+    if not result.matched_count:
+        return
+    order = await _card_tx_claim({"provider_card_id": provider_card_id})
+    if order:
+        _card_tx_sync(await get_settings_snapshot(), order)
+
+
+async def _card_tx_sync_tick(settings: Optional[dict], limit: int = 50) -> int:
+    """Sync up to `limit` flagged cards; a card that fails is backed off and not claimed again this tick."""
+    done = 0
+    for _ in range(limit):
+        order = await _card_tx_claim()
+        if not order:
+            break
+        done += 1
+        try:
+            await _card_tx_sync(settings, order)
+        except Exception:
+            # Leave it for the next webhook / view; failure was already logged.
+            pass
+    return done
+
+
+async def _card_tx_sync_loop() -> None:
+    """Periodic job: sync flagged cards whose webhook-triggered sync did not run or failed."""
+    while True:
+        await asyncio.sleep(CARD_TX_SYNC_INTERVAL_SECONDS)
+        try:
+            settings = await get_settings_snapshot()
+            if not _strowallet_enabled(settings):
+                continue
+            await _card_tx_sync_tick(settings)
+        except Exception as e:
+            logger.error(f"Card transaction sync loop error: {e}")
+
+
+def _card_tx_encode_cursor(doc: dict) -> str:
+    raw = f"{doc['occurred_at']}|{doc['txn_key']}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _card_tx_decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        occurred_at, txn_key = raw.split("|", 1)
+        return occurred_at, txn_key
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def _card_tx_page(
+    settings: Optional[dict],
+    order: dict,
+    *,
+    page: int,
+    take: int,
+    cursor: Optional[str],
+    tx_type: Optional[str],
+    tx_status: Optional[str],
+    since: Optional[str],
+    until: Optional[str],
+    refresh: bool,
+) -> Dict[str, Any]:
+    """Serve a page from the mirror (keyset on occurred_at, txn_key), syncing as needed."""
+    sync_error = None
+    if refresh or not order.get("tx_synced_at"):
+        # Explicit refresh or first view: wait for the provider.
+        try:
+            await asyncio.shield(_card_tx_sync(settings, order))
+        except HTTPException as e:
+            if not order.get("tx_synced_at"):
+                raise
+            sync_error = e.detail
+        except Exception as e:
+            if not order.get("tx_synced_at"):
+                raise HTTPException(status_code=502, detail=f"Strowallet API error: {e}")
+            sync_error = str(e)
+    elif not _card_tx_is_fresh(order):
+        _card_tx_sync(settings, order)
+
+    query: Dict[str, Any] = {"card_id": order["provider_card_id"]}
+    if tx_type:
+        query["type"] = tx_type.lower()
+    if tx_status:
+        query["status"] = tx_status.lower()
+    if since or until:
+        query["occurred_at"] = {}
+        if since:
+            query["occurred_at"]["$gte"] = since
+        if until:
+            query["occurred_at"]["$lt"] = until
+    if cursor:
+        occurred_at, txn_key = _card_tx_decode_cursor(cursor)
+        query["$or"] = [
+            {"occurred_at": {"$lt": occurred_at}},
+            {"occurred_at": occurred_at, "txn_key": {"$lt": txn_key}},
+        ]
+
+    find = db.card_transactions.find(query, {"_id": 0, "raw": 1, "occurred_at": 1, "txn_key": 1}).sort(
+        [("occurred_at", -1), ("txn_key", -1)]
+    )
+    if not cursor and page > 1:
+        find = find.skip((page - 1) * take)
+    docs = await find.limit(take + 1).to_list(take + 1)
+    has_more = len(docs) > take
+    docs = docs[:take]
+
+    fresh = await db.virtual_card_orders.find_one(
+        {"order_id": order["order_id"]}, {"_id": 0, "tx_synced_at": 1, "tx_sync_error": 1}
+    ) or {}
+    return {
+        "provider": "strowallet",
+        "order_id": order["order_id"],
+        "transactions": [d["raw"] for d in docs],
+        "next_cursor": _card_tx_encode_cursor(docs[-1]) if has_more and docs else None,
+        "synced_at": fresh.get("tx_synced_at"),
+        "sync_error": sync_error or fresh.get("tx_sync_error"),
+    }
+
+
 @api_router.get("/virtual-cards/{order_id}/transactions")
 async def virtual_card_transactions(
     order_id: str,
     page: int = Query(default=1, ge=1, le=10000),
     take: int = Query(default=50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    tx_type: Optional[str] = Query(default=None, alias="type"),
+    tx_status: Optional[str] = Query(default=None, alias="status"),
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    refresh: bool = False,
     current_user: dict = Depends(get_current_user),
 ):
     """
-    Fetch Strowallet card transactions for a user's approved card.
-    Requires provider card id and Strowallet automation enabled.
+    Card transactions for a user's approved Strowallet card, served from the local mirror.
+    Pass `cursor` (from `next_cursor`) for keyset pagination and `refresh=true` to sync first.
     """
-    settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
+    settings = await get_settings_snapshot()
     if not _virtual_cards_enabled(settings):
         raise HTTPException(status_code=403, detail="Virtual cards are currently disabled")
 
@@ -4285,15 +6627,12 @@ async def virtual_card_transactions(
             "transactions": []
         }
 
-    payload: Dict[str, Any] = {
-        "card_id": order.get("provider_card_id"),
-        "page": str(page),
-        "take": str(take),
-        "reference": f"tx-{order_id}-{page}-{take}",
-    }
-    payload = _with_aliases(payload, "card_id", "cardId", "id")
-    resp = await _strowallet_post(settings, cfg["card_tx_path"], payload)
-    return {"provider": "strowallet", "order_id": order_id, "response": resp}
+    return await _card_tx_page(
+        settings, order,
+        page=page, take=take, cursor=cursor,
+        tx_type=tx_type, tx_status=tx_status, since=since, until=until,
+        refresh=refresh,
+    )
 
 
 @api_router.get("/virtual-cards/{order_id}/history")
@@ -4301,13 +6640,19 @@ async def virtual_card_full_history(
     order_id: str,
     page: int = Query(default=1, ge=1, le=10000),
     take: int = Query(default=50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    tx_type: Optional[str] = Query(default=None, alias="type"),
+    tx_status: Optional[str] = Query(default=None, alias="status"),
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    refresh: bool = False,
     current_user: dict = Depends(get_current_user),
 ):
     """
-    Fetch full card history if provider offers a dedicated endpoint.
-    Falls back to transactions endpoint if not configured.
+    Full card history from the local mirror (synced from the provider's history endpoint
+    when only that one is configured, otherwise from the transactions endpoint).
     """
-    settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
+    settings = await get_settings_snapshot()
     if not _virtual_cards_enabled(settings):
         raise HTTPException(status_code=403, detail="Virtual cards are currently disabled")
 
@@ -4321,19 +6666,18 @@ async def virtual_card_full_history(
         raise HTTPException(status_code=400, detail="This card is not eligible for provider history")
 
     cfg = _strowallet_config(settings)
-    path = cfg.get("full_history_path") or cfg.get("card_tx_path")
+    path = cfg.get("card_tx_path") or cfg.get("full_history_path")
     if not path:
         raise HTTPException(status_code=400, detail="Card history endpoint not configured")
 
-    payload: Dict[str, Any] = {
-        "card_id": order.get("provider_card_id"),
-        "page": str(page),
-        "take": str(take),
-        "reference": f"hist-{order_id}-{page}-{take}",
-    }
-    payload = _with_aliases(payload, "card_id", "cardId", "id")
-    resp = await _strowallet_post(settings, path, payload)
-    return {"provider": "strowallet", "order_id": order_id, "response": resp, "path_used": path}
+    result = await _card_tx_page(
+        settings, order,
+        page=page, take=take, cursor=cursor,
+        tx_type=tx_type, tx_status=tx_status, since=since, until=until,
+        refresh=refresh,
+    )
+    result["path_used"] = path
+    return result
 
 
 class FreezeUnfreezeRequest(BaseModel):
@@ -4350,7 +6694,7 @@ async def virtual_card_freezeunfreeze(
     Freeze/unfreeze card. Supports either a single provider endpoint (freeze_unfreeze_path)
     or separate freeze/unfreeze paths.
     """
-    settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
+    settings = await get_settings_snapshot()
     if not _virtual_cards_enabled(settings):
         raise HTTPException(status_code=403, detail="Virtual cards are currently disabled")
 
@@ -4387,7 +6731,7 @@ async def virtual_card_withdraw_status(
     withdrawal_id: str,
     current_user: dict = Depends(get_current_user),
 ):
-    settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
+    settings = await get_settings_snapshot()
     if not _virtual_cards_enabled(settings):
         raise HTTPException(status_code=403, detail="Virtual cards are currently disabled")
 
@@ -4409,7 +6753,7 @@ async def virtual_card_withdraw_status(
         "transactionReference": record.get("provider_txn_id"),
         "transaction_reference": record.get("provider_txn_id"),
     }
-    resp = await _strowallet_post(settings, cfg["withdraw_status_path"], payload)
+    resp = await _strowallet_post(settings, cfg["withdraw_status_path"], payload, idempotent=True)
     return {"provider": "strowallet", "withdrawal": record, "response": resp}
 
 
@@ -4424,7 +6768,7 @@ async def virtual_card_upgrade_limit(
     payload: UpgradeLimitRequest,
     current_user: dict = Depends(get_current_user),
 ):
-    settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
+    settings = await get_settings_snapshot()
     if not _virtual_cards_enabled(settings):
         raise HTTPException(status_code=403, detail="Virtual cards are currently disabled")
 
@@ -4479,62 +6823,39 @@ async def admin_fetch_external_card_details(
         raise HTTPException(status_code=400, detail="Card provider not configured")
 
     card_id = request.card_id.strip()
-    stw_detail = None
-    last_error = None
+    payload: Dict[str, Any] = {
+        "card_id": card_id,
+        "public_key": cfg.get("api_key", ""),
+        "mode": "live",  # MUST be "live" to get full card number and CVV
+        "show_cvv": True,
+        "show_pan": True,
+        "include_cvv": True,
+        "include_pan": True,
+        "reference": f"fetch-ext-{admin['user_id']}-{card_id[:8]}",
+    }
+    # Add secret if available
+    if cfg.get("api_secret"):
+        payload["secret_key"] = cfg["api_secret"]
 
-    # Try multiple endpoint formats (Strowallet has different API versions)
-    endpoints_to_try = []
-    
-    # 1. Configured endpoint (if any)
-    if cfg.get("fetch_detail_path"):
-        endpoints_to_try.append(("configured", cfg.get("base_url", "https://strowallet.com"), cfg["fetch_detail_path"]))
-    
-    # 2. Alternative Strowallet API (api.strowallet.com)
-    endpoints_to_try.append(("api_v1", "https://api.strowallet.com", "/card/fetch-details/"))
-    
-    # 3. Standard bitvcard endpoint
-    endpoints_to_try.append(("bitvcard", cfg.get("base_url", "https://strowallet.com"), "/api/bitvcard/fetch-card-detail/"))
-
-    for endpoint_name, base_url, path in endpoints_to_try:
-        payload: Dict[str, Any] = {
-            "card_id": card_id,
-            "public_key": cfg.get("api_key", ""),
-            "mode": "live",  # MUST be "live" to get full card number and CVV
-            "show_cvv": True,
-            "show_pan": True,
-            "include_cvv": True,
-            "include_pan": True,
-            "reference": f"fetch-ext-{admin['user_id']}-{card_id[:8]}",
-        }
-        # Add secret if available
-        if cfg.get("api_secret"):
-            payload["secret_key"] = cfg["api_secret"]
+    headers = {
+        "Content-Type": "application/json",
+        "Accept": "application/json",
+    }
+    if cfg.get("api_key"):
+        headers["x-api-key"] = cfg["api_key"]
+        headers["public_key"] = cfg["api_key"]
+    if cfg.get("api_secret"):
+        headers["secret_key"] = cfg["api_secret"]
 
-        try:
-            url = base_url.rstrip("/") + "/" + path.lstrip("/")
-            headers = {
-                "Content-Type": "application/json",
-                "Accept": "application/json",
-            }
-            if cfg.get("api_key"):
-                headers["x-api-key"] = cfg["api_key"]
-                headers["public_key"] = cfg["api_key"]
-            if cfg.get("api_secret"):
-                headers["secret_key"] = cfg["api_secret"]
+    def _accept(status_code: int, data: Any) -> Optional[str]:
+        if not isinstance(data, dict):
+            return f"Status {status_code}"
+        if status_code == 200 and data.get("status") != "error" and data.get("success") != False:
+            return None
+        return data.get("message") or data.get("detail") or f"Status {status_code}"
 
-            async with httpx.AsyncClient(timeout=httpx.Timeout(30.0)) as client:
-                resp = await client.post(url, json=payload, headers=headers)
-                data = resp.json()
-                
-                # Check if successful
-                if resp.status_code == 200 and data.get("status") != "error" and data.get("success") != False:
-                    stw_detail = data
-                    break
-                else:
-                    last_error = data.get("message") or data.get("detail") or f"Status {resp.status_code}"
-        except Exception as e:
-            last_error = str(e)
-            continue
+    # Strowallet has different API versions; the endpoint layer tries the last working one first.
+    stw_detail, _, last_error = await _strowallet_fetch_detail_routed(cfg, payload, headers, _accept)
 
     if not stw_detail:
         # Provide helpful error message
@@ -4544,261 +6865,13 @@ async def admin_fetch_external_card_details(
 
     # Log the response for debugging
     logger.info(f"Strowallet API raw response: {stw_detail}")
-    
-    # Try to find card data in various locations
-    # Strowallet API returns data in: response.card_detail
-    card_data = None
-    
-    # Option 1: response.card_detail (Strowallet actual format!)
-    if isinstance(stw_detail.get("response"), dict):
-        r = stw_detail["response"]
-        if isinstance(r.get("card_detail"), dict):
-            card_data = r["card_detail"]
-            logger.info(f"Found card data in 'response.card_detail': {list(card_data.keys())}")
-        elif r.get("card_number") or r.get("cardNumber") or r.get("pan"):
-            card_data = r
-            logger.info(f"Found card data in 'response': {list(r.keys())}")
-    
-    # Option 2: data.card_detail
-    if not card_data and isinstance(stw_detail.get("data"), dict):
-        d = stw_detail["data"]
-        if isinstance(d.get("card_detail"), dict):
-            card_data = d["card_detail"]
-            logger.info(f"Found card data in 'data.card_detail': {list(card_data.keys())}")
-        elif d.get("card_number") or d.get("cardNumber") or d.get("pan"):
-            card_data = d
-            logger.info(f"Found card data in 'data': {list(d.keys())}")
-    
-    # Option 3: card_detail directly in root
-    if not card_data and isinstance(stw_detail.get("card_detail"), dict):
-        card_data = stw_detail["card_detail"]
-        logger.info(f"Found card data in 'card_detail': {list(card_data.keys())}")
-    
-    # Option 4: card_number is directly in root
-    if not card_data:
-        if stw_detail.get("card_number") or stw_detail.get("cardNumber") or stw_detail.get("pan"):
-            card_data = stw_detail
-            logger.info(f"Found card data in root: {list(stw_detail.keys())}")
-    
-    # If still no card_data, use the full response for extraction
-    if not card_data:
-        card_data = stw_detail
-        logger.warning(f"Could not find card data wrapper, using full response: {list(stw_detail.keys()) if isinstance(stw_detail, dict) else type(stw_detail)}")
-    
-    # Log all available keys in card_data for debugging
-    if isinstance(card_data, dict):
-        logger.info(f"card_data keys: {list(card_data.keys())}")
-        logger.info(f"card_data sample values: {[(k, str(v)[:50]) for k, v in list(card_data.items())[:10]]}")
-    
-    # Extract card fields - try many possible field names
-    card_number = (
-        card_data.get("card_number") or card_data.get("cardNumber") or 
-        card_data.get("pan") or card_data.get("card_pan") or
-        card_data.get("masked_pan") or card_data.get("unmasked_pan") or
-        card_data.get("number") or card_data.get("card_no") or
-        card_data.get("account_number") or card_data.get("cardNo") or
-        card_data.get("masked_card_number") or card_data.get("full_card_number") or
-        _extract_first(stw_detail, "response.card_detail.card_number", "response.card_detail.pan", 
-                       "response.card_number", "data.card_number", "message.card_number")
-    )
-    
-    # Log what we found for debugging
-    logger.info(f"Extracted card_number: {'YES - ' + str(card_number)[:6] + '...' if card_number else 'NO'}")
-    
-    # Try to get expiry from combined field first (e.g., "expiry": "12/26" or "valid_thru": "2026-12")
-    combined_expiry = (
-        card_data.get("expiry") or card_data.get("expiry_date") or 
-        card_data.get("valid_thru") or card_data.get("validity") or
-        card_data.get("card_expiry") or card_data.get("expiration") or
-        card_data.get("expiration_date") or card_data.get("exp_date") or
-        _extract_first(stw_detail, "response.card_detail.expiry", "response.card_detail.expiry_date",
-                       "response.card_detail.validity", "response.card_detail.valid_thru")
-    )
-    
-    expiry_month = None
-    expiry_year = None
-    
-    # Try to parse combined expiry field
-    if combined_expiry:
-        exp_str = str(combined_expiry)
-        logger.info(f"Found combined expiry: {exp_str}")
-        # Try various formats: MM/YY, MM/YYYY, YYYY-MM, MM-YY
-        if "/" in exp_str:
-            parts = exp_str.split("/")
-            if len(parts) == 2:
-                if len(parts[0]) <= 2:  # MM/YY or MM/YYYY
-                    expiry_month = parts[0]
-                    expiry_year = parts[1]
-                else:  # YYYY/MM
-                    expiry_year = parts[0]
-                    expiry_month = parts[1]
-        elif "-" in exp_str:
-            parts = exp_str.split("-")
-            if len(parts) >= 2:
-                if len(parts[0]) == 4:  # YYYY-MM
-                    expiry_year = parts[0]
-                    expiry_month = parts[1]
-                else:  # MM-YY
-                    expiry_month = parts[0]
-                    expiry_year = parts[1]
-    
-    # If not from combined, try individual fields
-    if not expiry_month:
-        expiry_month = (
-            card_data.get("expiry_month") or card_data.get("expiryMonth") or 
-            card_data.get("exp_month") or card_data.get("expMonth") or
-            card_data.get("month") or card_data.get("expiry_mm") or
-            card_data.get("card_expiry_month") or card_data.get("validity_month") or
-            card_data.get("expiration_month") or
-            _extract_first(stw_detail, "response.card_detail.expiry_month", "response.expiry_month", "data.expiry_month")
-        )
-    if not expiry_year:
-        expiry_year = (
-            card_data.get("expiry_year") or card_data.get("expiryYear") or 
-            card_data.get("exp_year") or card_data.get("expYear") or
-            card_data.get("year") or card_data.get("expiry_yy") or
-            card_data.get("card_expiry_year") or card_data.get("validity_year") or
-            card_data.get("expiration_year") or
-            _extract_first(stw_detail, "response.card_detail.expiry_year", "response.expiry_year", "data.expiry_year")
-        )
-    
-    logger.info(f"Extracted expiry_month: {expiry_month}, expiry_year: {expiry_year}")
-    cvv = (
-        card_data.get("cvv") or card_data.get("cvc") or 
-        card_data.get("cvv2") or card_data.get("security_code") or
-        card_data.get("cvv_code") or card_data.get("cvc2") or
-        card_data.get("card_cvv") or card_data.get("card_cvc") or
-        _extract_first(stw_detail, "response.card_detail.cvv", "response.cvv", "data.cvv")
-    )
-    holder_name = (
-        card_data.get("card_holder_name") or card_data.get("cardHolderName") or 
-        card_data.get("name_on_card") or card_data.get("cardholder_name") or
-        card_data.get("card_name") or  # Sometimes card_name is used for holder name
-        _extract_first(stw_detail, "response.card_detail.card_holder_name", "response.card_holder_name", "data.card_holder_name")
-    )
-    balance = (
-        card_data.get("balance") or card_data.get("card_balance") or
-        _extract_first(stw_detail, "response.card_detail.balance", "data.balance", "data.card.balance", "balance")
-    )
-    currency = (
-        card_data.get("currency") or card_data.get("card_currency") or
-        _extract_first(stw_detail, "response.card_detail.currency", "data.currency", "data.card.currency", "currency")
-    ) or "USD"
-    card_status = (
-        card_data.get("status") or card_data.get("card_status") or card_data.get("is_active") or
-        _extract_first(stw_detail, "response.card_detail.status", "data.status", "data.card.status", "status", "card_status")
-    ) or "active"
-    card_type = (
-        card_data.get("card_type") or card_data.get("cardType") or 
-        card_data.get("card_brand") or card_data.get("brand") or card_data.get("type") or
-        _extract_first(stw_detail, "response.card_detail.card_type", "response.card_detail.card_brand",
-                       "data.card_type", "data.cardType", "data.type", "data.brand", "card_type", "cardType", "type", "brand")
-    ) or "visa"
-    # Helper function to extract address from an object
-    def extract_address_from_obj(obj):
-        if not isinstance(obj, dict):
-            return None, None, None, None, None
-        addr = (
-            obj.get("street") or obj.get("address") or obj.get("street_address") or
-            obj.get("address_line1") or obj.get("address_line_1") or obj.get("line1") or 
-            obj.get("address1") or obj.get("address_1") or obj.get("billing_street") or
-            obj.get("street_line_1") or obj.get("house_no") or obj.get("house_number")
-        )
-        city = (
-            obj.get("city") or obj.get("town") or obj.get("city_name") or 
-            obj.get("billing_city") or obj.get("locality")
-        )
-        state = (
-            obj.get("state") or obj.get("region") or obj.get("province") or 
-            obj.get("billing_state") or obj.get("state_name") or obj.get("state_code")
-        )
-        country = (
-            obj.get("country") or obj.get("country_code") or obj.get("country_name") or 
-            obj.get("billing_country") or obj.get("nation")
-        )
-        zipcode = (
-            obj.get("zip") or obj.get("zip_code") or obj.get("zipCode") or 
-            obj.get("postal_code") or obj.get("postcode") or obj.get("postalCode") or
-            obj.get("billing_zip") or obj.get("postal")
-        )
-        return addr, city, state, country, zipcode
-    
-    # Try multiple nested objects that might contain address
-    billing_address, billing_city, billing_state, billing_country, billing_zip = None, None, None, None, None
-    
-    # List of possible nested objects containing address
-    nested_keys = ["billing_address", "address", "billing", "meta_data", "metadata", 
-                   "card_address", "user_address", "billing_info", "address_info"]
-    
-    for key in nested_keys:
-        if isinstance(card_data.get(key), dict):
-            addr, city, state, country, zipcode = extract_address_from_obj(card_data[key])
-            if addr or city or country or zipcode:
-                logger.info(f"Found address in nested object '{key}'")
-                billing_address = billing_address or addr
-                billing_city = billing_city or city
-                billing_state = billing_state or state
-                billing_country = billing_country or country
-                billing_zip = billing_zip or zipcode
-    
-    # Also check in stw_detail.response if there's a separate address object
-    if isinstance(stw_detail.get("response"), dict):
-        for key in nested_keys:
-            if isinstance(stw_detail["response"].get(key), dict):
-                addr, city, state, country, zipcode = extract_address_from_obj(stw_detail["response"][key])
-                if addr or city or country or zipcode:
-                    logger.info(f"Found address in response.{key}")
-                    billing_address = billing_address or addr
-                    billing_city = billing_city or city
-                    billing_state = billing_state or state
-                    billing_country = billing_country or country
-                    billing_zip = billing_zip or zipcode
-    
-    # Try direct fields in card_data
-    if not billing_address:
-        billing_address = (
-            (card_data.get("billing_address") if not isinstance(card_data.get("billing_address"), dict) else None) or
-            (card_data.get("address") if not isinstance(card_data.get("address"), dict) else None) or
-            card_data.get("street") or card_data.get("street_address") or
-            card_data.get("address_line1") or card_data.get("address_line_1") or
-            card_data.get("line1") or card_data.get("address1") or card_data.get("house_no")
-        )
-    
-    if not billing_city:
-        billing_city = card_data.get("billing_city") or card_data.get("city") or card_data.get("town") or card_data.get("locality")
-    
-    if not billing_state:
-        billing_state = card_data.get("billing_state") or card_data.get("state") or card_data.get("region") or card_data.get("province")
-    
-    if not billing_country:
-        billing_country = card_data.get("billing_country") or card_data.get("country") or card_data.get("country_code") or card_data.get("country_name")
-    
-    if not billing_zip:
-        billing_zip = (
-            card_data.get("billing_zip") or card_data.get("zip_code") or card_data.get("zipCode") or 
-            card_data.get("postal_code") or card_data.get("postcode") or card_data.get("zip") or card_data.get("postal")
-        )
-    
-    # Log what we found
-    logger.info(f"Billing: address={billing_address}, city={billing_city}, state={billing_state}, country={billing_country}, zip={billing_zip}")
 
-    # Set default billing address if none found
-    DEFAULT_BILLING_ADDRESS = "3401 N. Miami, Ave. Ste 230"
-    DEFAULT_BILLING_CITY = "Miami"
-    DEFAULT_BILLING_STATE = "Florida"
-    DEFAULT_BILLING_COUNTRY = "United States"
-    DEFAULT_BILLING_ZIP = "33127"
-    
-    if not billing_address:
-        billing_address = DEFAULT_BILLING_ADDRESS
-    if not billing_city:
-        billing_city = DEFAULT_BILLING_CITY
-    if not billing_state:
-        billing_state = DEFAULT_BILLING_STATE
-    if not billing_country:
-        billing_country = DEFAULT_BILLING_COUNTRY
-    if not billing_zip:
-        billing_zip = DEFAULT_BILLING_ZIP
+    card = normalize_strowallet_card(stw_detail)
+    card_number = card["card_number"]
+    _, card_number_path = STROWALLET_CARD_SCHEMA["card_number"].match(_strowallet_locate_card(stw_detail), stw_detail)
+    logger.info(f"Extracted card_number: {'YES - ' + str(card_number)[:6] + '... via ' + str(card_number_path) if card_number else 'NO'}")
+    logger.info(f"Extracted expiry_month: {card['expiry_month']}, expiry_year: {card['expiry_year']}")
+    logger.info(f"Billing: address={card['billing_address']}, city={card['billing_city']}, state={card['billing_state']}, country={card['billing_country']}, zip={card['billing_zip']}")
 
     if not card_number:
         # Return the full response for debugging
@@ -4809,24 +6882,30 @@ async def admin_fetch_external_card_details(
             debug_info = str(stw_detail)[:500]
         raise HTTPException(status_code=400, detail=f"Pa ka jwenn nimewo kat. Repons API: {debug_info}")
 
-    # Format expiry
-    card_expiry = None
-    if expiry_month and expiry_year:
-        em = str(expiry_month).zfill(2)
-        ey = str(expiry_year)[-2:] if len(str(expiry_year)) == 4 else str(expiry_year)
-        card_expiry = f"{em}/{ey}"
+    expiry_month = card["expiry_month"]
+    expiry_year = card["expiry_year"]
+    cvv = card["cvv"]
+    holder_name = card["card_holder_name"]
+    balance = card["balance"]
+    card_type = card["card_type"] or "visa"
+    # Set default billing address if none found
+    billing_address = card["billing_address"] or "3401 N. Miami, Ave. Ste 230"
+    billing_city = card["billing_city"] or "Miami"
+    billing_state = card["billing_state"] or "Florida"
+    billing_country = card["billing_country"] or "United States"
+    billing_zip = card["billing_zip"] or "33127"
 
     return {
         "card_id": request.card_id.strip(),
         "card_number": str(card_number),
-        "card_expiry": card_expiry,
+        "card_expiry": card["card_expiry"],
         "expiry_month": str(expiry_month) if expiry_month else None,
         "expiry_year": str(expiry_year) if expiry_year else None,
         "cvv": str(cvv) if cvv else None,
         "card_holder_name": str(holder_name) if holder_name else None,
         "balance": float(balance) if balance else None,
-        "currency": str(currency),
-        "card_status": str(card_status),
+        "currency": str(card["currency"] or "USD"),
+        "card_status": str(card["card_status"] or "active"),
         "card_type": str(card_type).lower() if card_type else "visa",
         "billing_address": str(billing_address) if billing_address else None,
         "billing_city": str(billing_city) if billing_city else None,
@@ -4883,84 +6962,40 @@ async def admin_link_external_card(
     if not cfg.get("api_key"):
         raise HTTPException(status_code=400, detail="Card provider not configured")
 
-    stw_detail = None
-    last_error = None
+    payload: Dict[str, Any] = {
+        "card_id": card_id,
+        "public_key": cfg.get("api_key", ""),
+        "mode": cfg.get("mode", "live"),
+        "reference": f"link-{target_user['user_id']}-{card_id[:8]}",
+    }
+    if cfg.get("api_secret"):
+        payload["secret_key"] = cfg["api_secret"]
 
-    # Try multiple endpoint formats (Strowallet has different API versions)
-    endpoints_to_try = []
-    if cfg.get("fetch_detail_path"):
-        endpoints_to_try.append(("configured", cfg.get("base_url", "https://strowallet.com"), cfg["fetch_detail_path"]))
-    endpoints_to_try.append(("api_v1", "https://api.strowallet.com", "/card/fetch-details/"))
-    endpoints_to_try.append(("bitvcard", cfg.get("base_url", "https://strowallet.com"), "/api/bitvcard/fetch-card-detail/"))
-
-    for endpoint_name, base_url, path in endpoints_to_try:
-        payload: Dict[str, Any] = {
-            "card_id": card_id,
-            "public_key": cfg.get("api_key", ""),
-            "mode": cfg.get("mode", "live"),
-            "reference": f"link-{target_user['user_id']}-{card_id[:8]}",
-        }
-        if cfg.get("api_secret"):
-            payload["secret_key"] = cfg["api_secret"]
+    headers = {
+        "Content-Type": "application/json",
+        "Accept": "application/json",
+    }
+    if cfg.get("api_key"):
+        headers["x-api-key"] = cfg["api_key"]
+        headers["public_key"] = cfg["api_key"]
+    if cfg.get("api_secret"):
+        headers["secret_key"] = cfg["api_secret"]
 
-        try:
-            url = base_url.rstrip("/") + "/" + path.lstrip("/")
-            headers = {
-                "Content-Type": "application/json",
-                "Accept": "application/json",
-            }
-            if cfg.get("api_key"):
-                headers["x-api-key"] = cfg["api_key"]
-                headers["public_key"] = cfg["api_key"]
-            if cfg.get("api_secret"):
-                headers["secret_key"] = cfg["api_secret"]
+    def _accept(status_code: int, data: Any) -> Optional[str]:
+        if not isinstance(data, dict):
+            return f"Status {status_code}"
+        if status_code == 200 and data.get("status") != "error" and data.get("success") != False:
+            return None
+        return data.get("message") or data.get("detail") or f"Status {status_code}"
 
-            async with httpx.AsyncClient(timeout=httpx.Timeout(30.0)) as client:
-                resp = await client.post(url, json=payload, headers=headers)
-                data = resp.json()
-                
-                if resp.status_code == 200 and data.get("status") != "error" and data.get("success") != False:
-                    stw_detail = data
-                    break
-                else:
-                    last_error = data.get("message") or data.get("detail") or f"Status {resp.status_code}"
-        except Exception as e:
-            last_error = str(e)
-            continue
+    # Strowallet has different API versions; the endpoint layer tries the last working one first.
+    stw_detail, _, last_error = await _strowallet_fetch_detail_routed(cfg, payload, headers, _accept)
 
     if not stw_detail:
         raise HTTPException(status_code=400, detail=f"Failed to verify card: {last_error}")
 
-    # Find card data in response.card_detail (Strowallet actual format)
-    card_data = None
-    if isinstance(stw_detail.get("response"), dict):
-        r = stw_detail["response"]
-        if isinstance(r.get("card_detail"), dict):
-            card_data = r["card_detail"]
-            logger.info(f"[link] Found card data in 'response.card_detail': {list(card_data.keys())}")
-        elif r.get("card_number") or r.get("cardNumber") or r.get("pan"):
-            card_data = r
-    if not card_data and isinstance(stw_detail.get("data"), dict):
-        d = stw_detail["data"]
-        if isinstance(d.get("card_detail"), dict):
-            card_data = d["card_detail"]
-        elif d.get("card_number") or d.get("cardNumber") or d.get("pan"):
-            card_data = d
-    if not card_data and isinstance(stw_detail.get("card_detail"), dict):
-        card_data = stw_detail["card_detail"]
-    if not card_data:
-        card_data = stw_detail
-
-    logger.info(f"[link] card_data keys: {list(card_data.keys()) if isinstance(card_data, dict) else 'N/A'}")
-
-    # Extract card details - try card_data first, then fallback paths
-    card_number = (
-        card_data.get("card_number") or card_data.get("cardNumber") or 
-        card_data.get("pan") or card_data.get("card_pan") or
-        card_data.get("masked_pan") or card_data.get("unmasked_pan") or
-        card_data.get("number") or card_data.get("card_no") or
-        _extract_first(stw_detail, "response.card_detail.card_number", "data.card_number", "card_number")
-    )
+    card = normalize_strowallet_card(stw_detail)
+    card_number = card["card_number"]
     if not card_number:
         import json
         try:
@@ -4969,142 +7004,20 @@ async def admin_link_external_card(
             debug_info = str(stw_detail)[:500]
         raise HTTPException(status_code=400, detail=f"Could not verify card with provider. API Response: {debug_info}")
 
-    expiry_month = (
-        card_data.get("expiry_month") or card_data.get("expiryMonth") or 
-        card_data.get("exp_month") or card_data.get("expMonth") or
-        card_data.get("month") or card_data.get("expiry_mm") or
-        card_data.get("card_expiry_month") or card_data.get("validity_month") or
-        _extract_first(stw_detail, "response.card_detail.expiry_month", "data.expiry_month")
-    )
-    expiry_year = (
-        card_data.get("expiry_year") or card_data.get("expiryYear") or 
-        card_data.get("exp_year") or card_data.get("expYear") or
-        card_data.get("year") or card_data.get("expiry_yy") or
-        card_data.get("card_expiry_year") or card_data.get("validity_year") or
-        _extract_first(stw_detail, "response.card_detail.expiry_year", "data.expiry_year")
-    )
-    holder_name = (
-        card_data.get("card_holder_name") or card_data.get("cardHolderName") or 
-        card_data.get("name_on_card") or card_data.get("cardholder_name") or
-        card_data.get("card_name") or
-        _extract_first(stw_detail, "response.card_detail.card_holder_name", "data.card_holder_name")
-    )
-    card_type = (
-        card_data.get("card_type") or card_data.get("cardType") or 
-        card_data.get("card_brand") or card_data.get("brand") or card_data.get("type") or
-        _extract_first(stw_detail, "response.card_detail.card_type", "response.card_detail.card_brand", "data.card_type")
-    ) or "visa"
-    
-    # Helper function to extract address from an object
-    def extract_addr(obj):
-        if not isinstance(obj, dict):
-            return None, None, None, None, None
-        addr = (
-            obj.get("street") or obj.get("address") or obj.get("street_address") or
-            obj.get("address_line1") or obj.get("address_line_1") or obj.get("line1") or 
-            obj.get("address1") or obj.get("address_1") or obj.get("billing_street") or
-            obj.get("street_line_1") or obj.get("house_no") or obj.get("house_number")
-        )
-        city = (
-            obj.get("city") or obj.get("town") or obj.get("city_name") or 
-            obj.get("billing_city") or obj.get("locality")
-        )
-        state = (
-            obj.get("state") or obj.get("region") or obj.get("province") or 
-            obj.get("billing_state") or obj.get("state_name") or obj.get("state_code")
-        )
-        country = (
-            obj.get("country") or obj.get("country_code") or obj.get("country_name") or 
-            obj.get("billing_country") or obj.get("nation")
-        )
-        zipcode = (
-            obj.get("zip") or obj.get("zip_code") or obj.get("zipCode") or 
-            obj.get("postal_code") or obj.get("postcode") or obj.get("postalCode") or
-            obj.get("billing_zip") or obj.get("postal")
-        )
-        return addr, city, state, country, zipcode
-    
-    billing_address, billing_city, billing_state, billing_country, billing_zip = None, None, None, None, None
-    
-    # Check nested objects
-    nested_keys = ["billing_address", "address", "billing", "meta_data", "metadata", 
-                   "card_address", "user_address", "billing_info", "address_info"]
-    
-    for key in nested_keys:
-        if isinstance(card_data.get(key), dict):
-            addr, city, state, country, zipcode = extract_addr(card_data[key])
-            if addr or city or country or zipcode:
-                logger.info(f"[link] Found address in nested object '{key}'")
-                billing_address = billing_address or addr
-                billing_city = billing_city or city
-                billing_state = billing_state or state
-                billing_country = billing_country or country
-                billing_zip = billing_zip or zipcode
-    
-    # Check in stw_detail.response
-    if isinstance(stw_detail.get("response"), dict):
-        for key in nested_keys:
-            if isinstance(stw_detail["response"].get(key), dict):
-                addr, city, state, country, zipcode = extract_addr(stw_detail["response"][key])
-                if addr or city or country or zipcode:
-                    logger.info(f"[link] Found address in response.{key}")
-                    billing_address = billing_address or addr
-                    billing_city = billing_city or city
-                    billing_state = billing_state or state
-                    billing_country = billing_country or country
-                    billing_zip = billing_zip or zipcode
-    
-    # Try direct fields
-    if not billing_address:
-        billing_address = (
-            (card_data.get("billing_address") if not isinstance(card_data.get("billing_address"), dict) else None) or
-            (card_data.get("address") if not isinstance(card_data.get("address"), dict) else None) or
-            card_data.get("street") or card_data.get("street_address") or
-            card_data.get("address_line1") or card_data.get("address_line_1") or card_data.get("house_no")
-        )
-    
-    if not billing_city:
-        billing_city = card_data.get("billing_city") or card_data.get("city") or card_data.get("town") or card_data.get("locality")
-    
-    if not billing_state:
-        billing_state = card_data.get("billing_state") or card_data.get("state") or card_data.get("region") or card_data.get("province")
-    
-    if not billing_country:
-        billing_country = card_data.get("billing_country") or card_data.get("country") or card_data.get("country_code") or card_data.get("country_name")
-    
-    if not billing_zip:
-        billing_zip = (
-            card_data.get("billing_zip") or card_data.get("zip_code") or card_data.get("zipCode") or 
-            card_data.get("postal_code") or card_data.get("postcode") or card_data.get("zip") or card_data.get("postal")
-        )
-    
-    logger.info(f"[link] Billing: address={billing_address}, city={billing_city}, state={billing_state}, country={billing_country}, zip={billing_zip}")
+    holder_name = card["card_holder_name"]
+    card_type = card["card_type"] or "visa"
+    logger.info(f"[link] Billing: address={card['billing_address']}, city={card['billing_city']}, state={card['billing_state']}, country={card['billing_country']}, zip={card['billing_zip']}")
 
     # Set default billing address if none found
-    DEFAULT_BILLING_ADDRESS = "3401 N. Miami, Ave. Ste 230"
-    DEFAULT_BILLING_CITY = "Miami"
-    DEFAULT_BILLING_STATE = "Florida"
-    DEFAULT_BILLING_COUNTRY = "United States"
-    DEFAULT_BILLING_ZIP = "33127"
-    
-    if not billing_address:
-        billing_address = DEFAULT_BILLING_ADDRESS
-    if not billing_city:
-        billing_city = DEFAULT_BILLING_CITY
-    if not billing_state:
-        billing_state = DEFAULT_BILLING_STATE
-    if not billing_country:
-        billing_country = DEFAULT_BILLING_COUNTRY
-    if not billing_zip:
-        billing_zip = DEFAULT_BILLING_ZIP
+    billing_address = card["billing_address"] or "3401 N. Miami, Ave. Ste 230"
+    billing_city = card["billing_city"] or "Miami"
+    billing_state = card["billing_state"] or "Florida"
+    billing_country = card["billing_country"] or "United States"
+    billing_zip = card["billing_zip"] or "33127"
 
     # Format card details
     card_last4 = str(card_number)[-4:] if card_number else None
-    card_expiry = None
-    if expiry_month and expiry_year:
-        em = str(expiry_month).zfill(2)
-        ey = str(expiry_year)[-2:] if len(str(expiry_year)) == 4 else str(expiry_year)
-        card_expiry = f"{em}/{ey}"
+    card_expiry = card["card_expiry"]
 
     # Use provided email or user's email
     card_email = (request.card_email or "").strip() or target_user.get("email") or ""
@@ -5183,6 +7096,13 @@ async def strowallet_webhook(request: Request):
     is_failed = status in {"failed", "declined", "reversed", "error"}
     is_payment = ("payment" in event_type) or ("transaction" in event_type) or (event_type == "")
 
+    if card_id and is_payment:
+        # New card activity: pull it into the transactions mirror.
+        try:
+            await card_tx_mark_pending(str(card_id))
+        except Exception as e:
+            logger.warning(f"Failed to schedule card transaction sync for {card_id}: {e}")
+
     if not card_id or not (is_failed and is_payment):
         return {"ok": True}
 
@@ -5201,7 +7121,7 @@ async def strowallet_webhook(request: Request):
     updated = await db.virtual_card_orders.find_one({"order_id": order["order_id"]}, {"_id": 0})
     failed_count = int((updated or {}).get("failed_payment_count", 0) or 0)
 
-    settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
+    settings = await get_settings_snapshot()
     cfg = _strowallet_config(settings)
 
     # Auto-freeze on FIRST failed payment to prevent the card being blocked by multiple failures.
@@ -5235,7 +7155,7 @@ async def strowallet_webhook(request: Request):
     return {"ok": True, "failed_count": failed_count}
 
 # Admin: Get all card orders
-@api_router.get("/admin/virtual-card-orders")
+@api_router.get("/admin/virtual-card-orders", response_model=AdminCardOrdersPage)
 async def admin_get_card_orders(
     status: Optional[str] = None,
     limit: int = Query(default=50, le=200),
@@ -5273,7 +7193,7 @@ async def admin_get_card_orders(
             o["user_full_name"] = u.get("full_name")
             o["user_email"] = u.get("email")
 
-    return {"orders": orders}
+    return model_response(AdminCardOrdersPage, orders=orders)
 
 # Admin: Delete a single virtual card order (dangerous)
 @api_router.delete("/admin/virtual-card-orders/{order_id}")
@@ -5586,7 +7506,7 @@ async def admin_process_card_order(
                     detail_payload["customer_id"] = stw_customer_id
                     detail_payload["card_user_id"] = stw_customer_id
                 detail_payload = _with_aliases(detail_payload, "card_id", "cardId", "id")
-                stw_detail = await _strowallet_post(settings, cfg["fetch_detail_path"], detail_payload)
+                stw_detail = await _strowallet_post(settings, cfg["fetch_detail_path"], detail_payload, idempotent=True)
 
             src = stw_detail or stw_resp
             # Provider schemas vary; support common keys/casing.
@@ -6133,25 +8053,16 @@ async def create_agent_deposit(request: AgentDepositRequest, current_user: dict
 
     # Notify admins (email + telegram)
     try:
-        await notify_admin(
-            subject="KAYICOM - New Agent Deposit Request",
-            html=f"""
-            <h2>New Agent Deposit Request</h2>
-            <p><strong>Agent:</strong> {current_user.get('full_name','')} ({current_user.get('client_id','')})</p>
-            <p><strong>Client:</strong> {client.get('full_name','')} ({client.get('client_id','')})</p>
-            <p><strong>Amount USD:</strong> {request.amount_usd}</p>
-            <p><strong>HTG Received:</strong> {request.amount_htg_received}</p>
-            <p><strong>Commission:</strong> ${agent_deposit.get('commission_usd',0):.2f}</p>
-            <p>Deposit ID: <code>{agent_deposit['deposit_id']}</code></p>
-            """,
-            telegram_message=(
-                f"🧾 <b>New Agent Deposit</b>\n"
-                f"Agent: <b>{current_user.get('full_name','')}</b> ({current_user.get('client_id','')})\n"
-                f"Client: <b>{client.get('full_name','')}</b> ({client.get('client_id','')})\n"
-                f"USD: <b>${request.amount_usd}</b> | HTG: <b>G {request.amount_htg_received}</b>\n"
-                f"Commission: <b>${agent_deposit.get('commission_usd',0):.2f}</b>\n"
-                f"ID: <code>{agent_deposit['deposit_id']}</code>"
-            ),
+        await notify_admin_event(
+            "admin_new_agent_deposit",
+            agent_name=current_user.get("full_name", ""),
+            agent_client_id=current_user.get("client_id", ""),
+            client_name=client.get("full_name", ""),
+            client_id=client.get("client_id", ""),
+            amount_usd=request.amount_usd,
+            amount_htg_received=request.amount_htg_received,
+            commission_usd=float(agent_deposit.get("commission_usd", 0) or 0),
+            deposit_id=agent_deposit["deposit_id"],
         )
     except Exception as e:
         logger.error(f"Failed to notify admins for agent deposit: {e}")
@@ -6325,14 +8236,17 @@ async def admin_process_agent_deposit(
     
     new_status = "approved" if action == "approve" else "rejected"
     
-    await db.agent_deposits.update_one(
-        {"deposit_id": deposit_id},
+    claim = await db.agent_deposits.update_one(
+        {"deposit_id": deposit_id, "status": "pending"},
         {"$set": {
             "status": new_status,
             "processed_at": datetime.now(timezone.utc).isoformat(),
             "processed_by": admin["user_id"]
         }}
     )
+    if claim.modified_count == 0:
+        # A concurrent request (single or bulk) processed it since we read it.
+        raise HTTPException(status_code=400, detail="Deposit already processed")
     
     if action == "approve":
         # Credit the client's USD wallet
@@ -6375,48 +8289,42 @@ async def admin_process_agent_deposit(
         
         # Send Telegram notification to agent
         agent_settings = await db.agent_settings.find_one({"setting_id": "main"}, {"_id": 0})
+        agent = await db.users.find_one(
+            {"user_id": deposit["agent_id"]},
+            {"_id": 0, "email": 1, "full_name": 1, "language": 1, "telegram_chat_id": 1},
+        )
+        agent_lang = notification_language(agent)
+        agent_values = {
+            "full_name": (agent or {}).get("full_name", "Agent"),
+            "client_name": deposit["client_name"],
+            "amount_usd": float(deposit["amount_usd"]),
+            "commission_usd": float(deposit["commission_usd"]),
+            "deposit_id": deposit_id,
+        }
         if agent_settings and agent_settings.get("agent_whatsapp_notifications", True):
-            # Get agent's Telegram chat ID
-            agent = await db.users.find_one({"user_id": deposit["agent_id"]}, {"_id": 0, "telegram_chat_id": 1})
+            # Agent's Telegram chat ID
             agent_telegram_chat_id = agent.get("telegram_chat_id") if agent else None
             
             if agent_telegram_chat_id:
-                message = f"""✅ <b>Depo Apwouve!</b>
-
-Kliyan: {deposit['client_name']}
-Montan: ${deposit['amount_usd']:.2f} USD
-Komisyon ou: ${deposit['commission_usd']:.2f} USD
-
-Mèsi pou sèvis ou ak KAYICOM!"""
-                await send_telegram_notification(message, agent_telegram_chat_id)
+                message = render_notification("agent_deposit_approved", agent_lang, "telegram", **agent_values)
+                await send_telegram_notification(message, agent_telegram_chat_id, wait=False)
         
         # Send email notification to agent
-        agent = await db.users.find_one({"user_id": deposit["agent_id"]}, {"_id": 0, "email": 1, "full_name": 1})
         if agent and agent.get("email"):
-            subject = "KAYICOM - Agent Deposit Approved"
-            content = f"""
-            <h2>Agent Deposit Approved</h2>
-            <p>Hello {agent.get('full_name', 'Agent')},</p>
-            <p>Your deposit for client <strong>{deposit['client_name']}</strong> has been approved.</p>
-            <p><strong>Amount:</strong> ${deposit['amount_usd']:.2f} USD</p>
-            <p><strong>Your Commission:</strong> ${deposit['commission_usd']:.2f} USD</p>
-            <p>Transaction ID: <code>{deposit_id}</code></p>
-            <p>Thank you for your service with KAYICOM!</p>
-            """
-            await send_email(agent["email"], subject, content)
+            await send_templated_email(agent["email"], "agent_deposit_approved", agent_lang, **agent_values)
         
         # Send email notification to client
-        client = await db.users.find_one({"user_id": deposit["client_user_id"]}, {"_id": 0, "email": 1, "full_name": 1})
+        client = await db.users.find_one({"user_id": deposit["client_user_id"]}, {"_id": 0, "email": 1, "full_name": 1, "language": 1})
         if client and client.get("email"):
-            subject = "KAYICOM - Deposit Received"
-            content = f"""
-            <h2>Deposit Received</h2>
-            <p>Hello {client.get('full_name', 'User')},</p>
-            <p>Your deposit of <strong>${deposit['amount_usd']:.2f} USD</strong> from agent <strong>{deposit['agent_name']}</strong> has been approved and credited to your account.</p>
-            <p>Transaction ID: <code>{deposit_id}</code></p>
-            <p>Thank you for using KAYICOM!</p>
-            """
-            await send_email(client["email"], subject, content)
+            await send_templated_email(
+                client["email"],
+                "agent_deposit_received",
+                notification_language(client),
+                full_name=client.get("full_name", "User"),
+                amount_usd=float(deposit["amount_usd"]),
+                agent_name=deposit["agent_name"],
+                deposit_id=deposit_id,
+            )
     
     await log_action(admin["user_id"], "agent_deposit_process", {"deposit_id": deposit_id, "action": action})
     
@@ -6554,40 +8462,107 @@ async def agent_get_reports(current_user: dict = Depends(get_agent_user)):
     ).sort("created_at", -1).to_list(100)
     return {"reports": reports}
 
-# Agent: Download transaction history (last 7 days)
+# Agent: Download transaction history
+AGENT_EXPORT_MAX_DAYS = int(os.environ.get("AGENT_EXPORT_MAX_DAYS", "731"))
+AGENT_EXPORT_JSON_LIMIT = 1000
+AGENT_EXPORT_COLUMNS = ["date", "deposit_id", "client_name", "client_id", "amount_usd", "amount_htg_received", "commission_usd", "status"]
+# Never pull proof_image (base64 upload) or other heavy fields into an export.
+_AGENT_EXPORT_PROJECTION = {"_id": 0, "created_at": 1, **{c: 1 for c in AGENT_EXPORT_COLUMNS[1:]}}
+
+
+async def _agent_export_totals(query: dict) -> Dict[str, Any]:
+    """Totals for the whole range (hot and archived deposits) in one aggregation round trip."""
+    hot, *archived = await archive_range_collections("agent_deposits", query)
+    rows = await db[hot].aggregate([
+        {"$match": query},
+        *({"$unionWith": {"coll": name, "pipeline": [{"$match": query}]}} for name in archived),
+        {"$group": {
+            "_id": None,
+            "total_deposits": {"$sum": 1},
+            "total_usd": {"$sum": {"$cond": [{"$eq": ["$status", "approved"]}, "$amount_usd", 0]}},
+            "total_commission": {"$sum": {"$cond": [{"$eq": ["$status", "approved"]}, "$commission_usd", 0]}},
+        }},
+    ]).to_list(1)
+    totals = rows[0] if rows else {"total_deposits": 0, "total_usd": 0, "total_commission": 0}
+    totals.pop("_id", None)
+    return totals
+
+
+def _agent_export_row(d: dict) -> Dict[str, Any]:
+    return {
+        "date": d.get("created_at"),
+        "deposit_id": d.get("deposit_id"),
+        "client_name": d.get("client_name"),
+        "client_id": d.get("client_id"),
+        "amount_usd": d.get("amount_usd"),
+        "amount_htg_received": d.get("amount_htg_received"),
+        "commission_usd": d.get("commission_usd"),
+        "status": d.get("status"),
+    }
+
+
+async def _agent_export_csv_stream(query: dict, totals: Dict[str, Any]):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=AGENT_EXPORT_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    async for d in archive_find_range("agent_deposits", query, _AGENT_EXPORT_PROJECTION, descending=True):
+        writer.writerow(_agent_export_row(d))
+        if buf.tell() >= STATEMENT_CHUNK_BYTES:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    totals_writer = csv.writer(buf)
+    totals_writer.writerow([])
+    totals_writer.writerow(["total_deposits", "total_usd_approved", "total_commission_approved"])
+    totals_writer.writerow([totals["total_deposits"], round(totals["total_usd"], 2), round(totals["total_commission"], 2)])
+    yield buf.getvalue()
+
+
 @api_router.get("/agent/export-history")
-async def agent_export_history(current_user: dict = Depends(get_agent_user)):
-    """Export agent deposit history for last 7 days"""
-    seven_days_ago = datetime.now(timezone.utc) - timedelta(days=7)
-    
-    deposits = await db.agent_deposits.find(
-        {
-            "agent_id": current_user["user_id"],
-            "created_at": {"$gte": seven_days_ago.isoformat()}
-        },
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(1000)
-    
-    # Format for export
-    export_data = []
-    for d in deposits:
-        export_data.append({
-            "date": d["created_at"],
-            "client_name": d["client_name"],
-            "client_id": d["client_id"],
-            "amount_usd": d["amount_usd"],
-            "amount_htg_received": d["amount_htg_received"],
-            "commission_usd": d["commission_usd"],
-            "status": d["status"]
-        })
-    
+async def agent_export_history(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    format: Literal["json", "csv"] = "json",
+    current_user: dict = Depends(get_agent_user)
+):
+    """
+    Export agent deposit history for [start, end] (YYYY-MM-DD, inclusive; defaults to the last 7 days).
+    format=csv streams every row; json returns up to AGENT_EXPORT_JSON_LIMIT rows. Totals always cover the full range.
+    """
+    now = datetime.now(timezone.utc)
+    if start or end:
+        start_dt, end_dt = _parse_export_range(
+            start or (now - timedelta(days=7)).date().isoformat(),
+            end or now.date().isoformat(),
+            AGENT_EXPORT_MAX_DAYS,
+        )
+    else:
+        start_dt, end_dt = now - timedelta(days=7), now
+    query = {
+        "agent_id": current_user["user_id"],
+        "created_at": {"$gte": start_dt.isoformat(), "$lt": end_dt.isoformat()},
+    }
+    totals = await _agent_export_totals(query)
+
+    if format == "csv":
+        filename = f"agent-history-{start_dt.date().isoformat()}-{(end_dt - timedelta(seconds=1)).date().isoformat()}.csv"
+        return StreamingResponse(
+            _agent_export_csv_stream(query, totals),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+
+    deposits = [
+        d async for d in archive_find_range(
+            "agent_deposits", query, _AGENT_EXPORT_PROJECTION, descending=True, limit=AGENT_EXPORT_JSON_LIMIT
+        )
+    ]
     return {
-        "history": export_data,
-        "period_start": seven_days_ago.isoformat(),
-        "period_end": datetime.now(timezone.utc).isoformat(),
-        "total_deposits": len(export_data),
-        "total_usd": sum(d["amount_usd"] for d in export_data if d["status"] == "approved"),
-        "total_commission": sum(d["commission_usd"] for d in export_data if d["status"] == "approved")
+        "history": [_agent_export_row(d) for d in deposits],
+        "period_start": start_dt.isoformat(),
+        "period_end": end_dt.isoformat(),
+        "truncated": totals["total_deposits"] > len(deposits),
+        **totals,
     }
 
 # Admin: Recharge agent account
@@ -6843,24 +8818,15 @@ async def agent_create_commission_withdrawal(payload: AgentCommissionWithdrawalC
 
     # Notify admins (email + telegram)
     try:
-        await notify_admin(
-            subject="KAYICOM - New Agent Commission Withdrawal",
-            html=f"""
-            <h2>New Agent Commission Withdrawal</h2>
-            <p><strong>Agent:</strong> {current_user.get('full_name','')} ({current_user.get('client_id','')})</p>
-            <p><strong>Amount:</strong> ${amount:.2f} USD</p>
-            <p><strong>Fee:</strong> ${fee:.2f} USD</p>
-            <p><strong>Net:</strong> ${net_amount:.2f} USD</p>
-            <p><strong>Method:</strong> {method.get('payment_method_name')}</p>
-            <p>Withdrawal ID: <code>{withdrawal_id}</code></p>
-            """,
-            telegram_message=(
-                f"💸 <b>Agent Commission Withdrawal</b>\n"
-                f"Agent: <b>{current_user.get('full_name','')}</b> ({current_user.get('client_id','')})\n"
-                f"Amount: <b>${amount:.2f}</b> | Fee: <b>${fee:.2f}</b> | Net: <b>${net_amount:.2f}</b>\n"
-                f"Method: <b>{method.get('payment_method_name')}</b>\n"
-                f"ID: <code>{withdrawal_id}</code>"
-            ),
+        await notify_admin_event(
+            "admin_new_agent_commission_withdrawal",
+            agent_name=current_user.get("full_name", ""),
+            agent_client_id=current_user.get("client_id", ""),
+            amount=amount,
+            fee=fee,
+            net_amount=net_amount,
+            method=method.get("payment_method_name"),
+            withdrawal_id=withdrawal_id,
         )
     except Exception as e:
         logger.error(f"Failed to notify admins for agent commission withdrawal: {e}")
@@ -6975,7 +8941,7 @@ async def admin_dashboard(admin: dict = Depends(get_admin_user)):
         "total_usd": total_balances.get("total_usd", 0)
     }
 
-@api_router.get("/admin/users")
+@api_router.get("/admin/users", response_model=AdminUsersPage)
 async def admin_get_users(
     search: Optional[str] = None,
     kyc_status: Optional[str] = None,
@@ -6996,7 +8962,7 @@ async def admin_get_users(
     users = await db.users.find(query, {"_id": 0, "password_hash": 0}).skip(skip).limit(limit).to_list(limit)
     total = await db.users.count_documents(query)
     
-    return {"users": users, "total": total}
+    return model_response(AdminUsersPage, users=users, total=total)
 
 @api_router.get("/admin/users/{user_id}")
 async def admin_get_user(user_id: str, admin: dict = Depends(get_admin_user)):
@@ -7061,7 +9027,7 @@ async def admin_adjust_balance(user_id: str, adjustment: BalanceAdjustment, admi
     return {"message": "Balance adjusted successfully"}
 
 # KYC Admin
-@api_router.get("/admin/kyc")
+@api_router.get("/admin/kyc", response_model=AdminKYCPage)
 async def admin_get_kyc_submissions(
     status: Optional[str] = None,
     limit: int = Query(default=50, le=200),
@@ -7128,16 +9094,17 @@ async def admin_get_kyc_submissions(
         "rejected": await db.kyc.count_documents({"status": "rejected"}),
         "total": await db.kyc.count_documents({}),
     }
-    return {
-        "submissions": submissions,
-        "stats": stats,
-        "meta": {
+    return model_response(
+        AdminKYCPage,
+        submissions=submissions,
+        stats=stats,
+        meta={
             "page": page,
             "limit": limit,
             "total_matches": total_matches,
             "query": (q or "").strip() or None,
         },
-    }
+    )
 
 @api_router.get("/admin/kyc/{kyc_id}")
 async def admin_get_kyc(
@@ -7195,13 +9162,10 @@ async def admin_review_kyc(
     # Send email notification
     user = await db.users.find_one({"user_id": kyc["user_id"]}, {"_id": 0})
     if user:
-        subject = "KAYICOM - KYC Verification " + ("Approved" if action == "approve" else "Rejected")
-        content = f"""
-        <h2>KYC Verification Update</h2>
-        <p>Your KYC verification has been {'approved' if action == 'approve' else 'rejected'}.</p>
-        {'<p>Reason: ' + rejection_reason + '</p>' if rejection_reason else ''}
-        """
-        await send_email(user["email"], subject, content)
+        lang = notification_language(user)
+        status_label = notification_label("approved" if action == "approve" else "rejected", lang)
+        reason_html = render_notification("kyc_reason", lang, "html", reason=rejection_reason) if rejection_reason else ""
+        await send_templated_email(user["email"], "kyc_reviewed", lang, status_label=status_label, reason_html=reason_html)
     
     return {"message": f"KYC {action}d successfully"}
 
@@ -7270,7 +9234,7 @@ async def admin_migrate_kyc_images(
     Safe by default (dry_run=true). Run multiple times in small batches.
     """
     settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
-    if not _cloudinary_is_configured(settings):
+    if not cloudinary_is_configured(settings):
         raise HTTPException(status_code=400, detail="Cloudinary is not configured (set in Admin Settings or CLOUDINARY_* env vars)")
 
     base_filter: Dict[str, Any] = {}
@@ -7323,7 +9287,7 @@ async def admin_migrate_kyc_images(
             if not isinstance(val, str) or not val.lower().startswith("data:image/"):
                 continue
             try:
-                stored = await _kyc_store_image_value(val, user_id=user_id, kyc_id=kyc_id, field_name=field_name, settings=settings)
+                stored = await kyc_store_image_value(val, user_id=user_id, kyc_id=kyc_id, field_name=field_name, settings=settings)
                 if stored["value"] and stored["value"] != val:
                     update_fields[field_name] = stored["value"]
                     meta[field_name] = stored["meta"]
@@ -7349,21 +9313,21 @@ async def admin_migrate_kyc_images(
 @api_router.get("/admin/kyc-image-storage-status")
 async def admin_kyc_image_storage_status(admin: dict = Depends(get_admin_user)):
     settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
-    c = _cloudinary_creds(settings)
+    c = cloudinary_creds(settings)
     source = "none"
     if settings and any((settings.get("cloudinary_cloud_name"), settings.get("cloudinary_api_key"), settings.get("cloudinary_api_secret"))):
         source = "settings"
     elif any((os.environ.get("CLOUDINARY_CLOUD_NAME"), os.environ.get("CLOUDINARY_API_KEY"), os.environ.get("CLOUDINARY_API_SECRET"))):
         source = "env"
     return {
-        "cloudinary_configured": _cloudinary_is_configured(settings),
+        "cloudinary_configured": cloudinary_is_configured(settings),
         "source": source,
         "cloudinary_folder": c.get("folder"),
         "kyc_max_image_bytes": int((settings or {}).get("kyc_max_image_bytes") or os.environ.get("KYC_MAX_IMAGE_BYTES") or 5242880),
     }
 
 # Deposits Admin
-@api_router.get("/admin/deposits")
+@api_router.get("/admin/deposits", response_model=AdminDepositsPage)
 async def admin_get_deposits(
     status: Optional[str] = None,
     limit: int = Query(default=50, le=200),
@@ -7374,7 +9338,7 @@ async def admin_get_deposits(
         query["status"] = status
     
     deposits = await db.deposits.find(query, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(limit)
-    return {"deposits": deposits}
+    return model_response(AdminDepositsPage, deposits=deposits)
 
 @api_router.get("/admin/deposits/{deposit_id}")
 async def admin_get_deposit(
@@ -7404,10 +9368,13 @@ async def admin_process_deposit(
     
     new_status = "completed" if action == "approve" else "rejected"
     
-    await db.deposits.update_one(
-        {"deposit_id": deposit_id},
+    claim = await db.deposits.update_one(
+        {"deposit_id": deposit_id, "status": "pending"},
         {"$set": {"status": new_status, "processed_at": datetime.now(timezone.utc).isoformat(), "processed_by": admin["user_id"]}}
     )
+    if claim.modified_count == 0:
+        # A concurrent request (single or bulk) processed it since we read it.
+        raise HTTPException(status_code=400, detail="Deposit already processed")
     
     if action == "approve":
         credit_amount = float(deposit.get("net_amount", deposit.get("amount", 0)) or 0)
@@ -7430,35 +9397,27 @@ async def admin_process_deposit(
         })
     
     # Send email notification
-    user = await db.users.find_one({"user_id": deposit["user_id"]}, {"_id": 0, "email": 1, "full_name": 1})
+    user = await db.users.find_one({"user_id": deposit["user_id"]}, {"_id": 0, "email": 1, "full_name": 1, "language": 1})
     if user:
-        if action == "approve":
-            subject = "KAYICOM - Deposit Approved"
-            content = f"""
-            <h2>Deposit Approved</h2>
-            <p>Hello {user.get('full_name', 'User')},</p>
-            <p>Your deposit of <strong>{deposit.get('amount')} {deposit['currency']}</strong> via <strong>{deposit.get('payment_method_name') or deposit.get('method') or 'method'}</strong> has been approved.</p>
-            <p>Fee: <strong>{deposit.get('fee', 0)} {deposit['currency']}</strong> | Total paid: <strong>{deposit.get('total_amount', (deposit.get('amount', 0) or 0) + (deposit.get('fee', 0) or 0))} {deposit['currency']}</strong></p>
-            <p>Transaction ID: <code>{deposit_id}</code></p>
-            <p>Thank you for using KAYICOM!</p>
-            """
-        else:
-            subject = "KAYICOM - Deposit Rejected"
-            content = f"""
-            <h2>Deposit Rejected</h2>
-            <p>Hello {user.get('full_name', 'User')},</p>
-            <p>Your deposit of <strong>{deposit.get('amount')} {deposit['currency']}</strong> via <strong>{deposit.get('payment_method_name') or deposit.get('method') or 'method'}</strong> has been rejected.</p>
-            <p>Transaction ID: <code>{deposit_id}</code></p>
-            <p>Please contact support if you have any questions.</p>
-            """
-        await send_email(user["email"], subject, content)
+        await send_templated_email(
+            user["email"],
+            "deposit_approved" if action == "approve" else "deposit_rejected",
+            notification_language(user),
+            full_name=user.get("full_name", "User"),
+            amount=deposit.get("amount"),
+            currency=deposit["currency"],
+            method=deposit.get("payment_method_name") or deposit.get("method") or "method",
+            fee=deposit.get("fee", 0),
+            total_amount=deposit.get("total_amount", (deposit.get("amount", 0) or 0) + (deposit.get("fee", 0) or 0)),
+            deposit_id=deposit_id,
+        )
     
     await log_action(admin["user_id"], "deposit_process", {"deposit_id": deposit_id, "action": action})
     
     return {"message": f"Deposit {action}d successfully"}
 
 # Withdrawals Admin
-@api_router.get("/admin/withdrawals")
+@api_router.get("/admin/withdrawals", response_model=AdminWithdrawalsPage)
 async def admin_get_withdrawals(
     status: Optional[str] = None,
     limit: int = Query(default=50, le=200),
@@ -7469,7 +9428,7 @@ async def admin_get_withdrawals(
         query["status"] = status
     
     withdrawals = await db.withdrawals.find(query, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(limit)
-    return {"withdrawals": withdrawals}
+    return model_response(AdminWithdrawalsPage, withdrawals=withdrawals)
 
 @api_router.patch("/admin/withdrawals/{withdrawal_id}")
 async def admin_process_withdrawal(
@@ -7489,10 +9448,13 @@ async def admin_process_withdrawal(
     
     new_status = "completed" if action == "approve" else "rejected"
     
-    await db.withdrawals.update_one(
-        {"withdrawal_id": withdrawal_id},
+    claim = await db.withdrawals.update_one(
+        {"withdrawal_id": withdrawal_id, "status": "pending"},
         {"$set": {"status": new_status, "processed_at": datetime.now(timezone.utc).isoformat(), "processed_by": admin["user_id"]}}
     )
+    if claim.modified_count == 0:
+        # A concurrent request (single or bulk) processed it since we read it.
+        raise HTTPException(status_code=400, detail="Withdrawal already processed")
     
     if action == "reject":
         # Refund what was deducted (supports cross-currency withdrawals)
@@ -7534,30 +9496,20 @@ async def admin_process_withdrawal(
     )
     
     # Send email notification
-    user = await db.users.find_one({"user_id": withdrawal["user_id"]}, {"_id": 0, "email": 1, "full_name": 1})
+    user = await db.users.find_one({"user_id": withdrawal["user_id"]}, {"_id": 0, "email": 1, "full_name": 1, "language": 1})
     if user:
-        method_name = withdrawal.get("payment_method_name") or withdrawal.get("method") or "method"
-        if action == "approve":
-            subject = "KAYICOM - Withdrawal Processed"
-            content = f"""
-            <h2>Withdrawal Processed</h2>
-            <p>Hello {user.get('full_name', 'User')},</p>
-            <p>Your withdrawal of <strong>{withdrawal.get('amount')} {withdrawal['currency']}</strong> via <strong>{method_name}</strong> has been processed.</p>
-            <p>Fee: <strong>{withdrawal.get('fee', 0)} {withdrawal['currency']}</strong> | Total deducted: <strong>{withdrawal.get('total_amount', (withdrawal.get('amount', 0) or 0) + (withdrawal.get('fee', 0) or 0))} {withdrawal['currency']}</strong></p>
-            <p>Transaction ID: <code>{withdrawal_id}</code></p>
-            <p>Thank you for using KAYICOM!</p>
-            """
-        else:
-            subject = "KAYICOM - Withdrawal Rejected"
-            content = f"""
-            <h2>Withdrawal Rejected</h2>
-            <p>Hello {user.get('full_name', 'User')},</p>
-            <p>Your withdrawal of <strong>{withdrawal.get('amount')} {withdrawal['currency']}</strong> via <strong>{method_name}</strong> has been rejected.</p>
-            <p>The amount has been refunded to your account.</p>
-            <p>Transaction ID: <code>{withdrawal_id}</code></p>
-            <p>Please contact support if you have any questions.</p>
-            """
-        await send_email(user["email"], subject, content)
+        await send_templated_email(
+            user["email"],
+            "withdrawal_processed" if action == "approve" else "withdrawal_rejected",
+            notification_language(user),
+            full_name=user.get("full_name", "User"),
+            amount=withdrawal.get("amount"),
+            currency=withdrawal["currency"],
+            method=withdrawal.get("payment_method_name") or withdrawal.get("method") or "method",
+            fee=withdrawal.get("fee", 0),
+            total_amount=withdrawal.get("total_amount", (withdrawal.get("amount", 0) or 0) + (withdrawal.get("fee", 0) or 0)),
+            withdrawal_id=withdrawal_id,
+        )
     
     await log_action(admin["user_id"], "withdrawal_process", {"withdrawal_id": withdrawal_id, "action": action})
     
@@ -7909,113 +9861,7 @@ async def admin_update_team_member(user_id: str, payload: TeamMemberUpdate, admi
 
 
 # ==================== RBAC MANAGEMENT ====================
-
-# All available admin routes/permissions
-AVAILABLE_ADMIN_PERMISSIONS = [
-    {"path": "/api/admin/dashboard", "label": "Dashboard", "category": "general"},
-    {"path": "/api/admin/users", "label": "Itilizatè yo", "category": "users"},
-    {"path": "/api/admin/kyc", "label": "KYC", "category": "users"},
-    {"path": "/api/admin/deposits", "label": "Depo", "category": "finance"},
-    {"path": "/api/admin/withdrawals", "label": "Retrè", "category": "finance"},
-    {"path": "/api/admin/exchange-rates", "label": "To echanj", "category": "finance"},
-    {"path": "/api/admin/rates", "label": "Rates", "category": "finance"},
-    {"path": "/api/admin/fees", "label": "Frè", "category": "finance"},
-    {"path": "/api/admin/card-fees", "label": "Frè Kat", "category": "cards"},
-    {"path": "/api/admin/virtual-cards", "label": "Kat Vityèl", "category": "cards"},
-    {"path": "/api/admin/virtual-card-orders", "label": "Komand Kat", "category": "cards"},
-    {"path": "/api/admin/card-topups", "label": "Top-up Kat", "category": "cards"},
-    {"path": "/api/admin/topup-orders", "label": "Komand Top-up", "category": "cards"},
-    {"path": "/api/admin/payment-gateway", "label": "Gateway Peman", "category": "settings"},
-    {"path": "/api/admin/settings", "label": "Paramèt", "category": "settings"},
-    {"path": "/api/admin/bulk-email", "label": "Imèl an mas", "category": "communication"},
-    {"path": "/api/admin/logs", "label": "Lòg", "category": "system"},
-    {"path": "/api/admin/webhook-events", "label": "Webhook Events", "category": "system"},
-    {"path": "/api/admin/agent-deposits", "label": "Depo Ajan", "category": "agents"},
-    {"path": "/api/admin/agent-settings", "label": "Paramèt Ajan", "category": "agents"},
-    {"path": "/api/admin/agent-commission-withdrawals", "label": "Retrè Komisyon Ajan", "category": "agents"},
-    {"path": "/api/admin/agents", "label": "Ajan yo", "category": "agents"},
-    {"path": "/api/admin/team", "label": "Ekip Admin", "category": "system"},
-    {"path": "/api/admin/rbac", "label": "Jesyon Wòl", "category": "system"},
-    {"path": "/api/admin/rbac-permissions", "label": "Pèmisyon Metòd", "category": "system"},
-]
-
-class RBACUpdate(BaseModel):
-    role: str
-    permissions: List[str]
-
-
-@api_router.get("/admin/rbac")
-async def get_rbac_config(admin: dict = Depends(get_admin_user)):
-    """Get current RBAC configuration."""
-    # Only superadmin or admin can view/modify RBAC
-    role = _normalize_admin_role(admin)
-    if role not in ["superadmin", "admin"]:
-        raise HTTPException(status_code=403, detail="Only admin or superadmin can manage RBAC")
-    
-    permissions = await _get_rbac_permissions()
-    
-    return {
-        "roles": ["support", "finance", "manager", "admin"],
-        "permissions": permissions,
-        "available_permissions": AVAILABLE_ADMIN_PERMISSIONS,
-        "default_permissions": DEFAULT_RBAC_PERMISSIONS,
-    }
-
-
-@api_router.patch("/admin/rbac")
-async def update_rbac_config(payload: RBACUpdate, admin: dict = Depends(get_admin_user)):
-    """Update RBAC permissions for a role."""
-    # Only superadmin or admin can modify RBAC
-    role = _normalize_admin_role(admin)
-    if role not in ["superadmin", "admin"]:
-        raise HTTPException(status_code=403, detail="Only admin or superadmin can manage RBAC")
-    
-    target_role = payload.role.lower()
-    if target_role not in ["support", "finance", "manager"]:
-        raise HTTPException(status_code=400, detail="Can only modify permissions for: support, finance, manager")
-    
-    # Validate permission paths
-    valid_paths = [p["path"] for p in AVAILABLE_ADMIN_PERMISSIONS]
-    for perm in payload.permissions:
-        if perm not in valid_paths:
-            raise HTTPException(status_code=400, detail=f"Invalid permission path: {perm}")
-    
-    # Get current permissions or defaults
-    current = await _get_rbac_permissions()
-    current[target_role] = payload.permissions
-    
-    # Save to database
-    await db.settings.update_one(
-        {"setting_id": "main"},
-        {"$set": {"rbac_permissions": current}},
-        upsert=True
-    )
-    
-    # Clear cache
-    _rbac_cache["permissions"] = None
-    _rbac_cache["last_fetch"] = 0
-    
-    await log_action(admin["user_id"], "rbac_update", {"role": target_role, "permissions": payload.permissions})
-    
-    return {"message": f"Permissions for {target_role} updated", "permissions": current}
-
-
-@api_router.post("/admin/rbac/reset")
-async def reset_rbac_to_defaults(admin: dict = Depends(get_admin_user)):
-    """Reset RBAC permissions to defaults."""
-    role = _normalize_admin_role(admin)
-    if role not in ["superadmin", "admin"]:
-        raise HTTPException(status_code=403, detail="Only admin or superadmin can manage RBAC")
-    
-    await db.settings.update_one(
-        {"setting_id": "main"},
-        {"$unset": {"rbac_permissions": ""}},
-        upsert=True
-    )
-    
-    # Clear cache
-    _rbac_cache["permissions"] = None
-    _rbac_cache["last_fetch"] = 0
+# /admin/rbac is served by kayicom_core.routers.admin_rbac, mounted at the bottom of this file.
 
 
 # ==================== RBAC PERMISSIONS FOR PAYMENT METHODS ====================
@@ -8054,12 +9900,9 @@ async def update_rbac_permissions_for_methods(payload: RBACPermissionsUpdate, ad
         },
         upsert=True,
     )
+    admin_permissions.invalidate()
     await log_action(admin["user_id"], "rbac_permissions_update", {"roles_updated": list(payload.permissions.keys())})
     return {"message": "Permissions updated"}
-    
-    await log_action(admin["user_id"], "rbac_reset", {})
-    
-    return {"message": "RBAC permissions reset to defaults", "permissions": DEFAULT_RBAC_PERMISSIONS}
 
 
 # Public endpoint for payment gateway methods (no auth required)
@@ -8142,6 +9985,11 @@ async def admin_get_settings(admin: dict = Depends(get_admin_user)):
         "cloudinary_api_secret": "",
         "cloudinary_folder": os.environ.get("CLOUDINARY_FOLDER", "") or "kayicom/kyc",
         "kyc_max_image_bytes": int(os.environ.get("KYC_MAX_IMAGE_BYTES", "5242880") or "5242880"),
+
+        # Admin alert digest
+        "admin_alert_digest_seconds": int(ADMIN_ALERT_DIGEST_SECONDS),
+        "admin_alert_immediate_usd": ADMIN_ALERT_IMMEDIATE_USD,
+        "admin_alert_immediate_htg": ADMIN_ALERT_IMMEDIATE_HTG,
     }
 
     # If settings exist already, non-destructively backfill any new keys.
@@ -8308,7 +10156,17 @@ async def admin_strowallet_diagnostics(admin: dict = Depends(get_admin_user)):
 
         p["classification"] = cls
 
-    return {"summary": summary, "probes": probes}
+    return {
+        "summary": summary,
+        "probes": probes,
+        "resilience": [provider_guard("strowallet").snapshot(), provider_guard("strowallet_alt").snapshot()],
+    }
+
+
+@api_router.get("/admin/provider-health")
+async def admin_provider_health(admin: dict = Depends(get_admin_user)):
+    """Circuit breaker / bulkhead state and latency for every external provider."""
+    return {"providers": provider_health(), "generated_at": datetime.now(timezone.utc).isoformat()}
 
 
 @api_router.post("/admin/strowallet/apply-default-endpoints")
@@ -8405,71 +10263,6 @@ async def get_public_app_config():
         "updated_at": settings.get("updated_at"),
     }
 
-@api_router.get("/public/help-center")
-async def get_public_help_center():
-    await _seed_help_articles_if_empty()
-    articles = await db.help_articles.find({"is_active": True}, {"_id": 0}).sort("order", 1).to_list(500)
-    return {"articles": articles}
-
-@api_router.get("/admin/help-center")
-async def admin_get_help_center(admin: dict = Depends(get_admin_user)):
-    await _seed_help_articles_if_empty()
-    articles = await db.help_articles.find({}, {"_id": 0}).sort("order", 1).to_list(500)
-    return {"articles": articles}
-
-@api_router.post("/admin/help-center")
-async def admin_create_help_article(payload: HelpArticleCreate, admin: dict = Depends(get_admin_user)):
-    title_values = [payload.title_ht, payload.title_fr, payload.title_en]
-    if not any(t and str(t).strip() for t in title_values):
-        raise HTTPException(status_code=400, detail="At least one title is required")
-
-    now = datetime.now(timezone.utc).isoformat()
-    article = {
-        "article_id": str(uuid.uuid4()),
-        "title_ht": payload.title_ht,
-        "title_fr": payload.title_fr,
-        "title_en": payload.title_en,
-        "content_ht": payload.content_ht,
-        "content_fr": payload.content_fr,
-        "content_en": payload.content_en,
-        "category": (payload.category or "General").strip(),
-        "order": int(payload.order or 0),
-        "is_active": bool(payload.is_active if payload.is_active is not None else True),
-        "created_at": now,
-        "updated_at": now,
-    }
-    await db.help_articles.insert_one(article)
-    await log_action(admin["user_id"], "help_article_create", {"article_id": article["article_id"]})
-    return {"article": article}
-
-@api_router.put("/admin/help-center/{article_id}")
-async def admin_update_help_article(article_id: str, payload: HelpArticleUpdate, admin: dict = Depends(get_admin_user)):
-    update_doc = {}
-    for k, v in payload.model_dump().items():
-        if v is not None:
-            update_doc[k] = v
-    if "category" in update_doc:
-        update_doc["category"] = (update_doc["category"] or "General").strip()
-    if "order" in update_doc:
-        update_doc["order"] = int(update_doc["order"] or 0)
-    update_doc["updated_at"] = datetime.now(timezone.utc).isoformat()
-
-    result = await db.help_articles.update_one({"article_id": article_id}, {"$set": update_doc})
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Article not found")
-
-    article = await db.help_articles.find_one({"article_id": article_id}, {"_id": 0})
-    await log_action(admin["user_id"], "help_article_update", {"article_id": article_id})
-    return {"article": article}
-
-@api_router.delete("/admin/help-center/{article_id}")
-async def admin_delete_help_article(article_id: str, admin: dict = Depends(get_admin_user)):
-    result = await db.help_articles.delete_one({"article_id": article_id})
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Article not found")
-    await log_action(admin["user_id"], "help_article_delete", {"article_id": article_id})
-    return {"success": True}
-
 @api_router.put("/admin/settings")
 async def admin_update_settings(settings: AdminSettingsUpdate, admin: dict = Depends(get_admin_user)):
     try:
@@ -8492,6 +10285,8 @@ async def admin_update_settings(settings: AdminSettingsUpdate, admin: dict = Dep
         )
         
         await log_action(admin["user_id"], "settings_update", {"fields_updated": list(update_doc.keys())})
+        invalidate_settings_snapshot()
+        await _refresh_admin_alert_settings()
         
         return {"message": "Settings updated"}
     except Exception as e:
@@ -8499,34 +10294,379 @@ async def admin_update_settings(settings: AdminSettingsUpdate, admin: dict = Dep
         raise HTTPException(status_code=500, detail=f"Failed to update settings: {str(e)}")
 
 # Bulk Email Admin
-@api_router.post("/admin/bulk-email")
-async def admin_send_bulk_email(request: BulkEmailRequest, admin: dict = Depends(get_admin_user)):
-    query = {}
-    if request.recipient_filter == "kyc_approved":
+# ==================== BULK EMAIL CAMPAIGNS ====================
+# Campaigns run in a background task (not inside the HTTP request), stream recipients from a
+# cursor ordered by user_id, and send through Resend's batch API. Progress is checkpointed after
+# every wave (`last_user_id` + per-recipient rows in `campaign_recipients`) so a paused or
+# interrupted campaign resumes where it stopped without re-sending.
+
+# Resend accepts up to 100 messages per batch call.
+CAMPAIGN_BATCH_SIZE = 100
+CAMPAIGN_MAX_CONCURRENT_BATCHES = max(1, int(os.environ.get("CAMPAIGN_MAX_CONCURRENT_BATCHES") or 4))
+CAMPAIGN_BATCH_RETRIES = 3
+# A worker must renew its lease between waves; a crashed worker's campaign can be picked up after this.
+CAMPAIGN_LEASE_SECONDS = 120
+
+_campaign_worker_id = str(uuid.uuid4())
+_campaign_tasks: Dict[str, asyncio.Task] = {}
+
+
+def _campaign_recipient_query(recipient_filter: str) -> Dict[str, Any]:
+    query: Dict[str, Any] = {"email": {"$type": "string", "$ne": ""}}
+    if recipient_filter == "kyc_approved":
         query["kyc_status"] = "approved"
-    elif request.recipient_filter == "active":
+    elif recipient_filter == "active":
         query["is_active"] = True
-    
-    users = await db.users.find(query, {"_id": 0, "email": 1}).to_list(10000)
-    
-    success_count = 0
-    fail_count = 0
-    
-    for user in users:
-        result = await send_email(user["email"], request.subject, request.html_content)
-        if result:
-            success_count += 1
-        else:
-            fail_count += 1
+    return query
+
+
+def _campaign_public(campaign: dict) -> dict:
+    """Campaign doc without the (large) HTML body, plus a progress percentage."""
+    out = {k: v for k, v in campaign.items() if k not in ("_id", "html_content")}
+    total = int(campaign.get("total") or 0)
+    done = int(campaign.get("sent") or 0) + int(campaign.get("failed") or 0) + int(campaign.get("skipped") or 0)
+    out["processed"] = done
+    out["progress_percent"] = round(min(100.0, (done / total) * 100.0), 1) if total else 100.0
+    return out
+
+
+async def _campaign_claim(campaign_id: str) -> Optional[dict]:
+    """
+    Take (or renew) the lease on a running campaign.
+    Returns None when the campaign was paused/cancelled or another worker holds a live lease.
+    """
+    now = datetime.now(timezone.utc)
+    return await db.campaigns.find_one_and_update(
+        {
+            "campaign_id": campaign_id,
+            "status": "running",
+            "$or": [
+                {"lease_owner": _campaign_worker_id},
+                {"lease_owner": None},
+                {"lease_until": {"$lt": now.isoformat()}},
+            ],
+        },
+        {
+            "$set": {
+                "lease_owner": _campaign_worker_id,
+                "lease_until": (now + timedelta(seconds=CAMPAIGN_LEASE_SECONDS)).isoformat(),
+            }
+        },
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _campaign_batch_key(campaign_id: str, recipients: List[dict]) -> str:
+    """Idempotency key for one batch: the same recipients in the same campaign always get the same key."""
+    digest = hashlib.sha256("\n".join(r["user_id"] for r in recipients).encode()).hexdigest()
+    return f"campaign-{campaign_id}-{digest}"
+
+
+async def _campaign_send_batch(campaign: dict, cfg: Dict[str, str], recipients: List[dict]) -> List[Dict[str, Any]]:
+    """
+    Send one Resend batch; returns one result dict per recipient (same order).
+    Retries reuse the batch's idempotency key, so a retry after a timed-out send that Resend
+    did accept is answered from its idempotency cache instead of mailing everyone again.
+    """
+    import resend
+
+    params = [
+        {"from": cfg["sender"], "to": [r["email"].strip()], "subject": campaign["subject"], "html": campaign["html_content"]}
+        for r in recipients
+    ]
+    options = {"idempotency_key": _campaign_batch_key(campaign["campaign_id"], recipients)}
+    last_error = ""
+    for attempt in range(CAMPAIGN_BATCH_RETRIES):
+        try:
+            async with provider_guard("resend").attempt(timeout=PROVIDER_WRITE_TIMEOUT_SECONDS) as att:
+                try:
+                    resp = await asyncio.to_thread(resend.Batch.send, params, options)
+                except Exception as e:
+                    if _resend_is_outage(e):
+                        att.fail()
+                    raise
+            ids = [(item or {}).get("id") for item in ((resp or {}).get("data") or [])]
+            return [
+                {"status": "sent", "provider_message_id": ids[i] if i < len(ids) else None, "error": None}
+                for i in range(len(recipients))
+            ]
+        except Exception as e:
+            last_error = f"{type(e).__name__}: {e}"
+            logger.warning(f"Campaign {campaign['campaign_id']} batch failed (attempt {attempt + 1}): {last_error}")
+            if attempt + 1 < CAMPAIGN_BATCH_RETRIES:
+                await asyncio.sleep(2 ** attempt)
+    return [{"status": "failed", "provider_message_id": None, "error": last_error} for _ in recipients]
+
+
+async def _campaign_process_wave(campaign: dict, cfg: Dict[str, str], wave: List[dict]) -> None:
+    campaign_id = campaign["campaign_id"]
+    user_ids = [u["user_id"] for u in wave]
+
+    # Recipients already delivered before a pause/crash are skipped on resume.
+    already_sent = {
+        r["user_id"]
+        async for r in db.campaign_recipients.find(
+            {"campaign_id": campaign_id, "user_id": {"$in": user_ids}, "status": "sent"},
+            {"_id": 0, "user_id": 1},
+        )
+    }
+    pending = [u for u in wave if u["user_id"] not in already_sent]
+
+    batches = [pending[i:i + CAMPAIGN_BATCH_SIZE] for i in range(0, len(pending), CAMPAIGN_BATCH_SIZE)]
+    results = await asyncio.gather(*[_campaign_send_batch(campaign, cfg, b) for b in batches])
+
+    now = datetime.now(timezone.utc).isoformat()
+    ops = []
+    sent = failed = 0
+    for batch, batch_results in zip(batches, results):
+        for recipient, res in zip(batch, batch_results):
+            if res["status"] == "sent":
+                sent += 1
+            else:
+                failed += 1
+            ops.append(UpdateOne(
+                {"campaign_id": campaign_id, "user_id": recipient["user_id"]},
+                {
+                    "$set": {
+                        "email": recipient["email"],
+                        "status": res["status"],
+                        "provider_message_id": res["provider_message_id"],
+                        "error": res["error"],
+                        "updated_at": now,
+                    },
+                    "$inc": {"attempts": 1},
+                },
+                upsert=True,
+            ))
+    if ops:
+        await db.campaign_recipients.bulk_write(ops, ordered=False)
+
+    await db.campaigns.update_one(
+        {"campaign_id": campaign_id},
+        {
+            "$set": {"last_user_id": user_ids[-1], "updated_at": now},
+            "$inc": {"sent": sent, "failed": failed, "skipped": len(already_sent)},
+        },
+    )
+
+
+async def _campaign_run(campaign_id: str) -> None:
+    campaign = await _campaign_claim(campaign_id)
+    if not campaign:
+        return
+
+    try:
+        settings = await db.settings.find_one({"setting_id": "main"}, {"_id": 0})
+        cfg = _resend_config(settings)
+        if not cfg:
+            raise RuntimeError("Resend email is not configured")
+        import resend
+        # Set once per run instead of once per message.
+        _resend_configure(resend, cfg["api_key"])
+
+        query = _campaign_recipient_query(campaign.get("recipient_filter") or "all")
+        if campaign.get("last_user_id"):
+            query["user_id"] = {"$gt": campaign["last_user_id"]}
+
+        wave_size = CAMPAIGN_BATCH_SIZE * CAMPAIGN_MAX_CONCURRENT_BATCHES
+        cursor = db.users.find(query, {"_id": 0, "user_id": 1, "email": 1}).sort("user_id", 1).batch_size(wave_size)
+        wave: List[dict] = []
+        async for user in cursor:
+            wave.append(user)
+            if len(wave) < wave_size:
+                continue
+            await _campaign_process_wave(campaign, cfg, wave)
+            wave = []
+            # Renew the lease; stops here when an admin paused or cancelled the campaign.
+            if not await _campaign_claim(campaign_id):
+                await cursor.close()
+                return
+        if wave:
+            await _campaign_process_wave(campaign, cfg, wave)
+
+        done = await db.campaigns.find_one_and_update(
+            {"campaign_id": campaign_id, "status": "running", "lease_owner": _campaign_worker_id},
+            {"$set": {
+                "status": "completed",
+                "completed_at": datetime.now(timezone.utc).isoformat(),
+                "lease_owner": None,
+                "lease_until": None,
+            }},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+        if done:
+            await log_action(done.get("created_by") or "", "bulk_email_completed", {
+                "campaign_id": campaign_id,
+                "subject": done.get("subject"),
+                "filter": done.get("recipient_filter"),
+                "success": done.get("sent", 0),
+                "failed": done.get("failed", 0),
+            })
+    except Exception as e:
+        logger.exception(f"Campaign {campaign_id} failed: {e}")
+        await db.campaigns.update_one(
+            {"campaign_id": campaign_id, "lease_owner": _campaign_worker_id},
+            {"$set": {
+                "status": "failed",
+                "last_error": str(e),
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+                "lease_owner": None,
+                "lease_until": None,
+            }},
+        )
+
+
+def _campaign_spawn(campaign_id: str) -> None:
+    existing = _campaign_tasks.get(campaign_id)
+    if existing and not existing.done():
+        return
+    task = asyncio.create_task(_campaign_run(campaign_id))
+    _campaign_tasks[campaign_id] = task
+
+    def _cleanup(t: asyncio.Task) -> None:
+        if _campaign_tasks.get(campaign_id) is t:
+            _campaign_tasks.pop(campaign_id, None)
+
+    task.add_done_callback(_cleanup)
+
+
+async def _campaign_resume_interrupted() -> None:
+    """Pick up campaigns left running by a restarted/crashed worker (lease expired)."""
+    try:
+        now = datetime.now(timezone.utc).isoformat()
+        async for c in db.campaigns.find(
+            {"status": "running", "$or": [{"lease_owner": None}, {"lease_until": {"$lt": now}}]},
+            {"_id": 0, "campaign_id": 1},
+        ):
+            _campaign_spawn(c["campaign_id"])
+    except Exception as e:
+        logger.error(f"Campaign resume scan failed: {e}")
+
+
+async def _campaign_get_or_404(campaign_id: str) -> dict:
+    campaign = await db.campaigns.find_one({"campaign_id": campaign_id}, {"_id": 0})
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return campaign
+
+
+@api_router.post("/admin/bulk-email")
+async def admin_send_bulk_email(request: BulkEmailRequest, admin: dict = Depends(get_admin_user)):
+    query = _campaign_recipient_query(request.recipient_filter)
+    total = await db.users.count_documents(query)
+
+    now = datetime.now(timezone.utc).isoformat()
+    campaign = {
+        "campaign_id": str(uuid.uuid4()),
+        "subject": request.subject,
+        "html_content": request.html_content,
+        "recipient_filter": request.recipient_filter,
+        "status": "running",
+        "total": total,
+        "sent": 0,
+        "failed": 0,
+        "skipped": 0,
+        "last_user_id": None,
+        "last_error": None,
+        "lease_owner": None,
+        "lease_until": None,
+        "created_by": admin["user_id"],
+        "created_at": now,
+        "updated_at": now,
+        "completed_at": None,
+    }
+    await db.campaigns.insert_one(campaign)
+    _campaign_spawn(campaign["campaign_id"])
     
     await log_action(admin["user_id"], "bulk_email", {
+        "campaign_id": campaign["campaign_id"],
         "subject": request.subject,
         "filter": request.recipient_filter,
-        "success": success_count,
-        "failed": fail_count
+        "total": total,
     })
     
-    return {"message": f"Emails sent: {success_count} success, {fail_count} failed"}
+    return {
+        "success": True,
+        "message": f"Campaign queued: {total} recipients",
+        "campaign": _campaign_public(campaign),
+    }
+
+
+@api_router.get("/admin/bulk-email/campaigns")
+async def admin_list_email_campaigns(
+    limit: int = Query(default=50, le=200),
+    admin: dict = Depends(get_admin_user),
+):
+    campaigns = await db.campaigns.find({}, {"_id": 0, "html_content": 0}).sort("created_at", -1).to_list(limit)
+    return {"campaigns": [_campaign_public(c) for c in campaigns]}
+
+
+@api_router.get("/admin/bulk-email/campaigns/{campaign_id}")
+async def admin_get_email_campaign_progress(campaign_id: str, admin: dict = Depends(get_admin_user)):
+    campaign = await _campaign_get_or_404(campaign_id)
+    return {"campaign": _campaign_public(campaign)}
+
+
+@api_router.get("/admin/bulk-email/campaigns/{campaign_id}/recipients")
+async def admin_get_email_campaign_recipients(
+    campaign_id: str,
+    status: Optional[str] = None,
+    limit: int = Query(default=100, le=500),
+    admin: dict = Depends(get_admin_user),
+):
+    query: Dict[str, Any] = {"campaign_id": campaign_id}
+    if status:
+        query["status"] = status
+    recipients = await db.campaign_recipients.find(query, {"_id": 0}).sort("updated_at", -1).to_list(limit)
+    return {"recipients": recipients}
+
+
+@api_router.post("/admin/bulk-email/campaigns/{campaign_id}/pause")
+async def admin_pause_email_campaign(campaign_id: str, admin: dict = Depends(get_admin_user)):
+    result = await db.campaigns.update_one(
+        {"campaign_id": campaign_id, "status": "running"},
+        {"$set": {"status": "paused", "updated_at": datetime.now(timezone.utc).isoformat()}},
+    )
+    if result.matched_count == 0:
+        await _campaign_get_or_404(campaign_id)
+        raise HTTPException(status_code=400, detail="Only running campaigns can be paused")
+    await log_action(admin["user_id"], "bulk_email_pause", {"campaign_id": campaign_id})
+    return {"message": "Campaign paused"}
+
+
+@api_router.post("/admin/bulk-email/campaigns/{campaign_id}/resume")
+async def admin_resume_email_campaign(campaign_id: str, admin: dict = Depends(get_admin_user)):
+    result = await db.campaigns.update_one(
+        {"campaign_id": campaign_id, "status": {"$in": ["paused", "failed"]}},
+        {"$set": {
+            "status": "running",
+            "last_error": None,
+            "lease_owner": None,
+            "lease_until": None,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }},
+    )
+    if result.matched_count == 0:
+        await _campaign_get_or_404(campaign_id)
+        raise HTTPException(status_code=400, detail="Only paused or failed campaigns can be resumed")
+    _campaign_spawn(campaign_id)
+    await log_action(admin["user_id"], "bulk_email_resume", {"campaign_id": campaign_id})
+    return {"message": "Campaign resumed"}
+
+
+@api_router.post("/admin/bulk-email/campaigns/{campaign_id}/cancel")
+async def admin_cancel_email_campaign(campaign_id: str, admin: dict = Depends(get_admin_user)):
+    result = await db.campaigns.update_one(
+        {"campaign_id": campaign_id, "status": {"$in": ["running", "paused", "failed"]}},
+        {"$set": {"status": "cancelled", "updated_at": datetime.now(timezone.utc).isoformat()}},
+    )
+    if result.matched_count == 0:
+        await _campaign_get_or_404(campaign_id)
+        raise HTTPException(status_code=400, detail="Campaign already finished")
+    await log_action(admin["user_id"], "bulk_email_cancel", {"campaign_id": campaign_id})
+    return {"message": "Campaign cancelled"}
 
 # Test Resend Email
 class TestEmailRequest(BaseModel):
@@ -8607,149 +10747,874 @@ async def admin_update_card_details(
             {"order_id": order_id},
             {"$set": update_doc}
         )
-    
-    return {"message": "Card details updated"}
+    
+    return {"message": "Card details updated"}
+
+# Admin: Get all card top-up requests
+@api_router.get("/admin/card-topups")
+async def admin_get_card_topups(
+    status: Optional[str] = None,
+    limit: int = Query(default=50, le=200),
+    admin: dict = Depends(get_admin_user)
+):
+    query = {}
+    if status:
+        query["status"] = status
+    
+    deposits = await db.virtual_card_deposits.find(query, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(limit)
+    return {"deposits": deposits}
+
+# Admin: Process card top-up (approve/reject)
+class CardTopUpProcessPayload(BaseModel):
+    action: str  # approve or reject
+    admin_notes: Optional[str] = None
+    delivery_info: Optional[str] = None  # Confirmation of delivery to card
+
+@api_router.patch("/admin/card-topups/{deposit_id}")
+async def admin_process_card_topup(
+    deposit_id: str,
+    payload: CardTopUpProcessPayload,
+    admin: dict = Depends(get_admin_user)
+):
+    deposit = await db.virtual_card_deposits.find_one({"deposit_id": deposit_id}, {"_id": 0})
+    if not deposit:
+        raise HTTPException(status_code=404, detail="Top-up request not found")
+    
+    if deposit["status"] != "pending":
+        raise HTTPException(status_code=400, detail="Top-up already processed")
+    
+    if payload.action not in ["approve", "reject"]:
+        raise HTTPException(status_code=400, detail="Invalid action")
+    
+    new_status = "approved" if payload.action == "approve" else "rejected"
+    
+    update_doc = {
+        "status": new_status,
+        "admin_notes": payload.admin_notes,
+        "delivery_info": payload.delivery_info,
+        "processed_at": datetime.now(timezone.utc).isoformat(),
+        "processed_by": admin["user_id"]
+    }
+    
+    claim = await db.virtual_card_deposits.update_one(
+        {"deposit_id": deposit_id, "status": "pending"},
+        {"$set": update_doc}
+    )
+    if claim.modified_count == 0:
+        # A concurrent request (single or bulk) processed it since we read it.
+        raise HTTPException(status_code=400, detail="Top-up already processed")
+    
+    # Update transaction status
+    await db.transactions.update_one(
+        {"reference_id": deposit_id},
+        {"$set": {"status": "completed" if payload.action == "approve" else "refunded"}}
+    )
+    
+    if payload.action == "reject":
+        # Refund the total charged amount (amount + fee) to user's USD balance
+        refund_amount = float(deposit.get("total_amount", deposit.get("amount", 0)) or 0)
+        await db.users.update_one(
+            {"user_id": deposit["user_id"]},
+            {"$inc": {"wallet_usd": refund_amount}}
+        )
+        
+        # Create refund transaction
+        await db.transactions.insert_one({
+            "transaction_id": str(uuid.uuid4()),
+            "user_id": deposit["user_id"],
+            "type": "card_topup_refund",
+            "amount": refund_amount,
+            "currency": "USD",
+            "status": "completed",
+            "description": f"Card top-up refund (rejected)",
+            "created_at": datetime.now(timezone.utc).isoformat()
+        })
+    
+    await log_action(admin["user_id"], "card_topup_process", {"deposit_id": deposit_id, "action": payload.action})
+    
+    return {"message": f"Top-up {payload.action}d successfully"}
+
+# ==================== ADMIN BULK QUEUE ACTIONS ====================
+# Bulk approve/reject for the admin queues. Each bulk call loads every item in
+# one query, claims the pending ones with a single conditional bulk_write, then
+# applies wallet movements / ledger rows in batches. The single-item PATCH
+# handlers claim with the same "status: pending" filter, so whichever request
+# flips the status first is the only one that moves money.
+# Emails and Telegram messages are sent from a background task so the
+# response does not wait on the providers.
+
+ADMIN_BULK_MAX_ITEMS = 500
+ADMIN_BULK_NOTIFY_CONCURRENCY = 5
+_bulk_notify_tasks: set = set()
+
+
+class AdminBulkActionPayload(BaseModel):
+    ids: List[str]
+    action: str  # approve or reject
+    rejection_reason: Optional[str] = None  # KYC only
+    admin_notes: Optional[str] = None  # card top-ups only
+    delivery_info: Optional[str] = None  # card top-ups only
+
+
+def _bulk_validate(payload: AdminBulkActionPayload) -> List[str]:
+    if payload.action not in ["approve", "reject"]:
+        raise HTTPException(status_code=400, detail="Invalid action")
+    ids = list(dict.fromkeys(i.strip() for i in payload.ids if i and i.strip()))
+    if not ids:
+        raise HTTPException(status_code=400, detail="No ids provided")
+    if len(ids) > ADMIN_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {ADMIN_BULK_MAX_ITEMS} items per request")
+    return ids
+
+
+async def _bulk_claim(
+    collection,
+    id_field: str,
+    ids: List[str],
+    update: Dict[str, Any],
+    results: Dict[str, Dict[str, Any]],
+) -> List[dict]:
+    """
+    Move every still-pending item to its new status and return the documents this call claimed.
+    Items that are missing or already processed are recorded in ``results``.
+    """
+    docs = await collection.find({id_field: {"$in": ids}}, {"_id": 0}).to_list(len(ids))
+    by_id = {d[id_field]: d for d in docs}
+    pending: List[str] = []
+    for item_id in ids:
+        doc = by_id.get(item_id)
+        if doc is None:
+            results[item_id] = {"id": item_id, "status": "error", "detail": "Not found"}
+        elif doc.get("status") != "pending":
+            results[item_id] = {"id": item_id, "status": "skipped", "detail": "Already processed"}
+        else:
+            pending.append(item_id)
+    if not pending:
+        return []
+
+    batch_id = str(uuid.uuid4())
+    await collection.bulk_write(
+        [
+            UpdateOne({id_field: item_id, "status": "pending"}, {"$set": {**update, "bulk_batch_id": batch_id}})
+            for item_id in pending
+        ],
+        ordered=False,
+    )
+    # Anything not tagged with our batch id was processed by someone else in the meantime.
+    claimed_ids = set(await collection.distinct(id_field, {id_field: {"$in": pending}, "bulk_batch_id": batch_id}))
+    claimed: List[dict] = []
+    for item_id in pending:
+        if item_id in claimed_ids:
+            claimed.append(by_id[item_id])
+            results[item_id] = {"id": item_id, "status": "ok"}
+        else:
+            results[item_id] = {"id": item_id, "status": "skipped", "detail": "Already processed"}
+    return claimed
+
+
+def _bulk_wallet_ops(credits: Dict[str, Dict[str, float]]) -> List[UpdateOne]:
+    """One $inc per user, combining every wallet field touched by the batch."""
+    return [
+        UpdateOne({"user_id": user_id}, {"$inc": incs})
+        for user_id, incs in credits.items()
+        if incs
+    ]
+
+
+def _bulk_add_credit(credits: Dict[str, Dict[str, float]], user_id: str, field: str, amount: float) -> None:
+    incs = credits.setdefault(user_id, {})
+    incs[field] = incs.get(field, 0) + amount
+
+
+async def _bulk_log(admin_id: str, action: str, details: List[dict]) -> None:
+    for d in details:
+        await log_action(admin_id, action, {**d, "bulk": True})
+
+
+def _bulk_response(ids: List[str], results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    items = [results[i] for i in ids]
+    return {
+        "results": items,
+        "processed": sum(1 for r in items if r["status"] == "ok"),
+        "skipped": sum(1 for r in items if r["status"] == "skipped"),
+        "failed": sum(1 for r in items if r["status"] == "error"),
+    }
+
+
+def _bulk_enqueue_notifications(jobs: List[Callable[[], Awaitable[Any]]]) -> None:
+    """Send the batch's notifications in the background with bounded concurrency."""
+    if not jobs:
+        return
+
+    async def run() -> None:
+        sem = asyncio.Semaphore(ADMIN_BULK_NOTIFY_CONCURRENCY)
+
+        async def one(job: Callable[[], Awaitable[Any]]) -> None:
+            async with sem:
+                try:
+                    await job()
+                except Exception as e:
+                    logger.warning(f"Bulk notification failed: {e}")
+
+        await asyncio.gather(*(one(job) for job in jobs))
+
+    task = asyncio.create_task(run())
+    _bulk_notify_tasks.add(task)
+    task.add_done_callback(_bulk_notify_tasks.discard)
+
+
+async def _bulk_users(user_ids: Iterable[str], projection: Dict[str, int]) -> Dict[str, dict]:
+    ids = list({u for u in user_ids if u})
+    if not ids:
+        return {}
+    rows = await db.users.find({"user_id": {"$in": ids}}, {"_id": 0, "user_id": 1, **projection}).to_list(len(ids))
+    return {u["user_id"]: u for u in rows}
+
+
+@api_router.post("/admin/deposits/bulk")
+async def admin_bulk_process_deposits(
+    payload: AdminBulkActionPayload,
+    admin: dict = Depends(get_admin_user)
+):
+    ids = _bulk_validate(payload)
+    action = payload.action
+    new_status = "completed" if action == "approve" else "rejected"
+    now = datetime.now(timezone.utc).isoformat()
+    results: Dict[str, Dict[str, Any]] = {}
+
+    deposits = await _bulk_claim(
+        db.deposits, "deposit_id", ids,
+        {"status": new_status, "processed_at": now, "processed_by": admin["user_id"]},
+        results,
+    )
+
+    if action == "approve" and deposits:
+        credits: Dict[str, Dict[str, float]] = {}
+        ledger = []
+        for deposit in deposits:
+            credit_amount = float(deposit.get("net_amount", deposit.get("amount", 0)) or 0)
+            _bulk_add_credit(credits, deposit["user_id"], f"wallet_{deposit['currency'].lower()}", credit_amount)
+            ledger.append({
+                "transaction_id": str(uuid.uuid4()),
+                "user_id": deposit["user_id"],
+                "type": "deposit",
+                "amount": credit_amount,
+                "currency": deposit["currency"],
+                "reference_id": deposit["deposit_id"],
+                "status": "completed",
+                "description": f"Deposit via {deposit.get('payment_method_name') or deposit.get('method') or 'method'}",
+                "created_at": now
+            })
+        await db.users.bulk_write(_bulk_wallet_ops(credits), ordered=False)
+        await db.transactions.insert_many(ledger, ordered=False)
+
+    users = await _bulk_users((d["user_id"] for d in deposits), {"email": 1, "full_name": 1, "language": 1})
+    jobs = []
+    for deposit in deposits:
+        user = users.get(deposit["user_id"])
+        if not user or not user.get("email"):
+            continue
+        jobs.append(functools.partial(
+            send_templated_email,
+            user["email"],
+            "deposit_approved" if action == "approve" else "deposit_rejected",
+            notification_language(user),
+            full_name=user.get("full_name", "User"),
+            amount=deposit.get("amount"),
+            currency=deposit["currency"],
+            method=deposit.get("payment_method_name") or deposit.get("method") or "method",
+            fee=deposit.get("fee", 0),
+            total_amount=deposit.get("total_amount", (deposit.get("amount", 0) or 0) + (deposit.get("fee", 0) or 0)),
+            deposit_id=deposit["deposit_id"],
+        ))
+    _bulk_enqueue_notifications(jobs)
+
+    await _bulk_log(admin["user_id"], "deposit_process", [
+        {"deposit_id": d["deposit_id"], "action": action} for d in deposits
+    ])
+    return _bulk_response(ids, results)
+
+
+@api_router.post("/admin/withdrawals/bulk")
+async def admin_bulk_process_withdrawals(
+    payload: AdminBulkActionPayload,
+    admin: dict = Depends(get_admin_user)
+):
+    ids = _bulk_validate(payload)
+    action = payload.action
+    new_status = "completed" if action == "approve" else "rejected"
+    now = datetime.now(timezone.utc).isoformat()
+    results: Dict[str, Dict[str, Any]] = {}
+
+    withdrawals = await _bulk_claim(
+        db.withdrawals, "withdrawal_id", ids,
+        {"status": new_status, "processed_at": now, "processed_by": admin["user_id"]},
+        results,
+    )
+    if not withdrawals:
+        return _bulk_response(ids, results)
+
+    users = await _bulk_users(
+        (w["user_id"] for w in withdrawals),
+        {"email": 1, "full_name": 1, "language": 1, "referred_by": 1, "client_id": 1},
+    )
+    credits: Dict[str, Dict[str, float]] = {}
+    ledger = []
+
+    if action == "reject":
+        # Refund what was deducted (supports cross-currency withdrawals)
+        for withdrawal in withdrawals:
+            source_currency = (withdrawal.get("source_currency") or withdrawal.get("currency") or "").lower()
+            refund_amount = float(withdrawal.get("amount_deducted", withdrawal.get("amount", 0)) or 0)
+            _bulk_add_credit(credits, withdrawal["user_id"], f"wallet_{source_currency}", refund_amount)
+    else:
+        # Affiliate commission: $1 for every $300 withdrawn in USD
+        codes = {
+            users[w["user_id"]]["referred_by"]
+            for w in withdrawals
+            if w["currency"] == "USD" and users.get(w["user_id"], {}).get("referred_by")
+        }
+        referrers: Dict[str, dict] = {}
+        if codes:
+            rows = await db.users.find(
+                {"affiliate_code": {"$in": list(codes)}}, {"_id": 0, "user_id": 1, "affiliate_code": 1}
+            ).to_list(len(codes))
+            referrers = {r["affiliate_code"]: r for r in rows}
+        for withdrawal in withdrawals:
+            user = users.get(withdrawal["user_id"])
+            if not user or not user.get("referred_by") or withdrawal["currency"] != "USD":
+                continue
+            commission = (withdrawal["amount"] // 300) * 1
+            referrer = referrers.get(user["referred_by"])
+            if commission <= 0 or not referrer:
+                continue
+            _bulk_add_credit(credits, referrer["user_id"], "affiliate_earnings", commission)
+            _bulk_add_credit(credits, referrer["user_id"], "wallet_usd", commission)
+            ledger.append({
+                "transaction_id": str(uuid.uuid4()),
+                "user_id": referrer["user_id"],
+                "type": "affiliate_commission",
+                "amount": commission,
+                "currency": "USD",
+                "status": "completed",
+                "description": f"Affiliate commission from {user['client_id']}",
+                "created_at": now
+            })
+
+    if credits:
+        await db.users.bulk_write(_bulk_wallet_ops(credits), ordered=False)
+    if ledger:
+        await db.transactions.insert_many(ledger, ordered=False)
+    await db.transactions.update_many(
+        {"reference_id": {"$in": [w["withdrawal_id"] for w in withdrawals]}, "type": "withdrawal"},
+        {"$set": {"status": new_status}}
+    )
+
+    jobs = []
+    for withdrawal in withdrawals:
+        user = users.get(withdrawal["user_id"])
+        if not user or not user.get("email"):
+            continue
+        jobs.append(functools.partial(
+            send_templated_email,
+            user["email"],
+            "withdrawal_processed" if action == "approve" else "withdrawal_rejected",
+            notification_language(user),
+            full_name=user.get("full_name", "User"),
+            amount=withdrawal.get("amount"),
+            currency=withdrawal["currency"],
+            method=withdrawal.get("payment_method_name") or withdrawal.get("method") or "method",
+            fee=withdrawal.get("fee", 0),
+            total_amount=withdrawal.get("total_amount", (withdrawal.get("amount", 0) or 0) + (withdrawal.get("fee", 0) or 0)),
+            withdrawal_id=withdrawal["withdrawal_id"],
+        ))
+    _bulk_enqueue_notifications(jobs)
+
+    await _bulk_log(admin["user_id"], "withdrawal_process", [
+        {"withdrawal_id": w["withdrawal_id"], "action": action} for w in withdrawals
+    ])
+    return _bulk_response(ids, results)
+
+
+@api_router.post("/admin/agent-deposits/bulk")
+async def admin_bulk_process_agent_deposits(
+    payload: AdminBulkActionPayload,
+    admin: dict = Depends(get_admin_user)
+):
+    ids = _bulk_validate(payload)
+    action = payload.action
+    new_status = "approved" if action == "approve" else "rejected"
+    now = datetime.now(timezone.utc).isoformat()
+    results: Dict[str, Dict[str, Any]] = {}
+
+    deposits = await _bulk_claim(
+        db.agent_deposits, "deposit_id", ids,
+        {"status": new_status, "processed_at": now, "processed_by": admin["user_id"]},
+        results,
+    )
+
+    if action == "approve" and deposits:
+        credits: Dict[str, Dict[str, float]] = {}
+        ledger = []
+        for deposit in deposits:
+            _bulk_add_credit(credits, deposit["client_user_id"], "wallet_usd", deposit["amount_usd"])
+            _bulk_add_credit(credits, deposit["agent_id"], "agent_wallet_usd", deposit["commission_usd"])
+            ledger.append({
+                "transaction_id": str(uuid.uuid4()),
+                "user_id": deposit["client_user_id"],
+                "type": "agent_deposit",
+                "amount": deposit["amount_usd"],
+                "currency": "USD",
+                "reference_id": deposit["deposit_id"],
+                "status": "completed",
+                "description": f"Agent deposit from {deposit['agent_name']}",
+                "created_at": now
+            })
+            ledger.append({
+                "transaction_id": str(uuid.uuid4()),
+                "user_id": deposit["agent_id"],
+                "type": "agent_commission",
+                "amount": deposit["commission_usd"],
+                "currency": "USD",
+                "reference_id": deposit["deposit_id"],
+                "status": "completed",
+                "description": f"Commission from deposit for {deposit['client_name']}",
+                "created_at": now
+            })
+        await db.users.bulk_write(_bulk_wallet_ops(credits), ordered=False)
+        await db.transactions.insert_many(ledger, ordered=False)
+
+        agent_settings = await db.agent_settings.find_one({"setting_id": "main"}, {"_id": 0})
+        telegram_enabled = bool(agent_settings and agent_settings.get("agent_whatsapp_notifications", True))
+        people = await _bulk_users(
+            [d["agent_id"] for d in deposits] + [d["client_user_id"] for d in deposits],
+            {"email": 1, "full_name": 1, "language": 1, "telegram_chat_id": 1},
+        )
+        jobs = []
+        for deposit in deposits:
+            agent = people.get(deposit["agent_id"])
+            agent_lang = notification_language(agent)
+            agent_values = {
+                "full_name": (agent or {}).get("full_name", "Agent"),
+                "client_name": deposit["client_name"],
+                "amount_usd": float(deposit["amount_usd"]),
+                "commission_usd": float(deposit["commission_usd"]),
+                "deposit_id": deposit["deposit_id"],
+            }
+            if telegram_enabled and agent and agent.get("telegram_chat_id"):
+                jobs.append(functools.partial(
+                    send_telegram_notification,
+                    render_notification("agent_deposit_approved", agent_lang, "telegram", **agent_values),
+                    agent["telegram_chat_id"],
+                    wait=False,
+                ))
+            if agent and agent.get("email"):
+                jobs.append(functools.partial(
+                    send_templated_email, agent["email"], "agent_deposit_approved", agent_lang, **agent_values
+                ))
+            client = people.get(deposit["client_user_id"])
+            if client and client.get("email"):
+                jobs.append(functools.partial(
+                    send_templated_email,
+                    client["email"],
+                    "agent_deposit_received",
+                    notification_language(client),
+                    full_name=client.get("full_name", "User"),
+                    amount_usd=float(deposit["amount_usd"]),
+                    agent_name=deposit["agent_name"],
+                    deposit_id=deposit["deposit_id"],
+                ))
+        _bulk_enqueue_notifications(jobs)
+
+    await _bulk_log(admin["user_id"], "agent_deposit_process", [
+        {"deposit_id": d["deposit_id"], "action": action} for d in deposits
+    ])
+    return _bulk_response(ids, results)
 
-# Admin: Get all card top-up requests
-@api_router.get("/admin/card-topups")
-async def admin_get_card_topups(
-    status: Optional[str] = None,
-    limit: int = Query(default=50, le=200),
+
+@api_router.post("/admin/card-topups/bulk")
+async def admin_bulk_process_card_topups(
+    payload: AdminBulkActionPayload,
     admin: dict = Depends(get_admin_user)
 ):
-    query = {}
-    if status:
-        query["status"] = status
-    
-    deposits = await db.virtual_card_deposits.find(query, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(limit)
-    return {"deposits": deposits}
+    ids = _bulk_validate(payload)
+    action = payload.action
+    new_status = "approved" if action == "approve" else "rejected"
+    now = datetime.now(timezone.utc).isoformat()
+    results: Dict[str, Dict[str, Any]] = {}
 
-# Admin: Process card top-up (approve/reject)
-class CardTopUpProcessPayload(BaseModel):
-    action: str  # approve or reject
-    admin_notes: Optional[str] = None
-    delivery_info: Optional[str] = None  # Confirmation of delivery to card
+    deposits = await _bulk_claim(
+        db.virtual_card_deposits, "deposit_id", ids,
+        {
+            "status": new_status,
+            "admin_notes": payload.admin_notes,
+            "delivery_info": payload.delivery_info,
+            "processed_at": now,
+            "processed_by": admin["user_id"]
+        },
+        results,
+    )
+    if deposits:
+        await db.transactions.update_many(
+            {"reference_id": {"$in": [d["deposit_id"] for d in deposits]}},
+            {"$set": {"status": "completed" if action == "approve" else "refunded"}}
+        )
 
-@api_router.patch("/admin/card-topups/{deposit_id}")
-async def admin_process_card_topup(
-    deposit_id: str,
-    payload: CardTopUpProcessPayload,
+    if action == "reject" and deposits:
+        # Refund the total charged amount (amount + fee) to each user's USD balance
+        credits: Dict[str, Dict[str, float]] = {}
+        ledger = []
+        for deposit in deposits:
+            refund_amount = float(deposit.get("total_amount", deposit.get("amount", 0)) or 0)
+            _bulk_add_credit(credits, deposit["user_id"], "wallet_usd", refund_amount)
+            ledger.append({
+                "transaction_id": str(uuid.uuid4()),
+                "user_id": deposit["user_id"],
+                "type": "card_topup_refund",
+                "amount": refund_amount,
+                "currency": "USD",
+                "status": "completed",
+                "description": "Card top-up refund (rejected)",
+                "created_at": now
+            })
+        await db.users.bulk_write(_bulk_wallet_ops(credits), ordered=False)
+        await db.transactions.insert_many(ledger, ordered=False)
+
+    await _bulk_log(admin["user_id"], "card_topup_process", [
+        {"deposit_id": d["deposit_id"], "action": action} for d in deposits
+    ])
+    return _bulk_response(ids, results)
+
+
+@api_router.post("/admin/kyc/bulk")
+async def admin_bulk_review_kyc(
+    payload: AdminBulkActionPayload,
     admin: dict = Depends(get_admin_user)
 ):
-    deposit = await db.virtual_card_deposits.find_one({"deposit_id": deposit_id}, {"_id": 0})
-    if not deposit:
-        raise HTTPException(status_code=404, detail="Top-up request not found")
-    
-    if deposit["status"] != "pending":
-        raise HTTPException(status_code=400, detail="Top-up already processed")
-    
-    if payload.action not in ["approve", "reject"]:
-        raise HTTPException(status_code=400, detail="Invalid action")
-    
-    new_status = "approved" if payload.action == "approve" else "rejected"
-    
+    ids = _bulk_validate(payload)
+    action = payload.action
+    new_status = "approved" if action == "approve" else "rejected"
+    rejection_reason = payload.rejection_reason
+    results: Dict[str, Dict[str, Any]] = {}
+
     update_doc = {
         "status": new_status,
-        "admin_notes": payload.admin_notes,
-        "delivery_info": payload.delivery_info,
-        "processed_at": datetime.now(timezone.utc).isoformat(),
-        "processed_by": admin["user_id"]
+        "reviewed_at": datetime.now(timezone.utc).isoformat(),
+        "reviewed_by": admin["user_id"]
     }
-    
-    await db.virtual_card_deposits.update_one(
-        {"deposit_id": deposit_id},
-        {"$set": update_doc}
-    )
-    
-    # Update transaction status
-    await db.transactions.update_one(
-        {"reference_id": deposit_id},
-        {"$set": {"status": "completed" if payload.action == "approve" else "refunded"}}
-    )
-    
-    if payload.action == "reject":
-        # Refund the total charged amount (amount + fee) to user's USD balance
-        refund_amount = float(deposit.get("total_amount", deposit.get("amount", 0)) or 0)
-        await db.users.update_one(
-            {"user_id": deposit["user_id"]},
-            {"$inc": {"wallet_usd": refund_amount}}
+    if rejection_reason:
+        update_doc["rejection_reason"] = rejection_reason
+    submissions = await _bulk_claim(db.kyc, "kyc_id", ids, update_doc, results)
+
+    if submissions:
+        user_ops = []
+        for kyc in submissions:
+            user_update = {"kyc_status": new_status}
+            if action == "approve":
+                if kyc.get("whatsapp_number"):
+                    user_update["whatsapp_number"] = kyc.get("whatsapp_number")
+                if kyc.get("phone_number"):
+                    user_update["phone"] = kyc.get("phone_number")
+            user_ops.append(UpdateOne({"user_id": kyc["user_id"]}, {"$set": user_update}))
+        await db.users.bulk_write(user_ops, ordered=False)
+
+    await _bulk_log(admin["user_id"], "kyc_review", [
+        {"kyc_id": k["kyc_id"], "action": action} for k in submissions
+    ])
+
+    users = await _bulk_users((k["user_id"] for k in submissions), {"email": 1, "language": 1})
+    jobs = []
+    for kyc in submissions:
+        user = users.get(kyc["user_id"])
+        if not user or not user.get("email"):
+            continue
+        lang = notification_language(user)
+        status_label = notification_label("approved" if action == "approve" else "rejected", lang)
+        reason_html = render_notification("kyc_reason", lang, "html", reason=rejection_reason) if rejection_reason else ""
+        jobs.append(functools.partial(
+            send_templated_email, user["email"], "kyc_reviewed", lang, status_label=status_label, reason_html=reason_html
+        ))
+    _bulk_enqueue_notifications(jobs)
+
+    return _bulk_response(ids, results)
+
+# ==================== ARCHIVAL ====================
+# Old, settled records are moved (not deleted) out of the hot collections into month-partitioned
+# archive collections `archive_<collection>_<YYYYMM>`. Batches are small and paced so the primary
+# is never hit with one giant delete. `archive_partitions` catalogs every partition (time bounds,
+# count) and `archive_index` maps a record id to its partition for point lookups. Each batch is
+# copied before it is removed, and the copy keeps `_id`, so a run that dies halfway can simply be
+# re-run.
+
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_BATCH_PAUSE_SECONDS = float(os.environ.get("ARCHIVE_BATCH_PAUSE_SECONDS", "0.25"))
+ARCHIVE_MIN_DAYS = 7
+# Scheduled archival: records older than this many days are archived daily (0 = admin-triggered only).
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "0"))
+
+# collection -> (id field, time field, extra filter selecting settled records, partition indexes)
+ARCHIVE_POLICIES: Dict[str, tuple] = {
+    "agent_deposits": ("deposit_id", "created_at", {"status": {"$in": ["approved", "rejected"]}},
+                       [[("agent_id", 1), ("created_at", -1)], [("client_user_id", 1)]]),
+    "deposits": ("deposit_id", "created_at", {"status": {"$in": ["completed", "rejected"]}},
+                 [[("user_id", 1), ("created_at", -1)]]),
+    "withdrawals": ("withdrawal_id", "created_at", {"status": {"$in": ["completed", "rejected"]}},
+                    [[("user_id", 1), ("created_at", -1)]]),
+    "transactions": ("transaction_id", "created_at", {"status": {"$ne": "pending"}},
+                     [[("user_id", 1), ("created_at", 1)]]),
+    "logs": ("log_id", "timestamp", {}, [[("user_id", 1), ("timestamp", -1)]]),
+}
+# High-volume collections that are only ever read by time range get no per-record archive_index rows.
+ARCHIVE_UNINDEXED = {"logs"}
+_archive_prepared: set = set()
+
+
+def _archive_partition(value: Any) -> Optional[str]:
+    """'2026-01-15T...' -> '202601'."""
+    text = value.isoformat() if isinstance(value, datetime) else str(value or "")
+    if len(text) < 7 or text[4] != "-":
+        return None
+    return text[:4] + text[5:7]
+
+
+def archive_collection_name(collection: str, partition: str) -> str:
+    return f"archive_{collection}_{partition}"
+
+
+async def _archive_prepare(collection: str, partition: str) -> None:
+    name = archive_collection_name(collection, partition)
+    if name in _archive_prepared:
+        return
+    id_field, time_field, _, indexes = ARCHIVE_POLICIES[collection]
+    await db[name].create_index(id_field)
+    for keys in indexes:
+        await db[name].create_index(keys)
+    _archive_prepared.add(name)
+
+
+async def _archive_batch(collection: str, cutoff: str) -> int:
+    """Move one batch of `collection` older than `cutoff`. Returns the number of records moved."""
+    id_field, time_field, settled, _ = ARCHIVE_POLICIES[collection]
+    query = {**settled, time_field: {"$lt": cutoff}}
+    docs = await db[collection].find(query).sort(time_field, 1).limit(ARCHIVE_BATCH_SIZE).to_list(ARCHIVE_BATCH_SIZE)
+    if not docs:
+        return 0
+
+    by_partition: Dict[str, List[dict]] = {}
+    for doc in docs:
+        partition = _archive_partition(doc.get(time_field))
+        if partition:
+            by_partition.setdefault(partition, []).append(doc)
+
+    moved_ids = []
+    for partition, rows in by_partition.items():
+        await _archive_prepare(collection, partition)
+        try:
+            await db[archive_collection_name(collection, partition)].insert_many(rows, ordered=False)
+        except BulkWriteError as e:
+            # Already copied by an interrupted earlier run; anything else is a real failure.
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+        index_ops = [
+            UpdateOne(
+                {"collection": collection, "key": row[id_field]},
+                {"$set": {"partition": partition, "user_id": row.get("user_id")}},
+                upsert=True,
+            )
+            for row in rows if row.get(id_field)
+        ]
+        if index_ops and collection not in ARCHIVE_UNINDEXED:
+            await db.archive_index.bulk_write(index_ops, ordered=False)
+        times = [str(row.get(time_field)) for row in rows]
+        await db.archive_partitions.update_one(
+            {"collection": collection, "partition": partition},
+            {
+                "$min": {"first_at": min(times)},
+                "$max": {"last_at": max(times)},
+                "$set": {"name": archive_collection_name(collection, partition), "updated_at": datetime.now(timezone.utc).isoformat()},
+            },
+            upsert=True,
         )
-        
-        # Create refund transaction
-        await db.transactions.insert_one({
-            "transaction_id": str(uuid.uuid4()),
-            "user_id": deposit["user_id"],
-            "type": "card_topup_refund",
-            "amount": refund_amount,
-            "currency": "USD",
-            "status": "completed",
-            "description": f"Card top-up refund (rejected)",
-            "created_at": datetime.now(timezone.utc).isoformat()
-        })
-    
-    await log_action(admin["user_id"], "card_topup_process", {"deposit_id": deposit_id, "action": payload.action})
-    
-    return {"message": f"Top-up {payload.action}d successfully"}
+        moved_ids.extend(row["_id"] for row in rows)
+
+    if moved_ids:
+        await db[collection].delete_many({"_id": {"$in": moved_ids}})
+    return len(moved_ids)
+
+
+async def archive_old_records(days: int, run_id: Optional[str] = None) -> Dict[str, int]:
+    """Archive every ARCHIVE_POLICIES collection older than `days`, batch by batch."""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    moved: Dict[str, int] = {}
+    for collection in ARCHIVE_POLICIES:
+        if _event_store_timeseries.get(collection):
+            # Time-series event stores expire by TTL instead of being archived.
+            continue
+        moved[collection] = 0
+        while True:
+            count = await _archive_batch(collection, cutoff)
+            if not count:
+                break
+            moved[collection] += count
+            if run_id:
+                await db.archive_runs.update_one({"run_id": run_id}, {"$set": {f"moved.{collection}": moved[collection]}})
+            await asyncio.sleep(ARCHIVE_BATCH_PAUSE_SECONDS)
+        if moved[collection]:
+            partitions = await db.archive_partitions.find({"collection": collection}, {"_id": 0, "partition": 1}).to_list(None)
+            for p in partitions:
+                count = await db[archive_collection_name(collection, p["partition"])].estimated_document_count()
+                await db.archive_partitions.update_one(
+                    {"collection": collection, "partition": p["partition"]}, {"$set": {"count": count}}
+                )
+    return moved
+
+
+async def _archive_run(run_id: str, days: int) -> None:
+    status, error, moved = "completed", None, {}
+    try:
+        moved = await archive_old_records(days, run_id)
+    except Exception as e:
+        logger.error(f"Archive run {run_id} failed: {e}")
+        status, error = "failed", str(e)
+    update = {"status": status, "finished_at": datetime.now(timezone.utc).isoformat(), "error": error}
+    if moved:
+        update["moved"] = moved
+    await db.archive_runs.update_one({"run_id": run_id}, {"$set": update})
+
+
+async def start_archive_run(days: int, started_by: str) -> Optional[dict]:
+    """Start a background archive run unless one is already running."""
+    # A run that has been "running" for hours died with its process; don't let it block forever.
+    stale_before = (datetime.now(timezone.utc) - timedelta(hours=6)).isoformat()
+    if await db.archive_runs.find_one({"status": "running", "started_at": {"$gt": stale_before}}, {"_id": 1}):
+        return None
+    run = {
+        "run_id": str(uuid.uuid4()),
+        "days": days,
+        "status": "running",
+        "moved": {},
+        "started_by": started_by,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "finished_at": None,
+    }
+    await db.archive_runs.insert_one(dict(run))
+    asyncio.create_task(_archive_run(run["run_id"], days))
+    return run
+
 
-# Admin: Purge old records (older than X days)
+async def _archive_loop() -> None:
+    owner = str(uuid.uuid4())
+    while True:
+        await asyncio.sleep(3600)
+        try:
+            today = datetime.now(timezone.utc).date().isoformat()
+            if not await acquire_worker_lease(f"archive:{today}", owner, 86400):
+                continue
+            await start_archive_run(ARCHIVE_AFTER_DAYS, "scheduler")
+        except Exception as e:
+            logger.error(f"Archive loop error: {e}")
+
+
+async def archive_find_one(collection: str, key: str, query: Optional[dict] = None, projection: Optional[dict] = None) -> Optional[dict]:
+    """Look an archived record up by id through `archive_index`."""
+    entry = await db.archive_index.find_one({"collection": collection, "key": key}, {"_id": 0, "partition": 1})
+    if not entry:
+        return None
+    id_field = ARCHIVE_POLICIES[collection][0]
+    return await db[archive_collection_name(collection, entry["partition"])].find_one(
+        {**(query or {}), id_field: key}, projection or {"_id": 0}
+    )
+
+
+async def archive_partitions_between(collection: str, start_iso: str, end_iso: str) -> List[str]:
+    """Partitions of `collection` that may hold records in [start_iso, end_iso)."""
+    rows = await db.archive_partitions.find(
+        {"collection": collection, "first_at": {"$lt": end_iso}, "last_at": {"$gte": start_iso}},
+        {"_id": 0, "partition": 1},
+    ).sort("partition", 1).to_list(None)
+    return [r["partition"] for r in rows]
+
+
+async def archive_range_collections(collection: str, query: dict) -> List[str]:
+    """The hot collection plus the archive partitions overlapping `query`'s range on the time field."""
+    window = query[ARCHIVE_POLICIES[collection][1]]
+    partitions = await archive_partitions_between(collection, window["$gte"], window["$lt"])
+    return [collection] + [archive_collection_name(collection, p) for p in partitions]
+
+
+def archive_find_range(
+    collection: str,
+    query: dict,
+    projection: dict,
+    *,
+    descending: bool = False,
+    limit: int = 0,
+):
+    """
+    Records matching `query` (which must carry a $gte/$lt range on the collection's time field) in
+    time order, across the hot collection and its archive partitions. `projection` must keep the time field.
+    """
+    time_field = ARCHIVE_POLICIES[collection][1]
+
+    async def stream():
+        names = await archive_range_collections(collection, query)
+        sources = [
+            db[name].find(query, projection).sort(time_field, -1 if descending else 1).limit(limit).batch_size(
+                STATEMENT_CURSOR_BATCH
+            )
+            for name in names
+        ]
+        sent = 0
+        async for doc in _merge_sorted(lambda d: d.get(time_field) or "", *sources, reverse=descending):
+            yield doc
+            sent += 1
+            if limit and sent >= limit:
+                break
+
+    return stream()
+
+
+# Admin: Archive old records (older than X days). Kept at the old purge URL for the admin UI.
 @api_router.post("/admin/purge-old-records")
 async def admin_purge_old_records(
     days: int = 7,
     admin: dict = Depends(get_admin_user)
 ):
-    """Delete completed/rejected records older than X days"""
-    cutoff_date = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
-    
-    # Delete old agent deposits (keep pending ones)
-    agent_result = await db.agent_deposits.delete_many({
-        "status": {"$in": ["approved", "rejected"]},
-        "created_at": {"$lt": cutoff_date}
-    })
-    
-    # Delete old deposits (keep pending ones)
-    deposits_result = await db.deposits.delete_many({
-        "status": {"$in": ["completed", "rejected"]},
-        "created_at": {"$lt": cutoff_date}
-    })
-    
-    # Delete old withdrawals (keep pending ones)
-    withdrawals_result = await db.withdrawals.delete_many({
-        "status": {"$in": ["completed", "rejected"]},
-        "created_at": {"$lt": cutoff_date}
-    })
-    
-    # Delete old transactions
-    transactions_result = await db.transactions.delete_many({
-        "created_at": {"$lt": cutoff_date}
-    })
-    
-    # Delete old logs
-    logs_result = await db.logs.delete_many({
-        "timestamp": {"$lt": cutoff_date}
-    })
-    
-    await log_action(admin["user_id"], "purge_old_records", {
-        "days": days,
-        "deleted_agent_deposits": agent_result.deleted_count,
-        "deleted_deposits": deposits_result.deleted_count,
-        "deleted_withdrawals": withdrawals_result.deleted_count,
-        "deleted_transactions": transactions_result.deleted_count,
-        "deleted_logs": logs_result.deleted_count
-    })
-    
-    return {
-        "message": f"Purged records older than {days} days",
-        "result": {
-            "deleted_agent_deposits": agent_result.deleted_count,
-            "deleted_deposits": deposits_result.deleted_count,
-            "deleted_withdrawals": withdrawals_result.deleted_count,
-            "deleted_transactions": transactions_result.deleted_count,
-            "deleted_logs": logs_result.deleted_count
-        }
-    }
+    """Move settled records older than X days to the archive tier (nothing is deleted)."""
+    if days < ARCHIVE_MIN_DAYS:
+        raise HTTPException(status_code=400, detail=f"days must be at least {ARCHIVE_MIN_DAYS}")
+    run = await start_archive_run(days, admin["user_id"])
+    if not run:
+        raise HTTPException(status_code=409, detail="An archive run is already in progress")
+    await log_action(admin["user_id"], "archive_old_records", {"days": days, "run_id": run["run_id"]})
+    return {"message": f"Archiving records older than {days} days", "run": run}
+
+
+@api_router.get("/admin/archive-runs")
+async def admin_get_archive_runs(
+    limit: int = Query(default=20, le=100),
+    admin: dict = Depends(get_admin_user)
+):
+    runs = await db.archive_runs.find({}, {"_id": 0}).sort("started_at", -1).limit(limit).to_list(limit)
+    partitions = await db.archive_partitions.find({}, {"_id": 0}).sort([("collection", 1), ("partition", 1)]).to_list(None)
+    return {"runs": runs, "partitions": partitions}
+
+
+@api_router.get("/admin/archive/{collection}/{key}")
+async def admin_get_archived_record(
+    collection: str,
+    key: str,
+    admin: dict = Depends(get_admin_user)
+):
+    if collection not in ARCHIVE_POLICIES:
+        raise HTTPException(status_code=400, detail="Unknown collection")
+    record = await archive_find_one(collection, key)
+    if not record:
+        raise HTTPException(status_code=404, detail="Archived record not found")
+    return {"record": record}
 
 # Logs Admin
-@api_router.get("/admin/logs")
+@api_router.get("/admin/logs", response_model=LogsPage)
 async def admin_get_logs(
     user_id: Optional[str] = None,
     action: Optional[str] = None,
@@ -8762,12 +11627,12 @@ async def admin_get_logs(
     if action:
         query["action"] = action
     
-    logs = await db.logs.find(query, {"_id": 0}).sort("timestamp", -1).limit(limit).to_list(limit)
-    return {"logs": logs}
+    logs = await db.logs.find(query, {"_id": 0, "ts": 0}).sort(event_sort_field("logs"), -1).limit(limit).to_list(limit)
+    return model_response(LogsPage, logs=logs)
 
 
 # Webhook Events Admin (Strowallet + related account providers)
-@api_router.get("/admin/webhook-events")
+@api_router.get("/admin/webhook-events", response_model=WebhookEventsPage)
 async def admin_get_webhook_events(
     provider: Optional[str] = None,
     limit: int = Query(default=100, le=500),
@@ -8781,7 +11646,7 @@ async def admin_get_webhook_events(
         query,
         # Don't return full headers/payload for list view; use detail endpoint for full body.
         {"_id": 0, "event_id": 1, "provider": 1, "received_at": 1, "payload": 1},
-    ).sort("received_at", -1).limit(limit).to_list(limit)
+    ).sort(event_sort_field("webhook_events"), -1).limit(limit).to_list(limit)
 
     # Provide a small extracted summary field for quick scanning.
     for e in events:
@@ -8807,7 +11672,7 @@ async def admin_get_webhook_events(
         else:
             e["payload"] = None
 
-    return {"events": events}
+    return model_response(WebhookEventsPage, events=events)
 
 
 @api_router.get("/admin/webhook-events/{event_id}")
@@ -8815,11 +11680,21 @@ async def admin_get_webhook_event_detail(
     event_id: str,
     admin: dict = Depends(get_admin_user),
 ):
-    ev = await db.webhook_events.find_one({"event_id": event_id}, {"_id": 0})
+    ev = await db.webhook_events.find_one({"event_id": event_id}, {"_id": 0, "ts": 0})
     if not ev:
         raise HTTPException(status_code=404, detail="Webhook event not found")
     return {"event": ev}
 
+
+@api_router.post("/admin/storage/migrate-event-stores")
+async def admin_migrate_event_stores(admin: dict = Depends(get_admin_user)):
+    """Convert logs / webhook_events / whatsapp_notifications to time-series collections."""
+    results = await migrate_event_stores()
+    modes = await refresh_event_store_modes()
+    await db.schema_meta.update_one({"_id": SCHEMA_META_ID}, {"$set": {"event_stores": modes}}, upsert=True)
+    await log_action(admin["user_id"], "migrate_event_stores", {"results": results})
+    return {"results": results, "timeseries": modes}
+
 # ==================== WHATSAPP NOTIFICATIONS ====================
 
 @api_router.get("/admin/whatsapp-notifications")
@@ -8834,22 +11709,24 @@ async def admin_get_whatsapp_notifications(
         query["status"] = status
     
     notifications = await db.whatsapp_notifications.find(
-        query, {"_id": 0}
-    ).sort("created_at", -1).limit(limit).to_list(limit)
-    
-    # Get stats
-    total = await db.whatsapp_notifications.count_documents({})
-    sent = await db.whatsapp_notifications.count_documents({"status": "sent"})
-    failed = await db.whatsapp_notifications.count_documents({"status": "failed"})
-    pending = await db.whatsapp_notifications.count_documents({"status": "pending"})
+        query, {"_id": 0, "ts": 0}
+    ).sort(event_sort_field("whatsapp_notifications"), -1).limit(limit).to_list(limit)
+    
+    # Get stats (one pass; status is the time-series metaField)
+    counts = {
+        row["_id"]: row["count"]
+        for row in await db.whatsapp_notifications.aggregate(
+            [{"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+        ).to_list(None)
+    }
     
     return {
         "notifications": notifications,
         "stats": {
-            "total": total,
-            "sent": sent,
-            "failed": failed,
-            "pending": pending
+            "total": sum(counts.values()),
+            "sent": counts.get("sent", 0),
+            "failed": counts.get("failed", 0),
+            "pending": counts.get("pending", 0)
         }
     }
 
@@ -8866,15 +11743,9 @@ async def admin_test_whatsapp(
     success = await send_whatsapp_notification(request.phone_number, request.message)
     
     # Log the test
-    await db.logs.insert_one({
-        "log_id": str(uuid.uuid4()),
-        "user_id": admin["user_id"],
-        "action": "whatsapp_test",
-        "details": {
-            "phone": request.phone_number,
-            "success": success
-        },
-        "timestamp": datetime.now(timezone.utc).isoformat()
+    await log_action(admin["user_id"], "whatsapp_test", {
+        "phone": request.phone_number,
+        "success": success
     })
     
     if success:
@@ -8894,13 +11765,7 @@ async def admin_test_telegram(
     success = await send_telegram_notification(request.message)
     
     # Log the test
-    await db.logs.insert_one({
-        "log_id": str(uuid.uuid4()),
-        "user_id": admin["user_id"],
-        "action": "telegram_test",
-        "details": {"success": success},
-        "timestamp": datetime.now(timezone.utc).isoformat()
-    })
+    await log_action(admin["user_id"], "telegram_test", {"success": success})
     
     if success:
         return {"success": True, "message": "Mesaj Telegram voye avèk siksè! ✅"}
@@ -8955,15 +11820,7 @@ async def admin_setup_telegram_webhook(admin: dict = Depends(get_admin_user)):
         logger.error(f"Error setting up Telegram webhook: {e}")
         raise HTTPException(status_code=500, detail=f"Error setting up webhook: {str(e)}")
 
-# ==================== MAIN ROUTES ====================
-
-@api_router.get("/")
-async def root():
-    return {"message": "KAYICOM Wallet API", "version": "1.0.0"}
-
-@api_router.get("/health")
-async def health():
-    return {"status": "healthy"}
+# ==================== WEBHOOK ROUTES ====================
 
 @api_router.post("/webhooks/strowallet")
 async def strowallet_webhook(request: Request):
@@ -8979,16 +11836,25 @@ async def strowallet_webhook(request: Request):
 
     # Store event for debugging/audit (best-effort).
     try:
+        received_at = datetime.now(timezone.utc)
         await db.webhook_events.insert_one({
             "event_id": str(uuid.uuid4()),
             "provider": "strowallet",
-            "received_at": datetime.now(timezone.utc).isoformat(),
+            "received_at": received_at.isoformat(),
+            "ts": received_at,
             "headers": {k.lower(): v for k, v in request.headers.items()},
             "payload": body,
         })
     except Exception as e:
         logger.warning(f"Failed to store strowallet webhook event: {e}")
 
+    card_id = _extract_first(body, "card_id", "data.card_id", "data.card.id", "data.cardId", "cardId")
+    if card_id:
+        try:
+            await card_tx_mark_pending(str(card_id))
+        except Exception as e:
+            logger.warning(f"Failed to schedule card transaction sync for {card_id}: {e}")
+
     return {"ok": True}
 
 
@@ -9003,10 +11869,12 @@ async def _generic_account_webhook(provider: str, request: Request):
         body = {"raw": (await request.body()).decode("utf-8", "replace")}
 
     try:
+        received_at = datetime.now(timezone.utc)
         await db.webhook_events.insert_one({
             "event_id": str(uuid.uuid4()),
             "provider": provider,
-            "received_at": datetime.now(timezone.utc).isoformat(),
+            "received_at": received_at.isoformat(),
+            "ts": received_at,
             "headers": {k.lower(): v for k, v in request.headers.items()},
             "payload": body,
         })
@@ -9040,8 +11908,25 @@ async def health_check():
     return {"status": "online", "message": "Wisebond Backend API"}
 
 # Include router
+app.include_router(system_routes.router)
+app.include_router(help_center_routes.build_router(get_db=lambda: db, admin_user=get_admin_user, log_action=log_action))
+app.include_router(auth_routes.build_router(
+    get_db=lambda: db, current_user=get_current_user, log_action=log_action, send_password_reset=send_password_reset_email,
+))
+app.include_router(admin_rbac_routes.build_router(
+    get_db=lambda: db, admin_user=get_admin_user, permissions=admin_permissions, log_action=log_action,
+))
 app.include_router(api_router)
 
+# Compress JSON lists and CSV exports (gzip; brotli/zstd when installed) for mobile clients.
+# Bodies under COMPRESSION_MIN_BYTES go out as-is; bodies from COMPRESSION_THREAD_BYTES up are
+# compressed in a worker thread.
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.environ.get("COMPRESSION_MIN_BYTES") or 1024),
+    thread_threshold=int(os.environ.get("COMPRESSION_THREAD_BYTES") or 64 * 1024),
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -9050,27 +11935,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.on_event("startup")
-async def startup():
-    # Create indexes
-    await db.users.create_index("email", unique=True)
-    await db.users.create_index("client_id", unique=True)
-    await db.users.create_index("affiliate_code", unique=True)
-    await db.users.create_index("phone")
-    await db.users.create_index("is_agent")
-    await db.transactions.create_index([("user_id", 1), ("created_at", -1)])
-    await db.deposits.create_index([("user_id", 1), ("status", 1)])
-    await db.withdrawals.create_index([("user_id", 1), ("status", 1)])
-    await db.kyc.create_index("user_id", unique=True)
-    await db.kyc.create_index([("status", 1), ("submitted_at", -1)])
-    await db.kyc.create_index([("submitted_at", -1)])
-    await db.kyc.create_index("client_id")
-    await db.agent_deposits.create_index([("agent_id", 1), ("status", 1)])
-    await db.agent_deposits.create_index([("client_user_id", 1)])
-    await db.agent_requests.create_index([("user_id", 1)])
-    await db.payment_gateway_methods.create_index("payment_method_id", unique=True)
-    await db.payment_gateway_methods.create_index([("payment_type", 1), ("status", 1)])
-    await db.webhook_events.create_index([("provider", 1), ("received_at", -1)])
+# ==================== SCHEMA MIGRATIONS ====================
+# Index builds, event store setup, seeding and data backfills run once per SCHEMA_VERSION, not on
+# every boot: `python migrate.py` runs them explicitly (deploy step), and startup only reads the
+# `schema_meta` document. When the stored version is behind (first boot after a deploy that
+# skipped migrate.py), one worker runs the migrations under a lease while the others serve.
+# Bump SCHEMA_VERSION whenever run_migrations() gains a step.
+
+SCHEMA_VERSION = 1
+SCHEMA_META_ID = "server"
+MIGRATE_ON_STARTUP = _env_bool("MIGRATE_ON_STARTUP", True)
+
+
+async def run_migrations() -> Dict[str, Any]:
+    """Idempotent schema/data setup. Records SCHEMA_VERSION in `schema_meta` when done."""
+    await ensure_event_stores()
+
+    # Create missing indexes (declared in db_indexes.INDEXES)
+    built = await ensure_indexes(db)
+    if built:
+        logger.info(f"Built {len(built)} missing index(es): {', '.join(built)}")
 
     # Auto-promote specified email to superadmin if it exists.
     primary_admin_email = "kayicom509@gmail.com"
@@ -9121,6 +12005,84 @@ async def startup():
             "updated_at": datetime.now(timezone.utc).isoformat()
         })
 
+    # Schedule Plisio reconciliation for pending deposits created before it existed.
+    await db.deposits.update_many(
+        {"provider": "plisio", "status": "pending", "plisio_next_check_at": {"$exists": False}},
+        {"$set": {"plisio_next_check_at": datetime.now(timezone.utc).isoformat()}},
+    )
+
+    meta = {
+        "version": SCHEMA_VERSION,
+        "migrated_at": datetime.now(timezone.utc).isoformat(),
+        "indexes_built": built,
+        "event_stores": dict(_event_store_timeseries),
+    }
+    await db.schema_meta.update_one({"_id": SCHEMA_META_ID}, {"$set": meta}, upsert=True)
+    return meta
+
+
+async def _migrate_in_background() -> None:
+    owner = str(uuid.uuid4())
+    try:
+        if not await acquire_worker_lease("schema_migration", owner, 900):
+            logger.info("Schema migration is running in another process")
+            return
+        meta = await run_migrations()
+        logger.info(f"Schema migrated to version {meta['version']}")
+    except Exception as e:
+        logger.error(f"Schema migration failed: {e}")
+
+
+async def check_schema_version() -> None:
+    """Startup check: one read of `schema_meta`; migrations only when the stored version is behind."""
+    meta = await db.schema_meta.find_one({"_id": SCHEMA_META_ID}) or {}
+    _event_store_timeseries.update(meta.get("event_stores") or {})
+    if int(meta.get("version") or 0) >= SCHEMA_VERSION:
+        return
+    if not MIGRATE_ON_STARTUP:
+        logger.warning(
+            f"Database schema version {meta.get('version') or 0} is behind {SCHEMA_VERSION}; run `python migrate.py`"
+        )
+        return
+    asyncio.create_task(_migrate_in_background())
+
+
+@app.on_event("startup")
+async def startup():
+    try:
+        replayed = await replay_audit_spill()
+        if replayed:
+            logger.info(f"Replayed {replayed} spilled audit log entries")
+    except Exception as e:
+        logger.error(f"Audit log spill replay failed: {e}")
+
+    await check_schema_version()
+
+    # Digest window and high-value thresholds from admin settings (env defaults until now).
+    await _refresh_admin_alert_settings()
+
+    # Resume bulk email campaigns interrupted by a restart.
+    asyncio.create_task(_campaign_resume_interrupted())
+
+    # Telegram send queue (+ getUpdates long-poll worker when TELEGRAM_MODE=polling).
+    telegram_start_gateway()
+
+    # Drain card transaction syncs flagged by webhooks.
+    asyncio.create_task(_card_tx_sync_loop())
+
+    # Settle pending Plisio deposits whose webhook was missed.
+    asyncio.create_task(_plisio_reconcile_loop())
+    asyncio.create_task(_balance_snapshot_loop())
+    if ARCHIVE_AFTER_DAYS > 0:
+        asyncio.create_task(_archive_loop())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    try:
+        await flush_admin_alerts_now()
+    except Exception as e:
+        logger.error(f"Failed to flush admin alerts on shutdown: {e}")
+    await flush_audit_log_now()
+    await telegram_stop_gateway()
+    shutdown_pdf_pool()
     client.close()
@@ -0,0 +1,7 @@
+import os
+import sys
+from pathlib import Path
+
+# server.py reads MONGO_URL at import; Motor connects lazily, so no mongod is needed for these tests.
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def deliveries(monkeypatch):
+    sent = []
+
+    async def deliver(subject, html, telegram_messages):
+        await asyncio.sleep(0.1)
+        sent.append(subject)
+
+    async def no_settings():
+        pass
+
+    monkeypatch.setattr(server, "_deliver_admin_alert", deliver)
+    monkeypatch.setattr(server, "_refresh_admin_alert_settings", no_settings)
+    monkeypatch.setattr(server, "_admin_alert_state", {
+        "pending": [], "flusher": None, "sending": False,
+        "window_seconds": 0.05, "immediate_usd": 1000.0, "immediate_htg": 130000.0,
+    })
+    return sent
+
+
+def test_shutdown_during_a_digest_send_keeps_the_batch(deliveries):
+    async def run():
+        await server.notify_admin("deposit 1", "<p>1</p>", amount=10)
+        await server.notify_admin("deposit 2", "<p>2</p>", amount=10)
+        await asyncio.sleep(0.08)  # window elapsed, the digest is being delivered
+        assert server._admin_alert_state["sending"]
+        await server.notify_admin("deposit 3", "<p>3</p>", amount=10)
+        await server.flush_admin_alerts_now()
+
+    asyncio.run(run())
+    assert deliveries == ["KAYICOM - 2 new admin alerts", "deposit 3"]
+
+
+def test_shutdown_during_the_window_sends_pending_alerts(deliveries):
+    async def run():
+        await server.notify_admin("deposit 1", "<p>1</p>", amount=10)
+        await server.flush_admin_alerts_now()
+        assert server._admin_alert_state["flusher"] is None
+
+    asyncio.run(run())
+    assert deliveries == ["deposit 1"]
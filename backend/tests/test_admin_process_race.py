@@ -0,0 +1,83 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+class _FakeCollection:
+    def __init__(self, docs=()):
+        self.docs = [dict(d) for d in docs]
+        self.updates = []
+        self.inserted = []
+
+    def _matches(self, doc, query):
+        return all(doc.get(k) == v for k, v in query.items())
+
+    async def find_one(self, query, projection=None):
+        await asyncio.sleep(0)  # let the other request read the same pending document
+        return next((dict(d) for d in self.docs if self._matches(d, query)), None)
+
+    async def update_one(self, query, update):
+        self.updates.append((query, update))
+        for doc in self.docs:
+            if self._matches(doc, query):
+                doc.update(update.get("$set", {}))
+                return SimpleNamespace(matched_count=1, modified_count=1)
+        return SimpleNamespace(matched_count=0, modified_count=0)
+
+    async def insert_one(self, doc):
+        self.inserted.append(doc)
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    fake = SimpleNamespace(
+        deposits=_FakeCollection([{"deposit_id": "d-1", "user_id": "u-1", "status": "pending", "amount": 50, "currency": "USD"}]),
+        virtual_card_deposits=_FakeCollection([{"deposit_id": "t-1", "user_id": "u-1", "status": "pending", "total_amount": 25}]),
+        users=_FakeCollection(),
+        transactions=_FakeCollection(),
+    )
+    monkeypatch.setattr(server, "db", fake)
+
+    async def _log_action(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(server, "log_action", _log_action)
+    return fake
+
+
+def _race(*calls):
+    async def run():
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    results = asyncio.run(run())
+    errors = [r for r in results if isinstance(r, HTTPException)]
+    assert len(errors) == 1 and errors[0].status_code == 400
+    return results
+
+
+def _wallet_credits(fake):
+    return [u for q, u in fake.users.updates if "$inc" in u]
+
+
+def test_concurrent_deposit_approvals_credit_once(fake_db):
+    admin = {"user_id": "admin-1"}
+    _race(
+        server.admin_process_deposit("d-1", "approve", admin),
+        server.admin_process_deposit("d-1", "approve", admin),
+    )
+    assert _wallet_credits(fake_db) == [{"$inc": {"wallet_usd": 50.0}}]
+    assert len(fake_db.transactions.inserted) == 1
+
+
+def test_concurrent_topup_rejections_refund_once(fake_db):
+    admin = {"user_id": "admin-1"}
+    payload = server.CardTopUpProcessPayload(action="reject")
+    _race(
+        server.admin_process_card_topup("t-1", payload, admin),
+        server.admin_process_card_topup("t-1", payload, admin),
+    )
+    assert _wallet_credits(fake_db) == [{"$inc": {"wallet_usd": 25.0}}]
@@ -0,0 +1,28 @@
+import asyncio
+
+import server
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+def _merge(sources, reverse=False):
+    async def run():
+        merged = server._merge_sorted(lambda d: d["created_at"], *(_aiter(s) for s in sources), reverse=reverse)
+        return [d["id"] async for d in merged]
+
+    return asyncio.run(run())
+
+
+def test_merge_interleaves_hot_and_archived_rows_in_time_order():
+    hot = [{"id": "h1", "created_at": "2026-03-02"}, {"id": "h2", "created_at": "2026-03-09"}]
+    archived = [{"id": "a1", "created_at": "2026-02-20"}, {"id": "a2", "created_at": "2026-03-05"}]
+    assert _merge([hot, archived]) == ["a1", "h1", "a2", "h2"]
+
+
+def test_merge_newest_first():
+    hot = [{"id": "h2", "created_at": "2026-03-09"}, {"id": "h1", "created_at": "2026-03-02"}]
+    archived = [{"id": "a2", "created_at": "2026-03-05"}, {"id": "a1", "created_at": "2026-02-20"}]
+    assert _merge([hot, archived, []], reverse=True) == ["h2", "a2", "h1", "a1"]
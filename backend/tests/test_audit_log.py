@@ -0,0 +1,70 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+import server
+
+
+class _FakeLogs:
+    def __init__(self):
+        self.docs = []
+        self.error = None
+
+    async def insert_many(self, docs, ordered=True):
+        if self.error is not None:
+            raise self.error
+        self.docs.extend(docs)
+
+
+@pytest.fixture
+def logs(monkeypatch, tmp_path):
+    fake = _FakeLogs()
+    monkeypatch.setattr(server, "db", SimpleNamespace(logs=fake))
+    monkeypatch.setattr(server, "AUDIT_LOG_SPILL_DIR", tmp_path)
+    monkeypatch.setattr(server, "AUDIT_LOG_FLUSH_SECONDS", 5.0)
+    monkeypatch.setattr(server, "_audit_state", {"queue": None, "flusher": None})
+    return fake
+
+
+def _entry(i):
+    return {"log_id": f"log-{i}", "user_id": "u-1", "action": "test", "details": {}, "timestamp": "2026-01-01T00:00:00+00:00"}
+
+
+def test_shutdown_flush_keeps_the_batch_the_flusher_is_holding(logs):
+    async def run():
+        for i in range(3):
+            server.audit_log_enqueue(_entry(i))
+        await asyncio.sleep(0.05)  # the flusher has taken the entries and waits for more
+        assert server._audit_queue().empty()
+        await server.flush_audit_log_now()
+
+    asyncio.run(run())
+    assert [d["log_id"] for d in logs.docs] == ["log-0", "log-1", "log-2"]
+
+
+def _write_spill(tmp_path, n):
+    with open(tmp_path / "audit-1.jsonl", "w", encoding="utf-8") as f:
+        for i in range(n):
+            f.write(json.dumps(_entry(i)) + "\n")
+
+
+def test_failed_replay_keeps_the_entries_for_the_next_startup(logs, tmp_path):
+    _write_spill(tmp_path, 3)
+    logs.error = RuntimeError("mongo down")
+    assert asyncio.run(server.replay_audit_spill()) == 0
+    assert len(list(tmp_path.glob("audit-*.jsonl"))) == 1
+
+    logs.error = None
+    assert asyncio.run(server.replay_audit_spill()) == 3
+    assert list(tmp_path.iterdir()) == []
+    assert [d["_id"] for d in logs.docs] == ["log-0", "log-1", "log-2"]
+
+
+def test_duplicate_keys_on_replay_count_as_written(logs, tmp_path):
+    _write_spill(tmp_path, 2)
+    logs.error = BulkWriteError({"writeErrors": [{"index": 0, "code": 11000, "errmsg": "duplicate key"}]})
+    assert asyncio.run(server.replay_audit_spill()) == 2
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,94 @@
+from types import SimpleNamespace
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from kayicom_core import rbac
+from kayicom_core.routers import admin_rbac, auth
+from kayicom_core.security import create_access_token
+
+
+class _Collection:
+    def __init__(self, docs=()):
+        self.docs = [dict(d) for d in docs]
+
+    async def find_one(self, query, projection=None):
+        return next((dict(d) for d in self.docs if all(d.get(k) == v for k, v in query.items())), None)
+
+    async def update_one(self, query, update, upsert=False):
+        doc = next((d for d in self.docs if all(d.get(k) == v for k, v in query.items())), None)
+        if doc is None:
+            doc = dict(query)
+            self.docs.append(doc)
+        doc.update(update.get("$set", {}))
+        for key in update.get("$unset", {}):
+            doc.pop(key, None)
+
+
+def _app(users, settings=()):
+    db = SimpleNamespace(users=_Collection(users), settings=_Collection(settings))
+    logged = []
+
+    async def log_action(user_id, action, details):
+        logged.append((user_id, action))
+
+    permissions = rbac.PermissionStore(lambda: db)
+    current_user = auth.current_user_dependency(lambda: db)
+    admin_user = auth.admin_user_dependency(current_user, permissions)
+
+    app = FastAPI()
+    app.include_router(admin_rbac.build_router(
+        get_db=lambda: db, admin_user=admin_user, permissions=permissions, log_action=log_action,
+    ))
+
+    @app.get("/api/admin/deposits")
+    async def deposits(admin: dict = Depends(admin_user)):
+        return {"ok": True}
+
+    @app.get("/api/admin/logs")
+    async def logs(admin: dict = Depends(admin_user)):
+        return {"ok": True}
+
+    return TestClient(app), db, logged
+
+
+def _auth(user_id):
+    return {"Authorization": f"Bearer {create_access_token({'sub': user_id})}"}
+
+
+USERS = [
+    {"user_id": "fin-1", "is_admin": True, "admin_role": "finance"},
+    {"user_id": "adm-1", "is_admin": True, "admin_role": "admin"},
+    {"user_id": "cli-1", "is_admin": False},
+]
+
+
+def test_admin_check_uses_the_permissions_stored_in_the_database():
+    client, _, _ = _app(USERS, settings=[{"setting_id": "main", "rbac_permissions": {"finance": ["/api/admin/logs"]}}])
+    assert client.get("/api/admin/logs", headers=_auth("fin-1")).status_code == 200
+    assert client.get("/api/admin/deposits", headers=_auth("fin-1")).status_code == 403
+    assert client.get("/api/admin/deposits", headers=_auth("cli-1")).status_code == 403
+
+
+def test_saved_role_permissions_apply_on_the_next_request():
+    client, db, logged = _app(USERS)
+    assert client.get("/api/admin/logs", headers=_auth("fin-1")).status_code == 403  # not in the defaults
+
+    resp = client.patch("/api/admin/rbac", json={"role": "finance", "permissions": ["/api/admin/logs"]}, headers=_auth("adm-1"))
+    assert resp.status_code == 200
+    assert db.settings.docs[0]["rbac_permissions"]["finance"] == ["/api/admin/logs"]
+    assert client.get("/api/admin/logs", headers=_auth("fin-1")).status_code == 200
+
+    resp = client.post("/api/admin/rbac/reset", headers=_auth("adm-1"))
+    assert resp.json()["permissions"] == rbac.DEFAULT_PERMISSIONS
+    assert client.get("/api/admin/logs", headers=_auth("fin-1")).status_code == 403
+    assert logged == [("adm-1", "rbac_update"), ("adm-1", "rbac_reset")]
+
+
+def test_both_entry_points_mount_the_shared_auth_routes():
+    import server
+
+    endpoints = {r.path: r.endpoint for r in server.app.routes if getattr(r, "path", "").startswith("/api/auth")}
+    assert set(endpoints) == {"/api/auth/register", "/api/auth/login", "/api/auth/forgot-password",
+                              "/api/auth/reset-password", "/api/auth/me"}
+    assert all(e.__module__ == auth.__name__ for e in endpoints.values())
@@ -0,0 +1,35 @@
+import asyncio
+
+import resend
+
+import server
+
+
+def test_batch_retries_reuse_the_idempotency_key(monkeypatch):
+    calls = []
+
+    def fake_send(params, options=None):
+        calls.append(options)
+        if len(calls) == 1:
+            raise RuntimeError("Request failed: read timed out")  # Resend may still have sent it
+        return {"data": [{"id": f"m-{i}"} for i in range(len(params))]}
+
+    monkeypatch.setattr(resend.Batch, "send", fake_send)
+    monkeypatch.setitem(server.PROVIDER_GUARDS, "resend", server.ProviderGuard("resend", max_concurrency=2, max_timeout=5.0))
+    campaign = {"campaign_id": "c-1", "subject": "Hi", "html_content": "<p>Hi</p>"}
+    recipients = [{"user_id": "u-1", "email": "a@example.com"}, {"user_id": "u-2", "email": "b@example.com"}]
+
+    results = asyncio.run(server._campaign_send_batch(campaign, {"sender": "s@example.com"}, recipients))
+
+    assert [r["status"] for r in results] == ["sent", "sent"]
+    assert len(calls) == 2 and calls[0] == calls[1]
+    assert calls[0]["idempotency_key"] == server._campaign_batch_key("c-1", recipients)
+    assert server._campaign_batch_key("c-1", recipients[:1]) != calls[0]["idempotency_key"]
+
+
+def test_resend_sends_use_the_fixed_write_timeout(monkeypatch):
+    monkeypatch.setattr(server, "PROVIDER_WRITE_TIMEOUT_SECONDS", 45.0)
+    monkeypatch.setattr(resend, "default_http_client", resend.default_http_client)
+    monkeypatch.setattr(resend, "api_key", resend.api_key)
+    server._resend_configure(resend, "re_test")
+    assert resend.default_http_client._timeout == 45
@@ -0,0 +1,63 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import server
+
+
+class _Recorder:
+    def __init__(self, doc=None):
+        self.doc = doc
+        self.updates = []
+
+    async def find_one(self, query, projection=None):
+        return self.doc
+
+    async def update_one(self, query, update):
+        self.updates.append(update["$set"])
+
+
+@pytest.fixture
+def refresh(monkeypatch):
+    orders = _Recorder()
+    monkeypatch.setattr(server, "db", SimpleNamespace(users=_Recorder({}), virtual_card_orders=orders))
+    monkeypatch.setattr(server, "_card_detail_fetched_at", {})
+
+    def run(detail, order=None):
+        async def fake_post(settings, path, payload, **kwargs):
+            return detail
+
+        monkeypatch.setattr(server, "_strowallet_post", fake_post)
+        order = {"order_id": "o-1", "user_id": "u-1", "provider_card_id": "c-1", **(order or {})}
+        return asyncio.run(server._card_detail_refresh_now({}, order))
+
+    return run
+
+
+def test_refresh_reads_the_card_not_the_envelope(refresh):
+    changes = refresh({
+        "status": "success",
+        "type": "card",
+        "response": {"card_detail": {
+            "card_number": "5399000011112222", "expiry": "09/27", "name_on_card": "JEAN B", "card_type": "Mastercard",
+        }},
+    })
+    assert changes["card_last4"] == "2222"
+    assert changes["card_expiry"] == "09/27"
+    assert changes["card_holder_name"] == "JEAN B"
+    assert changes["card_type"] == "mastercard"
+
+
+def test_refresh_prefers_the_full_pan_for_last4(refresh):
+    changes = refresh({"response": {"card_detail": {"masked_pan": "539900******0000", "unmasked_pan": "5399000011112222"}}})
+    assert changes["card_last4"] == "2222"
+
+
+def test_envelope_balance_is_not_written_to_the_card(refresh):
+    changes = refresh({"status": "success", "balance": "999", "response": {"card_detail": {"card_number": "5399000011112222"}}},
+                      order={"balance": 12.5})
+    assert "balance" not in changes
+
+    changes = refresh({"balance": "999", "response": {"card_detail": {"card_number": "5399000011112222", "balance": "7.25"}}})
+    assert changes["balance"] == 7.25
@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+def _matches(doc, query):
+    for key, cond in query.items():
+        if key == "$or":
+            if not any(_matches(doc, q) for q in cond):
+                return False
+        elif isinstance(cond, dict) and "$lte" in cond:
+            if doc.get(key) is None or not doc[key] <= cond["$lte"]:
+                return False
+        elif doc.get(key) != cond:
+            return False
+    return True
+
+
+class _FakeOrders:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def find_one_and_update(self, query, update, projection=None):
+        for doc in self.docs:
+            if _matches(doc, query):
+                doc.update(update["$set"])
+                return {k: doc.get(k) for k in projection if k != "_id"}
+        return None
+
+    async def update_one(self, query, update):
+        for doc in self.docs:
+            if _matches(doc, query):
+                doc.update(update["$set"])
+
+
+@pytest.fixture
+def orders(monkeypatch):
+    docs = [
+        {"order_id": f"o-{i}", "provider_card_id": f"c-{i}", "provider": "strowallet", "status": "approved", "tx_sync_pending": True}
+        for i in range(2)
+    ]
+    monkeypatch.setattr(server, "db", SimpleNamespace(virtual_card_orders=_FakeOrders(docs)))
+    monkeypatch.setattr(server, "_card_tx_syncs", {})
+    calls = []
+
+    async def failing_post(settings, path, payload, **kwargs):
+        calls.append(payload["card_id"])
+        raise HTTPException(status_code=502, detail="Strowallet API error")
+
+    monkeypatch.setattr(server, "_strowallet_post", failing_post)
+    return SimpleNamespace(docs=docs, calls=calls)
+
+
+def test_failing_cards_are_tried_once_per_tick_and_backed_off(orders):
+    assert asyncio.run(server._card_tx_sync_tick({})) == 2
+    assert sorted(orders.calls) == ["c-0", "c-1"]
+    assert asyncio.run(server._card_tx_sync_tick({})) == 0
+
+    doc = orders.docs[0]
+    assert (doc["tx_sync_pending"], doc["tx_sync_failures"]) == (True, 1)
+    first_delay = datetime.fromisoformat(doc["tx_sync_next_at"]) - datetime.now(timezone.utc)
+    assert first_delay <= timedelta(seconds=server.CARD_TX_SYNC_INTERVAL_SECONDS)
+
+    # Once the backoff is over the card is retried, and the next wait is longer.
+    doc["tx_sync_next_at"] = (datetime.now(timezone.utc) - timedelta(seconds=1)).isoformat()
+    assert asyncio.run(server._card_tx_sync_tick({})) == 1
+    assert doc["tx_sync_failures"] == 2
+    second_delay = datetime.fromisoformat(doc["tx_sync_next_at"]) - datetime.now(timezone.utc)
+    assert second_delay > first_delay
@@ -0,0 +1,15 @@
+import db_indexes
+import server
+
+
+def test_timeseries_options_match_the_event_stores():
+    assert set(db_indexes.TIMESERIES) == set(server.EVENT_STORES)
+    for name, options in db_indexes.TIMESERIES.items():
+        assert options["timeField"] == "ts"
+        assert options["metaField"] == server.EVENT_STORES[name]["meta_field"]
+
+
+def test_event_store_reads_are_indexed_on_ts():
+    for name in db_indexes.TIMESERIES:
+        sorts = [spec["sort"] for spec in db_indexes.INDEXES[name] if spec["sort"]]
+        assert [("ts", -1)] in sorts, f"{name}: no index for the newest-first read"
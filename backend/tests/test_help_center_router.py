@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from kayicom_core.routers import help_center
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs = sorted(self.docs, key=lambda d: d.get(field) or 0, reverse=direction < 0)
+        return self
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+
+class _Articles:
+    def __init__(self):
+        self.docs = []
+
+    async def count_documents(self, query):
+        return len(self.docs)
+
+    async def insert_many(self, docs):
+        self.docs.extend(dict(d) for d in docs)
+
+    async def insert_one(self, doc):
+        self.docs.append(dict(doc))
+        doc["_id"] = object()  # like Motor, which sets an ObjectId on the caller's dict
+
+    def find(self, query, projection=None):
+        return _Cursor([d for d in self.docs if all(d.get(k) == v for k, v in query.items())])
+
+
+def _client():
+    db = SimpleNamespace(help_articles=_Articles())
+    logged = []
+
+    async def log_action(user_id, action, details):
+        logged.append((user_id, action, details))
+
+    app = FastAPI()
+    app.include_router(help_center.build_router(
+        get_db=lambda: db, admin_user=lambda: {"user_id": "admin-1"}, log_action=log_action,
+    ))
+    return TestClient(app), db, logged
+
+
+def test_public_list_seeds_defaults_in_order():
+    client, db, _ = _client()
+    articles = client.get("/api/public/help-center").json()["articles"]
+    assert articles and [a["order"] for a in articles] == sorted(a["order"] for a in articles)
+    assert len(db.help_articles.docs) == len(articles)
+
+
+def test_admin_create_returns_the_article_and_logs_it():
+    client, db, logged = _client()
+    resp = client.post("/api/admin/help-center", json={"title_en": "Fees", "order": 3})
+    assert resp.status_code == 200
+    article = resp.json()["article"]
+    assert article["title_en"] == "Fees" and article["category"] == "General"
+    assert logged == [("admin-1", "help_article_create", {"article_id": article["article_id"]})]
+
+    assert client.post("/api/admin/help-center", json={"content_en": "no title"}).status_code == 400
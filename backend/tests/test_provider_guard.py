@@ -0,0 +1,140 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+class _StandIn:
+    """Local stand-in for the Strowallet API: answers every request with `status` after `delay`."""
+
+    def __init__(self):
+        self.status = 200
+        self.delay = 0.0
+        self.hits = 0
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _answer(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                stand_in.hits += 1
+                time.sleep(stand_in.delay)
+                body = json.dumps({"success": stand_in.status < 400}).encode()
+                self.send_response(stand_in.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except OSError:  # the client gave up (timeout test)
+                    pass
+
+            do_GET = _answer
+            do_POST = _answer
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def settings(self):
+        return {"strowallet_base_url": f"http://127.0.0.1:{self.httpd.server_address[1]}", "strowallet_api_key": "k"}
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    srv = _StandIn()
+    monkeypatch.setitem(
+        server.PROVIDER_GUARDS,
+        "strowallet",
+        server.ProviderGuard("strowallet", max_concurrency=2, max_timeout=5.0, min_timeout=0.2),
+    )
+    monkeypatch.setattr(server, "PROVIDER_BREAKER_FAILURES", 3)
+    monkeypatch.setattr(server, "PROVIDER_BREAKER_OPEN_SECONDS", 0.3)
+    monkeypatch.setattr(server, "PROVIDER_BULKHEAD_WAIT_SECONDS", 0.1)
+    monkeypatch.setattr(server, "STROWALLET_WRITE_TIMEOUT_SECONDS", 5.0)
+    yield srv
+    srv.close()
+
+
+def _warm_up(srv, calls=25):
+    async def run():
+        for _ in range(calls):
+            await server._strowallet_get(srv.settings, "/api/bitvcard/card-details/")
+
+    asyncio.run(run())
+
+
+def test_breaker_opens_on_5xx_and_closes_after_a_good_probe(stand_in):
+    stand_in.status = 503
+    guard = server.PROVIDER_GUARDS["strowallet"]
+
+    async def run():
+        for _ in range(3):
+            with pytest.raises(HTTPException):
+                await server._strowallet_get(stand_in.settings, "/api/bitvcard/card-details/")
+        assert guard.state == "open"
+
+        hits = stand_in.hits
+        with pytest.raises(server.ProviderUnavailableError):
+            await server._strowallet_get(stand_in.settings, "/api/bitvcard/card-details/")
+        assert stand_in.hits == hits  # failed fast, the provider was not called
+
+        stand_in.status = 200
+        await asyncio.sleep(0.35)
+        await server._strowallet_get(stand_in.settings, "/api/bitvcard/card-details/")
+        assert guard.state == "closed"
+
+    asyncio.run(run())
+
+
+def test_adaptive_timeout_applies_to_idempotent_calls_only(stand_in):
+    _warm_up(stand_in)
+    guard = server.PROVIDER_GUARDS["strowallet"]
+    assert guard.timeout() < 1.0
+
+    stand_in.delay = 1.5
+
+    async def run():
+        with pytest.raises(httpx.TimeoutException):
+            await server._strowallet_get(stand_in.settings, "/api/bitvcard/card-details/")
+        with pytest.raises(httpx.TimeoutException):
+            await server._strowallet_post(
+                stand_in.settings, "/api/bitvcard/fetch-card-detail/", {"card_id": "c-1"}, idempotent=True
+            )
+        # Money-moving POSTs keep the fixed write timeout and wait for the provider's answer.
+        data = await server._strowallet_post(
+            stand_in.settings, "/api/bitvcard/fund-card/", {"card_id": "c-1", "amount": "10"}
+        )
+        assert data == {"success": True}
+
+    asyncio.run(run())
+
+
+def test_bulkhead_rejects_when_all_slots_are_busy(stand_in):
+    stand_in.delay = 0.5
+
+    async def run():
+        calls = [server._strowallet_get(stand_in.settings, "/api/bitvcard/card-details/") for _ in range(3)]
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    results = asyncio.run(run())
+    rejected = [r for r in results if isinstance(r, server.ProviderUnavailableError)]
+    assert len(rejected) == 1
+    assert "busy" in str(rejected[0].detail)
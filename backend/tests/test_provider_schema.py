@@ -0,0 +1,58 @@
+import server
+from server import STROWALLET_CARD_SCHEMA, normalize_strowallet_card
+
+
+def _detail(**card):
+    return {"status": "success", "type": "card", "balance": "999", "response": {"card_detail": card}}
+
+
+def test_envelope_status_is_not_the_card_status():
+    assert normalize_strowallet_card(_detail(card_number="4111111111111111"))["card_status"] is None
+
+
+def test_lookup_order_does_not_depend_on_previous_responses():
+    # A response without a card status, then one that has it.
+    normalize_strowallet_card(_detail(card_number="4111111111111111"))
+    assert normalize_strowallet_card(_detail(card_number="4111111111111111", status="frozen"))["card_status"] == "frozen"
+
+    # A masked-only response must not make later responses prefer the masked PAN.
+    normalize_strowallet_card(_detail(masked_pan="411111******1111"))
+    dto = normalize_strowallet_card(_detail(card_number="4111111111111111", masked_pan="411111******1111"))
+    assert dto["card_number"] == "4111111111111111"
+    assert dto["card_last4"] == "1111"
+
+
+def test_root_paths_are_dotted_paths_into_the_envelope():
+    for name, field in STROWALLET_CARD_SCHEMA.items():
+        for source_index, keys, path in field.paths:
+            assert source_index == 0 or len(keys) > 1, f"{name}: root path {path!r} reads the envelope"
+
+
+def test_match_reports_the_path():
+    detail = {"data": {"card": {"balance": "12.5"}}}
+    assert STROWALLET_CARD_SCHEMA["balance"].match(server._strowallet_locate_card(detail), detail) == ("12.5", "data.card.balance")
+
+
+def test_normalized_card_dto():
+    dto = normalize_strowallet_card(_detail(
+        card_number="5399000011112222", expiry="09/27", cvv="123", name_on_card="JEAN B",
+        card_brand="mastercard", billing_address={"street": "12 Rue Capois", "city": "PAP", "country": "HT"},
+    ))
+    assert dto["card_expiry"] == "09/27"
+    assert (dto["expiry_month"], dto["expiry_year"]) == ("09", "27")
+    assert dto["card_holder_name"] == "JEAN B"
+    assert dto["card_type"] == "mastercard"
+    assert dto["balance"] is None
+    assert (dto["billing_address"], dto["billing_city"], dto["billing_country"]) == ("12 Rue Capois", "PAP", "HT")
+
+
+def test_full_pan_wins_over_masked_keys_in_any_order():
+    dto = normalize_strowallet_card(_detail(masked_pan="411111******1111", unmasked_pan="4111111111111111"))
+    assert (dto["card_number"], dto["card_number_masked"]) == ("4111111111111111", False)
+    dto = normalize_strowallet_card(_detail(masked_card_number="411111******1111", full_card_number="4111111111111111"))
+    assert (dto["card_number"], dto["card_number_masked"]) == ("4111111111111111", False)
+
+
+def test_masked_only_payload_is_flagged():
+    dto = normalize_strowallet_card(_detail(masked_pan="411111******1111"))
+    assert (dto["card_number"], dto["card_number_masked"], dto["card_last4"]) == ("411111******1111", True, "1111")
@@ -0,0 +1,34 @@
+import os
+import stat
+import time
+
+import server
+
+
+def _file(directory, name, size, age_hours):
+    path = directory / name
+    path.write_bytes(b"x" * size)
+    ts = time.time() - age_hours * 3600
+    os.utime(path, (ts, ts))
+    return path
+
+
+def test_prune_evicts_old_files_then_least_recent_over_budget(monkeypatch, tmp_path):
+    monkeypatch.setattr(server, "RECEIPT_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(server, "RECEIPT_CACHE_MAX_AGE_HOURS", 24)
+    monkeypatch.setattr(server, "RECEIPT_CACHE_MAX_MB", 2.5 / 1024)  # 2.5 KiB
+    _file(tmp_path, "stale.pdf", 100, age_hours=30)
+    _file(tmp_path, "older.pdf", 1024, age_hours=3)
+    _file(tmp_path, "rendering.tmp", 1024, age_hours=2)
+    _file(tmp_path, "recent.pdf", 1024, age_hours=1)
+
+    assert server.prune_receipt_cache() == 2
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["recent.pdf", "rendering.tmp"]
+
+
+def test_cache_dir_is_private(monkeypatch, tmp_path):
+    cache = tmp_path / "receipts"
+    cache.mkdir(mode=0o755)
+    monkeypatch.setattr(server, "RECEIPT_CACHE_DIR", cache)
+    server._receipt_cache_dir()
+    assert stat.S_IMODE(cache.stat().st_mode) == 0o700
@@ -0,0 +1,23 @@
+import asyncio
+
+import server
+
+
+def test_snapshot_is_moved_back_to_midnight(monkeypatch):
+    calls = []
+
+    async def ledger_net(user_id, start_iso, end_iso):
+        calls.append((user_id, start_iso, end_iso))
+        return {"HTG": 500.0, "USD": -12.5}  # booked between midnight and the snapshot
+
+    monkeypatch.setattr(server, "_ledger_net", ledger_net)
+    snapshot = {"as_of": "2026-03-02", "wallet_htg": 1500.0, "wallet_usd": 40.0, "taken_at": "2026-03-02T00:07:31+00:00"}
+
+    opening = asyncio.run(server._snapshot_at_day_start("u-1", snapshot))
+
+    assert calls == [("u-1", "2026-03-02T00:00:00+00:00", "2026-03-02T00:07:31+00:00")]
+    assert opening == {"as_of": "2026-03-02", "wallet_htg": 1000.0, "wallet_usd": 52.5}
+
+
+def test_missing_snapshot_stays_missing():
+    assert asyncio.run(server._snapshot_at_day_start("u-1", None)) is None
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def poller(monkeypatch):
+    async def lease(*args):
+        return True
+
+    async def settings():
+        return {"telegram_enabled": True, "telegram_bot_token": "t"}
+
+    monkeypatch.setattr(server, "acquire_worker_lease", lease)
+    monkeypatch.setattr(server, "get_settings_snapshot", settings)
+    monkeypatch.setattr(server, "TELEGRAM_POLL_ERROR_BACKOFF_SECONDS", 0)
+
+
+def test_poll_offset_moves_only_after_the_batch_was_handled(poller, monkeypatch):
+    offsets = []
+    handled = []
+
+    async def fake_api(bot_token, method, payload):
+        if method == "getUpdates":
+            offsets.append(payload.get("offset"))
+            await asyncio.sleep(0)
+            first = payload.get("offset") or 10
+            return {"ok": True, "result": [{"update_id": first}, {"update_id": first + 1}]}
+        return {"ok": True}
+
+    async def fake_handle(updates):
+        handled.append([u["update_id"] for u in updates])
+        if len(handled) == 1:
+            raise RuntimeError("mongo down")
+
+    monkeypatch.setattr(server, "_telegram_api", fake_api)
+    monkeypatch.setattr(server, "telegram_handle_updates", fake_handle)
+
+    async def run():
+        task = asyncio.create_task(server._telegram_poll_loop())
+        while len(offsets) < 3:
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(run())
+    assert offsets[:3] == [None, None, 12]
+    assert handled[:2] == [[10, 11], [10, 11]]
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    monkeypatch.setattr(server, "_telegram_state", {
+        "client": None, "queue": None, "workers": [], "poller": None,
+        "global_bucket": server._TokenBucket(100, 100), "chat_buckets": {},
+    })
+
+
+def test_groups_and_channels_get_the_slower_bucket(gateway):
+    assert server._telegram_chat_bucket("-1001234567890").rate == pytest.approx(server.TELEGRAM_GROUP_RATE_PER_MIN / 60)
+    assert server._telegram_chat_bucket("123456").rate == server.TELEGRAM_CHAT_RATE_PER_SEC
+
+
+def test_retry_after_pauses_the_chat_for_every_worker(gateway, monkeypatch):
+    import time
+
+    sent = []
+
+    async def fake_api(bot_token, method, payload):
+        sent.append((payload["text"], time.monotonic()))
+        if len(sent) == 1:
+            return {"ok": False, "http_status": 429, "parameters": {"retry_after": 0.3}}
+        return {"ok": True}
+
+    monkeypatch.setattr(server, "_telegram_api", fake_api)
+    monkeypatch.setattr(server, "TELEGRAM_CHAT_RATE_PER_SEC", 100)
+
+    async def run():
+        first = asyncio.create_task(server._telegram_send_now("t", "42", {"text": "a"}))
+        await asyncio.sleep(0.05)  # "a" got the 429
+        second = asyncio.create_task(server._telegram_send_now("t", "42", {"text": "b"}))
+        return await asyncio.gather(first, second)
+
+    started = time.monotonic()
+    assert asyncio.run(run()) == [True, True]
+    assert sorted(text for text, _ in sent) == ["a", "a", "b"]
+    assert all(at - started >= 0.3 for _, at in sent[1:])
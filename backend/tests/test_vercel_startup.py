@@ -0,0 +1,27 @@
+import asyncio
+import importlib
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def index(monkeypatch):
+    monkeypatch.syspath_prepend(str(Path(__file__).resolve().parents[2] / "api"))
+    return importlib.import_module("index")
+
+
+def test_cold_start_reports_a_stale_schema_without_migrating(index, monkeypatch, caplog):
+    class _Meta:
+        async def find_one(self, query):
+            return {"_id": index.SCHEMA_META_ID, "version": index.SCHEMA_VERSION - 1}
+
+    async def run_migrations():
+        raise AssertionError("startup must not run migrations")
+
+    monkeypatch.setattr(index, "get_db", lambda: SimpleNamespace(schema_meta=_Meta()))
+    monkeypatch.setattr(index, "run_migrations", run_migrations)
+
+    asyncio.run(index.startup())
+    assert "python api/index.py migrate" in caplog.text
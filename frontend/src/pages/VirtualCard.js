@@ -516,7 +516,7 @@ export default function VirtualCard() {
     if (!order?.order_id) return;
     setRefreshingDetails(true);
     try {
-      const resp = await axios.get(`${API}/virtual-cards/${order.order_id}/detail`);
+      const resp = await axios.get(`${API}/virtual-cards/${order.order_id}/detail?refresh=true`);
       const updated = resp.data?.card;
       if (updated) {
         setSelectedCard(updated);
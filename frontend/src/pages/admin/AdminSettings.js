@@ -273,15 +273,14 @@ export default function AdminSettings() {
 
   const purgeOldRecords = async () => {
     try {
-      const resp = await axios.post(`${API}/admin/purge-old-records?days=7`);
-      const r = resp.data?.result;
+      await axios.post(`${API}/admin/purge-old-records?days=7`);
       toast.success(getText(
-        `Netwayaj fèt: ${r.deleted_deposits} depo, ${r.deleted_withdrawals} retrè, ${r.deleted_transactions} tranzaksyon efase`,
-        `Nettoyage effectué: ${r.deleted_deposits} dépôts, ${r.deleted_withdrawals} retraits, ${r.deleted_transactions} transactions supprimés`,
-        `Cleanup done: deleted ${r.deleted_deposits} deposits, ${r.deleted_withdrawals} withdrawals, ${r.deleted_transactions} transactions`
+        'Achivaj kòmanse: istorik > 7 jou ap deplase nan achiv la',
+        'Archivage lancé: l\'historique > 7 jours est déplacé vers les archives',
+        'Archiving started: records older than 7 days are being moved to the archive'
       ));
     } catch (e) {
-      toast.error(getText('Erè pandan netwayaj', 'Erreur nettoyage', 'Cleanup error'));
+      toast.error(e.response?.data?.detail || getText('Erè pandan achivaj', 'Erreur archivage', 'Archiving error'));
     }
   };
 
@@ -1178,7 +1177,7 @@ export default function AdminSettings() {
             </Button>
             <Button variant="outline" onClick={purgeOldRecords} className="text-red-600 border-red-200 hover:bg-red-50">
               <Trash2 size={16} className="mr-2" />
-              {getText('Efase istorik > 7 jou', 'Supprimer > 7 jours', 'Delete > 7 days')}
+              {getText('Achive istorik > 7 jou', 'Archiver > 7 jours', 'Archive > 7 days')}
             </Button>
           </div>
 